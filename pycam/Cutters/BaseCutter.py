@@ -19,7 +19,7 @@ You should have received a copy of the GNU General Public License
 along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
 """
 
-import uuid
+import hashlib
 
 from pycam.Geometry import number, INFINITE, epsilon
 from pycam.Geometry import IDGenerator
@@ -71,7 +71,10 @@ class BaseCutter(IDGenerator):
         return start[1] + self.distance_radius
 
     def update_uuid(self):
-        self.uuid = uuid.uuid4()
+        """ the "uuid" is a hash of the shape of the cutter (ignoring its location) """
+        shape = (self.__class__.__name__, self.radius, self.height, self.required_distance,
+                 getattr(self, "minorradius", None))
+        self.uuid = hashlib.sha1(repr(shape).encode("utf-8")).hexdigest()
 
     def __repr__(self):
         return "BaseCutter"
@@ -19,9 +19,15 @@ along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
 """
 
 import os
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 import pycam.Exporters.GCode
 from pycam.Toolpath import CORNER_STYLE_EXACT_PATH, CORNER_STYLE_EXACT_STOP, \
-        CORNER_STYLE_OPTIMIZE_SPEED, CORNER_STYLE_OPTIMIZE_TOLERANCE
+        CORNER_STYLE_OPTIMIZE_SPEED, CORNER_STYLE_OPTIMIZE_TOLERANCE, MOVE_STRAIGHT_RAPID
 
 
 DEFAULT_HEADER = (("G40", "disable tool radius compensation"),
@@ -40,6 +46,27 @@ def _render_number(number):
         return ("%%.%df" % DEFAULT_DIGITS) % number
 
 
+def _get_move_templates():
+    """ return the format strings of all move lines (see "LinuxCNC.add_move")
+
+    The index of a template is the sum of the flags of the changed axes (x: 1, y: 2, z: 4) and
+    the flag of the move type (unchanged: 0, G1: 8, G0: 16).
+    """
+    templates = []
+    for prefix in (" ", "G1", "G0"):
+        for axes_flags in range(8):
+            components = [prefix]
+            for index, axis in enumerate("XYZ"):
+                if axes_flags & (1 << index):
+                    components.append("%s%%.6f" % axis)
+            command = " ".join(components)
+            templates.append((command + os.linesep) if command.strip() else "")
+    return templates
+
+
+_MOVE_TEMPLATES = _get_move_templates()
+
+
 class LinuxCNC(pycam.Exporters.GCode.BaseGenerator):
 
     def add_header(self):
@@ -85,6 +112,52 @@ class LinuxCNC(pycam.Exporters.GCode.BaseGenerator):
         if command.strip():
             self.add_command(command)
 
+    def add_arc(self, coordinates, center, clockwise=False):
+        start = self._get_cache("position", None)
+        if start is None:
+            # the center offset cannot be calculated without a start position
+            self.add_move(coordinates)
+            return
+        components = ["G2" if clockwise else "G3"]
+        for (axis, value, last) in zip("XYZ", coordinates, start):
+            if (axis != "Z") or (last != value):
+                components.append("%s%.6f" % (axis, value))
+        # the center is specified relative to the start position
+        components.append("I%.6f" % (center[0] - start[0]))
+        components.append("J%.6f" % (center[1] - start[1]))
+        self.add_command(" ".join(components))
+
+    def add_move_batch(self, steps):
+        if numpy is None:
+            return super(LinuxCNC, self).add_move_batch(steps)
+        # The axes to be written and the move type of every line are determined for all moves at
+        # once.  Lines sharing the same template are formatted together.
+        positions = numpy.array([step.position for step in steps], dtype=numpy.float64)
+        is_rapid = numpy.array([step.action == MOVE_STRAIGHT_RAPID for step in steps])
+        changed_axes = numpy.ones(positions.shape, dtype=bool)
+        changed_axes[1:] = positions[1:] != positions[:-1]
+        previous = self._get_cache("position", None)
+        if previous is not None:
+            changed_axes[0] = positions[0] != numpy.array(previous, dtype=numpy.float64)
+        changed_type = numpy.ones(len(steps), dtype=bool)
+        changed_type[1:] = is_rapid[1:] != is_rapid[:-1]
+        changed_type[0] = self._get_cache("rapid_move", None) != bool(is_rapid[0])
+        template_indices = (changed_axes * (1, 2, 4)).sum(axis=1) \
+            + changed_type * numpy.where(is_rapid, 16, 8)
+        lines = numpy.empty(len(steps), dtype=object)
+        for template_index in numpy.unique(template_indices).tolist():
+            rows = numpy.nonzero(template_indices == template_index)[0]
+            template = _MOVE_TEMPLATES[template_index]
+            columns = [axis for axis in range(3) if template_index & (1 << axis)]
+            if columns:
+                lines[rows] = [template % tuple(values)
+                               for values in positions[rows][:, columns].tolist()]
+            else:
+                lines[rows] = template
+        self.destination.write("".join(lines.tolist()))
+        self._cache["position"] = steps[-1].position
+        self._cache["rapid_move"] = bool(is_rapid[-1])
+
     def command_feedrate(self, feedrate):
         self.add_command("F%s" % _render_number(feedrate), "set feedrate")
 
@@ -20,10 +20,15 @@ along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
 
 import pycam.Utils.log
 import pycam.Toolpath.Filters
-from pycam.Toolpath import MOVE_STRAIGHT_RAPID, MACHINE_SETTING, COMMENT, MOVES_LIST
+from pycam.Toolpath import MOVE_ARC, MOVE_STRAIGHT_RAPID, MACHINE_SETTING, COMMENT, MOVES_LIST
 
 _log = pycam.Utils.log.get_logger()
 
+# number of consecutive moves passed to the generator at once (see "add_move_batch")
+MOVE_BATCH_SIZE = 4096
+# size of the write buffer for output files
+OUTPUT_BUFFER_SIZE = 1024 * 1024
+
 
 class BaseGenerator(object):
 
@@ -35,7 +40,7 @@ class BaseGenerator(object):
             self._close_stream_on_exit = False
         else:
             # open the file
-            self.destination = open(destination, "w")
+            self.destination = open(destination, "w", OUTPUT_BUFFER_SIZE)
             self._close_stream_on_exit = True
         self._filters = []
         self._cache = {}
@@ -57,6 +62,20 @@ class BaseGenerator(object):
     def add_move(self, coordinates, is_rapid=False):
         raise NotImplementedError("someone forgot to implement 'add_move'")
 
+    def add_arc(self, coordinates, center, clockwise=False):
+        raise NotImplementedError("someone forgot to implement 'add_arc'")
+
+    def add_move_batch(self, steps):
+        """ add a sequence of moves
+
+        Generators may override this method for processing many moves at once.
+        """
+        for step in steps:
+            is_rapid = step.action == MOVE_STRAIGHT_RAPID
+            self.add_move(step.position, is_rapid)
+            self._cache["position"] = step.position
+            self._cache["rapid_move"] = is_rapid
+
     def add_footer(self):
         raise NotImplementedError("someone forgot to implement 'add_footer'")
 
@@ -70,13 +89,27 @@ class BaseGenerator(object):
         all_filters = list(self._filters)
         if filters:
             all_filters.extend(filters)
-        filtered_moves = pycam.Toolpath.Filters.get_filtered_moves(moves, all_filters)
+        # the moves are passed on one by one (as far as the filters allow it)
+        filtered_moves = pycam.Toolpath.Filters.iter_filtered_moves(moves, all_filters)
+        # consecutive moves are collected in batches
+        move_batch = []
         for step in filtered_moves:
-            if step.action in MOVES_LIST:
-                is_rapid = step.action == MOVE_STRAIGHT_RAPID
-                self.add_move(step.position, is_rapid)
+            if (step.action in MOVES_LIST) \
+                    and not ((step.action == MOVE_ARC) and (step.center is not None)):
+                # arcs without a center are straight moves
+                move_batch.append(step)
+                if len(move_batch) >= MOVE_BATCH_SIZE:
+                    self.add_move_batch(move_batch)
+                    move_batch = []
+                continue
+            elif move_batch:
+                self.add_move_batch(move_batch)
+                move_batch = []
+            if step.action == MOVE_ARC:
+                self.add_arc(step.position, step.center, step.clockwise)
                 self._cache["position"] = step.position
-                self._cache["rapid_move"] = is_rapid
+                # the next straight move needs to specify its type
+                self._cache["rapid_move"] = None
             elif step.action == COMMENT:
                 self.add_comment(step.text)
             elif step.action == MACHINE_SETTING:
@@ -91,3 +124,5 @@ class BaseGenerator(object):
                               "'%s=%s' -> ignore", step.key, step.value)
             else:
                 _log.warn("A non-basic toolpath item (%s) remained in the queue -> ignore", step)
+        if move_batch:
+            self.add_move_batch(move_batch)
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2017 The PyCAM developers
+
+This file is part of PyCAM.
+
+PyCAM is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyCAM is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import numpy
+
+
+class FlatKdtree(object):
+    """ spatial index for two-dimensional boxes stored in flat arrays
+
+    The tree is an implicit complete binary tree: node "k" has the children
+    "2k+1" and "2k+2". Every level splits the boxes of each node at the median
+    of their centers along the axis with the largest spread. Each node stores
+    the bounding box of all its items (similar to a bounding volume hierarchy).
+    The leaves refer to consecutive ranges of the reordered items.
+    """
+
+    def __init__(self, lower, upper, leaf_size=8):
+        """
+        @param lower: array of shape (N, 2) with the minimum x/y of each box
+        @param upper: array of shape (N, 2) with the maximum x/y of each box
+        """
+        lower = numpy.asarray(lower, dtype=numpy.float64).reshape(-1, 2)
+        upper = numpy.asarray(upper, dtype=numpy.float64).reshape(-1, 2)
+        count = len(lower)
+        self.depth = 0
+        while (count >> self.depth) > leaf_size:
+            self.depth += 1
+        self.order = self._get_order(lower, upper, self.depth)
+        self.lower = numpy.ascontiguousarray(lower[self.order])
+        self.upper = numpy.ascontiguousarray(upper[self.order])
+        # the items of leaf "j" are in the range leaf_starts[j]..leaf_starts[j+1]
+        leaf_count = 1 << self.depth
+        self.leaf_starts = (count * numpy.arange(leaf_count + 1)) // leaf_count
+        self.node_lower, self.node_upper = self._get_node_bounds()
+        self._lists = None
+
+    @staticmethod
+    def _get_order(lower, upper, depth):
+        """ return the permutation of the items sorted into the leaves
+
+        Each axis keeps its own ordering of the items (grouped by node, sorted
+        along the axis within each node). Splitting a node partitions both
+        orderings in a stable way. Thus the items are sorted only once.
+        """
+        count = len(lower)
+        centers = (lower + upper) / 2
+        orders = [numpy.argsort(centers[:, axis], kind="mergesort") for axis in range(2)]
+        goes_low = numpy.empty(count, dtype=bool)
+        for level in range(depth):
+            node_count = 1 << level
+            starts = (count * numpy.arange(node_count + 1)) // node_count
+            middles = (count * numpy.arange(1, 2 * node_count, 2)) // (2 * node_count)
+            sizes = numpy.diff(starts)
+            node_of_position = numpy.repeat(numpy.arange(node_count), sizes)
+            # the spread of the centers within each node (based on the sorted orders)
+            spreads = [centers[order[starts[1:] - 1], axis] - centers[order[starts[:-1]], axis]
+                       for axis, order in enumerate(orders)]
+            split_axis = (spreads[1] > spreads[0]).astype(numpy.int8)
+            for axis, order in enumerate(orders):
+                selected = split_axis[node_of_position] == axis
+                is_low = numpy.arange(count) < middles[node_of_position]
+                goes_low[order[selected]] = is_low[selected]
+            for axis, order in enumerate(orders):
+                low = goes_low[order]
+                # positions within the node for the low and the high part
+                low_rank = numpy.cumsum(low) - low
+                high_rank = numpy.arange(count) - low_rank
+                low_offset = low_rank[starts[:-1]]
+                high_offset = high_rank[starts[:-1]]
+                new_positions = numpy.where(
+                    low, starts[:-1][node_of_position] + low_rank - low_offset[node_of_position],
+                    middles[node_of_position] + high_rank - high_offset[node_of_position])
+                reordered = numpy.empty_like(order)
+                reordered[new_positions] = order
+                orders[axis] = reordered
+        return orders[0]
+
+    def _get_node_bounds(self):
+        """ calculate the bounding boxes of all nodes (bottom-up) """
+        leaf_count = 1 << self.depth
+        node_count = 2 * leaf_count - 1
+        node_lower = numpy.empty((node_count, 2), dtype=numpy.float64)
+        node_upper = numpy.empty((node_count, 2), dtype=numpy.float64)
+        if len(self.lower) == 0:
+            # no node overlaps any box
+            node_lower.fill(numpy.inf)
+            node_upper.fill(-numpy.inf)
+            return node_lower, node_upper
+        # the leaves are not empty (see "leaf_size")
+        starts = self.leaf_starts[:-1]
+        node_lower[leaf_count - 1:] = numpy.minimum.reduceat(self.lower, starts, axis=0)
+        node_upper[leaf_count - 1:] = numpy.maximum.reduceat(self.upper, starts, axis=0)
+        for level in range(self.depth - 1, -1, -1):
+            first = (1 << level) - 1
+            nodes = numpy.arange(first, 2 * first + 1)
+            node_lower[nodes] = numpy.minimum(node_lower[2 * nodes + 1],
+                                              node_lower[2 * nodes + 2])
+            node_upper[nodes] = numpy.maximum(node_upper[2 * nodes + 1],
+                                              node_upper[2 * nodes + 2])
+        return node_lower, node_upper
+
+    def __len__(self):
+        return len(self.order)
+
+    def __getstate__(self):
+        # the lists for single queries are rebuilt on demand
+        state = dict(self.__dict__)
+        state["_lists"] = None
+        return state
+
+    def _get_lists(self):
+        # plain lists are faster than numpy arrays for the access of single items
+        if self._lists is None:
+            self._lists = (self.node_lower.tolist(), self.node_upper.tolist(),
+                           self.lower.tolist(), self.upper.tolist(), self.order.tolist(),
+                           self.leaf_starts.tolist())
+        return self._lists
+
+    def Search(self, minx, maxx, miny, maxy):
+        """ return the indices of all boxes overlapping the given rectangle """
+        node_lower, node_upper, lower, upper, order, leaf_starts = self._get_lists()
+        first_leaf = (1 << self.depth) - 1
+        result = []
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            low = node_lower[node]
+            high = node_upper[node]
+            if (low[0] > maxx) or (high[0] < minx) or (low[1] > maxy) or (high[1] < miny):
+                continue
+            if node < first_leaf:
+                stack.append(2 * node + 2)
+                stack.append(2 * node + 1)
+            else:
+                leaf = node - first_leaf
+                for index in range(leaf_starts[leaf], leaf_starts[leaf + 1]):
+                    low = lower[index]
+                    high = upper[index]
+                    if not ((low[0] > maxx) or (high[0] < minx) or (low[1] > maxy)
+                            or (high[1] < miny)):
+                        result.append(order[index])
+        return result
+
+    def search_many(self, minx, maxx, miny, maxy):
+        """ search the boxes overlapping each of many rectangles at once
+
+        @param minx, maxx, miny, maxy: arrays (of equal length N) describing
+            the query rectangles
+        @returns: a tuple (offsets, indices) - the result of query "i" is
+            indices[offsets[i]:offsets[i + 1]]
+        """
+        query_lower = numpy.column_stack((minx, miny)).astype(numpy.float64)
+        query_upper = numpy.column_stack((maxx, maxy)).astype(numpy.float64)
+        query_count = len(query_lower)
+        # all (query, node) pairs that still need to be checked - level by level
+        queries = numpy.arange(query_count)
+        nodes = numpy.zeros(query_count, dtype=numpy.int64)
+        for level in range(self.depth + 1):
+            overlap = self._overlaps(self.node_lower[nodes], self.node_upper[nodes],
+                                     query_lower[queries], query_upper[queries])
+            queries = queries[overlap]
+            nodes = nodes[overlap]
+            if level < self.depth:
+                queries = numpy.repeat(queries, 2)
+                nodes = (2 * numpy.repeat(nodes, 2) + 1) + numpy.tile((0, 1), len(nodes))
+        # expand the leaves to their items
+        leaves = nodes - ((1 << self.depth) - 1)
+        starts = self.leaf_starts[leaves]
+        sizes = self.leaf_starts[leaves + 1] - starts
+        queries = numpy.repeat(queries, sizes)
+        items = (numpy.repeat(starts - numpy.cumsum(sizes) + sizes, sizes)
+                 + numpy.arange(sizes.sum()))
+        overlap = self._overlaps(self.lower[items], self.upper[items], query_lower[queries],
+                                 query_upper[queries])
+        queries = queries[overlap]
+        items = self.order[items[overlap]]
+        # sort the results by query (keeping the order of items)
+        sort_order = numpy.argsort(queries, kind="mergesort")
+        offsets = numpy.zeros(query_count + 1, dtype=numpy.int64)
+        numpy.cumsum(numpy.bincount(queries, minlength=query_count), out=offsets[1:])
+        return offsets, items[sort_order]
+
+    @staticmethod
+    def _overlaps(lower1, upper1, lower2, upper2):
+        return ~((lower1 > upper2) | (upper1 < lower2)).any(axis=1)
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2017 The PyCAM developers
+
+This file is part of PyCAM.
+
+PyCAM is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyCAM is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import bisect
+
+
+class IntervalTree(object):
+    """ spatial index for one-dimensional intervals (e.g. the height range of triangles)
+
+    This is a centered interval tree: every node stores the intervals containing its
+    center - sorted by their lower and by their upper limits. All other intervals are
+    passed to the left or right child of the node. Small nodes are stored as plain lists.
+    """
+
+    def __init__(self, lower, upper, leaf_size=16):
+        """
+        @param lower: sequence of the lower limits of the intervals
+        @param upper: sequence of the upper limits of the intervals
+        """
+        self.lower = [float(value) for value in lower]
+        self.upper = [float(value) for value in upper]
+        self._leaf_size = leaf_size
+        self._root = self._build(list(range(len(self.lower))))
+
+    def __len__(self):
+        return len(self.lower)
+
+    def _build(self, items):
+        if not items:
+            return None
+        if len(items) <= self._leaf_size:
+            return items
+        middles = sorted((self.lower[index] + self.upper[index]) / 2.0 for index in items)
+        center = middles[len(middles) // 2]
+        left, right, centered = [], [], []
+        for index in items:
+            if self.upper[index] < center:
+                left.append(index)
+            elif self.lower[index] > center:
+                right.append(index)
+            else:
+                centered.append(index)
+        by_lower = sorted((self.lower[index], index) for index in centered)
+        # the upper limits are negated for a common (ascending) order
+        by_upper = sorted((-self.upper[index], index) for index in centered)
+        return (center, [item[0] for item in by_lower], [item[1] for item in by_lower],
+                [item[0] for item in by_upper], [item[1] for item in by_upper],
+                self._build(left), self._build(right))
+
+    def search(self, low, high):
+        """ return the sorted indices of all intervals overlapping the range "low..high" """
+        result = []
+        todo = [self._root]
+        while todo:
+            node = todo.pop()
+            if node is None:
+                continue
+            if isinstance(node, list):
+                result.extend(index for index in node
+                              if (self.lower[index] <= high) and (self.upper[index] >= low))
+                continue
+            center, lower_limits, lower_items, upper_limits, upper_items, left, right = node
+            if high < center:
+                # all intervals of this node reach up to "high"
+                result.extend(lower_items[:bisect.bisect_right(lower_limits, high)])
+                todo.append(left)
+            elif low > center:
+                # all intervals of this node reach down to "low"
+                result.extend(upper_items[:bisect.bisect_right(upper_limits, -low)])
+                todo.append(right)
+            else:
+                result.extend(lower_items)
+                todo.append(left)
+                todo.append(right)
+        result.sort()
+        return result
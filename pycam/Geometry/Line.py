@@ -27,8 +27,8 @@ except ImportError:
 
 from pycam.Geometry import epsilon, TransformableContainer, IDGenerator
 from pycam.Geometry.Plane import Plane
-from pycam.Geometry.PointUtils import (padd, pcross, pdist, pdot, pmul, pnorm, pnormsq,
-                                       pnormalized, psub)
+from pycam.Geometry.PointUtils import (padd, pcross, pdist, pdot, pis_inside, pmul, pnorm,
+                                       pnormsq, pnormalized, psub)
 # OpenGLTools will be imported later, if necessary
 # import pycam.Gui.OpenGLTools
 
@@ -240,20 +240,21 @@ class Line(IDGenerator, TransformableContainer):
             # remove all intersections outside the box and outside the line
             valid_intersections = [(cp, dist) for cp, dist in intersections
                                    if cp and (-epsilon <= dist <= self.len + epsilon)
-                                   and cp.is_inside(minx, maxx, miny, maxy, minz, maxz)]
+                                   and pis_inside(cp, minx, maxx, miny, maxy, minz, maxz)]
             # sort the intersections according to their distance to self.p1
             valid_intersections.sort(key=lambda collision: collision[1])
             # Check if p1 is within the box - otherwise use the closest
             # intersection. The check for "valid_intersections" is necessary
             # to prevent an IndexError due to floating point inaccuracies.
-            if self.p1.is_inside(minx, maxx, miny, maxy, minz, maxz) \
+            if pis_inside(self.p1, minx, maxx, miny, maxy, minz, maxz) \
                     or not valid_intersections:
                 new_p1 = self.p1
             else:
                 new_p1 = valid_intersections[0][0]
             # Check if p2 is within the box - otherwise use the intersection
             # most distant from p1.
-            if self.p2.is_inside(minx, maxx, miny, maxy, minz, maxz) or not valid_intersections:
+            if pis_inside(self.p2, minx, maxx, miny, maxy, minz, maxz) \
+                    or not valid_intersections:
                 new_p2 = self.p2
             else:
                 new_p2 = valid_intersections[-1][0]
@@ -19,11 +19,13 @@ You should have received a copy of the GNU General Public License
 along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
 """
 
+import hashlib
 import math
-import uuid
+import struct
 
 from pycam.Geometry import epsilon, INFINITE, TransformableContainer, IDGenerator, Box3D, Point3D
 from pycam.Geometry.Matrix import TRANSFORMATIONS
+from pycam.Geometry.IntervalTree import IntervalTree
 from pycam.Geometry.Line import Line
 from pycam.Geometry.Plane import Plane
 from pycam.Geometry.Polygon import Polygon
@@ -35,6 +37,13 @@ from pycam.Utils import ProgressCounter
 import pycam.Utils.log
 log = pycam.Utils.log.get_logger()
 
+try:
+    import numpy
+    from pycam.Geometry.FlatKdtree import FlatKdtree
+    from pycam.Geometry.TriangleMesh import TriangleMesh
+except ImportError:
+    FlatKdtree = None
+
 
 def get_combined_bounds(models):
     low = [None, None, None]
@@ -174,8 +183,9 @@ class BaseModel(IDGenerator, TransformableContainer):
 
     def _get_progress_callback(self, update_callback):
         if update_callback:
-            return ProgressCounter(self.get_children_count(),
-                                   update_callback=update_callback).increment
+            # the callback is called for every single item - read the clock less often
+            return ProgressCounter(self.get_children_count(), update_callback=update_callback,
+                                   check_every=100).increment
         else:
             return None
 
@@ -203,7 +213,7 @@ class BaseModel(IDGenerator, TransformableContainer):
 
 class Model(BaseModel):
 
-    def __init__(self, use_kdtree=True):
+    def __init__(self, use_kdtree=True, mesh=None):
         import pycam.Exporters.STLExporter
         super(Model, self).__init__()
         self._triangles = []
@@ -214,7 +224,15 @@ class Model(BaseModel):
         # enable/disable kdtree
         self._use_kdtree = use_kdtree
         self._t_kdtree = None
+        # interval tree of the height ranges of all triangles (see "get_height_index")
+        self._z_index = None
+        # array-based copy of list-based models (see "get_triangle_index")
+        self._t_mesh = None
         self.__uuid = None
+        # optional array-based storage (see pycam.Geometry.TriangleMesh)
+        self._mesh = None
+        if mesh is not None:
+            self.set_mesh(mesh)
 
     def __len__(self):
         """ Return the number of available items in the model.
@@ -222,7 +240,15 @@ class Model(BaseModel):
         """
         return len(self._triangles)
 
+    def __add__(self, other_model):
+        if (self._mesh is not None) and (getattr(other_model, "_mesh", None) is not None):
+            return self.__class__(use_kdtree=self._use_kdtree, mesh=self._mesh + other_model._mesh)
+        else:
+            return super(Model, self).__add__(other_model)
+
     def copy(self):
+        if self._mesh is not None:
+            return self.__class__(use_kdtree=self._use_kdtree, mesh=self._mesh.copy())
         result = self.__class__(use_kdtree=self._use_kdtree)
         for triangle in self.triangles():
             result.append(triangle.copy())
@@ -230,29 +256,124 @@ class Model(BaseModel):
 
     @property
     def uuid(self):
-        if (self.__uuid is None) or self._dirty:
+        """ a hash of the triangles of the model
+
+        Equal models share the same "uuid" - thus they are transferred only once to the
+        workers of parallel processing.
+        """
+        if self._dirty:
             self._update_caches()
+        if self.__uuid is None:
+            self.__uuid = self._get_content_hash()
         return self.__uuid
 
+    def _get_content_hash(self):
+        content_hash = hashlib.sha1()
+        if self._mesh is None:
+            for triangle in self._triangles:
+                coords = [value for point in (triangle.p1, triangle.p2, triangle.p3,
+                                              triangle.normal) for value in point[:3]]
+                content_hash.update(struct.pack("12d", *coords))
+        else:
+            for array in (self._mesh.vertices, self._mesh.faces, self._mesh.normals):
+                content_hash.update(numpy.ascontiguousarray(array).tobytes())
+        return content_hash.hexdigest()
+
+    def set_mesh(self, mesh):
+        """ use a TriangleMesh as the storage of all triangles of this model
+
+        Triangle objects are created only on demand afterwards.
+        """
+        self._mesh = mesh
+        # the mesh behaves like a sequence of triangles
+        self._triangles = mesh
+        self._item_groups = [self._triangles]
+        self.reset_cache()
+
+    def get_mesh(self):
+        """ return the TriangleMesh of this model or None (for list-based models) """
+        return self._mesh
+
+    def _detach_mesh(self):
+        """ turn the mesh into a plain list of triangles (e.g. for appending) """
+        if self._mesh is not None:
+            self._triangles = list(self._mesh)
+            self._item_groups = [self._triangles]
+            self._mesh = None
+
     def append(self, item):
+        if isinstance(item, Triangle):
+            self._detach_mesh()
         super(Model, self).append(item)
         if isinstance(item, Triangle):
             self._triangles.append(item)
             # we assume, that the kdtree needs to be rebuilt again
             self._dirty = True
 
+    def get_children_count(self):
+        if self._mesh is not None:
+            # see Triangle.get_children_count
+            return 7 * len(self._mesh)
+        return super(Model, self).get_children_count()
+
+    def transform_by_matrix(self, matrix, transformed_list=None, callback=None):
+        if self._mesh is None:
+            super(Model, self).transform_by_matrix(matrix, transformed_list=transformed_list,
+                                                   callback=callback)
+        else:
+            self._mesh.transform_by_matrix(matrix)
+            if callback:
+                callback()
+            self.reset_cache()
+
     def reset_cache(self):
-        super(Model, self).reset_cache()
+        if self._mesh is None:
+            super(Model, self).reset_cache()
+        else:
+            lower, upper = self._mesh.get_bounds()
+            if lower is None:
+                self.minx = self.miny = self.minz = None
+                self.maxx = self.maxy = self.maxz = None
+            else:
+                self.minx, self.miny, self.minz = lower.tolist()
+                self.maxx, self.maxy, self.maxz = upper.tolist()
         # the triangle kdtree needs to be reset after transforming the model
         self._update_caches()
 
     def _update_caches(self):
         if self._use_kdtree:
-            self._t_kdtree = TriangleKdtree(self.triangles())
-        self.__uuid = str(uuid.uuid4())
+            if FlatKdtree is None:
+                self._t_kdtree = TriangleKdtree(self.triangles())
+            elif self._mesh is None:
+                # the flat kdtree contains the indices of the triangles
+                bounds = numpy.array([(t.minx, t.miny, t.maxx, t.maxy) for t in self._triangles],
+                                     dtype=numpy.float64).reshape(-1, 4)
+                self._t_kdtree = FlatKdtree(bounds[:, :2], bounds[:, 2:])
+            else:
+                self._t_kdtree = FlatKdtree(self._mesh.lower[:, :2], self._mesh.upper[:, :2])
+        self._t_mesh = None
+        self._z_index = None
+        # the hash is calculated on demand
+        self.__uuid = None
         # the kdtree is up-to-date again
         self._dirty = False
 
+    def get_triangle_index(self):
+        """ return the flat kdtree (or None) and a TriangleMesh of all triangles
+
+        The indices returned by the kdtree refer to the faces of the mesh.
+        This is used for vectorized calculations (requires numpy).
+        """
+        if self._dirty:
+            self._update_caches()
+        if self._mesh is not None:
+            mesh = self._mesh
+        else:
+            if self._t_mesh is None:
+                self._t_mesh = TriangleMesh.from_triangles(self._triangles)
+            mesh = self._t_mesh
+        return (self._t_kdtree if self._use_kdtree else None), mesh
+
     def triangles(self, minx=-INFINITE, miny=-INFINITE, minz=-INFINITE, maxx=+INFINITE,
                   maxy=+INFINITE, maxz=+INFINITE):
         if (minx == miny == minz == -INFINITE) and (maxx == maxy == maxz == +INFINITE):
@@ -261,14 +382,69 @@ class Model(BaseModel):
             # update the kdtree, if new triangles were added meanwhile
             if self._dirty:
                 self._update_caches()
-            return self._t_kdtree.Search(minx, maxx, miny, maxy)
+            if FlatKdtree is None:
+                return self._t_kdtree.Search(minx, maxx, miny, maxy)
+            else:
+                return [self._triangles[index]
+                        for index in self._t_kdtree.Search(minx, maxx, miny, maxy)]
         return self._triangles
 
+    def get_triangle_indices(self, minx=-INFINITE, miny=-INFINITE, maxx=+INFINITE,
+                             maxy=+INFINITE, minz=-INFINITE, maxz=+INFINITE):
+        """ return the indices of the triangles overlapping the given area
+
+        The indices refer to the sequence returned by "triangles()" (without arguments).  They
+        are ordered like the result of "triangles(...)" for the same area.  In contrast to the
+        identity of the triangle objects they are also valid for copies of the model (e.g. in
+        other processes).
+        A height range ("minz" / "maxz") selects only the triangles overlapping it.
+        """
+        if (minx == miny == -INFINITE) and (maxx == maxy == +INFINITE):
+            if (minz == -INFINITE) and (maxz == +INFINITE):
+                return list(range(len(self._triangles)))
+            return self.get_height_index().search(minz, maxz)
+        if self._use_kdtree and (FlatKdtree is not None):
+            if self._dirty:
+                self._update_caches()
+            indices = self._t_kdtree.Search(minx, maxx, miny, maxy)
+        else:
+            indices = [index for index, t in enumerate(self._triangles)
+                       if not ((t.minx > maxx) or (t.maxx < minx) or (t.miny > maxy)
+                               or (t.maxy < miny))]
+        if (minz != -INFINITE) or (maxz != +INFINITE):
+            z_index = self.get_height_index()
+            indices = [index for index in indices
+                       if (z_index.lower[index] <= maxz) and (z_index.upper[index] >= minz)]
+        return indices
+
+    def get_height_index(self):
+        """ return an IntervalTree of the height ranges (minz..maxz) of all triangles
+
+        The indices of the tree refer to the sequence returned by "triangles()".
+        """
+        if self._dirty:
+            self._update_caches()
+        if self._z_index is None:
+            if self._mesh is None:
+                self._z_index = IntervalTree([t.minz for t in self._triangles],
+                                             [t.maxz for t in self._triangles])
+            else:
+                self._z_index = IntervalTree(self._mesh.lower[:, 2].tolist(),
+                                             self._mesh.upper[:, 2].tolist())
+        return self._z_index
+
     def get_waterline_contour(self, plane, callback=None):
+        if plane.n[0] == plane.n[1] == 0:
+            # a horizontal plane: only the triangles crossing its height are relevant
+            z = plane.p[2]
+            triangles = [self._triangles[index]
+                         for index in self.get_height_index().search(z - epsilon, z + epsilon)]
+        else:
+            triangles = self._triangles
         collision_lines = []
-        progress_max = 2 * len(self._triangles)
+        progress_max = 2 * len(triangles)
         counter = 0
-        for t in self._triangles:
+        for t in triangles:
             if callback and callback(percent=100.0 * counter / progress_max):
                 return
             collision_line = plane.intersect_triangle(t, counter_clockwise=True)
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2017 The PyCAM developers
+
+This file is part of PyCAM.
+
+PyCAM is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyCAM is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import numpy
+
+from pycam.Geometry.Triangle import Triangle
+
+
+def merge_vertices(points):
+    """ merge points with identical coordinates (via sorting instead of a kd-tree)
+
+    @param points: an array of shape (N, 3)
+    @returns: a tuple of the unique vertices and the index of the vertex for
+        every point (an array of length N)
+    """
+    points = numpy.asarray(points).reshape(-1, 3)
+    if len(points) == 0:
+        return points.copy(), numpy.zeros(0, dtype=numpy.int32)
+    # lexsort uses the last key as the primary one
+    order = numpy.lexsort(points.T[::-1])
+    sorted_points = points[order]
+    is_new = numpy.empty(len(points), dtype=bool)
+    is_new[0] = True
+    numpy.any(sorted_points[1:] != sorted_points[:-1], axis=1, out=is_new[1:])
+    inverse = numpy.empty(len(points), dtype=numpy.int32)
+    inverse[order] = numpy.cumsum(is_new) - 1
+    return sorted_points[is_new], inverse
+
+
+class TriangleMesh(object):
+    """ a triangle mesh stored in contiguous arrays
+
+    All vertices are stored only once (shared by the faces). Every face is
+    described by the indices of its three vertices in clockwise order (as
+    expected by pycam.Geometry.Triangle).
+    The per-face values (normals, bounds, circumcircle, ...) are calculated
+    once for all faces. Triangle objects are only created on demand
+    (e.g. for code that iterates a model) and are cached afterwards.
+    The mesh behaves like a read-only sequence of Triangle objects.
+    """
+
+    def __init__(self, vertices, faces, normals=None):
+        self.vertices = numpy.ascontiguousarray(vertices, dtype=numpy.float64).reshape(-1, 3)
+        self.faces = numpy.ascontiguousarray(faces, dtype=numpy.int32).reshape(-1, 3)
+        if normals is None:
+            normals = self._calculate_normals()
+        self.normals = numpy.ascontiguousarray(normals, dtype=numpy.float64).reshape(-1, 3)
+        self.reset_cache()
+
+    @classmethod
+    def from_triangles(cls, triangles):
+        """ create a mesh based on a sequence of Triangle objects """
+        vertex_indices = {}
+        vertices = []
+        faces = []
+        normals = []
+        for triangle in triangles:
+            face = []
+            for point in triangle.get_points():
+                point = tuple(point[:3])
+                try:
+                    face.append(vertex_indices[point])
+                except KeyError:
+                    vertex_indices[point] = len(vertices)
+                    face.append(len(vertices))
+                    vertices.append(point)
+            faces.append(face)
+            normals.append(triangle.normal[:3])
+        return cls(numpy.array(vertices, dtype=numpy.float64).reshape(-1, 3),
+                   numpy.array(faces, dtype=numpy.int32).reshape(-1, 3),
+                   numpy.array(normals, dtype=numpy.float64).reshape(-1, 3))
+
+    def __len__(self):
+        return len(self.faces)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self.faces)
+        if not 0 <= index < len(self.faces):
+            raise IndexError("triangle index out of range: %d" % index)
+        try:
+            return self._triangles[index]
+        except KeyError:
+            triangle = Triangle(*self.get_points(index),
+                                n=tuple(self.normals[index].tolist()) + ('v', ))
+            self._triangles[index] = triangle
+            return triangle
+
+    def __iter__(self):
+        for index in range(len(self.faces)):
+            yield self[index]
+
+    def __getstate__(self):
+        # the lazily created triangles are not worth transferring
+        state = dict(self.__dict__)
+        state["_triangles"] = {}
+        return state
+
+    def copy(self):
+        return type(self)(self.vertices.copy(), self.faces.copy(), self.normals.copy())
+
+    def __add__(self, other):
+        return type(self)(numpy.concatenate((self.vertices, other.vertices)),
+                          numpy.concatenate((self.faces, other.faces + len(self.vertices))),
+                          numpy.concatenate((self.normals, other.normals)))
+
+    def get_points(self, index):
+        p1, p2, p3 = self.vertices[self.faces[index]].tolist()
+        return (tuple(p1), tuple(p2), tuple(p3))
+
+    def get_face_points(self):
+        """ return the three corner arrays (each with one row per face) """
+        return (self.vertices[self.faces[:, 0]], self.vertices[self.faces[:, 1]],
+                self.vertices[self.faces[:, 2]])
+
+    def _calculate_normals(self):
+        p1, p2, p3 = self.get_face_points()
+        # the same orientation as used by pycam.Geometry.Triangle
+        normals = numpy.cross(p3 - p1, p2 - p1)
+        lengths = numpy.sqrt((normals * normals).sum(axis=1))
+        # degenerated faces keep a zero-length normal
+        lengths[lengths == 0] = 1
+        return normals / lengths[:, numpy.newaxis]
+
+    def reset_cache(self):
+        self._triangles = {}
+        p1, p2, p3 = self.get_face_points()
+        self.lower = numpy.minimum(numpy.minimum(p1, p2), p3)
+        self.upper = numpy.maximum(numpy.maximum(p1, p2), p3)
+        self.center = (p1 + p2 + p3) / 3
+        # circumcircle (see pycam.Geometry.Triangle.reset_cache)
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            v12 = p2 - p1
+            v23 = p3 - p2
+            v31 = p1 - p3
+            dist12_sq = (v12 * v12).sum(axis=1)
+            dist23_sq = (v23 * v23).sum(axis=1)
+            dist31_sq = (v31 * v31).sum(axis=1)
+            cross = numpy.cross(v12, v23)
+            denom = numpy.sqrt((cross * cross).sum(axis=1))
+            self.radius = numpy.sqrt(dist12_sq * dist23_sq * dist31_sq) / (2 * denom)
+            self.radiussq = self.radius ** 2
+            denom2 = 2 * denom * denom
+            alpha = dist23_sq * (-v12 * v31).sum(axis=1) / denom2
+            beta = dist31_sq * (-v23 * v12).sum(axis=1) / denom2
+            gamma = dist12_sq * (-v31 * v23).sum(axis=1) / denom2
+        self.middle = (p1 * alpha[:, numpy.newaxis] + p2 * beta[:, numpy.newaxis]
+                       + p3 * gamma[:, numpy.newaxis])
+
+    def get_bounds(self):
+        """ return the lower and upper corner of the bounding box of all faces """
+        if len(self.faces) == 0:
+            return None, None
+        return self.lower.min(axis=0), self.upper.max(axis=0)
+
+    def transform_by_matrix(self, matrix):
+        """ transform all vertices and normals by a 3x3 or 3x4 matrix
+
+        The normals are transformed without the translation part - similar to
+        the behaviour of pycam.Geometry.PointUtils.ptransform_by_matrix.
+        """
+        rotation = numpy.array([row[:3] for row in matrix], dtype=numpy.float64)
+        offset = numpy.array([(row[3] if len(row) > 3 else 0) for row in matrix],
+                             dtype=numpy.float64)
+        self.vertices = numpy.ascontiguousarray(self.vertices.dot(rotation.T) + offset)
+        self.normals = numpy.ascontiguousarray(self.normals.dot(rotation.T))
+        self.reset_cache()
@@ -0,0 +1,569 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2017 The PyCAM developers
+
+This file is part of PyCAM.
+
+PyCAM is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyCAM is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
+
+Headless batch processing of toolpath jobs described by a manifest (JSON).
+
+Example of a manifest (all sections except "jobs" are optional):
+
+    {"models": {"part": {"file": "part.stl", "unit": "mm"}},
+     "tools": {"ball": {"shape": "ballnose", "parameters": {"radius": 1.5, "feedrate": 500}}},
+     "processes": {"rough": {"strategy": "slicing",
+                             "parameters": {"step_down": 2, "path_pattern": "grid"}}},
+     "bounds": {"margin": {"type": "relative_margin", "unit": "mm",
+                           "lower": [5, 5, 0], "upper": [5, 5, 1]}},
+     "outputs": {"part": {"file": "part.ngc", "settings": {"safety_height": 10}}},
+     "settings": {"spindle_delay": 1},
+     "jobs": [{"name": "rough", "models": ["part"], "tool": "ball", "process": "rough",
+               "bounds": "margin", "output": "part", "timeout": 600}]}
+
+Tools, processes and bounds of a job may be given inline (as a dictionary) instead of a name.
+An output that is not defined in "outputs" is used as a filename ("-" for stdout).  Relative
+filenames refer to the location of the manifest.  The toolpaths of jobs sharing an output are
+written in the order of the jobs.  A missing corner ("lower" or "upper") of custom bounds is
+taken from the bounding box of the models.
+"""
+
+import json
+import os
+import sys
+import time
+
+from pycam import GenericError
+import pycam.Exporters.GCode.LinuxCNC
+from pycam.Geometry.Model import get_combined_bounds
+import pycam.Importers
+import pycam.Plugins
+from pycam.Plugins.Bounds import BoundsEntity
+from pycam.Plugins.Models import ModelEntity
+from pycam.Plugins.ParameterGroupManager import ParameterGroupManager
+from pycam.Plugins.PathPatterns import PathPatternGrid, PathPatternSpiral
+from pycam.Plugins.ProcessStrategies import ProcessStrategyContour, ProcessStrategyEngraving, \
+        ProcessStrategySlicing, ProcessStrategySurfacing
+from pycam.Plugins.TaskTypes import TaskTypeMilling
+from pycam.Plugins.ToolTypes import ToolTypeBallNose, ToolTypeBullNose, ToolTypeFlat
+from pycam.Toolpath import CORNER_STYLE_EXACT_PATH, CORNER_STYLE_EXACT_STOP, \
+        CORNER_STYLE_OPTIMIZE_SPEED, CORNER_STYLE_OPTIMIZE_TOLERANCE
+import pycam.Toolpath.Filters as Filters
+import pycam.Toolpath.MotionGrid as MotionGrid
+import pycam.Utils
+from pycam.Utils.events import EventCore
+import pycam.Utils.log
+import pycam.Utils.threading
+
+
+log = pycam.Utils.log.get_logger()
+
+PARAMETER_GROUPS = ("tool", "process", "path_pattern", "task", "toolpath_processor")
+
+# see pycam.Plugins.ToolpathProcessors.ToolpathProcessorMilling
+DEFAULT_SETTINGS = {"safety_height": 25,
+                    "plunge_feedrate": 100,
+                    "step_width_x": 0.0001,
+                    "step_width_y": 0.0001,
+                    "step_width_z": 0.0001,
+                    "path_mode": CORNER_STYLE_EXACT_PATH,
+                    "motion_tolerance": 0.0,
+                    "naive_tolerance": 0.0,
+                    "spindle_enable": True,
+                    "spindle_delay": 3,
+                    "arc_tolerance": 0}
+
+# readable names of parameter values (numbers are accepted, too)
+PARAMETER_CHOICES = {
+    "milling_style": {"ignore": MotionGrid.MILLING_STYLE_IGNORE,
+                      "conventional": MotionGrid.MILLING_STYLE_CONVENTIONAL,
+                      "climb": MotionGrid.MILLING_STYLE_CLIMB},
+    "grid_direction": {"x": MotionGrid.GRID_DIRECTION_X,
+                       "y": MotionGrid.GRID_DIRECTION_Y,
+                       "xy": MotionGrid.GRID_DIRECTION_XY},
+    "spiral_direction": {"in": MotionGrid.SPIRAL_DIRECTION_IN,
+                         "out": MotionGrid.SPIRAL_DIRECTION_OUT},
+    "pocketing_type": {"none": MotionGrid.POCKETING_TYPE_NONE,
+                       "holes": MotionGrid.POCKETING_TYPE_HOLES,
+                       "material": MotionGrid.POCKETING_TYPE_MATERIAL},
+    "path_mode": {"exact_path": CORNER_STYLE_EXACT_PATH,
+                  "exact_stop": CORNER_STYLE_EXACT_STOP,
+                  "optimize_speed": CORNER_STYLE_OPTIMIZE_SPEED,
+                  "optimize_tolerance": CORNER_STYLE_OPTIMIZE_TOLERANCE}}
+
+# see pycam.Plugins.Bounds
+BOUNDS_TYPES = ("relative_margin", "custom")
+BOUNDS_UNITS = ("%", "mm")
+BOUNDS_TOOL_LIMITS = ("inside", "along", "around")
+
+
+class HeadlessToolpathFilters(pycam.Plugins.PluginBase):
+    """ the toolpath filters of the tool and G-code parameter plugins (without their controls) """
+
+    def setup(self):
+        self._filter_funcs = (self.get_feedrate_filters, self.get_spindle_speed_filters,
+                              self.get_safety_height_filters, self.get_plunge_feedrate_filters,
+                              self.get_step_width_filters, self.get_spindle_filters,
+                              self.get_corner_style_filters, self.get_arc_fitting_filters)
+        for func in self._filter_funcs:
+            self.core.register_chain("toolpath_filters", func)
+        return True
+
+    def teardown(self):
+        for func in self._filter_funcs:
+            self.core.unregister_chain("toolpath_filters", func)
+
+    @Filters.toolpath_filter("tool", "feedrate")
+    def get_feedrate_filters(self, feedrate):
+        return [Filters.MachineSetting("feedrate", feedrate)]
+
+    @Filters.toolpath_filter("tool", "spindle_speed")
+    def get_spindle_speed_filters(self, spindle_speed):
+        return [Filters.MachineSetting("spindle_speed", spindle_speed)]
+
+    @Filters.toolpath_filter("settings", "safety_height")
+    def get_safety_height_filters(self, safety_height):
+        return [Filters.SafetyHeight(safety_height)]
+
+    @Filters.toolpath_filter("settings", "plunge_feedrate")
+    def get_plunge_feedrate_filters(self, plunge_feedrate):
+        return [Filters.PlungeFeedrate(plunge_feedrate)]
+
+    @Filters.toolpath_filter("settings", ("step_width_x", "step_width_y", "step_width_z"))
+    def get_step_width_filters(self, **kwargs):
+        return [Filters.StepWidth(**kwargs)]
+
+    @Filters.toolpath_filter("settings", ("spindle_enable", "spindle_delay"))
+    def get_spindle_filters(self, spindle_enable=False, spindle_delay=0):
+        if spindle_enable:
+            return [Filters.TriggerSpindle(spindle_delay)]
+        else:
+            return []
+
+    @Filters.toolpath_filter("settings", ("path_mode", "motion_tolerance", "naive_tolerance"))
+    def get_corner_style_filters(self, path_mode=CORNER_STYLE_EXACT_PATH, motion_tolerance=0,
+                                 naive_tolerance=0):
+        return [Filters.PathMode(path_mode, motion_tolerance, naive_tolerance)]
+
+    @Filters.toolpath_filter("settings", "arc_tolerance")
+    def get_arc_fitting_filters(self, arc_tolerance):
+        if arc_tolerance:
+            return [Filters.ArcFitting(arc_tolerance)]
+        else:
+            return []
+
+
+class _SilentProgress(object):
+    """ progress handler for processes reporting via the core (e.g. engraving) """
+
+    def update(self, *args, **kwargs):
+        return False
+
+    def set_multiple(self, count, base_text=None):
+        pass
+
+    def update_multiple(self, increment=True):
+        pass
+
+    def finish(self):
+        pass
+
+
+# the plugins providing the parameter sets of the GUI (without their controls)
+HEADLESS_PLUGINS = (HeadlessToolpathFilters, ToolTypeBallNose, ToolTypeBullNose, ToolTypeFlat,
+                    PathPatternGrid, PathPatternSpiral, ProcessStrategySlicing,
+                    ProcessStrategyContour, ProcessStrategySurfacing, ProcessStrategyEngraving,
+                    TaskTypeMilling)
+
+
+def get_headless_core(use_toolpath_cache=True):
+    """ create an event core providing the tool, process and task types of the GUI """
+    core = EventCore()
+    ParameterGroupManager(core, "ParameterGroupManager").setup()
+    # the groups are usually registered by the GUI plugins
+    for group_name in PARAMETER_GROUPS:
+        core.get("register_parameter_group")(group_name)
+    for plugin_class in HEADLESS_PLUGINS:
+        plugin = plugin_class(core, plugin_class.__name__)
+        if not plugin.setup():
+            raise GenericError("Failed to initialize plugin: %s" % plugin.name)
+        if (plugin_class is TaskTypeMilling) and not use_toolpath_cache:
+            plugin.toolpath_cache = None
+    core.set("progress", _SilentProgress())
+    return core
+
+
+def load_manifest(filename):
+    """ read a manifest (JSON) - relative filenames refer to its directory """
+    try:
+        with open(filename) as manifest_file:
+            manifest = json.load(manifest_file)
+    except (IOError, ValueError) as exc:
+        raise GenericError("Failed to read the manifest '%s': %s" % (filename, exc))
+    if not isinstance(manifest, dict) or not isinstance(manifest.get("jobs"), list):
+        raise GenericError("The manifest '%s' does not contain a list of jobs" % filename)
+    return manifest
+
+
+def write_summary(summary, destination):
+    """ store the summary as JSON in a file ("-" for stdout) """
+    text = json.dumps(summary, indent=2, sort_keys=True)
+    if destination == "-":
+        print(text)
+    else:
+        with open(os.path.expanduser(destination), "w") as summary_file:
+            summary_file.write(text + os.linesep)
+
+
+def _get_choice(key, value):
+    choices = PARAMETER_CHOICES.get(key)
+    if choices and isinstance(value, (type(b""), type(u""))):
+        try:
+            return choices[value.lower()]
+        except KeyError:
+            raise GenericError("Invalid value for '%s': %s (choose one of: %s)"
+                               % (key, value, ", ".join(sorted(choices))))
+    return value
+
+
+class BatchRunner(object):
+    """ generate the toolpaths of all jobs in a manifest and export them as G-code
+
+    The toolpaths are calculated by the task type "milling" (like in the GUI).  Every model is
+    loaded only once.  Independent jobs run in parallel (see
+    pycam.Utils.threading.run_jobs_concurrently).
+    """
+
+    def __init__(self, manifest, base_directory=None, program_locations=None, core=None):
+        self.manifest = manifest
+        self.base_directory = base_directory or os.getcwd()
+        self.program_locations = program_locations or {}
+        if core is None:
+            core = get_headless_core(use_toolpath_cache=manifest.get("toolpath_cache", True))
+        self.core = core
+        self._models = {}
+
+    def _get_filename(self, filename):
+        if filename == "-":
+            return filename
+        return os.path.join(self.base_directory, os.path.expanduser(filename))
+
+    def _get_item(self, section, reference, description):
+        """ return an item defined in a section of the manifest or an inline definition """
+        if isinstance(reference, dict):
+            return reference
+        try:
+            return self.manifest.get(section, {})[reference]
+        except (KeyError, TypeError):
+            raise GenericError("Unknown %s: %s" % (description, reference))
+
+    def _get_parameters(self, group_name, set_name, parameters, description):
+        """ merge the given parameters with the defaults of a parameter set """
+        parameter_sets = self.core.get("get_parameter_sets")(group_name)
+        if set_name not in parameter_sets:
+            raise GenericError("Unknown %s: %s (choose one of: %s)"
+                               % (description, set_name, ", ".join(sorted(parameter_sets))))
+        result = dict(parameter_sets[set_name]["parameters"])
+        for key, value in (parameters or {}).items():
+            if key not in result:
+                raise GenericError("Unknown parameter for %s '%s': %s"
+                                   % (description, set_name, key))
+            result[key] = _get_choice(key, value)
+        return result
+
+    def _load_model(self, name):
+        """ load a model (once) - the result is a dictionary for the summary """
+        if name in self._models:
+            return self._models[name]
+        spec = self._get_item("models", name, "model")
+        if not isinstance(spec, dict):
+            spec = {"file": spec}
+        result = {"name": name, "file": spec.get("file"), "status": "failed", "load_time": 0,
+                  "entity": None}
+        self._models[name] = result
+        start_time = time.time()
+        try:
+            uri = pycam.Utils.URIHandler(spec["file"])
+            if uri.is_local():
+                uri = pycam.Utils.URIHandler(self._get_filename(str(spec["file"])))
+            if not uri.exists():
+                raise GenericError("The model file ('%s') was not found" % uri)
+            importer = pycam.Importers.detect_file_type(uri)[1]
+            model = importer(uri, program_locations=self.program_locations,
+                             unit=spec.get("unit", "mm"))
+            if not model:
+                raise GenericError("Failed to load the model file (%s)" % uri)
+        except (GenericError, KeyError, TypeError) as exc:
+            result["error"] = str(exc)
+            log.error("Failed to load model '%s': %s", name, exc)
+        else:
+            result["entity"] = ModelEntity(model)
+            result["status"] = "ok"
+            log.info("Loaded model '%s' from '%s'", name, uri)
+        result["load_time"] = time.time() - start_time
+        return result
+
+    def _get_models(self, names):
+        entities = []
+        for name in names:
+            model = self._load_model(name)
+            if model["entity"] is None:
+                raise GenericError("The model '%s' is not available" % name)
+            entities.append(model["entity"])
+        return entities
+
+    def _get_tool(self, reference):
+        spec = self._get_item("tools", reference, "tool")
+        shape = spec.get("shape")
+        return {"shape": shape,
+                "parameters": self._get_parameters("tool", shape, spec.get("parameters"), "tool")}
+
+    def _get_process(self, reference):
+        spec = self._get_item("processes", reference, "process")
+        strategy = spec.get("strategy")
+        parameters = self._get_parameters("process", strategy, spec.get("parameters"), "process")
+        if "path_pattern" in parameters:
+            pattern = parameters["path_pattern"] or "grid"
+            if not isinstance(pattern, dict):
+                pattern = {"name": pattern}
+            parameters["path_pattern"] = {
+                "name": pattern.get("name"),
+                "parameters": self._get_parameters("path_pattern", pattern.get("name"),
+                                                   pattern.get("parameters"), "path pattern")}
+        if "trace_models" in parameters:
+            parameters["trace_models"] = self._get_models(parameters["trace_models"])
+        return {"strategy": strategy, "parameters": parameters}
+
+    def _get_bounds(self, reference, name, models=None):
+        bounds = BoundsEntity(self.core, name)
+        if reference is None:
+            # zero margin around the collision models
+            return bounds
+        spec = self._get_item("bounds", reference, "bounds")
+        bounds_type = spec.get("type", "relative_margin")
+        unit = spec.get("unit", "%")
+        tool_limit = spec.get("tool_limit", "along")
+        for value, choices in ((bounds_type, BOUNDS_TYPES), (unit, BOUNDS_UNITS),
+                               (tool_limit, BOUNDS_TOOL_LIMITS)):
+            if value not in choices:
+                raise GenericError("Invalid bounds setting: %s (choose one of: %s)"
+                                   % (value, ", ".join(choices)))
+        parameters = bounds["parameters"]
+        parameters["TypeRelativeMargin"] = (bounds_type == "relative_margin")
+        parameters["TypeCustom"] = (bounds_type == "custom")
+        parameters["RelativeUnit"] = BOUNDS_UNITS.index(unit)
+        parameters["ToolLimit"] = BOUNDS_TOOL_LIMITS.index(tool_limit)
+        parameters["Models"] = self._get_models(spec.get("models", []))
+        model_box = None
+        for key in ("lower", "upper"):
+            values = spec.get(key)
+            if values is None and (bounds_type == "custom"):
+                # the missing corner of custom bounds is taken from the models
+                if model_box is None:
+                    model_box = get_combined_bounds(
+                        [entity.model for entity in (parameters["Models"] or models or [])])
+                if model_box is None:
+                    raise GenericError("Invalid bounds: custom bounds without '%s' require "
+                                       "models" % key)
+                values = getattr(model_box, key)
+            elif values is None:
+                values = (0, 0, 0)
+            if len(values) != 3:
+                raise GenericError("Invalid bounds: '%s' requires three values" % key)
+            for axis, value in zip("XYZ", values):
+                parameters["Boundary%s%s" % ("Low" if key == "lower" else "High", axis)] = \
+                    float(value)
+        return bounds
+
+    def _get_output(self, reference):
+        """ return the filename and the settings of an output """
+        spec = self.manifest.get("outputs", {}).get(reference)
+        if spec is None:
+            spec = {"file": reference}
+        settings = dict(DEFAULT_SETTINGS)
+        for source in (self.manifest.get("settings", {}), spec.get("settings", {})):
+            for key, value in source.items():
+                if key not in settings:
+                    raise GenericError("Unknown output setting: %s" % key)
+                settings[key] = _get_choice(key, value)
+        return self._get_filename(spec["file"]), settings
+
+    def _get_task(self, index, job):
+        name = job.get("name") or "Job #%d" % (index + 1)
+        models = job.get("models", [])
+        if not isinstance(models, list):
+            models = [models]
+        collision_models = self._get_models(models)
+        if not collision_models and ((job.get("bounds") is None)
+                                     or (self._get_item("bounds", job["bounds"], "bounds")
+                                         .get("type", "relative_margin") != "custom")):
+            raise GenericError("Jobs without models require custom bounds")
+        return {"type": "milling", "name": name,
+                "parameters": {"collision_models": collision_models,
+                               "tool": self._get_tool(job.get("tool")),
+                               "process": self._get_process(job.get("process")),
+                               "bounds": self._get_bounds(job.get("bounds"), name,
+                                                          collision_models)}}
+
+    def run(self, max_jobs=None, progress=None):
+        """ process all jobs and return the summary (a dictionary)
+
+        @param max_jobs: number of jobs running at the same time (default: number of processes)
+        @param progress: optional progress bar (see pycam.Gui.Console.ConsoleProgressBar)
+        """
+        start_time = time.time()
+        jobs = self.manifest["jobs"]
+        results = []
+        tasks = []
+        outputs = []
+        for index, job in enumerate(jobs):
+            result = {"name": job.get("name") or "Job #%d" % (index + 1), "status": "pending",
+                      "models": job.get("models", []), "output": None, "steps": 0,
+                      "times": {"generation": 0, "export": 0}}
+            results.append(result)
+            try:
+                task = self._get_task(index, job)
+                output = None
+                if job.get("output"):
+                    output = self._get_output(job["output"])
+                    result["output"] = output[0]
+            except (GenericError, AttributeError, TypeError, ValueError) as exc:
+                log.error("Invalid job '%s': %s", result["name"], exc)
+                result["status"] = "failed"
+                result["error"] = str(exc)
+                task, output = None, None
+            tasks.append(task)
+            outputs.append(output)
+        run_task = self.core.get("get_parameter_sets")("task")["milling"]["func"]
+        timeouts = [job.get("timeout") for job in jobs]
+        start_times = [None] * len(jobs)
+
+        def get_job_function(index, task):
+            def generate(job):
+                start_times[index] = time.time()
+
+                def update(text=None, percent=None, **kwargs):
+                    return job.update(text=text, percent=percent)
+
+                try:
+                    return run_task(task, callback=update)
+                finally:
+                    results[index]["times"]["generation"] = time.time() - start_times[index]
+            return generate
+
+        def poll(concurrent_jobs):
+            running = [job for job in concurrent_jobs if job.started and not job.finished]
+            now = time.time()
+            for job in running:
+                index = indices[job.index]
+                timeout = timeouts[index]
+                if timeout and (start_times[index] is not None) \
+                        and (now - start_times[index] > timeout) and not job.cancel_requested:
+                    log.warn("Job '%s' exceeded its time limit (%ss)", results[index]["name"],
+                             timeout)
+                    results[index]["status"] = "timeout"
+                    job.cancel()
+            if progress and running:
+                text = ", ".join("%s: %d%%" % (results[indices[job.index]]["name"],
+                                               job.percent or 0) for job in running)
+                percent = sum(job.percent or 0 for job in running) / float(len(running))
+                progress.update(text=text, percent=percent)
+            return False
+
+        # the last job writing to each output file
+        last_job_of_output = {}
+        for index, output in enumerate(outputs):
+            if output is not None:
+                last_job_of_output[output[0]] = index
+        generators = {}
+        funcs = [get_job_function(index, task) for index, task in enumerate(tasks)
+                 if task is not None]
+        indices = [index for index, task in enumerate(tasks) if task is not None]
+        try:
+            for job in pycam.Utils.threading.run_jobs_concurrently(funcs, max_jobs=max_jobs,
+                                                                   poll=poll):
+                index = indices[job.index]
+                result = results[index]
+                if job.error:
+                    log.error("Failed to generate toolpath for '%s': %s", result["name"],
+                              job.error)
+                    result["status"] = "failed"
+                    result["error"] = job.error
+                elif job.cancel_requested:
+                    if result["status"] != "timeout":
+                        result["status"] = "cancelled"
+                elif job.result is None:
+                    result["status"] = "failed"
+                    result["error"] = "No toolpath was generated"
+                else:
+                    self._add_toolpath(result, job.result, outputs[index], generators)
+                self._finish_outputs(index, last_job_of_output, generators)
+            self._finish_outputs(len(jobs), last_job_of_output, generators)
+        finally:
+            # close all remaining files (e.g. after an interrupt)
+            for generator in generators.values():
+                generator.finish()
+            if progress:
+                progress.finish()
+        failed = [result for result in results if result["status"] != "ok"]
+        models = []
+        for name in sorted(self._models):
+            model = dict(self._models[name])
+            model.pop("entity")
+            models.append(model)
+        return {"jobs": results, "models": models, "total_time": time.time() - start_time,
+                "jobs_ok": len(results) - len(failed), "jobs_failed": len(failed)}
+
+    def _add_toolpath(self, result, toolpath, output, generators):
+        result["steps"] = len(toolpath.path)
+        distance, duration = toolpath.get_machine_move_distance_and_time()
+        result["machine_distance"] = distance
+        result["machine_time"] = duration
+        if output is not None:
+            filename, settings = output
+            start_time = time.time()
+            try:
+                if filename not in generators:
+                    if filename == "-":
+                        destination = sys.stdout
+                    else:
+                        destination = filename
+                        directory = os.path.dirname(filename)
+                        if directory and not os.path.isdir(directory):
+                            os.makedirs(directory)
+                    generator = pycam.Exporters.GCode.LinuxCNC.LinuxCNC(destination)
+                    generator.add_filters(self._get_settings_filters(settings))
+                    generators[filename] = generator
+                generators[filename].add_moves(toolpath.path, toolpath.filters)
+            except (IOError, OSError) as exc:
+                log.error("Failed to write the toolpath of '%s' to '%s': %s", result["name"],
+                          filename, exc)
+                result["status"] = "failed"
+                result["error"] = str(exc)
+                return
+            finally:
+                result["times"]["export"] = time.time() - start_time
+        result["status"] = "ok"
+
+    def _get_settings_filters(self, settings):
+        filters = []
+        self.core.call_chain("toolpath_filters", "settings", settings, filters)
+        return filters
+
+    def _finish_outputs(self, index, last_job_of_output, generators):
+        """ complete the files that are not used by any job after the given one """
+        for filename, last_index in last_job_of_output.items():
+            if (last_index <= index) and (filename in generators):
+                generators.pop(filename).finish()
+                log.info("GCode file successfully written: %s", filename)
@@ -55,6 +55,9 @@ FILTER_MODEL = (("All supported model filetypes",
 
 FILENAME_DRAG_TARGETS = ("text/uri-list", "text-plain")
 
+# interval (milliseconds) for delivering the log records of other threads to the GUI handlers
+DEFERRED_LOG_INTERVAL = 250
+
 
 log = pycam.Utils.log.get_logger()
 
@@ -376,6 +379,13 @@ class ProjectGui(pycam.Gui.BaseUI):
             # register a logging handler for displaying error messages
             pycam.Utils.log.add_gtk_gui(self.window, logging.ERROR)
             self.window.show()
+        # GTK may be used only by the main thread
+        gobject.timeout_add(DEFERRED_LOG_INTERVAL, self._emit_deferred_log_records)
+
+    def _emit_deferred_log_records(self):
+        pycam.Utils.log.emit_deferred_records()
+        # keep the timer running
+        return True
 
     def gui_activity_guard(func):
         def gui_activity_guard_wrapper(self, *args, **kwargs):
@@ -19,6 +19,8 @@ You should have received a copy of the GNU General Public License
 along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
 """
 
+import mmap
+import os
 import re
 try:
     # Python2 (load first - due to incompatible interface)
@@ -37,12 +39,31 @@ import pycam.Utils.log
 import pycam.Utils
 log = pycam.Utils.log.get_logger()
 
+try:
+    import numpy
+    from pycam.Geometry.TriangleMesh import merge_vertices, TriangleMesh
+    numpy_enabled = True
+except ImportError:
+    numpy_enabled = False
+else:
+    # the 50 bytes of a facet record in a binary STL file
+    BINARY_FACET = numpy.dtype([("normal", "<f4", (3, )),
+                                ("vertices", "<f4", (3, 3)),
+                                ("attributes", "<u2")])
+
 
 vertices = 0
 edges = 0
 kdtree = None
 lastUniqueVertex = (None, None, None)
 
+# ASCII files are parsed in blocks of (roughly) this size
+ASCII_BLOCK_SIZE = 4 * 1024 * 1024
+ASCII_COMMENT_LINE = re.compile(br"^;.*$", re.MULTILINE)
+ASCII_SOLID = re.compile(r"\s*solid\s+(\w+)\s+.*")
+# the same as ASCII_SOLID - but for a block of lines
+ASCII_SOLID_LINE = re.compile(br"^[^\S\n]*solid[^\S\n]+(\w+)\s", re.MULTILINE)
+
 
 def UniqueVertex(x, y, z):
     global vertices, lastUniqueVertex
@@ -56,6 +77,197 @@ def UniqueVertex(x, y, z):
         return (x, y, z)
 
 
+def _get_binary_facet_count(header, size):
+    """ return the number of facets of a binary STL file or None (for other files) """
+    if len(header) < 84:
+        return None
+    numfacets = unpack("<I", header[80:84])[0]
+    if size == 84 + 50 * numfacets:
+        return numfacets
+    else:
+        return None
+
+
+def _get_facet_cross_products(corners):
+    """ return the cross products (p2 - p1) x (p3 - p1) of an array of facets """
+    return numpy.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+
+
+def _get_mesh_from_facets(corners, normals, dotcross, missing_normals, filename):
+    """ turn the facets of an STL file into a TriangleMesh
+
+    Vertices with identical coordinates are merged (via sorting). The order of
+    the vertices of each face is adjusted to the direction of its normal (based
+    on the sign of "dotcross") - the same way as for the non-vectorized import.
+
+    @param corners: array of shape (N, 3, 3) containing the points of all facets
+    @param normals: array of shape (N, 3) containing the normals of all facets
+    @param dotcross: the dot product of the normal and the cross product of
+        each facet (or a replacement value for facets without a normal)
+    @param missing_normals: boolean array marking the facets without a normal
+    """
+    # merge "-0.0" and "0.0" before comparing the coordinates
+    unique_vertices, inverse = merge_vertices(corners.reshape(-1, 3) + 0.0)
+    faces = inverse.reshape(-1, 3)
+    inconsistent = numpy.flatnonzero(dotcross < 0)
+    if len(inconsistent) > 0:
+        log.warn("Inconsistent normal/vertices found in facet definition %d of '%s'. "
+                 "Please validate the STL file!", inconsistent[0] + 1, filename)
+    # Triangle expects the vertices in clockwise order
+    clockwise = dotcross > 0
+    faces[clockwise] = faces[clockwise][:, (0, 2, 1)]
+    valid = dotcross != 0
+    if not valid.all():
+        # the three points are in a line - or two points are identical
+        log.warn("Skipping %d invalid triangle(s) (maybe the resolution of the model is too "
+                 "high?)", len(valid) - valid.sum())
+    mesh = TriangleMesh(unique_vertices, faces[valid])
+    # keep the normals given in the file (the missing ones are calculated by the mesh)
+    given_normals = valid & ~missing_normals
+    mesh.normals[given_normals[valid]] = normals[given_normals]
+    return mesh
+
+
+def _get_mesh_from_binary_facets(facets, filename):
+    corners = facets["vertices"].astype(numpy.float64)
+    normals = facets["normal"].astype(numpy.float64)
+    cross = _get_facet_cross_products(corners)
+    dotcross = (normals * cross).sum(axis=1)
+    # facets without a normal are oriented upwards
+    missing_normals = ~normals.any(axis=1)
+    dotcross[missing_normals] = cross[missing_normals, 2]
+    return _get_mesh_from_facets(corners, normals, dotcross, missing_normals, filename)
+
+
+def _import_binary_mesh(data, numfacets, filename, use_kdtree=True, callback=None):
+    if callback and callback():
+        log.warn("STLImporter: load model operation cancelled")
+        return None
+    facets = numpy.frombuffer(data, dtype=BINARY_FACET, count=numfacets, offset=84)
+    mesh = _get_mesh_from_binary_facets(facets, filename)
+    if callback and callback():
+        log.warn("STLImporter: load model operation cancelled")
+        return None
+    return _get_model_from_mesh(mesh, use_kdtree)
+
+
+def _get_model_from_mesh(mesh, use_kdtree, name=None):
+    log.info("Imported STL model: %d vertices, %d triangles", len(mesh.vertices), len(mesh))
+    if len(mesh) == 0:
+        # no valid items added to the model
+        return None
+    model = Model(use_kdtree, mesh=mesh)
+    if name is not None:
+        model.name = name
+    return model
+
+
+def _read_ascii_blocks(f, block_size=ASCII_BLOCK_SIZE):
+    """ read blocks of complete lines - comment lines are removed """
+    while True:
+        block = f.read(block_size)
+        if not block:
+            break
+        block += f.readline()
+        if b";" in block:
+            block = ASCII_COMMENT_LINE.sub(b"", block)
+        yield block
+
+
+def _parse_ascii_facets(tokens, facets):
+    """ parse all complete facets of an array of tokens
+
+    The coordinates of all facets are converted at once. The keywords are
+    handled similar to the line-based parser: the vertices of a facet are all
+    "vertex" items following the previous "endfacet".
+
+    @param facets: the list of parsed (corners, normals, missing_normals) items
+    @returns: the index of the first token following the last complete facet
+    """
+    ends = numpy.flatnonzero(tokens == b"endfacet")
+    if len(ends) == 0:
+        return 0
+    previous_ends = numpy.concatenate(([-1], ends[:-1]))
+    vertex_positions = numpy.flatnonzero(tokens == b"vertex")
+    first_vertex = numpy.searchsorted(vertex_positions, previous_ends)
+    vertex_count = numpy.searchsorted(vertex_positions, ends) - first_vertex
+    if (vertex_count < 3).any():
+        log.warn("Skipping %d invalid facet definition(s). Please validate the STL file!",
+                 (vertex_count < 3).sum())
+    if (vertex_count > 3).any():
+        log.error("STLImporter: more then 3 points in %d facet(s)", (vertex_count > 3).sum())
+    complete = vertex_count >= 3
+    parsed = ends[-1] + 1
+    ends = ends[complete]
+    previous_ends = previous_ends[complete]
+    vertex_positions = vertex_positions[first_vertex[complete][:, numpy.newaxis]
+                                        + numpy.arange(3)]
+    # the three coordinates are following each "vertex" token
+    corners = tokens[vertex_positions[:, :, numpy.newaxis] + numpy.arange(1, 4)]
+    corners = corners.astype(numpy.float64)
+    # the normal is defined in the last "facet" line (if it exists)
+    facet_positions = numpy.flatnonzero(tokens == b"facet")
+    last_facet = numpy.concatenate(([-1], facet_positions))[
+        numpy.searchsorted(facet_positions, ends)]
+    has_normal = (last_facet > previous_ends) & (tokens[last_facet + 1] == b"normal")
+    normals = numpy.zeros((len(ends), 3), dtype=numpy.float64)
+    normal_positions = last_facet[has_normal]
+    normals[has_normal] = tokens[normal_positions[:, numpy.newaxis]
+                                 + numpy.arange(2, 5)].astype(numpy.float64)
+    facets.append((corners, normals, ~has_normal))
+    return parsed
+
+
+def _import_ascii_mesh(f, filename, use_kdtree=True, callback=None,
+                       block_size=ASCII_BLOCK_SIZE):
+    """ parse an ASCII STL file token-wise (instead of line-wise) """
+    facets = []
+    remaining = []
+    name = None
+    for block in _read_ascii_blocks(f, block_size=block_size):
+        if callback and callback():
+            log.warn("STLImporter: load model operation cancelled")
+            return None
+        for m in ASCII_SOLID_LINE.finditer(block):
+            # the native string type (bytes in Python2, unicode in Python3)
+            name = str(m.group(1).decode("ascii", "replace"))
+        tokens = remaining + block.split()
+        parsed = _parse_ascii_facets(numpy.array(tokens, dtype=bytes), facets)
+        remaining = tokens[parsed:]
+    if facets:
+        corners, normals, missing_normals = (numpy.concatenate(items) for items in zip(*facets))
+    else:
+        corners = numpy.zeros((0, 3, 3), dtype=numpy.float64)
+        normals = numpy.zeros((0, 3), dtype=numpy.float64)
+        missing_normals = numpy.zeros(0, dtype=bool)
+    cross = _get_facet_cross_products(corners)
+    dotcross = (normals * cross).sum(axis=1)
+    # missing normals are calculated - thus they are always consistent
+    dotcross[missing_normals] = (cross[missing_normals] ** 2).sum(axis=1)
+    mesh = _get_mesh_from_facets(corners, normals, dotcross, missing_normals, filename)
+    return _get_model_from_mesh(mesh, use_kdtree, name=name)
+
+
+def _import_mapped_binary_file(filename, use_kdtree=True, callback=None):
+    """ try to import a local binary STL file via a memory map
+
+    @returns: a tuple (is_binary, model)
+    """
+    size = os.path.getsize(filename)
+    if size < 84:
+        return False, None
+    with open(filename, "rb") as handle:
+        numfacets = _get_binary_facet_count(handle.read(84), size)
+        if numfacets is None:
+            return False, None
+        data = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        return True, _import_binary_mesh(data, numfacets, filename, use_kdtree=use_kdtree,
+                                         callback=callback)
+    finally:
+        data.close()
+
+
 def ImportModel(filename, use_kdtree=True, callback=None, **kwargs):
     global vertices, edges, kdtree
     vertices = 0
@@ -64,6 +276,19 @@ def ImportModel(filename, use_kdtree=True, callback=None, **kwargs):
 
     normal_conflict_warning_seen = False
 
+    if numpy_enabled and not hasattr(filename, "read"):
+        uri = pycam.Utils.URIHandler(filename)
+        if uri.is_local():
+            try:
+                is_binary, model = _import_mapped_binary_file(uri.get_local_path(),
+                                                              use_kdtree=use_kdtree,
+                                                              callback=callback)
+            except (IOError, OSError) as err_msg:
+                log.error("STLImporter: Failed to read file (%s): %s", filename, err_msg)
+                return None
+            if is_binary:
+                return model
+
     if hasattr(filename, "read"):
         # make sure that the input stream can seek and has ".len"
         f = StringIO(filename.read())
@@ -112,6 +337,18 @@ def ImportModel(filename, use_kdtree=True, callback=None, **kwargs):
         log.error("STLImporter: STL binary/ascii detection failed")
         return None
 
+    if binary and numpy_enabled:
+        return _import_binary_mesh(f.getvalue(), numfacets, filename, use_kdtree=use_kdtree,
+                                   callback=callback)
+
+    if not binary and numpy_enabled:
+        try:
+            return _import_ascii_mesh(f, filename, use_kdtree=use_kdtree, callback=callback)
+        except ValueError:
+            # e.g. a coordinate that is not a number
+            log.info("STLImporter: falling back to the line-based parser for '%s'", filename)
+            f.seek(0)
+
     if use_kdtree:
         kdtree = PointKdtree([], 3, 1, epsilon)
     model = Model(use_kdtree)
@@ -179,7 +416,7 @@ def ImportModel(filename, use_kdtree=True, callback=None, **kwargs):
 
             model.append(t)
     else:
-        solid = re.compile(r"\s*solid\s+(\w+)\s+.*")
+        solid = ASCII_SOLID
         endsolid = re.compile(r"\s*endsolid\s*")
         facet = re.compile(r"\s*facet\s*")
         normal = re.compile(r"\s*facet\s+normal"
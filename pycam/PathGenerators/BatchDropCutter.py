@@ -0,0 +1,565 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2017 The PyCAM developers
+
+This file is part of PyCAM.
+
+PyCAM is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyCAM is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
+
+Vectorized drop of a cutter onto the triangles of a model at many positions.
+
+The calculations follow the per-triangle implementations of the cutters
+("intersect" with the vertical direction (0, 0, -1)) case by case: the facet,
+the edges and the vertices of each triangle are checked for all candidate
+pairs of positions and triangles at once.
+All functions below return the distance "d" that the cutter moves downwards
+until it touches the triangle (INFINITE for "no contact").
+"""
+
+import numpy
+
+from pycam.Cutters.CylindricalCutter import CylindricalCutter
+from pycam.Cutters.SphericalCutter import SphericalCutter
+from pycam.Cutters.ToroidalCutter import ToroidalCutter
+from pycam.Geometry import epsilon, INFINITE
+
+
+# maximum number of positions processed at once (limits the size of the triangle search)
+DROP_BLOCK_SIZE = 4096
+# maximum number of (position, triangle) pairs processed at once
+DROP_PAIR_BLOCK_SIZE = 2 ** 15
+# maximum number of sample points of toroidal edges calculated at once
+TORUS_SAMPLE_BLOCK_SIZE = 2 ** 16
+
+
+def _dot(a, b):
+    return a[:, 0] * b[:, 0] + a[:, 1] * b[:, 1] + a[:, 2] * b[:, 2]
+
+
+def _cross(a, b):
+    return numpy.column_stack((a[:, 1] * b[:, 2] - a[:, 2] * b[:, 1],
+                               a[:, 2] * b[:, 0] - a[:, 0] * b[:, 2],
+                               a[:, 0] * b[:, 1] - a[:, 1] * b[:, 0]))
+
+
+def _norm(a):
+    return numpy.sqrt(_dot(a, a))
+
+
+def _normalized(a):
+    return a / _norm(a)[:, numpy.newaxis]
+
+
+def _with_z(points, z):
+    result = points.copy()
+    result[:, 2] = z
+    return result
+
+
+def _plane_drop(plane_normals, plane_points, points):
+    """ the distance between points and the planes along (0, 0, -1) """
+    return (_dot(plane_normals, points) - _dot(plane_normals, plane_points)) / plane_normals[:, 2]
+
+
+def _get_result(valid, distances):
+    """ apply the validity mask (ignoring non-numeric results) """
+    return numpy.where(valid & (distances < INFINITE), distances, INFINITE)
+
+
+def _is_point_inside(p1, p2, p3, points):
+    """ see pycam.Geometry.Triangle.is_point_inside """
+    v0 = p3 - p1
+    v1 = p2 - p1
+    v2 = points - p1
+    dot00 = _dot(v0, v0)
+    dot01 = _dot(v0, v1)
+    dot02 = _dot(v0, v2)
+    dot11 = _dot(v1, v1)
+    dot12 = _dot(v1, v2)
+    denom = dot00 * dot11 - dot01 * dot01
+    inv_denom = 1.0 / numpy.where(denom == 0, 1, denom)
+    u = (dot11 * dot02 - dot01 * dot12) * inv_denom
+    v = (dot00 * dot12 - dot01 * dot02) * inv_denom
+    return (denom != 0) & (u > 0) & (v > 0) & (u + v < 1)
+
+
+class _Candidates(object):
+    """ the data of all pairs of cutter positions and triangles """
+
+    def __init__(self, starts, mesh, triangle_indices):
+        self.starts = starts
+        faces = mesh.faces[triangle_indices]
+        self.p1 = mesh.vertices[faces[:, 0]]
+        self.p2 = mesh.vertices[faces[:, 1]]
+        self.p3 = mesh.vertices[faces[:, 2]]
+        self.normals = mesh.normals[triangle_indices]
+        self.centers = mesh.center[triangle_indices]
+
+    def get_edges(self):
+        return ((self.p1, self.p2), (self.p2, self.p3), (self.p3, self.p1))
+
+    def get_vertices(self):
+        return (self.p1, self.p2, self.p3)
+
+
+def _drop_circle_facet(centers, radius, cands):
+    """ the flat bottom of a cylinder (see intersection.intersect_circle_plane) """
+    normals = cands.normals
+    horizontal_length = numpy.sqrt(normals[:, 0] ** 2 + normals[:, 1] ** 2)
+    is_flat = horizontal_length == 0
+    divisor = numpy.where(is_flat, 1, horizontal_length)
+    contact = centers.copy()
+    contact[:, 0] -= numpy.where(is_flat, 0, normals[:, 0] / divisor * radius)
+    contact[:, 1] -= numpy.where(is_flat, 0, normals[:, 1] / divisor * radius)
+    d = _plane_drop(normals, cands.centers, contact)
+    cp = _with_z(contact, contact[:, 2] - d)
+    valid = (normals[:, 2] != 0) & _is_point_inside(cands.p1, cands.p2, cands.p3, cp)
+    return _get_result(valid, d)
+
+
+def _drop_circle_vertex(centers, radiussq, points):
+    """ see intersection.intersect_circle_point """
+    height = points[:, 2] - centers[:, 2]
+    ccp = _with_z(points, points[:, 2] - height)
+    valid = _dot(centers - ccp, centers - ccp) < radiussq - epsilon
+    return _get_result(valid, -height)
+
+
+def _drop_circle_edge(centers, radius, radiussq, p1, p2):
+    """ see intersection.intersect_circle_line and BaseCutter.intersect_circle_edge """
+    vector = p2 - p1
+    length = _norm(vector)
+    direction = vector / length[:, numpy.newaxis]
+    result = numpy.full(len(p1), float(INFINITE))
+    # horizontal edges
+    horizontal = numpy.flatnonzero(direction[:, 2] == 0)
+    if len(horizontal) > 0:
+        center = centers[horizontal]
+        d = direction[horizontal]
+        a = p1[horizontal]
+        b = p2[horizontal]
+        proj_a = _with_z(a, a[:, 2] - (a[:, 2] - center[:, 2]))
+        height = b[:, 2] - center[:, 2]
+        proj_b = _with_z(b, b[:, 2] - height)
+        # the closest point of the projected line
+        proj_vector = proj_b - proj_a
+        proj_length = _norm(proj_vector)
+        proj_dir = proj_vector / numpy.where(proj_length == 0, 1, proj_length)[:, numpy.newaxis]
+        lam = _dot(proj_a, proj_dir) - _dot(center, proj_dir)
+        closest = proj_a - proj_dir * lam[:, numpy.newaxis]
+        dist_sq = _dot(closest - center, closest - center)
+        with numpy.errstate(invalid="ignore"):
+            half_chord = numpy.sqrt(radiussq - dist_sq)
+        d1 = _dot(proj_a - closest, d)
+        d2 = _dot(proj_b - closest, d)
+        case1 = numpy.abs(d1) < half_chord - epsilon
+        case2 = ~case1 & (numpy.abs(d2) < half_chord - epsilon)
+        case3 = ~case1 & ~case2 & (((d1 < -half_chord + epsilon) & (d2 > half_chord - epsilon))
+                                   | ((d2 < -half_chord + epsilon)
+                                      & (d1 > half_chord - epsilon)))
+        ccp = numpy.where(case1[:, numpy.newaxis], proj_a,
+                          numpy.where(case2[:, numpy.newaxis], proj_b, closest))
+        cp = _with_z(ccp, ccp[:, 2] + height)
+        m = _dot(cp - a, d)
+        valid = ((dist_sq < radiussq) & (case1 | case2 | case3) & (m >= -epsilon)
+                 & (m <= length[horizontal] + epsilon))
+        result[horizontal] = _get_result(valid, -height)
+    # all other edges (except for vertical ones)
+    others = numpy.flatnonzero((direction[:, 2] != 0)
+                               & ((direction[:, 0] != 0) | (direction[:, 1] != 0)))
+    if len(others) > 0:
+        center = centers[others]
+        d = direction[others]
+        a = p1[others]
+        # the normalized direction is used for the intersection with the base plane
+        unit_d = numpy.where((_norm(d) != 1)[:, numpy.newaxis], _normalized(d), d)
+        along = -(a[:, 2] - center[:, 2]) / unit_d[:, 2]
+        base_point = a + unit_d * along[:, numpy.newaxis]
+        n = numpy.column_stack((-d[:, 1], d[:, 0], numpy.zeros(len(d))))
+        n_raw = n
+        n = _normalized(n)
+        v = _normalized(numpy.column_stack((-n[:, 1], n[:, 0], numpy.zeros(len(n)))))
+        n2 = _normalized(numpy.column_stack((v[:, 1], -v[:, 0], numpy.zeros(len(v)))))
+        dist = _dot(n2, center) - _dot(n2, base_point)
+        dist_sq = dist * dist
+        with numpy.errstate(invalid="ignore"):
+            dist2 = numpy.sqrt(radiussq - dist_sq)
+        dist2 = numpy.where(d[:, 2] < 0, -dist2, dist2)
+        ccp = center - (n2 * dist[:, numpy.newaxis] - v * dist2[:, numpy.newaxis])
+        plane_normals = _cross(n_raw, d)
+        height = _plane_drop(plane_normals, a, ccp)
+        cp = _with_z(ccp, ccp[:, 2] - height)
+        m = _dot(cp - a, d)
+        valid = ((dist_sq <= radiussq - epsilon) & (m >= -epsilon)
+                 & (m <= length[others] + epsilon))
+        result[others] = _get_result(valid, height)
+    return result
+
+
+def _drop_sphere_facet(centers, radius, cands):
+    """ see intersection.intersect_sphere_plane """
+    normals = cands.normals
+    offsets = normals * radius
+    ccp = numpy.where((normals[:, 2] > 0)[:, numpy.newaxis], centers - offsets,
+                      centers + offsets)
+    d = _plane_drop(normals, cands.centers, ccp)
+    cp = _with_z(ccp, ccp[:, 2] - d)
+    valid = (normals[:, 2] != 0) & _is_point_inside(cands.p1, cands.p2, cands.p3, cp)
+    return _get_result(valid, d)
+
+
+def _drop_sphere_vertex(centers, radiussq, points):
+    """ see intersection.intersect_sphere_point """
+    offsets = centers - points
+    b = 2 * -offsets[:, 2]
+    c = _dot(offsets, offsets) - radiussq
+    discriminant = b * b - 4 * c
+    with numpy.errstate(invalid="ignore"):
+        height = (-b - numpy.sqrt(discriminant)) / 2
+    return _get_result(discriminant >= 0, height)
+
+
+def _drop_sphere_edge(centers, radius, radiussq, p1, p2):
+    """ see intersection.intersect_sphere_line and SphericalCutter.intersect_sphere_edge """
+    vector = p2 - p1
+    d = _normalized(vector)
+    n = numpy.column_stack((-d[:, 1], d[:, 0], numpy.zeros(len(d))))
+    n_length = _norm(n)
+    not_vertical = n_length != 0
+    n = n / numpy.where(not_vertical, n_length, 1)[:, numpy.newaxis]
+    dist = -_dot(centers, n) + _dot(p1, n)
+    n2 = _normalized(_cross(n, d))
+    with numpy.errstate(invalid="ignore"):
+        dist2 = numpy.sqrt(radiussq - dist * dist)
+    ccp = centers + (n * dist[:, numpy.newaxis] + n2 * dist2[:, numpy.newaxis])
+    height = _plane_drop(n2, p1, ccp)
+    cp = _with_z(ccp, ccp[:, 2] - height)
+    m = _dot(cp - p1, vector)
+    valid = (not_vertical & (numpy.abs(dist) <= radius - epsilon) & (m >= -epsilon)
+             & (m <= _dot(vector, vector) + epsilon))
+    return _get_result(valid, height)
+
+
+def _drop_torus_facet(centers, majorradius, minorradius, cands):
+    """ see intersection.intersect_torus_plane """
+    normals = cands.normals
+    horizontal_sq = normals[:, 0] ** 2 + normals[:, 1] ** 2
+    divisor = numpy.sqrt(numpy.where(horizontal_sq > 0, horizontal_sq, 1))
+    ccp = centers.copy()
+    ccp[:, 0] += -normals[:, 0] / divisor * majorradius
+    ccp[:, 1] += -normals[:, 1] / divisor * majorradius
+    ccp -= normals * minorradius
+    d = _plane_drop(normals, cands.centers, ccp)
+    cp = _with_z(ccp, ccp[:, 2] - d)
+    valid = ((normals[:, 2] != 0) & (normals[:, 2] != 1) & (horizontal_sq > 0)
+             & _is_point_inside(cands.p1, cands.p2, cands.p3, cp))
+    return _get_result(valid, d)
+
+
+def _drop_torus_point(centers, cutter, points):
+    """ see intersection.intersect_torus_point (the "drop" case) """
+    major = cutter.distance_majorradius
+    minor = cutter.distance_minorradius
+    minlsq = (major - minor) ** 2
+    maxlsq = (major + minor) ** 2
+    l_sq = (points[:, 0] - centers[:, 0]) ** 2 + (points[:, 1] - centers[:, 1]) ** 2
+    z_sq = cutter.distance_minorradiussq - (major - numpy.sqrt(l_sq)) ** 2
+    valid = (l_sq >= minlsq + epsilon) & (l_sq <= maxlsq - epsilon) & (z_sq >= 0)
+    with numpy.errstate(invalid="ignore"):
+        dist = (centers[:, 2] - numpy.sqrt(z_sq)) - points[:, 2]
+    return _get_result(valid, dist)
+
+
+def _get_segment_minimum(values, starts, segments):
+    """ return the minimum of each segment and the index of its first occurrence """
+    minimum = numpy.minimum.reduceat(values, starts)
+    positions = numpy.arange(len(values))
+    first = numpy.minimum.reduceat(numpy.where(values == minimum[segments], positions,
+                                               len(values)), starts)
+    return minimum, first
+
+
+def _get_blocks(sizes, max_size):
+    """ split a list of items into blocks with a limited sum of their sizes
+
+    Every block contains at least one item.
+    @returns: the (start, end) indices of the blocks
+    """
+    ends = numpy.cumsum(sizes)
+    start = 0
+    while start < len(sizes):
+        limit = ends[start] - sizes[start] + max_size
+        end = max(start + 1, int(numpy.searchsorted(ends, limit, side="right")))
+        yield start, end
+        start = end
+
+
+def _get_linear_range(values, slopes, limit):
+    """ the range of "m" with abs(values + m * slopes) <= limit (empty: lower > upper) """
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        first = (-limit - values) / slopes
+        second = (limit - values) / slopes
+    constant = slopes == 0
+    inside = numpy.abs(values) <= limit
+    lower = numpy.where(constant, numpy.where(inside, -INFINITE, INFINITE),
+                        numpy.minimum(first, second))
+    upper = numpy.where(constant, numpy.where(inside, INFINITE, -INFINITE),
+                        numpy.maximum(first, second))
+    return lower, upper
+
+
+def _get_circle_range(centers, radius, p1, vector):
+    """ the range of "m" with "p1 + m * vector" within a horizontal circle (empty: lower > upper)
+    """
+    offset = p1[:, :2] - centers[:, :2]
+    a = vector[:, 0] ** 2 + vector[:, 1] ** 2
+    b = 2 * (offset[:, 0] * vector[:, 0] + offset[:, 1] * vector[:, 1])
+    c = offset[:, 0] ** 2 + offset[:, 1] ** 2 - radius ** 2
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        root = numpy.sqrt(b * b - 4 * a * c)
+        lower = (-b - root) / (2 * a)
+        upper = (-b + root) / (2 * a)
+    # vertical edges are either completely inside or outside
+    vertical = a == 0
+    lower = numpy.where(vertical, numpy.where(c <= 0, -INFINITE, INFINITE), lower)
+    upper = numpy.where(vertical, numpy.where(c <= 0, INFINITE, -INFINITE), upper)
+    # the line misses the circle
+    missed = numpy.isnan(lower) | numpy.isnan(upper)
+    lower[missed] = INFINITE
+    upper[missed] = -INFINITE
+    return lower, upper
+
+
+def _sample_torus_edge(get_distances, cutter, p1, p2, get_range=None):
+    """ sample the edge (see ToroidalCutter.intersect_torus_edge)
+
+    Only the samples within the range returned by "get_range" are calculated.  The result is
+    the same - as long as the torus can't touch the edge outside of this range.
+    @param get_distances: function returning the distances of the torus to
+        sample points - called with the indices of the edges and the points
+    @param get_range: function returning the lower and upper limits of the relevant part of
+        each edge ("p1 + m * (p2 - p1)") - called with "p1" and "p2 - p1"
+    """
+    if len(p1) == 0:
+        return numpy.zeros(0, dtype=numpy.float64)
+    vector = p2 - p1
+    length = _norm(vector)
+    direction = vector / length[:, numpy.newaxis]
+    scale = numpy.maximum(3, (length / cutter.distance_minorradius * 2).astype(numpy.int64))
+    if get_range is None:
+        first_steps = numpy.zeros(len(p1), dtype=numpy.int64)
+        last_steps = scale
+    else:
+        # one additional sample at both ends compensates rounding errors
+        lower, upper = get_range(p1, vector)
+        with numpy.errstate(invalid="ignore"):
+            first_steps = numpy.clip(numpy.ceil(lower * scale) - 1, 0, scale).astype(numpy.int64)
+            last_steps = numpy.clip(numpy.floor(upper * scale) + 1, 0, scale).astype(numpy.int64)
+        # an empty range is represented by one (useless) sample
+        last_steps = numpy.maximum(first_steps, last_steps)
+    counts = last_steps - first_steps + 1
+    result = numpy.empty(len(p1), dtype=numpy.float64)
+    for start, end in _get_blocks(counts, TORUS_SAMPLE_BLOCK_SIZE):
+        block = numpy.arange(start, end)
+        result[start:end] = _sample_torus_edge_block(get_distances, p1, direction, length,
+                                                     scale, first_steps, counts, block)
+    return result
+
+
+def _sample_torus_edge_block(get_distances, p1, direction, length, scale, first_steps, counts,
+                             block):
+    """ sample the edges with the given indices (see "_sample_torus_edge") """
+    block_counts = counts[block]
+    starts = numpy.concatenate(([0], numpy.cumsum(block_counts)[:-1]))
+    segments = numpy.repeat(numpy.arange(len(block)), block_counts)
+    edges = block[segments]
+    steps = first_steps[edges] + numpy.arange(block_counts.sum()) - starts[segments]
+    factors = steps / scale[edges].astype(numpy.float64)
+    samples = p1[edges] + direction[edges] * (factors * length[edges])[:, numpy.newaxis]
+    distances = get_distances(edges, samples)
+    min_distance, first = _get_segment_minimum(distances, starts, segments)
+    valid = min_distance < INFINITE
+    # refine the position around the best sample
+    refine_steps = (numpy.arange(1, 11) / 10.0) * 2 - 1
+    best_factors = factors[first[valid]]
+    refine_factors = (best_factors[:, numpy.newaxis]
+                      + refine_steps / scale[block[valid]][:, numpy.newaxis]).ravel()
+    refine_edges = numpy.repeat(block[valid], len(refine_steps))
+    samples = (p1[refine_edges] + direction[refine_edges]
+               * (refine_factors * length[refine_edges])[:, numpy.newaxis])
+    distances = get_distances(refine_edges, samples)
+    distances[(refine_factors < -epsilon) | (refine_factors > 1 + epsilon)] = INFINITE
+    refined = distances.reshape(-1, len(refine_steps)).min(axis=1)
+    min_distance[valid] = numpy.minimum(min_distance[valid], refined)
+    return min_distance
+
+
+def _drop_torus_edge(centers, cutter, p1, p2):
+    # the torus touches only points within its outer circle
+    outer_radius = cutter.distance_majorradius + cutter.distance_minorradius
+    return _sample_torus_edge(
+        lambda edges, points: _drop_torus_point(centers[edges], cutter, points), cutter, p1, p2,
+        get_range=lambda p1, vector: _get_circle_range(centers, outer_radius, p1, vector))
+
+
+def _get_centers(cutter, starts):
+    """ the cutters use their center relative to their current location """
+    offset = [cutter.center[index] - cutter.location[index] for index in range(3)]
+    return starts + numpy.array(offset, dtype=numpy.float64)
+
+
+def _drop_cylindrical(cutter, cands):
+    """ see CylindricalCutter.intersect """
+    centers = _get_centers(cutter, cands.starts)
+    radius = cutter.distance_radius
+    radiussq = cutter.distance_radiussq
+    result = _drop_circle_facet(centers, radius, cands)
+    # the edges are only relevant, if the facet is not hit
+    open_pairs = numpy.flatnonzero(result >= INFINITE)
+    edges = [_drop_circle_edge(centers[open_pairs], radius, radiussq, p1[open_pairs],
+                               p2[open_pairs]) for p1, p2 in cands.get_edges()]
+    result[open_pairs] = numpy.minimum.reduce(edges)
+    # the vertices are only relevant, if neither facet nor edges are hit
+    open_pairs = numpy.flatnonzero(result >= INFINITE)
+    vertices = [_drop_circle_vertex(centers[open_pairs], radiussq, point[open_pairs])
+                for point in cands.get_vertices()]
+    result[open_pairs] = numpy.minimum.reduce(vertices)
+    return result
+
+
+def _drop_spherical(cutter, cands):
+    """ see SphericalCutter.intersect """
+    centers = _get_centers(cutter, cands.starts)
+    radius = cutter.distance_radius
+    radiussq = cutter.distance_radiussq
+    result = _drop_sphere_facet(centers, radius, cands)
+    # edges and vertices are only relevant, if the facet is not hit
+    open_pairs = numpy.flatnonzero(result >= INFINITE)
+    others = [_drop_sphere_edge(centers[open_pairs], radius, radiussq, p1[open_pairs],
+                                p2[open_pairs]) for p1, p2 in cands.get_edges()]
+    others.extend(_drop_sphere_vertex(centers[open_pairs], radiussq, point[open_pairs])
+                  for point in cands.get_vertices())
+    result[open_pairs] = numpy.minimum.reduce(others)
+    return result
+
+
+def _drop_toroidal(cutter, cands):
+    """ see ToroidalCutter.intersect """
+    starts = cands.starts
+    centers = _get_centers(cutter, starts)
+    major = cutter.distance_majorradius
+    majorsq = cutter.distance_majorradiussq
+    results = [_drop_torus_facet(centers, major, cutter.distance_minorradius, cands)]
+    results.extend(_drop_torus_edge(centers, cutter, p1, p2) for p1, p2 in cands.get_edges())
+    results.extend(_drop_torus_point(centers, cutter, point) for point in cands.get_vertices())
+    # the flat bottom of the cutter
+    results.append(_drop_circle_facet(starts, major, cands))
+    results.extend(_drop_circle_vertex(starts, majorsq, point) for point in cands.get_vertices())
+    results.extend(_drop_circle_edge(starts, major, majorsq, p1, p2)
+                   for p1, p2 in cands.get_edges())
+    return numpy.minimum.reduce(results)
+
+
+_DROP_FUNCTIONS = ((ToroidalCutter, _drop_toroidal), (SphericalCutter, _drop_spherical),
+                   (CylindricalCutter, _drop_cylindrical))
+
+
+def get_drop_function(cutter):
+    """ return the vectorized drop function for a cutter (or None) """
+    for cutter_class, func in _DROP_FUNCTIONS:
+        if type(cutter) is cutter_class:
+            return func
+    return None
+
+
+def is_supported(model, cutter):
+    return (get_drop_function(cutter) is not None) and hasattr(model, "get_triangle_index")
+
+
+def _drop_pairs(mesh, cutter, positions, maxz, heights, position_indices, triangle_indices):
+    """ store the maximum height of the given (position, triangle) pairs in "heights"
+
+    The pairs need to be sorted by position.
+    """
+    radius = cutter.distance_radius
+    xy = positions[position_indices]
+    # the bounding box and bounding circle checks of BaseCutter.drop
+    lower = mesh.lower[triangle_indices]
+    upper = mesh.upper[triangle_indices]
+    middle = mesh.middle[triangle_indices]
+    triangle_radius = mesh.radius[triangle_indices]
+    with numpy.errstate(invalid="ignore"):
+        outside = ((xy[:, 0] - radius > upper[:, 0] + epsilon)
+                   | (xy[:, 0] + radius < lower[:, 0] - epsilon)
+                   | (xy[:, 1] - radius > upper[:, 1] + epsilon)
+                   | (xy[:, 1] + radius < lower[:, 1] - epsilon)
+                   | ((middle[:, 0] - xy[:, 0]) ** 2 + (middle[:, 1] - xy[:, 1]) ** 2
+                      > (cutter.distance_radiussq + 2 * radius * triangle_radius
+                         + mesh.radiussq[triangle_indices]) + epsilon))
+    position_indices = position_indices[~outside]
+    triangle_indices = triangle_indices[~outside]
+    starts = numpy.column_stack((positions[position_indices],
+                                 numpy.full(len(position_indices), maxz, dtype=numpy.float64)))
+    if len(position_indices) > 0:
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            distances = get_drop_function(cutter)(
+                cutter, _Candidates(starts, mesh, triangle_indices))
+        z = numpy.where(distances < INFINITE, maxz - distances, numpy.nan)
+        # the pairs are sorted by position
+        first = numpy.flatnonzero(numpy.concatenate(
+            ([True], position_indices[1:] != position_indices[:-1])))
+        heights[position_indices[first]] = numpy.fmax.reduceat(z, first)
+
+
+def drop_many(model, cutter, positions, minz, maxz):
+    """ calculate the height of the cutter at many positions
+
+    The result is equal to get_max_height_triangles for every position.
+
+    @param positions: a sequence of (x, y) tuples
+    @returns: an array with the z value of each position - "nan" for positions
+        that exceed "maxz"
+    """
+    positions = numpy.asarray(positions, dtype=numpy.float64).reshape(-1, 2)
+    if model is None:
+        return numpy.full(len(positions), minz, dtype=numpy.float64)
+    if len(positions) > DROP_BLOCK_SIZE:
+        return numpy.concatenate([
+            drop_many(model, cutter, positions[start:start + DROP_BLOCK_SIZE], minz, maxz)
+            for start in range(0, len(positions), DROP_BLOCK_SIZE)])
+    tree, mesh = model.get_triangle_index()
+    radius = cutter.distance_radius
+    if tree is None:
+        # every position needs to be checked against every triangle
+        offsets = numpy.arange(len(positions) + 1) * len(mesh)
+        triangle_indices = None
+    else:
+        offsets, triangle_indices = tree.search_many(
+            positions[:, 0] - radius, positions[:, 0] + radius,
+            positions[:, 1] - radius, positions[:, 1] + radius)
+    heights = numpy.full(len(positions), numpy.nan)
+    # the number of candidate pairs (and thus the memory usage) varies between positions
+    for start, end in _get_blocks(numpy.diff(offsets), DROP_PAIR_BLOCK_SIZE):
+        if triangle_indices is None:
+            block_triangles = numpy.tile(numpy.arange(len(mesh)), end - start)
+        else:
+            block_triangles = triangle_indices[offsets[start]:offsets[end]]
+        _drop_pairs(mesh, cutter, positions, maxz, heights,
+                    numpy.repeat(numpy.arange(start, end), numpy.diff(offsets[start:end + 1])),
+                    block_triangles)
+    # see get_max_height_triangles
+    with numpy.errstate(invalid="ignore"):
+        heights[numpy.isnan(heights) | (heights < minz + epsilon)] = minz
+        heights[heights > maxz + epsilon] = numpy.nan
+    return heights
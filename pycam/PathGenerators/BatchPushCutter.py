@@ -0,0 +1,427 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2017 The PyCAM developers
+
+This file is part of PyCAM.
+
+PyCAM is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyCAM is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
+
+Vectorized push of a cutter along all horizontal lines of a layer.
+
+The calculations follow the per-triangle implementations of the cutters
+("intersect" with a horizontal direction) case by case - similar to
+BatchDropCutter. Every pair of a line and a candidate triangle is pushed
+forward and backward from the start of the line. The hits are combined into
+the free intervals of each line just like in get_free_paths_triangles.
+All functions below return the distance "d" that the cutter moves along the
+direction until it touches the triangle (INFINITE for "no contact").
+"""
+
+import numpy
+
+from pycam.Cutters.CylindricalCutter import CylindricalCutter
+from pycam.Cutters.SphericalCutter import SphericalCutter
+from pycam.Cutters.ToroidalCutter import ToroidalCutter
+from pycam.Geometry import epsilon, INFINITE
+from pycam.PathGenerators.BatchDropCutter import _Candidates, _cross, _dot, _get_centers, \
+        _get_linear_range, _get_result, _is_point_inside, _norm, _normalized, _sample_torus_edge
+
+
+# maximum number of (line, triangle) pairs to be calculated at once
+PAIR_CHUNK_SIZE = 2 ** 15
+
+
+def _horizontal_normals(directions, sign=1):
+    """ the horizontal vectors perpendicular to the given directions """
+    return numpy.column_stack((sign * directions[:, 1], -sign * directions[:, 0],
+                               numpy.zeros(len(directions))))
+
+
+def _with_zero_z(vectors):
+    result = vectors.copy()
+    result[:, 2] = 0
+    return result
+
+
+def _safe_normalized(vectors):
+    """ normalize vectors - ignoring zero length vectors """
+    length = _norm(vectors)
+    return vectors / numpy.where(length == 0, 1, length)[:, numpy.newaxis], length != 0
+
+
+def _plane_push(plane_normals, plane_points, points, directions):
+    """ the distance between points and the planes along the directions """
+    denominator = _dot(plane_normals, directions)
+    distance = -(_dot(plane_normals, points) - _dot(plane_normals, plane_points)) / numpy.where(
+        denominator == 0, 1, denominator)
+    return distance, denominator != 0
+
+
+def _push_facet(contact, directions, cands, valid):
+    """ move the contact points of the cutter onto the plane of the triangles """
+    d, hits_plane = _plane_push(cands.normals, cands.centers, contact, directions)
+    cp = contact + directions * d[:, numpy.newaxis]
+    valid = valid & hits_plane & _is_point_inside(cands.p1, cands.p2, cands.p3, cp)
+    return _get_result(valid, d)
+
+
+def _push_circle_facet(centers, radius, directions, cands):
+    """ see intersection.intersect_circle_plane """
+    normals = cands.normals
+    horizontal, not_flat = _safe_normalized(_with_zero_z(normals))
+    return _push_facet(centers - horizontal * radius, directions, cands, not_flat)
+
+
+def _push_circle_edge(centers, radius, radiussq, directions, p1, p2):
+    """ see intersection.intersect_circle_line and BaseCutter.intersect_circle_edge
+
+    Horizontal edges are never hit by a horizontal push.
+    """
+    vector = p2 - p1
+    length = _norm(vector)
+    d = vector / length[:, numpy.newaxis]
+    valid = d[:, 2] != 0
+    n, _ = _safe_normalized(_cross(d, directions))
+    # intersection of the edge with the base plane of the circle
+    along = -(p1[:, 2] - centers[:, 2]) / numpy.where(valid, d[:, 2], 1)
+    base_point = p1 + d * along[:, numpy.newaxis]
+    v, not_vertical = _safe_normalized(numpy.column_stack((-n[:, 1], n[:, 0],
+                                                           numpy.zeros(len(n)))))
+    n2, _ = _safe_normalized(numpy.column_stack((v[:, 1], -v[:, 0], numpy.zeros(len(v)))))
+    dist = _dot(n2, centers) - _dot(n2, base_point)
+    dist_sq = dist * dist
+    with numpy.errstate(invalid="ignore"):
+        dist2 = numpy.sqrt(radiussq - dist_sq)
+    dist2 = numpy.where(d[:, 2] < 0, -dist2, dist2)
+    ccp = centers - (n2 * dist[:, numpy.newaxis] - v * dist2[:, numpy.newaxis])
+    distance, hits_plane = _plane_push(_cross(_cross(d, directions), d), p1, ccp, directions)
+    cp = ccp + directions * distance[:, numpy.newaxis]
+    m = _dot(cp - p1, d)
+    valid &= (not_vertical & hits_plane & (dist_sq <= radiussq - epsilon) & (m >= -epsilon)
+              & (m <= length + epsilon))
+    return _get_result(valid, distance)
+
+
+def _push_cylinder_vertex(centers, radius, radiussq, directions, points):
+    """ see intersection.intersect_cylinder_point and BaseCutter.intersect_cylinder_vertex """
+    n = _horizontal_normals(directions)
+    offset = _dot(n, points) - _dot(n, centers)
+    with numpy.errstate(invalid="ignore"):
+        ccl = centers + (n * offset[:, numpy.newaxis]
+                         + directions * numpy.sqrt(radiussq - offset * offset)[:, numpy.newaxis])
+    distance = _dot(directions, points) - _dot(directions, ccl)
+    valid = (numpy.abs(offset) <= radius - epsilon) & (points[:, 2] >= centers[:, 2])
+    return _get_result(valid, distance)
+
+
+def _push_cylinder_edge(centers, radius, directions, p1, p2):
+    """ see intersection.intersect_cylinder_line and BaseCutter.intersect_cylinder_edge """
+    vector = p2 - p1
+    length = _norm(vector)
+    d = vector / length[:, numpy.newaxis]
+    n, not_vertical = _safe_normalized(_horizontal_normals(d))
+    n = numpy.where((_dot(n, directions) < 0)[:, numpy.newaxis], -n, n)
+    ccl = centers + n * radius
+    n2 = _horizontal_normals(directions)
+    along, hits_plane = _plane_push(n2, ccl, p1, d)
+    cp = p1 + d * along[:, numpy.newaxis]
+    distance = _dot(directions, cp) - _dot(directions, ccl)
+    m = _dot(cp - p1, d)
+    valid = (not_vertical & hits_plane & (cp[:, 2] >= centers[:, 2]) & (m >= -epsilon)
+             & (m <= length + epsilon))
+    return _get_result(valid, distance)
+
+
+def _push_sphere_facet(centers, radius, directions, cands):
+    """ see intersection.intersect_sphere_plane """
+    normals = cands.normals
+    offsets = normals * radius
+    contact = numpy.where((_dot(normals, directions) < 0)[:, numpy.newaxis], centers - offsets,
+                          centers + offsets)
+    return _push_facet(contact, directions, cands, True)
+
+
+def _push_sphere_vertex(centers, radiussq, directions, points):
+    """ see intersection.intersect_sphere_point """
+    offsets = centers - points
+    b = 2 * _dot(offsets, directions)
+    c = _dot(offsets, offsets) - radiussq
+    discriminant = b * b - 4 * c
+    with numpy.errstate(invalid="ignore"):
+        distance = (-b - numpy.sqrt(discriminant)) / 2
+    return _get_result(discriminant >= 0, distance)
+
+
+def _push_sphere_edge(centers, radius, radiussq, directions, p1, p2):
+    """ see intersection.intersect_sphere_line and SphericalCutter.intersect_sphere_edge """
+    vector = p2 - p1
+    d = _normalized(vector)
+    n, not_parallel = _safe_normalized(_cross(d, directions))
+    dist = -_dot(centers, n) + _dot(p1, n)
+    n2, _ = _safe_normalized(_cross(n, d))
+    with numpy.errstate(invalid="ignore"):
+        dist2 = numpy.sqrt(radiussq - dist * dist)
+    ccp = centers + (n * dist[:, numpy.newaxis] + n2 * dist2[:, numpy.newaxis])
+    distance, hits_plane = _plane_push(n2, p1, ccp, directions)
+    cp = ccp + directions * distance[:, numpy.newaxis]
+    m = _dot(cp - p1, vector)
+    valid = (not_parallel & hits_plane & (numpy.abs(dist) <= radius - epsilon)
+             & (m >= -epsilon) & (m <= _dot(vector, vector) + epsilon))
+    return _get_result(valid, distance)
+
+
+def _push_torus_facet(centers, majorradius, minorradius, directions, cands):
+    """ see intersection.intersect_torus_plane """
+    normals = cands.normals
+    horizontal, not_flat = _safe_normalized(_with_zero_z(-normals))
+    contact = centers + horizontal * majorradius - normals * minorradius
+    return _push_facet(contact, directions, cands, not_flat & (normals[:, 2] != 1))
+
+
+def _push_torus_point(centers, cutter, directions, points):
+    """ see intersection.intersect_torus_point (the "push" case) """
+    major = cutter.distance_majorradius
+    minor = cutter.distance_minorradius
+    z = points[:, 2] - centers[:, 2]
+    with numpy.errstate(invalid="ignore"):
+        radius = major + numpy.sqrt(cutter.distance_minorradiussq - z * z)
+        n = _horizontal_normals(directions, sign=-1)
+        offset = _dot(n, points) - _dot(n, centers)
+        along = numpy.sqrt(radius * radius - offset * offset)
+    ccp = centers + n * offset[:, numpy.newaxis] + directions * along[:, numpy.newaxis]
+    ccp[:, 2] = points[:, 2]
+    valid = (numpy.abs(z) <= minor - epsilon) & (numpy.abs(offset) <= radius - epsilon)
+    return _get_result(valid, _dot(points - ccp, directions))
+
+
+def _get_torus_push_range(centers, cutter, directions, p1, vector):
+    """ the part of each edge within the height and the width of the pushed torus """
+    minor_lower, minor_upper = _get_linear_range(p1[:, 2] - centers[:, 2], vector[:, 2],
+                                                 cutter.distance_minorradius)
+    n = _horizontal_normals(directions, sign=-1)
+    width_lower, width_upper = _get_linear_range(
+        _dot(n, p1) - _dot(n, centers), _dot(n, vector),
+        cutter.distance_majorradius + cutter.distance_minorradius)
+    return numpy.maximum(minor_lower, width_lower), numpy.minimum(minor_upper, width_upper)
+
+
+def _push_torus_edge(centers, cutter, directions, p1, p2):
+    return _sample_torus_edge(
+        lambda edges, points: _push_torus_point(centers[edges], cutter, directions[edges],
+                                                points), cutter, p1, p2,
+        get_range=lambda p1, vector: _get_torus_push_range(centers, cutter, directions, p1,
+                                                           vector))
+
+
+def _push_cylinder_shaft(centers, cutter, directions, cands):
+    """ the vertical side of the cutter - relevant for all cutter shapes """
+    radius = cutter.distance_radius
+    results = [_push_cylinder_vertex(centers, radius, cutter.distance_radiussq, directions, point)
+               for point in cands.get_vertices()]
+    results.extend(_push_cylinder_edge(centers, radius, directions, p1, p2)
+                   for p1, p2 in cands.get_edges())
+    return results
+
+
+def _push_cylindrical(cutter, cands, directions):
+    """ see CylindricalCutter.intersect """
+    centers = _get_centers(cutter, cands.starts)
+    radius = cutter.distance_radius
+    results = [_push_circle_facet(centers, radius, directions, cands)]
+    results.extend(_push_circle_edge(centers, radius, cutter.distance_radiussq, directions,
+                                     p1, p2) for p1, p2 in cands.get_edges())
+    results.extend(_push_cylinder_shaft(centers, cutter, directions, cands))
+    return numpy.minimum.reduce(results)
+
+
+def _push_spherical(cutter, cands, directions):
+    """ see SphericalCutter.intersect """
+    centers = _get_centers(cutter, cands.starts)
+    radius = cutter.distance_radius
+    radiussq = cutter.distance_radiussq
+    results = [_push_sphere_facet(centers, radius, directions, cands)]
+    results.extend(_push_sphere_edge(centers, radius, radiussq, directions, p1, p2)
+                   for p1, p2 in cands.get_edges())
+    results.extend(_push_sphere_vertex(centers, radiussq, directions, point)
+                   for point in cands.get_vertices())
+    results.extend(_push_cylinder_shaft(centers, cutter, directions, cands))
+    return numpy.minimum.reduce(results)
+
+
+def _push_toroidal(cutter, cands, directions):
+    """ see ToroidalCutter.intersect """
+    starts = cands.starts
+    centers = _get_centers(cutter, starts)
+    major = cutter.distance_majorradius
+    results = [_push_torus_facet(centers, major, cutter.distance_minorradius, directions, cands)]
+    results.extend(_push_torus_edge(centers, cutter, directions, p1, p2)
+                   for p1, p2 in cands.get_edges())
+    results.extend(_push_torus_point(centers, cutter, directions, point)
+                   for point in cands.get_vertices())
+    # the flat bottom of the cutter (its vertices are never hit by a horizontal push)
+    results.append(_push_circle_facet(starts, major, directions, cands))
+    results.extend(_push_circle_edge(starts, major, cutter.distance_majorradiussq, directions,
+                                     p1, p2) for p1, p2 in cands.get_edges())
+    results.extend(_push_cylinder_shaft(centers, cutter, directions, cands))
+    return numpy.minimum.reduce(results)
+
+
+_PUSH_FUNCTIONS = ((ToroidalCutter, _push_toroidal), (SphericalCutter, _push_spherical),
+                   (CylindricalCutter, _push_cylindrical))
+
+
+def get_push_function(cutter):
+    """ return the vectorized push function for a cutter (or None) """
+    for cutter_class, func in _PUSH_FUNCTIONS:
+        if type(cutter) is cutter_class:
+            return func
+    return None
+
+
+def is_supported(model, cutter):
+    return (get_push_function(cutter) is not None) and hasattr(model, "get_triangle_index")
+
+
+def _get_pairs(model, cutter, starts, ends):
+    """ return the line index and the triangle index of all candidate pairs """
+    tree, mesh = model.get_triangle_index()
+    radius = cutter.distance_radius
+    if tree is None:
+        line_indices = numpy.repeat(numpy.arange(len(starts)), len(mesh))
+        triangle_indices = numpy.tile(numpy.arange(len(mesh)), len(starts))
+    else:
+        lower = numpy.minimum(starts, ends)
+        upper = numpy.maximum(starts, ends)
+        offsets, triangle_indices = tree.search_many(lower[:, 0] - radius, upper[:, 0] + radius,
+                                                     lower[:, 1] - radius, upper[:, 1] + radius)
+        line_indices = numpy.repeat(numpy.arange(len(starts)), numpy.diff(offsets))
+    # triangles below the bottom of the cutter can't be hit
+    bottom = starts[line_indices, 2] - cutter.get_required_distance()
+    relevant = mesh.upper[triangle_indices, 2] >= bottom - epsilon
+    # lines without a length have no direction
+    relevant &= (starts != ends).any(axis=1)[line_indices]
+    return mesh, line_indices[relevant], triangle_indices[relevant]
+
+
+def _get_hits(model, cutter, starts, ends, directions):
+    """ push the cutter forward and backward along each line
+
+    @returns: the line indices, the signed distances of the hits from the
+        start of the line and the direction of each hit (forward: 1,
+        backward: -1) - sorted like the hits in get_free_paths_triangles
+    """
+    mesh, line_indices, triangle_indices = _get_pairs(model, cutter, starts, ends)
+    push = get_push_function(cutter)
+    forward = numpy.full(len(line_indices), float(INFINITE))
+    backward = numpy.full(len(line_indices), float(INFINITE))
+    for chunk_start in range(0, len(line_indices), PAIR_CHUNK_SIZE):
+        chunk = slice(chunk_start, chunk_start + PAIR_CHUNK_SIZE)
+        lines = line_indices[chunk]
+        triangles = triangle_indices[chunk]
+        both_lines = numpy.concatenate((lines, lines))
+        both_directions = numpy.concatenate((directions[lines], -directions[lines]))
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            distances = push(cutter, _Candidates(starts[both_lines], mesh,
+                                                 numpy.concatenate((triangles, triangles))),
+                             both_directions)
+        forward[chunk] = distances[:len(lines)]
+        backward[chunk] = distances[len(lines):]
+    pair_count = len(line_indices)
+    # the legacy implementation adds the backward hit of a triangle before its forward hit
+    order_keys = numpy.concatenate((2 * numpy.arange(pair_count) + 1,
+                                    2 * numpy.arange(pair_count)))
+    signs = numpy.concatenate((numpy.ones(pair_count, dtype=numpy.int64),
+                               -numpy.ones(pair_count, dtype=numpy.int64)))
+    distances = numpy.concatenate((forward, -backward))
+    lines = numpy.concatenate((line_indices, line_indices))
+    is_hit = numpy.abs(distances) < INFINITE
+    lines, distances, signs, order_keys = (lines[is_hit], distances[is_hit], signs[is_hit],
+                                           order_keys[is_hit])
+    order = numpy.lexsort((order_keys, distances, lines))
+    return lines[order], distances[order], signs[order]
+
+
+def get_free_intervals(model, cutter, starts, ends):
+    """ calculate the free intervals along many horizontal lines
+
+    The result is equal to get_free_paths_triangles for every line.
+
+    @param starts, ends: arrays of the start and end points of the lines
+    @returns: a tuple (offsets, points) - the points of line "i" are
+        points[offsets[i]:offsets[i + 1]] (pairs of start and end points)
+    """
+    starts = numpy.asarray(starts, dtype=numpy.float64).reshape(-1, 3)
+    ends = numpy.asarray(ends, dtype=numpy.float64).reshape(-1, 3)
+    line_count = len(starts)
+    vectors = ends - starts
+    lengths = _norm(vectors)
+    directions = vectors / numpy.where(lengths == 0, 1, lengths)[:, numpy.newaxis]
+    lines, distances, signs = _get_hits(model, cutter, starts, ends, directions)
+    # count the open forward hits in front of each hit (per line)
+    counts = numpy.cumsum(signs) - signs
+    counts -= counts[numpy.searchsorted(lines, lines)]
+    in_range = (distances >= -epsilon) & (distances <= lengths[lines] + epsilon)
+    selected = numpy.flatnonzero(in_range & (((signs > 0) & (counts == 0))
+                                             | ((signs < 0) & (counts == 1))))
+    selected_lines = lines[selected]
+    selected_counts = numpy.bincount(selected_lines, minlength=line_count)
+    # the start point precedes a leading forward hit
+    first = numpy.searchsorted(selected_lines, numpy.arange(line_count))
+    has_selected = selected_counts > 0
+    prefix = numpy.zeros(line_count, dtype=numpy.int64)
+    prefix[has_selected] = signs[selected[first[has_selected]]] > 0
+    suffix = (prefix + selected_counts) % 2
+    # lines without a hit are completely free or completely inside of the model
+    inside = numpy.bincount(lines, weights=signs * (distances < -epsilon), minlength=line_count)
+    is_free = ~has_selected & (inside <= 0)
+    prefix[is_free] = 1
+    suffix[is_free] = 1
+    offsets = numpy.zeros(line_count + 1, dtype=numpy.int64)
+    numpy.cumsum(prefix + selected_counts + suffix, out=offsets[1:])
+    points = numpy.zeros((offsets[-1], 3), dtype=numpy.float64)
+    with_prefix = numpy.flatnonzero(prefix)
+    points[offsets[with_prefix]] = starts[with_prefix]
+    ranks = numpy.arange(len(selected)) - first[selected_lines]
+    points[offsets[selected_lines] + prefix[selected_lines] + ranks] = (
+        starts[selected_lines]
+        + directions[selected_lines] * distances[selected][:, numpy.newaxis])
+    with_suffix = numpy.flatnonzero(suffix)
+    points[offsets[with_suffix + 1] - 1] = ends[with_suffix]
+    return offsets, points
+
+
+def get_free_intervals_many(models, cutter, starts, ends):
+    """ calculate the free intervals along many lines for a list of models
+
+    Each model is processed with the free intervals of the previous one (see
+    get_free_paths_triangles). The result is equal to get_free_intervals.
+    """
+    starts = numpy.asarray(starts, dtype=numpy.float64).reshape(-1, 3)
+    ends = numpy.asarray(ends, dtype=numpy.float64).reshape(-1, 3)
+    line_count = len(starts)
+    # the index of the original line of each interval
+    owners = numpy.arange(line_count)
+    for model in models:
+        if model is None:
+            continue
+        offsets, points = get_free_intervals(model, cutter, starts, ends)
+        owners = numpy.repeat(owners, numpy.diff(offsets) // 2)
+        starts = points[0::2]
+        ends = points[1::2]
+    offsets = numpy.zeros(line_count + 1, dtype=numpy.int64)
+    numpy.cumsum(2 * numpy.bincount(owners, minlength=line_count), out=offsets[1:])
+    points = numpy.empty((2 * len(starts), 3), dtype=numpy.float64)
+    points[0::2] = starts
+    points[1::2] = ends
+    return offsets, points
@@ -23,13 +23,16 @@ take a look at the related blog posting describing this algorithm:
   http://fab.senselab.org/node/43
 """
 
+import bisect
+
 from pycam.Geometry import ceil, epsilon, sqrt
 from pycam.Geometry.Line import Line
 from pycam.Geometry.Plane import Plane
 from pycam.Geometry.PointUtils import padd, pcross, pdot, pmul, pnorm, pnormalized, psub
-from pycam.PathGenerators import get_free_paths_triangles
-from pycam.Utils import ProgressCounter
-from pycam.Utils.threading import run_in_parallel
+from pycam.PathGenerators import get_free_paths_triangles, get_free_paths_many, \
+        is_free_paths_many_supported
+from pycam.Utils import DrawCallbackThrottle, ProgressCounter
+from pycam.Utils.threading import AutoTuneChunkPolicy, run_in_parallel
 import pycam.Utils.log
 
 _DEBUG_DISABLE_COLLISION_CHECK = False
@@ -43,7 +46,9 @@ log = pycam.Utils.log.get_logger()
 # We need to use a global function here - otherwise it does not work with
 # the multiprocessing Pool.
 def _process_one_triangle(extra_args):
-    model, cutter, up_vector, triangle, z = extra_args
+    model, cutter, up_vector, triangle_index, z = extra_args
+    # the index is valid for the copy of the model within a worker process
+    triangle = model.triangles()[triangle_index]
     result = []
     # ignore triangles below the z level
     if triangle.maxz < z:
@@ -56,7 +61,7 @@ def _process_one_triangle(extra_args):
     edge_collisions = get_collision_waterline_of_triangle(model, cutter, up_vector, triangle, z)
     if edge_collisions is None:
         # don't try to use this edge again
-        return result, [id(triangle)]
+        return result, [triangle_index]
     elif len(edge_collisions) == 0:
         return result, None
     else:
@@ -107,7 +112,7 @@ class CollisionPaths(object):
     def _get_groups(self):
         if len(self.waterlines) == 0:
             return []
-        queue = range(len(self.waterlines))
+        queue = list(range(len(self.waterlines)))
         current_group = [0]
         queue.pop(0)
         groups = [current_group]
@@ -169,7 +174,8 @@ class CollisionPaths(object):
                                                                 infinite_lines=True)
                 # TODO: add an arc (composed of lines) for a soft corner (not
                 # required, but nicer)
-                if dist < epsilon:
+                # parallel lines do not intersect ("dist" is None)
+                if (dist is None) or (dist < epsilon):
                     self.shifted_lines[current] = None
                     index -= 1
                 elif dist2 > 1 - epsilon:
@@ -194,7 +200,12 @@ class ContourFollow(object):
     def __init__(self, path_processor):
         self.pa = path_processor
         self._up_vector = (0, 0, 1, 'v')
-        self._processed_triangles = []
+        # indices of triangles without collisions (see "_process_one_triangle")
+        self._processed_triangles = set()
+        # the candidate triangles of the current area (see "_get_layer_triangles")
+        self._candidates = None
+        # most triangles are processed quickly - thus they are sent to the workers in chunks
+        self._chunk_policy = AutoTuneChunkPolicy()
 
     def _get_free_paths(self, cutter, models, p1, p2):
         return get_free_paths_triangles(models, cutter, p1, p2)
@@ -202,7 +213,10 @@ class ContourFollow(object):
     def GenerateToolPath(self, cutter, models, minx, maxx, miny, maxy, minz, maxz, dz,
                          draw_callback=None):
         # reset the list of processed triangles
-        self._processed_triangles = []
+        self._processed_triangles = set()
+        self._candidates = None
+        # the chunk sizes are tuned for this toolpath only (concurrent tasks use their own)
+        self._chunk_policy = AutoTuneChunkPolicy()
         # calculate the number of steps
         # Sometimes there is a floating point accuracy issue: make sure
         # that only one layer is drawn, if maxz and minz are almost the same.
@@ -245,12 +259,17 @@ class ContourFollow(object):
         if num_of_triangles is None:
             num_of_triangles = len(shifted_lines)
         last_position = None
+        draw_throttle = DrawCallbackThrottle(draw_callback)
         self.pa.new_scanline()
-        for line in shifted_lines:
-            if _DEBUG_DISABLE_COLLISION_CHECK:
-                points = (line.p1, line.p2)
-            else:
-                points = self._get_free_paths(line.p1, line.p2)
+        lines = [(line.p1, line.p2) for line in shifted_lines]
+        if _DEBUG_DISABLE_COLLISION_CHECK:
+            free_paths = lines
+        elif is_free_paths_many_supported([model], cutter, lines):
+            # all lines of the layer are calculated at once
+            free_paths = get_free_paths_many([model], cutter, lines)
+        else:
+            free_paths = (self._get_free_paths(cutter, [model], p1, p2) for p1, p2 in lines)
+        for points in free_paths:
             if points:
                 if (last_position is not None) and (last_position != points[0]):
                     self.pa.end_scanline()
@@ -258,8 +277,7 @@ class ContourFollow(object):
                 for p in points:
                     self.pa.append(p)
                 last_position = points[-1]
-                if draw_callback:
-                    draw_callback(tool_position=last_position, toolpath=self.pa.paths)
+                draw_throttle.update(tool_position=last_position, toolpath=self.pa.paths)
             # update the progress counter
             if progress_counter is not None:
                 if progress_counter.increment():
@@ -270,21 +288,47 @@ class ContourFollow(object):
         if progress_counter is not None:
             progress_counter.increment(num_of_triangles - len(shifted_lines))
         self.pa.end_scanline()
+        draw_throttle.flush()
         return self.pa.paths
 
+    def _get_layer_triangles(self, model, minx, maxx, miny, maxy, z):
+        """ return the indices of the triangles within the area reaching up to the given layer
+
+        The candidate triangles of the area are collected only once and sorted by their top.
+        Thus every layer just picks the triangles above its height.
+        """
+        key = (model.uuid, minx, maxx, miny, maxy)
+        if (self._candidates is None) or (self._candidates[0] != key):
+            triangles = model.triangles()
+            candidates = []
+            for position, index in enumerate(model.get_triangle_indices(
+                    minx=minx, miny=miny, maxx=maxx, maxy=maxy)):
+                triangle = triangles[index]
+                # ignore triangles pointing upwards or downwards (see "_process_one_triangle")
+                if pnorm(pcross(triangle.normal, self._up_vector)) != 0:
+                    candidates.append((-triangle.maxz, position, index))
+            candidates.sort()
+            self._candidates = (key, [item[0] for item in candidates],
+                                [item[1:] for item in candidates])
+        key, negative_tops, positions = self._candidates
+        # all triangles with "maxz >= z" - in their original order
+        return [index for position, index
+                in sorted(positions[:bisect.bisect_right(negative_tops, -z)])]
+
     def get_potential_contour_lines(self, cutter, model, minx, maxx, miny, maxy, z,
                                     progress_counter=None):
         # use only the first model for the contour
         follow_model = model
         waterline_triangles = CollisionPaths()
-        triangles = follow_model.triangles(minx=minx, miny=miny, maxx=maxx, maxy=maxy)
-        args = [(follow_model, cutter, self._up_vector, t, z)
-                for t in triangles if id(t) not in self._processed_triangles]
-        results_iter = run_in_parallel(_process_one_triangle, args, unordered=True,
-                                       callback=progress_counter.update)
+        args = [(follow_model, cutter, self._up_vector, index, z)
+                for index in self._get_layer_triangles(follow_model, minx, maxx, miny, maxy, z)
+                if index not in self._processed_triangles]
+        results_iter = run_in_parallel(
+            _process_one_triangle, args, unordered=True, chunk_policy=self._chunk_policy,
+            callback=(None if progress_counter is None else progress_counter.update))
         for result, ignore_triangle_id_list in results_iter:
             if ignore_triangle_id_list:
-                self._processed_triangles.extend(ignore_triangle_id_list)
+                self._processed_triangles.update(ignore_triangle_id_list)
             for edge, shifted_edge in result:
                 waterline_triangles.add(edge, shifted_edge)
             if (progress_counter is not None) and (progress_counter.increment()):
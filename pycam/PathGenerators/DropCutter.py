@@ -22,9 +22,13 @@ along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
 import pycam.Geometry.Model
 from pycam.PathGenerators import get_max_height_dynamic
 from pycam.Toolpath.Steps import MoveStraight, MoveSafety
-from pycam.Utils import ProgressCounter
-from pycam.Utils.threading import run_in_parallel
+from pycam.Utils import DrawCallbackThrottle, ProgressCounter
+from pycam.Utils.threading import GuidedChunkPolicy, run_in_parallel
 import pycam.Utils.log
+try:
+    from pycam.PathGenerators import HeightField
+except ImportError:
+    HeightField = None
 
 log = pycam.Utils.log.get_logger()
 
@@ -36,12 +40,40 @@ def _process_one_grid_line(extra_args):
     Otherwise the dynamic over-sampling (in get_max_height_dynamic) is
     pointless.
     """
-    positions, minz, maxz, model, cutter = extra_args
-    return get_max_height_dynamic(model, cutter, positions, minz, maxz)
+    positions, minz, maxz, model, cutter, height_field = extra_args
+    return get_max_height_dynamic(model, cutter, positions, minz, maxz,
+                                  height_field=height_field)
 
 
 class DropCutter(object):
 
+    def __init__(self, height_field_resolution=None):
+        """
+        @param height_field_resolution: use an approximated height field (see
+            HeightField) with the given grid distance instead of calculating
+            the exact height of every position
+        """
+        self.height_field_resolution = height_field_resolution
+
+    def _get_height_field(self, cutter, model, lines, minz, maxz):
+        if not self.height_field_resolution:
+            return None
+        if HeightField is None:
+            log.warn("DropCutter: the height field mode requires 'numpy' - falling back to "
+                     "exact calculation")
+            return None
+        if not HeightField.is_supported(cutter):
+            log.warn("DropCutter: the height field mode does not support the cutter '%s' - "
+                     "falling back to exact calculation", cutter)
+            return None
+        positions = [pos for line in lines for pos in line]
+        if not positions:
+            return None
+        xs = [pos[0] for pos in positions]
+        ys = [pos[1] for pos in positions]
+        return HeightField.HeightField(model, cutter, self.height_field_resolution, minz, maxz,
+                                       bounds=(min(xs), min(ys), max(xs), max(ys)))
+
     def GenerateToolPath(self, cutter, models, motion_grid, minz=None, maxz=None,
                          draw_callback=None):
         path = []
@@ -58,35 +90,39 @@ class DropCutter(object):
 
         num_of_lines = len(lines)
         progress_counter = ProgressCounter(len(lines), draw_callback)
+        draw_throttle = DrawCallbackThrottle(draw_callback)
         current_line = 0
 
+        height_field = self._get_height_field(cutter, model, lines, minz, maxz)
+
         args = []
         for one_grid_line in lines:
             # simplify the data (useful for remote processing)
             xy_coords = [(pos[0], pos[1]) for pos in one_grid_line]
-            args.append((xy_coords, minz, maxz, model, cutter))
+            args.append((xy_coords, minz, maxz, model, cutter, height_field))
         for points in run_in_parallel(_process_one_grid_line, args,
-                                      callback=progress_counter.update):
-            if draw_callback and draw_callback(
-                    text="DropCutter: processing line %d/%d" % (current_line + 1, num_of_lines)):
-                # cancel requested
-                quit_requested = True
-                break
+                                      callback=progress_counter.update,
+                                      chunk_policy=GuidedChunkPolicy()):
+            line_start = len(path)
+            tool_position = None
             for point in points:
                 if point is None:
                     # exceeded maxz - the cutter has to skip this point
                     path.append(MoveSafety())
                 else:
                     path.append(MoveStraight(point))
-                # The progress counter may return True, if cancel was requested.
-                if draw_callback and draw_callback(tool_position=point, toolpath=path):
-                    quit_requested = True
-                    break
+                    tool_position = point
             # add a move to safety height after each line of moves
             path.append(MoveSafety())
-            progress_counter.increment()
             # update progress
             current_line += 1
-            if quit_requested:
+            # The callbacks may return True, if cancel was requested.
+            if draw_throttle.update(
+                    text="DropCutter: processing line %d/%d" % (current_line, num_of_lines),
+                    tool_position=tool_position, moves=path[line_start:]) \
+                    or progress_counter.increment():
+                quit_requested = True
                 break
+        if not quit_requested:
+            draw_throttle.flush()
         return path
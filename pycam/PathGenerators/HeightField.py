@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2017 The PyCAM developers
+
+This file is part of PyCAM.
+
+PyCAM is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyCAM is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import hashlib
+import math
+
+import numpy
+
+from pycam.Cutters.CylindricalCutter import CylindricalCutter
+from pycam.Cutters.SphericalCutter import SphericalCutter
+from pycam.Cutters.ToroidalCutter import ToroidalCutter
+from pycam.Geometry import epsilon
+
+
+# the maximum number of (triangle, cell) pairs that are processed at once
+RASTER_CHUNK_SIZE = 2 ** 21
+
+
+def _get_cylindrical_profile(cutter, distances):
+    # flat bottom at the height of the center
+    offset = cutter.center[2] - cutter.location[2]
+    return numpy.where(distances <= cutter.distance_radius, offset, numpy.inf)
+
+
+def _get_spherical_profile(cutter, distances):
+    offset = cutter.center[2] - cutter.location[2]
+    with numpy.errstate(invalid="ignore"):
+        profile = offset - numpy.sqrt(cutter.distance_radiussq - distances ** 2)
+    return numpy.where(distances <= cutter.distance_radius, profile, numpy.inf)
+
+
+def _get_toroidal_profile(cutter, distances):
+    # the torus and the flat circle at the bottom of the cutter (see ToroidalCutter.drop)
+    offset = cutter.center[2] - cutter.location[2]
+    circle = numpy.where(distances <= cutter.distance_majorradius, 0, numpy.inf)
+    tube_distances = distances - cutter.distance_majorradius
+    with numpy.errstate(invalid="ignore"):
+        tube = offset - numpy.sqrt(cutter.distance_minorradiussq - tube_distances ** 2)
+    tube = numpy.where(numpy.abs(tube_distances) <= cutter.distance_minorradius, tube,
+                       numpy.inf)
+    return numpy.minimum(circle, tube)
+
+
+# the order is relevant: derived classes need to be checked first
+_PROFILE_FUNCTIONS = ((ToroidalCutter, _get_toroidal_profile),
+                      (SphericalCutter, _get_spherical_profile),
+                      (CylindricalCutter, _get_cylindrical_profile))
+
+
+def get_profile_function(cutter):
+    """ return the function describing the shape of the cutter's bottom
+
+    The function returns the height of the cutter's surface (relative to its
+    location) for an array of horizontal distances from the axis. Distances
+    outside of the cutter are marked with "inf".
+    """
+    for cutter_class, func in _PROFILE_FUNCTIONS:
+        if type(cutter) is cutter_class:
+            return func
+    return None
+
+
+def is_supported(cutter):
+    return get_profile_function(cutter) is not None
+
+
+def _update_maximum(field, indices, values):
+    """ store the maximum of all values for each index in the (flat) field """
+    if len(indices) == 0:
+        return
+    order = numpy.argsort(indices)
+    indices = indices[order]
+    group_starts = numpy.nonzero(numpy.append(True, indices[1:] != indices[:-1]))[0]
+    indices = indices[group_starts]
+    maximum = numpy.maximum.reduceat(values[order], group_starts)
+    field[indices] = numpy.maximum(field[indices], maximum)
+
+
+def _expand(counts):
+    """ return the owner and the local index of "counts[i]" items for each "i" """
+    owners = numpy.repeat(numpy.arange(len(counts)), counts)
+    local = numpy.arange(len(owners)) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+    return owners, local
+
+
+def _get_chunks(counts):
+    """ split the items into consecutive ranges with not more than RASTER_CHUNK_SIZE
+    expanded items (or a single item)
+    """
+    cumulated = numpy.cumsum(counts)
+    start = 0
+    while start < len(counts):
+        end = numpy.searchsorted(cumulated, cumulated[start] - counts[start] + RASTER_CHUNK_SIZE,
+                                 side="right")
+        end = min(max(start + 1, end), len(counts))
+        yield start, end
+        start = end
+
+
+def _rasterize_facets(field, origin, resolution, p1, p2, p3):
+    """ store the height of the triangles at the center of every cell below
+
+    Each triangle is split into the columns of cells below. The range of cells
+    within each column is calculated from the edges of the triangle.
+    """
+    width, height = field.shape
+    v0 = p2 - p1
+    v1 = p3 - p1
+    denominator = v0[:, 0] * v1[:, 1] - v1[:, 0] * v0[:, 1]
+    # vertical triangles are handled by their edges
+    valid = numpy.abs(denominator) >= epsilon ** 2
+    p1, p2, p3, v0, v1 = p1[valid], p2[valid], p3[valid], v0[valid], v1[valid]
+    denominator = denominator[valid]
+    # the gradient of the height within the plane of each triangle
+    gradient_x = (v1[:, 1] * v0[:, 2] - v0[:, 1] * v1[:, 2]) / denominator
+    gradient_y = (v0[:, 0] * v1[:, 2] - v1[:, 0] * v0[:, 2]) / denominator
+    min_x = numpy.minimum(numpy.minimum(p1[:, 0], p2[:, 0]), p3[:, 0])
+    max_x = numpy.maximum(numpy.maximum(p1[:, 0], p2[:, 0]), p3[:, 0])
+    first = numpy.maximum(numpy.ceil((min_x - origin[0]) / resolution), 0).astype(numpy.int64)
+    last = numpy.minimum(numpy.floor((max_x - origin[0]) / resolution),
+                         width - 1).astype(numpy.int64)
+    triangles, local = _expand(numpy.maximum(last - first + 1, 0))
+    columns = first[triangles] + local
+    x = origin[0] + columns * resolution
+    # the range of each triangle along the column
+    low_y = numpy.full(len(x), numpy.inf)
+    high_y = numpy.full(len(x), -numpy.inf)
+    for start, end in ((p1, p2), (p2, p3), (p3, p1)):
+        start, end = start[triangles], end[triangles]
+        delta_x = end[:, 0] - start[:, 0]
+        crosses = ((numpy.minimum(start[:, 0], end[:, 0]) <= x)
+                   & (x <= numpy.maximum(start[:, 0], end[:, 0])) & (delta_x != 0))
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            y = start[:, 1] + (x - start[:, 0]) * (end[:, 1] - start[:, 1]) / delta_x
+        numpy.minimum(low_y, numpy.where(crosses, y, numpy.inf), out=low_y)
+        numpy.maximum(high_y, numpy.where(crosses, y, -numpy.inf), out=high_y)
+    valid = low_y <= high_y
+    triangles, columns, x = triangles[valid], columns[valid], x[valid]
+    first = numpy.maximum(numpy.ceil((low_y[valid] - origin[1]) / resolution - epsilon), 0)
+    last = numpy.minimum(numpy.floor((high_y[valid] - origin[1]) / resolution + epsilon),
+                         height - 1)
+    first = first.astype(numpy.int64)
+    counts = numpy.maximum(last.astype(numpy.int64) - first + 1, 0)
+    flat_field = field.reshape(-1)
+    for start, end in _get_chunks(counts):
+        owners, local = _expand(counts[start:end])
+        owners += start
+        rows = first[owners] + local
+        owner_triangles = triangles[owners]
+        z = (p1[owner_triangles, 2]
+             + (x[owners] - p1[owner_triangles, 0]) * gradient_x[owner_triangles]
+             + (origin[1] + rows * resolution - p1[owner_triangles, 1])
+             * gradient_y[owner_triangles])
+        _update_maximum(flat_field, columns[owners] * height + rows, z)
+
+
+def _rasterize_edges(field, origin, resolution, starts, ends):
+    """ store the height of the edges in the nearest cells
+
+    This catches vertical and very small triangles. The edges are sampled with
+    half of the resolution.
+    """
+    width, height = field.shape
+    lengths = numpy.hypot(ends[:, 0] - starts[:, 0], ends[:, 1] - starts[:, 1])
+    counts = numpy.ceil(lengths / (resolution / 2)).astype(numpy.int64) + 1
+    flat_field = field.reshape(-1)
+    for start, end in _get_chunks(counts):
+        edges, local = _expand(counts[start:end])
+        edges += start
+        factors = local / numpy.maximum(counts[edges] - 1, 1).astype(numpy.float64)
+        points = starts[edges] + (ends[edges] - starts[edges]) * factors[:, numpy.newaxis]
+        cells = numpy.rint((points[:, :2] - origin) / resolution).astype(numpy.int64)
+        valid = ((cells[:, 0] >= 0) & (cells[:, 0] < width)
+                 & (cells[:, 1] >= 0) & (cells[:, 1] < height))
+        _update_maximum(flat_field, (cells[:, 0] * height + cells[:, 1])[valid],
+                        points[valid, 2])
+
+
+def _get_sliding_maximum(values, length):
+    """ return the maximum of every "length" adjacent values along the second axis
+
+    The van Herk/Gil-Werman algorithm needs a constant number of operations per
+    item - independent of "length".
+    """
+    rows, columns = values.shape
+    block_count = -(-columns // length)
+    padded = numpy.full((rows, block_count * length), -numpy.inf)
+    padded[:, :columns] = values
+    blocks = padded.reshape(rows, block_count, length)
+    prefix = numpy.maximum.accumulate(blocks, axis=2).reshape(rows, -1)
+    suffix = numpy.maximum.accumulate(blocks[:, :, ::-1], axis=2)[:, :, ::-1].reshape(rows, -1)
+    count = columns - length + 1
+    return numpy.maximum(suffix[:, :count], prefix[:, length - 1:length - 1 + count])
+
+
+class HeightField(object):
+    """ approximate the cutter locations above a model with a regular grid
+
+    The model is rasterized once into a height map. The height of the cutter
+    location for every cell is the morphological dilation of this map with the
+    shape of the cutter. Afterwards the height of any position is calculated by
+    bilinear interpolation.
+    The results are approximations of "get_max_height_triangles": the error
+    depends on the resolution.
+    """
+
+    def __init__(self, model, cutter, resolution, minz, maxz, bounds=None):
+        """
+        @param resolution: the distance between two cells of the grid
+        @param bounds: the range (minx, miny, maxx, maxy) of the positions that
+            will be requested (default: the bounding box of the model)
+        """
+        self.resolution = float(resolution)
+        self.minz = minz
+        self.maxz = maxz
+        if bounds is None:
+            bounds = (model.minx, model.miny, model.maxx, model.maxy)
+        # one additional cell at each side for the interpolation
+        self.origin = numpy.array(bounds[:2], dtype=numpy.float64) - self.resolution
+        size = (numpy.array(bounds[2:], dtype=numpy.float64) - self.origin) / self.resolution
+        self.shape = tuple(int(value) + 2 for value in numpy.ceil(size))
+        self.heights = self._get_cutter_heights(model, cutter)
+        # equal height fields share their cache items in parallel processing
+        parameters = repr((self.resolution, self.origin.tolist(), minz, maxz))
+        content_hash = hashlib.sha1(parameters.encode("utf-8"))
+        content_hash.update(self.heights.tobytes())
+        self.uuid = content_hash.hexdigest()
+
+    def _get_cutter_heights(self, model, cutter):
+        profile_func = get_profile_function(cutter)
+        if profile_func is None:
+            raise ValueError("Unsupported cutter type for height fields: %s" % str(cutter))
+        margin = int(math.ceil(cutter.distance_radius / self.resolution))
+        if isinstance(cutter, ToroidalCutter):
+            margin = max(margin, int(math.ceil(
+                (cutter.distance_majorradius + cutter.distance_minorradius) / self.resolution)))
+        model_heights = self._get_model_heights(model, margin)
+        offsets = numpy.arange(-margin, margin + 1)
+        distances = numpy.hypot(offsets[:, numpy.newaxis], offsets[numpy.newaxis, :])
+        profile = profile_func(cutter, distances * self.resolution)
+        result = numpy.full(self.shape, -numpy.inf)
+        shifted = numpy.empty(self.shape)
+        width, height = self.shape
+        for dx, row in enumerate(profile):
+            strip = model_heights[dx:dx + width]
+            finite = numpy.nonzero(numpy.isfinite(row))[0]
+            if len(finite) == 0:
+                continue
+            # the flat part of the cutter is handled with a sliding maximum
+            flat = finite[row[finite] == row[finite].min()]
+            if (len(flat) > 2) and (flat[-1] - flat[0] + 1 == len(flat)):
+                windows = _get_sliding_maximum(strip, len(flat))
+                numpy.subtract(windows[:, flat[0]:flat[0] + height], row[flat[0]], out=shifted)
+                numpy.maximum(result, shifted, out=result)
+                finite = finite[(finite < flat[0]) | (finite > flat[-1])]
+            for dy in finite:
+                numpy.subtract(strip[:, dy:dy + height], row[dy], out=shifted)
+                numpy.maximum(result, shifted, out=result)
+        # positions without any contact
+        return numpy.maximum(result, self.minz)
+
+    def _get_model_heights(self, model, margin):
+        """ rasterize the model - the cells without material are "-inf" """
+        shape = (self.shape[0] + 2 * margin, self.shape[1] + 2 * margin)
+        heights = numpy.full(shape, -numpy.inf)
+        if model is None:
+            return heights
+        origin = self.origin - margin * self.resolution
+        tree, mesh = model.get_triangle_index()
+        if len(mesh) == 0:
+            return heights
+        points = mesh.vertices[mesh.faces]
+        p1, p2, p3 = points[:, 0], points[:, 1], points[:, 2]
+        _rasterize_facets(heights, origin, self.resolution, p1, p2, p3)
+        _rasterize_edges(heights, origin, self.resolution, numpy.vstack((p1, p2, p3)),
+                         numpy.vstack((p2, p3, p1)))
+        return heights
+
+    def get_heights(self, positions):
+        """ calculate the heights of the cutter at many positions
+
+        @param positions: a sequence of (x, y) tuples
+        @returns: an array with the z value of each position - "nan" for
+            positions that exceed "maxz"
+        """
+        positions = numpy.asarray(positions, dtype=numpy.float64).reshape(-1, 2)
+        cells = (positions - self.origin) / self.resolution
+        limit = numpy.array(self.shape) - 2
+        indices = numpy.clip(numpy.floor(cells).astype(numpy.int64), 0, limit)
+        fractions = numpy.clip(cells - indices, 0, 1)
+        x, y = indices[:, 0], indices[:, 1]
+        fx, fy = fractions[:, 0], fractions[:, 1]
+        heights = self.heights
+        result = ((heights[x, y] * (1 - fx) + heights[x + 1, y] * fx) * (1 - fy)
+                  + (heights[x, y + 1] * (1 - fx) + heights[x + 1, y + 1] * fx) * fy)
+        result[result < self.minz + epsilon] = self.minz
+        result[result > self.maxz + epsilon] = numpy.nan
+        return result
+
+    def get_max_height_many(self, positions):
+        """ return the same type of results as "get_max_height_many" """
+        heights = self.get_heights(positions)
+        return [None if (z != z) else (x, y, z)
+                for (x, y), z in zip(positions, heights.tolist())]
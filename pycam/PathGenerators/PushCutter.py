@@ -19,16 +19,20 @@ You should have received a copy of the GNU General Public License
 along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
 """
 
-from pycam.PathGenerators import get_free_paths_triangles
+from pycam.PathGenerators import get_free_paths_triangles, get_free_paths_many, \
+        is_free_paths_many_supported
 import pycam.PathProcessors.ContourCutter
-from pycam.Utils.threading import run_in_parallel
-from pycam.Utils import ProgressCounter
+from pycam.Utils.threading import GuidedChunkPolicy, get_number_of_processes, run_in_parallel
+from pycam.Utils import DrawCallbackThrottle, ProgressCounter
 import pycam.Utils.log
 from pycam.Toolpath.Steps import MoveStraight, MoveSafety
 
 
 log = pycam.Utils.log.get_logger()
 
+# maximum number of lines calculated by the vectorized implementation in a single task
+LINES_PER_TASK = 64
+
 
 # We need to use a global function here - otherwise it does not work with
 # the multiprocessing Pool.
@@ -38,6 +42,11 @@ def _process_one_line(extra_args):
     return points
 
 
+def _process_lines(extra_args):
+    lines, models, cutter = extra_args
+    return get_free_paths_many(models, cutter, lines)
+
+
 class PushCutter(object):
 
     def __init__(self, waterlines=False):
@@ -98,9 +107,8 @@ class PushCutter(object):
                     # We assume that the first model is used for the waterline and all
                     # other models are obstacles (e.g. a support grid).
                     other_models = models[1:]
-                    for p1, p2 in pairs:
-                        free_points = get_free_paths_triangles(other_models, cutter, p1, p2)
-                        for index in range(len(free_points) / 2):
+                    for free_points in get_free_paths_many(other_models, cutter, pairs):
+                        for index in range(len(free_points) // 2):
                             result.append(MoveStraight(free_points[2 * index]))
                             result.append(MoveStraight(free_points[2 * index + 1]))
                             result.append(MoveSafety())
@@ -116,37 +124,49 @@ class PushCutter(object):
     def GenerateToolPathSlice(self, cutter, models, layer_grid, draw_callback=None,
                               progress_counter=None):
         path = []
+        draw_throttle = DrawCallbackThrottle(draw_callback)
         # the ContourCutter pathprocessor does not work with combined models
         if self.waterlines:
             models = models[:1]
         else:
             models = models
-        args = []
-        for line in layer_grid:
-            p1, p2 = line
-            args.append((p1, p2, models, cutter))
-        for points in run_in_parallel(_process_one_line, args, callback=progress_counter.update):
+        lines = [tuple(line) for line in layer_grid]
+        callback = None if progress_counter is None else progress_counter.update
+        if is_free_paths_many_supported(models, cutter, lines):
+            # blocks of lines are calculated at once - every process gets at least one block
+            block_size = max(1, min(LINES_PER_TASK,
+                                    -(-len(lines) // get_number_of_processes())))
+            args = [(lines[start:start + block_size], models, cutter)
+                    for start in range(0, len(lines), block_size)]
+            results = (points for block in run_in_parallel(_process_lines, args,
+                                                           callback=callback)
+                       for points in block)
+        else:
+            args = [(p1, p2, models, cutter) for p1, p2 in lines]
+            results = run_in_parallel(_process_one_line, args, callback=callback,
+                                      chunk_policy=GuidedChunkPolicy())
+        for points in results:
             if points:
                 if self.waterlines:
                     self.pa.new_scanline()
                     for point in points:
                         self.pa.append(point)
                 else:
-                    for index in range(len(points) / 2):
+                    line_start = len(path)
+                    for index in range(len(points) // 2):
                         path.append(MoveStraight(points[2 * index]))
                         path.append(MoveStraight(points[2 * index + 1]))
                         path.append(MoveSafety())
                 if self.waterlines:
-                    if draw_callback:
-                        draw_callback(tool_position=points[-1])
+                    draw_throttle.update(tool_position=points[-1])
                     self.pa.end_scanline()
                 else:
-                    if draw_callback:
-                        draw_callback(tool_position=points[-1], toolpath=path)
+                    draw_throttle.update(tool_position=points[-1], moves=path[line_start:])
             # update the progress counter
             if progress_counter and progress_counter.increment():
                 # quit requested
                 break
+        draw_throttle.flush()
 
         if not self.waterlines:
             return path
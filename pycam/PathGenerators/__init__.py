@@ -22,6 +22,15 @@ along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
 from pycam.Geometry import epsilon, INFINITE
 from pycam.Geometry.PointUtils import pdist, pnorm, pnormalized, psub
 
+try:
+    from pycam.PathGenerators import BatchDropCutter
+except ImportError:
+    BatchDropCutter = None
+try:
+    from pycam.PathGenerators import BatchPushCutter
+except ImportError:
+    BatchPushCutter = None
+
 
 class Hit(object):
     def __init__(self, cl, cp, t, d, direction):
@@ -128,6 +137,33 @@ def get_free_paths_triangles(models, cutter, p1, p2, return_triangles=False):
         return [cut_info[0] for cut_info in points]
 
 
+def is_free_paths_many_supported(models, cutter, lines):
+    """ check if get_free_paths_many can use the vectorized implementation
+
+    This requires numpy, supported models and cutters and horizontal lines.
+    """
+    return ((BatchPushCutter is not None)
+            and all((model is None) or BatchPushCutter.is_supported(model, cutter)
+                    for model in models)
+            and all(p1[2] == p2[2] for p1, p2 in lines))
+
+
+def get_free_paths_many(models, cutter, lines):
+    """ return the results of get_free_paths_triangles for a list of (p1, p2) lines
+
+    All lines are processed at once by the vectorized implementation, if
+    possible (see BatchPushCutter).
+    """
+    if lines and is_free_paths_many_supported(models, cutter, lines):
+        offsets, points = BatchPushCutter.get_free_intervals_many(
+            models, cutter, [line[0] for line in lines], [line[1] for line in lines])
+        points = [tuple(point) for point in points.tolist()]
+        offsets = offsets.tolist()
+        return [points[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+    else:
+        return [get_free_paths_triangles(models, cutter, p1, p2) for p1, p2 in lines]
+
+
 def get_max_height_triangles(model, cutter, x, y, minz, maxz):
     if model is None:
         return (x, y, minz)
@@ -154,6 +190,20 @@ def get_max_height_triangles(model, cutter, x, y, minz, maxz):
         return (x, y, height_max)
 
 
+def get_max_height_many(model, cutter, positions, minz, maxz):
+    """ return the results of get_max_height_triangles for a list of (x, y) positions
+
+    The vectorized implementation is used if possible (see BatchDropCutter).
+    """
+    if (BatchDropCutter is not None) and BatchDropCutter.is_supported(model, cutter):
+        heights = BatchDropCutter.drop_many(model, cutter, positions, minz, maxz)
+        # "nan" marks positions exceeding "maxz"
+        return [None if (z != z) else (x, y, z)
+                for (x, y), z in zip(positions, heights.tolist())]
+    else:
+        return [get_max_height_triangles(model, cutter, x, y, minz, maxz) for x, y in positions]
+
+
 def _check_deviance_of_adjacent_points(p1, p2, p3, min_distance):
     straight = psub(p3, p1)
     added = pdist(p2, p1) + pdist(p3, p2)
@@ -166,46 +216,81 @@ def _check_deviance_of_adjacent_points(p1, p2, p3, min_distance):
         return (added / pnorm(straight)) < 1.001
 
 
-def get_max_height_dynamic(model, cutter, positions, minz, maxz):
+def _get_segments_to_refine(points, check_indices, min_distance):
+    """ return the indices of all segments that need an additional point
+
+    Only the triples starting at the given indices are checked. The segment
+    "i" connects the points "i" and "i+1".
+    """
+    segments = set()
+    for index in check_indices:
+        p1, p2, p3 = points[index:index + 3]
+        if ((None not in (p1, p2, p3))
+                and not _check_deviance_of_adjacent_points(p1, p2, p3, min_distance)):
+            segments.add(index)
+            segments.add(index + 1)
+    return sorted(segments)
+
+
+def get_max_height_dynamic(model, cutter, positions, minz, maxz, height_field=None):
+    """ calculate the cutter locations along a line and refine non-flat parts
+
+    @param height_field: an optional HeightField instance replacing the exact
+        calculation of heights
+    """
     max_depth = 8
     # the points don't need to get closer than 1/1000 of the cutter radius
     min_distance = cutter.distance_radius / 1000
-    points = []
-    get_max_height = lambda x, y: get_max_height_triangles(model, cutter, x, y, minz, maxz)
-    # add one point between all existing points
-    for index, p in enumerate(positions):
-        points.append(get_max_height(p[0], p[1]))
-    # Check if three consecutive points are "flat".
-    # Add additional points if necessary.
-    index = 0
-    depth_count = 0
-    while index < len(points) - 2:
-        p1 = points[index]
-        p2 = points[index + 1]
-        p3 = points[index + 2]
-        if ((None not in (p1, p2, p3))
-                and not _check_deviance_of_adjacent_points(p1, p2, p3, min_distance)
-                and (depth_count < max_depth)):
-            # distribute the new point two before the middle and one after
-            if depth_count % 3 != 2:
-                # insert between the 1st and 2nd point
-                middle = ((p1[0] + p2[0]) / 2, (p1[1] + p2[1]) / 2)
-                points.insert(index + 1, get_max_height(middle[0], middle[1]))
-            else:
-                # insert between the 2nd and 3rd point
-                middle = ((p2[0] + p3[0]) / 2, (p2[1] + p3[1]) / 2)
-                points.insert(index + 2, get_max_height(middle[0], middle[1]))
-            depth_count += 1
-        else:
-            index += 1
-            depth_count = 0
+    if height_field is None:
+        get_heights = lambda positions: get_max_height_many(model, cutter, positions, minz, maxz)
+    else:
+        get_heights = height_field.get_max_height_many
+    points = get_heights([(p[0], p[1]) for p in positions])
+    # Check if three consecutive points are "flat" and add additional points
+    # if necessary. Each pass splits all segments of non-flat triples at once.
+    # Afterwards only the triples containing a new point need to be checked
+    # again - all other triples were flat before.
+    # Every segment of the original positions receives at most "max_depth" new points.
+    origins = list(range(len(points)))
+    budgets = [max_depth] * len(points)
+    check_indices = range(len(points) - 2)
+    while True:
+        segments = []
+        for index in _get_segments_to_refine(points, check_indices, min_distance):
+            if budgets[origins[index]] > 0:
+                budgets[origins[index]] -= 1
+                segments.append(index)
+        if not segments:
+            break
+        middles = [((points[index][0] + points[index + 1][0]) / 2,
+                    (points[index][1] + points[index + 1][1]) / 2) for index in segments]
+        new_points = get_heights(middles)
+        # merge the new points into the list
+        merged = []
+        merged_origins = []
+        check_indices = set()
+        previous = 0
+        for index, new_point in zip(segments, new_points):
+            merged.extend(points[previous:index + 1])
+            merged_origins.extend(origins[previous:index + 1])
+            new_index = len(merged)
+            merged.append(new_point)
+            # the new point is part of the same original segment
+            merged_origins.append(origins[index])
+            check_indices.update(range(max(0, new_index - 2), new_index + 1))
+            previous = index + 1
+        merged.extend(points[previous:])
+        merged_origins.extend(origins[previous:])
+        points = merged
+        origins = merged_origins
+        check_indices = sorted(index for index in check_indices if index < len(points) - 2)
     # remove all points that are in line
-    index = 1
-    while index + 1 < len(points):
-        p1, p2, p3 = points[index - 1:index + 2]
-        if _check_deviance_of_adjacent_points(p1, p2, p3, 0):
-            # remove superfluous point
-            points.pop(index)
-        else:
-            index += 1
-    return points
+    if len(points) < 3:
+        return points
+    result = [points[0]]
+    for index in range(1, len(points) - 1):
+        p1, p2, p3 = result[-1], points[index], points[index + 1]
+        if (None in (p1, p2, p3)) or not _check_deviance_of_adjacent_points(p1, p2, p3, 0):
+            result.append(p2)
+    result.append(points[-1])
+    return result
@@ -230,3 +230,35 @@ class GCodeCornerStyle(pycam.Plugins.PluginBase):
     def get_toolpath_filters(self, path_mode=CORNER_STYLE_EXACT_PATH, motion_tolerance=0,
                              naive_tolerance=0):
         return [Filters.PathMode(path_mode, motion_tolerance, naive_tolerance)]
+
+
+class GCodeArcFitting(pycam.Plugins.PluginBase):
+
+    DEPENDS = ["ToolpathProcessors"]
+    CATEGORIES = ["GCode"]
+
+    def setup(self):
+        self._table = pycam.Gui.ControlsGTK.ParameterSection()
+        self.core.register_ui("gcode_preferences", "Arc fitting", self._table.get_widget())
+        self.core.register_ui_section("gcode_arc_fitting", self._table.add_widget,
+                                      self._table.clear_widgets)
+        self.control = pycam.Gui.ControlsGTK.InputNumber(digits=3, lower=0, increment=0.01)
+        self.core.register_ui("gcode_arc_fitting", "Chord tolerance (0: disabled)",
+                              self.control.get_widget(), weight=10)
+        self.core.get("register_parameter")("toolpath_processor", "arc_tolerance", self.control)
+        self.core.register_chain("toolpath_filters", self.get_toolpath_filters)
+        return True
+
+    def teardown(self):
+        self.core.unregister_chain("toolpath_filters", self.get_toolpath_filters)
+        self.core.unregister_ui("gcode_arc_fitting", self.control.get_widget())
+        self.core.unregister_ui_section("gcode_arc_fitting")
+        self.core.unregister_ui("gcode_preferences", self._table.get_widget())
+        self.core.get("unregister_parameter")("toolpath_processor", "arc_tolerance")
+
+    @Filters.toolpath_filter("settings", "arc_tolerance")
+    def get_toolpath_filters(self, arc_tolerance):
+        if arc_tolerance:
+            return [Filters.ArcFitting(arc_tolerance)]
+        else:
+            return []
@@ -85,6 +85,26 @@ class PathParamMaterialAllowance(pycam.Plugins.PluginBase):
         self.core.get("unregister_parameter")("process", "material_allowance")
 
 
+class PathParamHeightFieldResolution(pycam.Plugins.PluginBase):
+
+    DEPENDS = ["Processes"]
+    CATEGORIES = ["Process", "Parameter"]
+
+    def setup(self):
+        # zero: calculate the exact height of every position
+        self.control = pycam.Gui.ControlsGTK.InputNumber(
+            start=0, lower=0, digits=3, increment=0.01,
+            change_handler=lambda widget=None: self.core.emit_event("process-changed"))
+        self.core.get("register_parameter")("process", "height_field_resolution", self.control)
+        self.core.register_ui("process_path_parameters", "Height field resolution",
+                              self.control.get_widget(), weight=35)
+        return True
+
+    def teardown(self):
+        self.core.unregister_ui("process_path_parameters", self.control.get_widget())
+        self.core.get("unregister_parameter")("process", "height_field_resolution")
+
+
 class PathParamMillingStyle(pycam.Plugins.PluginBase):
 
     DEPENDS = ["Processes", "PathParamPattern"]
@@ -92,12 +92,13 @@ class ProcessStrategyContour(pycam.Plugins.PluginBase):
 class ProcessStrategySurfacing(pycam.Plugins.PluginBase):
 
     DEPENDS = ["ParameterGroupManager", "PathParamOverlap", "PathParamMaterialAllowance",
-               "PathParamPattern"]
+               "PathParamPattern", "PathParamHeightFieldResolution"]
     CATEGORIES = ["Process"]
 
     def setup(self):
         parameters = {"overlap": 0.6,
                       "material_allowance": 0,
+                      "height_field_resolution": 0,
                       "path_pattern": None}
         self.core.get("register_parameter_set")("process", "surfacing", "Surfacing",
                                                 self.run_process, parameters=parameters, weight=50)
@@ -108,7 +109,8 @@ class ProcessStrategySurfacing(pycam.Plugins.PluginBase):
 
     def run_process(self, process, tool_radius, box):
         line_distance = _get_line_distance(tool_radius, process["parameters"]["overlap"])
-        path_generator = pycam.PathGenerators.DropCutter.DropCutter()
+        path_generator = pycam.PathGenerators.DropCutter.DropCutter(
+            height_field_resolution=process["parameters"].get("height_field_resolution"))
         path_pattern = process["parameters"]["path_pattern"]
         path_get_func = self.core.get("get_parameter_sets")(
             "path_pattern")[path_pattern["name"]]["func"]
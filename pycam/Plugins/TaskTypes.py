@@ -19,8 +19,12 @@ along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
 """
 
 
+import os
+
+import pycam.Gui.Settings
 import pycam.Plugins
 import pycam.Toolpath
+from pycam.Toolpath.Cache import ToolpathCache, get_toolpath_key
 
 
 class TaskTypeMilling(pycam.Plugins.PluginBase):
@@ -33,11 +37,22 @@ class TaskTypeMilling(pycam.Plugins.PluginBase):
         parameters = {"collision_models": [], "tool": None, "process": None, "bounds": None}
         self.core.get("register_parameter_set")("task", "milling", "Milling", self.run_task,
                                                 parameters=parameters, weight=10)
+        config_dir = pycam.Gui.Settings.get_config_dirname()
+        if config_dir is None:
+            self.toolpath_cache = None
+        else:
+            self.toolpath_cache = ToolpathCache(os.path.join(config_dir, "toolpath_cache"))
+        self.core.set("clear_toolpath_cache", self.clear_toolpath_cache)
         return True
 
     def teardown(self):
+        self.core.set("clear_toolpath_cache", None)
         self.core.get("unregister_parameter_set")("task", "milling")
 
+    def clear_toolpath_cache(self):
+        if self.toolpath_cache is not None:
+            self.toolpath_cache.clear()
+
     def run_task(self, task, callback=None):
         environment = {}
         for key in task["parameters"]:
@@ -67,10 +82,69 @@ class TaskTypeMilling(pycam.Plugins.PluginBase):
             # issue a warning - and go ahead ...
             self.log.warn("No collision model was selected. This can be intentional, but maybe "
                           "you simply forgot it.")
-        moves = path_generator.GenerateToolPath(tool, models, motion_grid, minz=box.lower.z,
-                                                maxz=box.upper.z, draw_callback=callback)
+        moves = None
+        cache_key = None
+        # the cache may be disabled in the preferences
+        toolpath_cache = self.toolpath_cache if self.core.get("toolpath_cache_enabled", True) \
+            else None
+        if toolpath_cache is not None:
+            # resolve the generator (all path generators do this anyway)
+            motion_grid = [[list(line) for line in layer] for layer in motion_grid]
+            cache_key = get_toolpath_key(models, tool, environment["process"], motion_grid, box,
+                                         path_generator)
+            moves = toolpath_cache.get(cache_key)
+        if moves is None:
+            cancel_requested = []
+
+            def cancel_callback(*args, **kwargs):
+                if callback(*args, **kwargs):
+                    cancel_requested.append(True)
+                    return True
+                return False
+
+            moves = path_generator.GenerateToolPath(
+                tool, models, motion_grid, minz=box.lower.z, maxz=box.upper.z,
+                draw_callback=(None if callback is None else cancel_callback))
+            # incomplete toolpaths are not cached
+            if moves and (toolpath_cache is not None) and not cancel_requested:
+                toolpath_cache.store(cache_key, moves)
         if not moves:
             self.log.info("No valid moves found")
             return None
         return pycam.Toolpath.Toolpath(toolpath_path=moves, tool=tool,
                                        toolpath_filters=tool_filters)
+
+
+class ToolpathCachePreferences(pycam.Plugins.PluginBase):
+
+    DEPENDS = ["TaskTypeMilling"]
+    CATEGORIES = ["System"]
+
+    def setup(self):
+        if self._gtk:
+            self._box = self._gtk.HBox(spacing=6)
+            self._enable_checkbox = self._gtk.CheckButton("Reuse previously generated toolpaths")
+            self._enable_checkbox.set_active(True)
+            self._box.pack_start(self._enable_checkbox, expand=False)
+            clear_button = self._gtk.Button("Clear cache")
+            clear_button.set_tooltip_text("Remove all stored toolpaths")
+            self._box.pack_end(clear_button, expand=False)
+            self._gtk_handlers = [
+                (clear_button, "clicked", lambda widget: self.core.get("clear_toolpath_cache")())]
+            self.register_gtk_handlers(self._gtk_handlers)
+            self._box.show_all()
+            self.core.register_ui("preferences", "Toolpath cache", self._box, 50)
+            self.core.add_item("toolpath_cache_enabled", self._enable_checkbox.get_active,
+                               self._enable_checkbox.set_active)
+            self.register_state_item("settings/toolpath_cache_enabled",
+                                     self._enable_checkbox.get_active,
+                                     self._enable_checkbox.set_active)
+        return True
+
+    def teardown(self):
+        if self._gtk:
+            self.clear_state_items()
+            self.unregister_gtk_handlers(self._gtk_handlers)
+            self.core.unregister_ui("preferences", self._box)
+            # the cache is used again without the preferences control
+            self.core.add_item("toolpath_cache_enabled", lambda: True)
@@ -24,6 +24,7 @@ from pycam import GenericError
 import pycam.Plugins
 import pycam.Utils
 from pycam.Utils import get_non_conflicting_name
+import pycam.Utils.threading
 
 
 class Tasks(pycam.Plugins.ListPluginBase):
@@ -247,13 +248,96 @@ class Tasks(pycam.Plugins.ListPluginBase):
     def generate_toolpaths(self, tasks):
         progress = self.core.get("progress")
         progress.set_multiple(len(tasks), "Toolpath")
-        for task in tasks:
-            if not self.generate_toolpath(task, progress=progress):
-                # break out of the loop, if cancel was requested
-                break
-            progress.update_multiple()
+        max_jobs = pycam.Utils.threading.get_number_of_processes()
+        if (len(tasks) > 1) and (max_jobs > 1):
+            self._generate_toolpaths_concurrently(tasks, progress, max_jobs)
+        else:
+            for task in tasks:
+                if not self.generate_toolpath(task, progress=progress):
+                    # break out of the loop, if cancel was requested
+                    break
+                progress.update_multiple()
         progress.finish()
 
+    def _generate_toolpaths_concurrently(self, tasks, progress, max_jobs):
+        """ run independent tasks at the same time - their toolpaths are added in order
+
+        A task is cancelled (without a toolpath) if it fails.  The other tasks continue.
+        """
+        start_time = time.time()
+        task_resolvers = self.core.get("get_parameter_sets")("task")
+        tools = [self._get_task_tool(task) if task["parameters"]["tool"] else None
+                 for task in tasks]
+        # the tool position and the moves reported by each task (for the visualization)
+        views = [{"tool_position": None, "toolpath": []} for task in tasks]
+        redraw_limiter = pycam.Utils.RateLimiter(
+            min_interval=1.0 / self.core.get("tool_progress_max_fps"))
+
+        def get_job_function(task, view):
+            def run_task(job):
+                def update(text=None, percent=None, tool_position=None, toolpath=None,
+                           toolpath_delta=None):
+                    if toolpath is not None:
+                        view["toolpath"] = list(toolpath)
+                    elif toolpath_delta is not None:
+                        view["toolpath"].extend(toolpath_delta)
+                    if tool_position is not None:
+                        view["tool_position"] = tool_position
+                    return job.update(text=text, percent=percent)
+
+                try:
+                    return task_resolvers[task["type"]]["func"](task, callback=update)
+                except GenericError as exc:
+                    self.log.error("Failed to generate toolpath for '%s': %s", task["name"], exc)
+                    return None
+            return run_task
+
+        def poll(jobs):
+            running = [job for job in jobs if job.started and not job.finished]
+            if running:
+                # the visualization shows the earliest running task
+                view = views[running[0].index]
+                tool = tools[running[0].index]
+                if (tool is not None) and redraw_limiter.is_due():
+                    if view["tool_position"] is not None:
+                        tool.moveto(view["tool_position"])
+                    self.core.set("current_tool", tool)
+                    self.core.set("toolpath_in_progress", view["toolpath"])
+                    self.core.emit_event("visual-item-updated")
+                text = ", ".join("%s: %d%%" % (tasks[job.index]["name"], job.percent or 0)
+                                 for job in running)
+                percent = sum(job.percent or 0 for job in running) / float(len(running))
+            else:
+                text, percent = None, None
+            # "update" returns True if the user requested to cancel
+            return progress.update(text=text, percent=percent)
+
+        try:
+            for job in pycam.Utils.threading.run_jobs_concurrently(
+                    [get_job_function(task, view) for task, view in zip(tasks, views)],
+                    max_jobs=max_jobs, poll=poll):
+                task = tasks[job.index]
+                if job.error:
+                    self.log.error("Failed to generate toolpath for '%s': %s",
+                                   task["name"], job.error)
+                elif job.cancel_requested:
+                    self.log.info("Toolpath generation cancelled: %s", task["name"])
+                elif job.result is not None:
+                    self.core.get("toolpaths").add_new(job.result)
+                # release the moves of the finished task
+                views[job.index] = None
+                progress.update_multiple()
+        finally:
+            self.core.set("current_tool", None)
+            self.core.set("toolpath_in_progress", None)
+        self.log.info("Toolpath generation time: %f", time.time() - start_time)
+
+    def _get_task_tool(self, task):
+        tool_shape = task["parameters"]["tool"]["shape"]
+        tool_parameters = task["parameters"]["tool"]["parameters"]
+        return self.core.get("get_parameter_sets")("tool")[tool_shape]["func"](
+            tool_parameters)[0]
+
     def _generate_selected_toolpaths(self, widget=None):
         tasks = self.get_selected()
         self.generate_toolpaths(tasks)
@@ -278,10 +362,16 @@ class Tasks(pycam.Plugins.ListPluginBase):
                 self.request_redraw_function = request_redraw_function
                 self.last_tool_position = None
                 self.current_tool_position = None
+                # the moves reported via "toolpath_delta"
+                self.toolpath = []
 
-            def update(self, text=None, percent=None, tool_position=None, toolpath=None):
+            def update(self, text=None, percent=None, tool_position=None, toolpath=None,
+                       toolpath_delta=None):
                 if toolpath is not None:
                     self.task_plugin.core.set("toolpath_in_progress", toolpath)
+                elif toolpath_delta is not None:
+                    self.toolpath.extend(toolpath_delta)
+                    self.task_plugin.core.set("toolpath_in_progress", self.toolpath)
                 # always store the most recently reported tool_position for the next visualization
                 if tool_position is not None:
                     self.current_tool_position = tool_position
@@ -302,9 +392,7 @@ class Tasks(pycam.Plugins.ListPluginBase):
                 # break the loop if someone clicked the "cancel" button
                 return progress.update(text=text, percent=percent)
 
-        tool_shape = task["parameters"]["tool"]["shape"]
-        tool_parameters = task["parameters"]["tool"]["parameters"]
-        tool = self.core.get("get_parameter_sets")("tool")[tool_shape]["func"](tool_parameters)[0]
+        tool = self._get_task_tool(task)
         self.core.set("current_tool", tool)
         draw_callback = UpdateView(self, lambda: self.core.emit_event("visual-item-updated"),
                                    max_fps=self.core.get("tool_progress_max_fps")).update
@@ -205,7 +205,7 @@ def _get_processor_filters(core, parameters):
 class ToolpathProcessorMilling(pycam.Plugins.PluginBase):
 
     DEPENDS = ["Toolpaths", "GCodeSafetyHeight", "GCodePlungeFeedrate", "GCodeFilenameExtension",
-               "GCodeStepWidth", "GCodeSpindle", "GCodeCornerStyle"]
+               "GCodeStepWidth", "GCodeSpindle", "GCodeCornerStyle", "GCodeArcFitting"]
     CATEGORIES = ["Toolpath"]
 
     def setup(self):
@@ -220,6 +220,7 @@ class ToolpathProcessorMilling(pycam.Plugins.PluginBase):
                       "naive_tolerance": 0.0,
                       "spindle_enable": True,
                       "spindle_delay": 3,
+                      "arc_tolerance": 0.0,
                       "touch_off": None}
         self.core.get("register_parameter_set")(
             "toolpath_processor", "milling", "Milling",
@@ -235,7 +236,8 @@ class ToolpathProcessorMilling(pycam.Plugins.PluginBase):
 
 class ToolpathProcessorLaser(pycam.Plugins.PluginBase):
 
-    DEPENDS = ["Toolpaths", "GCodeFilenameExtension", "GCodeStepWidth", "GCodeCornerStyle"]
+    DEPENDS = ["Toolpaths", "GCodeFilenameExtension", "GCodeStepWidth", "GCodeCornerStyle",
+               "GCodeArcFitting"]
     CATEGORIES = ["Toolpath"]
 
     def setup(self):
@@ -245,7 +247,8 @@ class ToolpathProcessorLaser(pycam.Plugins.PluginBase):
                       "step_width_z": 0.0001,
                       "path_mode": CORNER_STYLE_EXACT_PATH,
                       "motion_tolerance": 0.0,
-                      "naive_tolerance": 0.0}
+                      "naive_tolerance": 0.0,
+                      "arc_tolerance": 0.0}
         self.core.get("register_parameter_set")(
             "toolpath_processor", "laser", "Laser",
             lambda params: _get_processor_filters(self.core, params), parameters=parameters,
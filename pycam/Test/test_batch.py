@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2017 The PyCAM developers
+
+This file is part of PyCAM.
+
+PyCAM is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyCAM is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import logging
+import os
+import shutil
+import tempfile
+
+try:
+    import pycam.Gui.Batch as Batch
+except ImportError:
+    # the GUI modules are not available for Python3, yet
+    Batch = None
+import pycam.Utils.log
+import pycam.Utils.threading
+import pycam.Test
+
+
+# a pyramid (10 x 10 x 5)
+PYRAMID_STL = """solid pyramid
+  facet normal 0 -0.447214 0.894427
+    outer loop
+      vertex 0 0 0
+      vertex 10 0 0
+      vertex 5 5 5
+    endloop
+  endfacet
+  facet normal 0.447214 0 0.894427
+    outer loop
+      vertex 10 0 0
+      vertex 10 10 0
+      vertex 5 5 5
+    endloop
+  endfacet
+  facet normal 0 0.447214 0.894427
+    outer loop
+      vertex 10 10 0
+      vertex 0 10 0
+      vertex 5 5 5
+    endloop
+  endfacet
+  facet normal -0.447214 0 0.894427
+    outer loop
+      vertex 0 10 0
+      vertex 0 0 0
+      vertex 5 5 5
+    endloop
+  endfacet
+endsolid pyramid
+"""
+
+
+class _LoadCounter(logging.Handler):
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.loaded_models = []
+
+    def emit(self, record):
+        if record.getMessage().startswith("Loaded model"):
+            self.loaded_models.append(record.getMessage())
+
+
+def _get_tool(feedrate, radius=1):
+    return {"shape": "ballnose", "parameters": {"radius": radius, "feedrate": feedrate}}
+
+
+class BatchRunnerTest(pycam.Test.PycamTestCase):
+    """Processing the jobs of a manifest without the GUI"""
+
+    def setUp(self):
+        if Batch is None:
+            self.skipTest("the GUI modules are not available")
+        self._directory = tempfile.mkdtemp()
+        with open(os.path.join(self._directory, "pyramid.stl"), "w") as model_file:
+            model_file.write(PYRAMID_STL)
+        pycam.Utils.threading.init_threading(0)
+        self.counter = _LoadCounter()
+        pycam.Utils.log.get_logger().addHandler(self.counter)
+
+    def tearDown(self):
+        pycam.Utils.log.get_logger().removeHandler(self.counter)
+        pycam.Utils.threading.cleanup()
+        shutil.rmtree(self._directory)
+
+    def _run(self, jobs):
+        manifest = {
+            "toolpath_cache": False,
+            "models": {"pyramid": "pyramid.stl"},
+            "processes": {"surface": {"strategy": "surfacing",
+                                      "parameters": {"overlap": 0.1}},
+                          # separate lines: the job is cancelled after the current line
+                          "fine": {"strategy": "surfacing",
+                                   "parameters": {"overlap": 0.9, "path_pattern": {
+                                       "name": "grid",
+                                       "parameters": {"milling_style": "climb"}}}}},
+            "settings": {"safety_height": 8},
+            "jobs": jobs}
+        runner = Batch.BatchRunner(manifest, base_directory=self._directory)
+        return runner.run(max_jobs=2)
+
+    def test_manifest(self):
+        """Valid jobs are processed - invalid or slow jobs fail"""
+        summary = self._run([
+            {"name": "first", "models": ["pyramid"], "tool": _get_tool(111),
+             "process": "surface", "output": "part.ngc"},
+            {"name": "unknown", "models": ["missing"], "tool": _get_tool(100),
+             "process": "surface", "output": "other.ngc"},
+            {"name": "slow", "models": ["pyramid"], "tool": _get_tool(100, radius=0.2),
+             "process": "fine", "timeout": 0.01},
+            {"name": "second", "models": ["pyramid"], "tool": _get_tool(222),
+             "process": "surface", "output": "part.ngc"}])
+        self.assertEqual([job["status"] for job in summary["jobs"]],
+                         ["ok", "failed", "timeout", "ok"])
+        self.assertEqual((summary["jobs_ok"], summary["jobs_failed"]), (2, 2))
+        self.assertIn("missing", summary["jobs"][1]["error"])
+        filename = os.path.join(self._directory, "part.ngc")
+        for index in (0, 3):
+            job = summary["jobs"][index]
+            self.assertEqual(job["output"], filename)
+            self.assertGreater(job["steps"], 0)
+            self.assertGreater(job["machine_distance"], 0)
+            self.assertIn("generation", job["times"])
+        # the model is loaded only once
+        self.assertEqual(len(self.counter.loaded_models), 1)
+        self.assertEqual([(model["name"], model["status"]) for model in summary["models"]],
+                         [("pyramid", "ok")])
+        # the toolpaths of both jobs are written to the same file in the order of the jobs
+        with open(filename) as gcode_file:
+            gcode = gcode_file.read()
+        self.assertLess(gcode.index("F111"), gcode.index("F222"))
+        self.assertFalse(os.path.exists(os.path.join(self._directory, "other.ngc")))
+
+    def test_custom_bounds(self):
+        """A missing corner of custom bounds is taken from the models"""
+        summary = self._run([
+            {"name": "bounded", "models": ["pyramid"], "tool": _get_tool(100),
+             "process": "surface", "output": "bounded.ngc",
+             "bounds": {"type": "custom", "lower": [-20, -20, -1]}}])
+        self.assertEqual(summary["jobs"][0]["status"], "ok")
+        with open(os.path.join(self._directory, "bounded.ngc")) as gcode_file:
+            gcode = gcode_file.read()
+        self.assertIn("X-20.", gcode)
+        self.assertNotIn("X11.", gcode)
+
+
+if __name__ == "__main__":
+    pycam.Test.main()
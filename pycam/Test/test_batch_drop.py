@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2017 The PyCAM developers
+
+This file is part of PyCAM.
+
+PyCAM is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyCAM is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import numpy
+
+from pycam.Cutters.CylindricalCutter import CylindricalCutter
+from pycam.Cutters.SphericalCutter import SphericalCutter
+from pycam.Cutters.ToroidalCutter import ToroidalCutter
+from pycam.Geometry.Model import Model
+from pycam.Geometry.Triangle import Triangle
+from pycam.PathGenerators import get_max_height_triangles
+import pycam.PathGenerators.BatchDropCutter
+from pycam.PathGenerators.BatchDropCutter import drop_many, _drop_torus_point, \
+        _get_circle_range, _sample_torus_edge
+import pycam.Test
+
+
+class BatchDropCutter(pycam.Test.PycamTestCase):
+    """Batched drop cutter"""
+
+    def setUp(self):
+        self._model = Model()
+        for points in (((0, 0, 0), (0, 2, 1), (3, 0, 0)),
+                       ((3, 0, 0), (0, 2, 1), (4, 3, 2)),
+                       ((-1, -2, 0.5), (0, 0, 0), (3, 0, 0)),
+                       ((1, 1, 3), (1.5, 1, 3), (1, 1.5, 2.5))):
+            self._model.append(Triangle(*points))
+        self._positions = [(x * 0.37 - 2, y * 0.41 - 3) for x in range(20) for y in range(20)]
+
+    def _check_cutter(self, cutter):
+        minz, maxz = -1, 2.8
+        heights = drop_many(self._model, cutter, self._positions, minz, maxz)
+        for (x, y), height in zip(self._positions, heights):
+            expected = get_max_height_triangles(self._model, cutter, x, y, minz, maxz)
+            if expected is None:
+                self.assertNotEqual(height, height)
+            else:
+                self.assertAlmostEqual(height, expected[2])
+
+    def test_cylindrical(self):
+        "Cylindrical cutter"
+        self._check_cutter(CylindricalCutter(0.6))
+
+    def test_spherical(self):
+        "Spherical cutter"
+        self._check_cutter(SphericalCutter(0.6))
+
+    def test_toroidal(self):
+        "Toroidal cutter"
+        self._check_cutter(ToroidalCutter(0.8, 0.2))
+
+    def test_blocks(self):
+        "Small blocks of pairs and edge samples"
+        module = pycam.PathGenerators.BatchDropCutter
+        original_sizes = (module.DROP_PAIR_BLOCK_SIZE, module.TORUS_SAMPLE_BLOCK_SIZE)
+        # a long edge crosses the positions
+        self._model.append(Triangle((-30, -2.5, 0), (30, 1, 1.5), (-30, -2.4, 0.2)))
+        module.DROP_PAIR_BLOCK_SIZE, module.TORUS_SAMPLE_BLOCK_SIZE = 5, 40
+        try:
+            for cutter in (CylindricalCutter(0.6), ToroidalCutter(0.8, 0.2)):
+                self._check_cutter(cutter)
+        finally:
+            module.DROP_PAIR_BLOCK_SIZE, module.TORUS_SAMPLE_BLOCK_SIZE = original_sizes
+
+    def test_edge_samples(self):
+        "Only the samples of an edge within reach of the cutter are calculated"
+        cutter = ToroidalCutter(0.8, 0.2)
+        centers = numpy.array([(3, 0.5, 2), (-20, 0.1, 2), (0, 5, 2)], dtype=float)
+        p1 = numpy.array([(-50, 0, 0)] * 3, dtype=float)
+        p2 = numpy.array([(50, 0, 1)] * 3, dtype=float)
+        sample_counts = []
+
+        def get_distances(edges, points):
+            sample_counts.append(len(points))
+            return _drop_torus_point(centers[edges], cutter, points)
+
+        expected = _sample_torus_edge(get_distances, cutter, p1, p2)
+        self.assertEqual(sample_counts[0], 3 * 1001)
+        del sample_counts[:]
+        result = _sample_torus_edge(
+            get_distances, cutter, p1, p2,
+            get_range=lambda p1, vector: _get_circle_range(centers, 1.0, p1, vector))
+        self.assertEqual(result.tolist(), expected.tolist())
+        # two edges pass the circle (about 20 samples) - the third one misses it
+        self.assertLess(sample_counts[0], 2 * 25 + 1)
+
+
+if __name__ == "__main__":
+    pycam.Test.main()
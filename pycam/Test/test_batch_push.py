@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2017 The PyCAM developers
+
+This file is part of PyCAM.
+
+PyCAM is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyCAM is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from pycam.Cutters.CylindricalCutter import CylindricalCutter
+from pycam.Cutters.SphericalCutter import SphericalCutter
+from pycam.Cutters.ToroidalCutter import ToroidalCutter
+from pycam.Geometry.Model import Model
+from pycam.Geometry.Triangle import Triangle
+from pycam.PathGenerators import get_free_paths_triangles
+from pycam.PathGenerators.BatchPushCutter import get_free_intervals, get_free_intervals_many
+from pycam.PathGenerators.PushCutter import PushCutter
+import pycam.Test
+from pycam.Utils import ProgressCounter
+import pycam.Utils.threading
+
+
+def _get_pyramid(x, y, size, height):
+    """ a closed pyramid with a square base at z=0 """
+    corners = ((x, y, 0), (x + size, y, 0), (x + size, y + size, 0), (x, y + size, 0))
+    top = (x + size / 2.0, y + size / 2.0, height)
+    model = Model()
+    for index in range(4):
+        model.append(Triangle(corners[index], corners[(index + 1) % 4], top))
+    model.append(Triangle(corners[0], corners[2], corners[1]))
+    model.append(Triangle(corners[0], corners[3], corners[2]))
+    return model
+
+
+class BatchPushCutter(pycam.Test.PycamTestCase):
+    """Batched push cutter"""
+
+    def setUp(self):
+        self._model = _get_pyramid(0, 0, 4, 3)
+        self._model.append(Triangle((5, 1, 0.5), (7, 0, 2), (6, 3, 1)))
+        self._lines = []
+        for z in (0, 0.4, 1.3, 2.9):
+            for index in range(15):
+                position = index * 0.6 - 1.7
+                self._lines.append(((-2, position, z), (9, position, z)))
+                self._lines.append(((position, 6, z), (position, -2, z)))
+                self._lines.append(((-2, position - 2, z), (8, position + 1, z)))
+
+    def _assert_intervals(self, offsets, points, expected_lines):
+        self.assertEqual(len(offsets), len(expected_lines) + 1)
+        for index, expected in enumerate(expected_lines):
+            result = points[offsets[index]:offsets[index + 1]].tolist()
+            self.assertEqual(len(result), len(expected))
+            for point, expected_point in zip(result, expected):
+                self.assertVectorEqual(point, expected_point)
+
+    def _check_cutter(self, cutter):
+        offsets, points = get_free_intervals(self._model, cutter,
+                                             [line[0] for line in self._lines],
+                                             [line[1] for line in self._lines])
+        expected = [get_free_paths_triangles([self._model], cutter, p1, p2)
+                    for p1, p2 in self._lines]
+        self._assert_intervals(offsets, points, expected)
+
+    def test_cylindrical(self):
+        "Cylindrical cutter"
+        self._check_cutter(CylindricalCutter(0.6))
+
+    def test_spherical(self):
+        "Spherical cutter"
+        self._check_cutter(SphericalCutter(0.6))
+
+    def test_toroidal(self):
+        "Toroidal cutter"
+        self._check_cutter(ToroidalCutter(0.8, 0.2))
+
+    def test_multiple_models(self):
+        "Obstacles in a second model"
+        models = [self._model, _get_pyramid(-1.3, 3.1, 1, 2)]
+        cutter = SphericalCutter(0.5)
+        offsets, points = get_free_intervals_many(models, cutter,
+                                                  [line[0] for line in self._lines],
+                                                  [line[1] for line in self._lines])
+        expected = [get_free_paths_triangles(models, cutter, p1, p2) for p1, p2 in self._lines]
+        self._assert_intervals(offsets, points, expected)
+
+
+class PushCutterLayer(pycam.Test.PycamTestCase):
+    """Blocks of lines of a layer processed by the local worker processes"""
+
+    def setUp(self):
+        pycam.Utils.threading.init_threading(2)
+        self._model = _get_pyramid(0, 0, 4, 3)
+        self._lines = [((-2, index * 0.3 - 1.7, 1.3), (9, index * 0.3 - 1.7, 1.3))
+                       for index in range(40)]
+
+    def tearDown(self):
+        pycam.Utils.threading.cleanup()
+
+    def test_layer(self):
+        "The moves of a layer are calculated in the worker processes"
+        cutter = SphericalCutter(0.6)
+        progress_counter = ProgressCounter(len(self._lines), None)
+        path = PushCutter().GenerateToolPathSlice(cutter, [self._model], self._lines,
+                                                  progress_counter=progress_counter)
+        expected = []
+        for p1, p2 in self._lines:
+            points = get_free_paths_triangles([self._model], cutter, p1, p2)
+            for index in range(len(points) // 2):
+                expected.extend([points[2 * index], points[2 * index + 1], None])
+        self.assertEqual(len(path), len(expected))
+        for move, expected_position in zip(path, expected):
+            if expected_position is None:
+                self.assertIsNone(move.position)
+            else:
+                self.assertVectorEqual(move.position, expected_position)
+        self.assertEqual(progress_counter.current_value, len(self._lines))
+        # the model and the cutter were published for the workers
+        self.assertEqual(pycam.Utils.threading.get_task_statistics()["cache"], 2)
+
+    def test_cancel(self):
+        "The calculation of a layer stops after a cancel request"
+        progress_counter = ProgressCounter(len(self._lines), lambda percent: True)
+        path = PushCutter().GenerateToolPathSlice(SphericalCutter(0.6), [self._model],
+                                                  self._lines, progress_counter=progress_counter)
+        self.assertEqual(path, [])
+
+
+if __name__ == "__main__":
+    pycam.Test.main()
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2017 The PyCAM developers
+
+This file is part of PyCAM.
+
+PyCAM is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyCAM is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from pycam.Cutters.CylindricalCutter import CylindricalCutter
+from pycam.Geometry.Model import Model
+from pycam.Geometry.PointUtils import pcross, pnorm
+from pycam.Geometry.Triangle import Triangle
+from pycam.PathGenerators.ContourFollow import CollisionPaths, ContourFollow, \
+        get_collision_waterline_of_triangle, get_shifted_waterline
+import pycam.Test
+
+
+def _process_triangle_object(model, cutter, up_vector, triangle, z):
+    """ the previous implementation of "_process_one_triangle" (based on triangle objects) """
+    result = []
+    if triangle.maxz < z:
+        return result, None
+    if pnorm(pcross(triangle.normal, up_vector)) == 0:
+        return result, None
+    edge_collisions = get_collision_waterline_of_triangle(model, cutter, up_vector, triangle, z)
+    if edge_collisions is None:
+        return result, [id(triangle)]
+    for cutter_location, edge in edge_collisions:
+        shifted_edge = get_shifted_waterline(up_vector, edge, cutter_location)
+        if shifted_edge is not None:
+            result.append((edge, shifted_edge))
+    return result, None
+
+
+class _ReferenceContourFollow(ContourFollow):
+    """ the previous selection of triangles: all triangles of the area are processed in every
+    layer - triangles without collisions are skipped by their identity
+    """
+
+    def __init__(self, path_processor):
+        super(_ReferenceContourFollow, self).__init__(path_processor)
+        self.processed_triangles = []
+
+    def get_potential_contour_lines(self, cutter, model, minx, maxx, miny, maxy, z,
+                                    progress_counter=None):
+        waterline_triangles = CollisionPaths()
+        for triangle in model.triangles(minx=minx, miny=miny, maxx=maxx, maxy=maxy):
+            if id(triangle) in self.processed_triangles:
+                continue
+            result, ignore_triangle_id_list = _process_triangle_object(
+                model, cutter, self._up_vector, triangle, z)
+            if ignore_triangle_id_list:
+                self.processed_triangles.extend(ignore_triangle_id_list)
+            for edge, shifted_edge in result:
+                waterline_triangles.add(edge, shifted_edge)
+        waterline_triangles.extend_shifted_lines()
+        result = []
+        for line in waterline_triangles.get_shifted_lines():
+            cropped_line = line.get_cropped_line(minx, maxx, miny, maxy, z, z)
+            if cropped_line is not None:
+                result.append(cropped_line)
+        return result
+
+
+class _PathRecorder(object):
+    """ a path processor storing all calls """
+
+    def __init__(self):
+        self.paths = []
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args: self.calls.append((name, ) + args)
+
+
+def _add_box(model, lower, upper):
+    x1, y1, z1 = lower
+    x2, y2, z2 = upper
+    corners = [(x1, y1, z1), (x2, y1, z1), (x2, y2, z1), (x1, y2, z1),
+               (x1, y1, z2), (x2, y1, z2), (x2, y2, z2), (x1, y2, z2)]
+    # counter-clockwise (seen from the outside)
+    for a, b, c, d in ((0, 3, 2, 1), (4, 5, 6, 7), (0, 1, 5, 4), (1, 2, 6, 5), (2, 3, 7, 6),
+                       (3, 0, 4, 7)):
+        model.append(Triangle(corners[a], corners[b], corners[c]))
+        model.append(Triangle(corners[a], corners[c], corners[d]))
+
+
+def _get_model():
+    model = Model()
+    # a pyramid: its faces span all layers
+    apex = (5, 5, 6)
+    base = ((0, 0, 0), (10, 0, 0), (10, 10, 0), (0, 10, 0))
+    for index in range(4):
+        model.append(Triangle(base[index], base[(index + 1) % 4], apex))
+    model.append(Triangle(base[0], base[2], base[1]))
+    model.append(Triangle(base[0], base[3], base[2]))
+    # a tower next to the pyramid
+    _add_box(model, (11, 3, 0), (13, 7, 4))
+    # a floating bar: its sides are skipped below it (after the first layer without collisions)
+    _add_box(model, (-2.5, 11, 3), (12, 12, 4))
+    return model
+
+
+class ContourFollowLayers(pycam.Test.PycamTestCase):
+    """Selection of the relevant triangles of waterline layers"""
+
+    def _generate(self, generator_class, cutter, model):
+        recorder = _PathRecorder()
+        generator = generator_class(recorder)
+        generator.GenerateToolPath(cutter, [model], -3, 16, -3, 13, 0.5, 5.5, 1)
+        return generator, recorder.calls
+
+    def test_previous_results(self):
+        "The layers are equal to the results of processing all triangles in every layer"
+        model = _get_model()
+        cutter = CylindricalCutter(1)
+        generator, calls = self._generate(ContourFollow, cutter, model)
+        reference, expected = self._generate(_ReferenceContourFollow, cutter, model)
+        self.assertEqual(calls, expected)
+        self.assertTrue([call for call in calls if call[0] == "append"])
+        # the sides of the bar are skipped in the following layers
+        self.assertEqual(sorted(generator._processed_triangles), list(range(22, 30)))
+        self.assertEqual(
+            sorted(id(model.triangles()[index]) for index in generator._processed_triangles),
+            sorted(reference.processed_triangles))
+
+    def test_layer_triangles(self):
+        "Every layer uses the triangles reaching up to its height"
+        model = _get_model()
+        generator = ContourFollow(_PathRecorder())
+
+        def check(area, z, expected):
+            minx, maxx, miny, maxy = area
+            result = generator._get_layer_triangles(model, minx, maxx, miny, maxy, z)
+            # the order of the triangles within the area is kept
+            self.assertEqual(result, [index for index in model.get_triangle_indices(
+                minx=minx, maxx=maxx, miny=miny, maxy=maxy) if index in expected])
+            self.assertEqual(sorted(result), expected)
+
+        # the flat faces are ignored
+        pyramid, tower, bar = [0, 1, 2, 3], list(range(10, 18)), list(range(22, 30))
+        check((-3, 16, -3, 13), 5.5, pyramid)
+        check((-3, 16, -3, 13), 3.5, pyramid + tower + bar)
+        check((-3, 16, -3, 13), 0.5, pyramid + tower + bar)
+        # the area of the tower
+        check((10.5, 16, -3, 10.5), 2, tower)
+
+
+if __name__ == "__main__":
+    pycam.Test.main()
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2017 The PyCAM developers
+
+This file is part of PyCAM.
+
+PyCAM is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyCAM is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import math
+
+from pycam.Cutters.CylindricalCutter import CylindricalCutter
+from pycam.Cutters.SphericalCutter import SphericalCutter
+from pycam.Geometry.Model import Model
+from pycam.Geometry.Triangle import Triangle
+from pycam.PathGenerators import _check_deviance_of_adjacent_points, get_max_height_dynamic, \
+        get_max_height_many, get_max_height_triangles
+import pycam.Test
+
+
+MIN_Z, MAX_Z = 0, 10
+
+
+def _get_max_height_dynamic_previous(model, cutter, positions, minz, maxz):
+    """ the previous (depth-first) implementation of get_max_height_dynamic """
+    max_depth = 8
+    min_distance = cutter.distance_radius / 1000
+    get_max_height = lambda x, y: get_max_height_triangles(model, cutter, x, y, minz, maxz)
+    points = [get_max_height(p[0], p[1]) for p in positions]
+    index = 0
+    depth_count = 0
+    while index < len(points) - 2:
+        p1, p2, p3 = points[index:index + 3]
+        if ((None not in (p1, p2, p3))
+                and not _check_deviance_of_adjacent_points(p1, p2, p3, min_distance)
+                and (depth_count < max_depth)):
+            if depth_count % 3 != 2:
+                middle = ((p1[0] + p2[0]) / 2, (p1[1] + p2[1]) / 2)
+                points.insert(index + 1, get_max_height(middle[0], middle[1]))
+            else:
+                middle = ((p2[0] + p3[0]) / 2, (p2[1] + p3[1]) / 2)
+                points.insert(index + 2, get_max_height(middle[0], middle[1]))
+            depth_count += 1
+        else:
+            index += 1
+            depth_count = 0
+    index = 1
+    while index + 1 < len(points):
+        p1, p2, p3 = points[index - 1:index + 2]
+        if _check_deviance_of_adjacent_points(p1, p2, p3, 0):
+            points.pop(index)
+        else:
+            index += 1
+    return points
+
+
+class _CountingHeights(object):
+    """ a replacement of a height field: exact heights - all positions are stored """
+
+    def __init__(self, model, cutter):
+        self.model = model
+        self.cutter = cutter
+        self.positions = []
+
+    def get_max_height_many(self, positions):
+        self.positions.extend(positions)
+        return get_max_height_many(self.model, self.cutter, positions, MIN_Z, MAX_Z)
+
+
+def _get_half_cylinder(facets):
+    """ a half cylinder (radius 5) along the y axis """
+    model = Model()
+    for index in range(facets):
+        corners = []
+        for angle in (math.pi * index / facets, math.pi * (index + 1) / facets):
+            x, z = 5 * math.cos(angle), 5 * math.sin(angle)
+            corners.append(((x, -1, z), (x, 1, z)))
+        (p1, p4), (p2, p3) = corners
+        model.append(Triangle(p1, p3, p2))
+        model.append(Triangle(p1, p4, p3))
+    return model
+
+
+class DynamicDropRefinement(pycam.Test.PycamTestCase):
+    """Refinement of non-flat parts of drop cutter lines"""
+
+    def _get_deviation(self, model, cutter, path):
+        """ the maximum height difference between the path and the exact heights """
+        samples = [(-4 + index * 0.05, 0) for index in range(161)]
+        deviation = 0
+        for point in get_max_height_many(model, cutter, samples, MIN_Z, MAX_Z):
+            for p1, p2 in zip(path, path[1:]):
+                if p1[0] <= point[0] <= p2[0]:
+                    z = p1[2] + (p2[2] - p1[2]) * (point[0] - p1[0]) / (p2[0] - p1[0])
+                    deviation = max(deviation, abs(z - point[2]))
+                    break
+            else:
+                self.fail("Sample position outside of the path: %s" % str(point))
+        return deviation
+
+    def test_previous_results(self):
+        "Curved surfaces are approximated as closely as before"
+        model = _get_half_cylinder(96)
+        for cutter in (SphericalCutter(1), CylindricalCutter(1)):
+            for step in (2.0, 0.5):
+                positions = [(-4 + step * index, 0) for index in range(int(8 / step) + 1)]
+                heights = _CountingHeights(model, cutter)
+                path = get_max_height_dynamic(model, cutter, positions, MIN_Z, MAX_Z,
+                                              height_field=heights)
+                previous = _get_max_height_dynamic_previous(model, cutter, positions, MIN_Z,
+                                                            MAX_Z)
+                self.assertEqual((path[0], path[-1]), (previous[0], previous[-1]))
+                # the deviation depends mainly on the flatness criterion of the refinement
+                self.assertLess(self._get_deviation(model, cutter, path),
+                                1.5 * self._get_deviation(model, cutter, previous))
+
+    def test_refinement_limit(self):
+        "Every segment of the line receives at most eight additional points"
+        # the corners of the facets are never flat for a cylindrical cutter
+        model = _get_half_cylinder(24)
+        cutter = CylindricalCutter(1)
+        positions = [(-4 + 2 * index, 0) for index in range(5)]
+        heights = _CountingHeights(model, cutter)
+        get_max_height_dynamic(model, cutter, positions, MIN_Z, MAX_Z, height_field=heights)
+        added = heights.positions[len(positions):]
+        self.assertGreater(len(added), 8)
+        for start, end in zip(positions, positions[1:]):
+            self.assertLessEqual(len([x for x, y in added if start[0] < x < end[0]]), 8)
+
+
+if __name__ == "__main__":
+    pycam.Test.main()
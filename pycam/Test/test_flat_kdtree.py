@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2017 The PyCAM developers
+
+This file is part of PyCAM.
+
+PyCAM is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyCAM is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import random
+
+from pycam.Geometry.FlatKdtree import FlatKdtree
+import pycam.Test
+
+
+def _get_overlapping(boxes, minx, maxx, miny, maxy):
+    return [index for index, (x1, y1, x2, y2) in enumerate(boxes)
+            if not ((x1 > maxx) or (x2 < minx) or (y1 > maxy) or (y2 < miny))]
+
+
+class FlatKdtreeSearch(pycam.Test.PycamTestCase):
+    """Flat kdtree range queries"""
+
+    def setUp(self):
+        rand = random.Random(42)
+        self._boxes = []
+        for _ in range(500):
+            x, y = rand.uniform(0, 50), rand.uniform(0, 50)
+            self._boxes.append((x, y, x + rand.uniform(0, 3), y + rand.uniform(0, 3)))
+        self._queries = []
+        for _ in range(40):
+            x, y = rand.uniform(-5, 50), rand.uniform(-5, 50)
+            self._queries.append((x, x + rand.uniform(0, 8), y, y + rand.uniform(0, 8)))
+
+    def test_search(self):
+        "Single queries"
+        tree = FlatKdtree([box[:2] for box in self._boxes], [box[2:] for box in self._boxes])
+        for query in self._queries:
+            self.assertEqual(sorted(tree.Search(*query)), _get_overlapping(self._boxes, *query))
+
+    def test_search_many(self):
+        "Batched queries"
+        tree = FlatKdtree([box[:2] for box in self._boxes], [box[2:] for box in self._boxes])
+        offsets, indices = tree.search_many(*zip(*self._queries))
+        self.assertEqual(len(offsets), len(self._queries) + 1)
+        for index, query in enumerate(self._queries):
+            found = indices[offsets[index]:offsets[index + 1]].tolist()
+            self.assertEqual(sorted(found), _get_overlapping(self._boxes, *query))
+
+    def test_empty(self):
+        "Empty tree"
+        tree = FlatKdtree([], [])
+        self.assertEqual(tree.Search(0, 1, 0, 1), [])
+        offsets, indices = tree.search_many([0], [1], [0], [1])
+        self.assertEqual(offsets.tolist(), [0, 0])
+        self.assertEqual(len(indices), 0)
+
+
+if __name__ == "__main__":
+    pycam.Test.main()
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2017 The PyCAM developers
+
+This file is part of PyCAM.
+
+PyCAM is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyCAM is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import random
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+import pycam.Exporters.GCode
+from pycam.Exporters.GCode.LinuxCNC import LinuxCNC
+import pycam.Toolpath.Steps as Steps
+import pycam.Test
+
+
+class SingleMoveLinuxCNC(LinuxCNC):
+    """ the reference: every move is written on its own """
+
+    def add_move_batch(self, steps):
+        return pycam.Exporters.GCode.BaseGenerator.add_move_batch(self, steps)
+
+
+class BatchedGCode(pycam.Test.PycamTestCase):
+    """Batched G-code output"""
+
+    def _get_steps(self):
+        generator = random.Random(5)
+        steps = []
+        position = [0, 0, 0]
+        for index in range(3000):
+            choice = generator.random()
+            if choice < 0.02:
+                steps.append(Steps.MachineSetting("feedrate", generator.choice((100, 250.5))))
+            elif choice < 0.03:
+                steps.append(Steps.Comment("comment"))
+            else:
+                for axis in range(3):
+                    if generator.random() < 0.4:
+                        position[axis] = generator.choice((generator.uniform(-10, 10), 1, -0.0,
+                                                           0.5, 1e-7, 2.5e-7))
+                if generator.random() < 0.2:
+                    steps.append(Steps.MoveStraightRapid(tuple(position)))
+                else:
+                    steps.append(Steps.MoveStraight(tuple(position)))
+        return steps
+
+    def _get_output(self, generator_class):
+        destination = StringIO()
+        generator = generator_class(destination)
+        steps = self._get_steps()
+        generator.add_moves(steps[:1000])
+        generator.add_moves(steps[1000:])
+        generator.finish()
+        return destination.getvalue()
+
+    def test_identical_output(self):
+        "Batched moves are written like single moves"
+        original_batch_size = pycam.Exporters.GCode.MOVE_BATCH_SIZE
+        expected = self._get_output(SingleMoveLinuxCNC)
+        try:
+            for batch_size in (1, 7, 4096):
+                pycam.Exporters.GCode.MOVE_BATCH_SIZE = batch_size
+                self.assertEqual(self._get_output(LinuxCNC), expected)
+        finally:
+            pycam.Exporters.GCode.MOVE_BATCH_SIZE = original_batch_size
+
+    def test_arcs(self):
+        "Arcs are written as G2/G3 with a relative center"
+        destination = StringIO()
+        generator = LinuxCNC(destination)
+        generator.add_moves([Steps.MoveStraight((1, 0, 2)),
+                             Steps.MoveArc((0, 1, 2), center=(0, 0, 2)),
+                             Steps.MoveArc((1, 0, 1), center=(0.5, 0.5, 1), clockwise=True),
+                             Steps.MoveStraight((2, 0, 1)), Steps.MoveArc((3, 0, 1))])
+        lines = destination.getvalue().splitlines()[-5:]
+        self.assertEqual(lines, ["G1 X1.000000 Y0.000000 Z2.000000",
+                                 "G3 X0.000000 Y1.000000 I-1.000000 J0.000000",
+                                 "G2 X1.000000 Y0.000000 Z1.000000 I0.500000 J-0.500000",
+                                 "G1 X2.000000",
+                                 "  X3.000000"])
+
+
+if __name__ == "__main__":
+    pycam.Test.main()
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2017 The PyCAM developers
+
+This file is part of PyCAM.
+
+PyCAM is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyCAM is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from pycam.Cutters.CylindricalCutter import CylindricalCutter
+from pycam.Cutters.SphericalCutter import SphericalCutter
+from pycam.Cutters.ToroidalCutter import ToroidalCutter
+from pycam.Geometry.Model import Model
+from pycam.Geometry.Triangle import Triangle
+from pycam.PathGenerators import get_max_height_triangles
+from pycam.PathGenerators.HeightField import HeightField
+import pycam.Test
+
+
+class HeightFieldApproximation(pycam.Test.PycamTestCase):
+    """Height field surfacing"""
+
+    def setUp(self):
+        # a pyramid on a square plate
+        self._model = Model()
+        top = (5, 5, 3)
+        corners = ((2, 2, 1), (8, 2, 1), (8, 8, 1), (2, 8, 1))
+        for index, corner in enumerate(corners):
+            self._model.append(Triangle(corner, corners[(index + 1) % 4], top))
+        self._model.append(Triangle((0, 0, 0), (10, 0, 0), (10, 10, 0)))
+        self._model.append(Triangle((0, 0, 0), (10, 10, 0), (0, 10, 0)))
+        self._positions = [(x * 0.43 + 0.3, y * 0.47 + 0.2) for x in range(22) for y in range(20)]
+
+    def test_spherical(self):
+        "Compare with the exact heights"
+        cutter = SphericalCutter(0.7)
+        height_field = HeightField(self._model, cutter, 0.02, 0, 10)
+        heights = height_field.get_heights(self._positions)
+        for (x, y), height in zip(self._positions, heights):
+            expected = get_max_height_triangles(self._model, cutter, x, y, 0, 10)[2]
+            self.assertAlmostEqual(height, expected, delta=0.02)
+
+    def test_flat_bottom(self):
+        "Cutters with a flat bottom"
+        for cutter in (CylindricalCutter(0.7), ToroidalCutter(0.7, 0.2)):
+            height_field = HeightField(self._model, cutter, 0.02, 0, 10)
+            heights = height_field.get_heights([(5, 5), (5.3, 4.9), (9, 1)])
+            self.assertAlmostEqual(heights[0], 3)
+            self.assertAlmostEqual(heights[1], 3)
+            self.assertAlmostEqual(heights[2], 0)
+
+    def test_maxz(self):
+        "Positions exceeding maxz"
+        height_field = HeightField(self._model, SphericalCutter(0.5), 0.05, 0, 2)
+        self.assertEqual(height_field.get_max_height_many([(5, 5)]), [None])
+        self.assertEqual(height_field.get_max_height_many([(0.5, 0.5)]), [(0.5, 0.5, 0)])
+
+
+if __name__ == "__main__":
+    pycam.Test.main()
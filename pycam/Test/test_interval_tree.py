@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2017 The PyCAM developers
+
+This file is part of PyCAM.
+
+PyCAM is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyCAM is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import random
+
+from pycam.Geometry.IntervalTree import IntervalTree
+from pycam.Geometry.Model import Model
+from pycam.Geometry.Plane import Plane
+from pycam.Geometry.Triangle import Triangle
+import pycam.Test
+
+
+class IntervalTreeSearch(pycam.Test.PycamTestCase):
+    """Interval tree of height ranges"""
+
+    def setUp(self):
+        generator = random.Random(17)
+        self._lower = []
+        self._upper = []
+        for index in range(300):
+            low = generator.uniform(-10, 10)
+            # include some degenerate (flat) intervals
+            size = generator.choice((0, generator.uniform(0, 3), generator.uniform(0, 15)))
+            self._lower.append(low)
+            self._upper.append(low + size)
+        self._tree = IntervalTree(self._lower, self._upper, leaf_size=4)
+
+    def _get_expected(self, low, high):
+        return [index for index in range(len(self._lower))
+                if (self._lower[index] <= high) and (self._upper[index] >= low)]
+
+    def test_search(self):
+        "Overlapping intervals"
+        for low, high in ((-20, 20), (0, 0), (3.5, 4), (-10.5, -9), (11, 30), (30, 40),
+                          (self._lower[7], self._lower[7])):
+            self.assertEqual(self._tree.search(low, high), self._get_expected(low, high))
+
+    def test_model_layers(self):
+        "Triangles of a model crossing a layer"
+        model = Model()
+        model.append(Triangle((0, 0, 0), (4, 0, 0), (2, 2, 3)))
+        model.append(Triangle((4, 0, 0), (4, 4, 0), (2, 2, 3)))
+        model.append(Triangle((0, 0, 5), (1, 0, 5), (0, 1, 6)))
+        self.assertEqual(model.get_triangle_indices(minz=1, maxz=2), [0, 1])
+        self.assertEqual(model.get_triangle_indices(minz=5.5, maxz=5.5), [2])
+        self.assertEqual(model.get_triangle_indices(minx=3, miny=3, maxx=5, maxy=5, minz=5),
+                         [])
+        contour = model.get_waterline_contour(Plane((0, 0, 1.5), (0, 0, 1)))
+        self.assertEqual(sum(len(polygon.get_lines()) for polygon in contour.get_polygons()),
+                         2)
+
+
+if __name__ == "__main__":
+    pycam.Test.main()
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2017 The PyCAM developers
+
+This file is part of PyCAM.
+
+PyCAM is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyCAM is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from pycam.Utils import DrawCallbackThrottle, ProgressCounter
+import pycam.Test
+
+
+class ThrottledProgress(pycam.Test.PycamTestCase):
+    """Rate-limited progress callbacks"""
+
+    def test_progress_counter(self):
+        "Coalesced progress updates"
+        calls = []
+        counter = ProgressCounter(10, lambda percent=None: calls.append(percent),
+                                  min_interval=1000)
+        for index in range(10):
+            self.assertFalse(counter.increment())
+        # only the first update is delivered within the interval
+        self.assertEqual(calls, [10])
+        counter.update(force=True)
+        self.assertEqual(calls, [10, 100])
+
+    def test_check_every(self):
+        "Every n-th increment reaches the callback"
+        calls = []
+        counter = ProgressCounter(9, lambda percent=None: calls.append(percent) or percent > 50,
+                                  min_interval=0, check_every=3)
+        results = [counter.increment() for index in range(9)]
+        self.assertEqual(calls, [100.0 * 3 / 9, 100.0 * 6 / 9])
+        # the cancel request is remembered
+        self.assertEqual(results, [False] * 5 + [True] * 4)
+
+    def test_toolpath_delta(self):
+        "Collected moves of a draw callback"
+        calls = []
+        throttle = DrawCallbackThrottle(lambda **kwargs: calls.append(kwargs),
+                                        min_interval=1000)
+        for index in range(5):
+            throttle.update(text="line %d" % index, tool_position=(index, 0, 0),
+                            moves=[index, index])
+        throttle.flush()
+        self.assertEqual([call["text"] for call in calls], ["line 0", "line 4"])
+        self.assertEqual(calls[1]["tool_position"], (4, 0, 0))
+        self.assertEqual(calls[0]["toolpath_delta"] + calls[1]["toolpath_delta"],
+                         [0, 0, 1, 1, 2, 2, 3, 3, 4, 4])
+
+
+if __name__ == "__main__":
+    pycam.Test.main()
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2017 The PyCAM developers
+
+This file is part of PyCAM.
+
+PyCAM is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyCAM is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import io
+import logging
+import sys
+
+import pycam.Importers.STLImporter as STLImporter
+import pycam.Utils.log
+import pycam.Test
+
+
+def _get_facet(vertices, normal="0 0 1"):
+    lines = ["  facet" if normal is None else "  facet normal %s" % normal, "    outer loop"]
+    lines.extend("      vertex %s" % vertex for vertex in vertices)
+    lines.extend(("    endloop", "  endfacet"))
+    return "\n".join(lines) + "\n"
+
+
+def _get_solid(*facets):
+    return "solid sample\n" + "".join(facets) + "endsolid sample\n"
+
+
+# counter-clockwise (seen from above) - consistent with an upwards normal
+CCW = ("0 0 0", "2 0 0", "0 2 1")
+# clockwise (seen from above)
+CW = ("0 0 0", "0 2 1", "2 0 0")
+
+WINDING_STL = _get_solid(
+    _get_facet(CCW),
+    # inconsistent normal
+    _get_facet(CW),
+    _get_facet(("1 1 1", "3 1 1.5", "1 3 2.5e-1"), normal="0.1 -0.2 0.97"),
+    # missing normals: the vertices define the orientation
+    _get_facet(CCW, normal=None),
+    _get_facet(("5 5 5", "4 5 5", "5 4 5"), normal=None),
+    # the normal is not normalized
+    _get_facet(("-1 -1 -1", "-3 -1 -1", "-1 -3 -1"), normal="0 0 -10"),
+    # three points on a line
+    _get_facet(("0 0 0", "1 1 1", "2 2 2")))
+
+VERTEX_COUNT_STL = _get_solid(
+    _get_facet(CCW),
+    # the fourth vertex is ignored
+    _get_facet(("0 0 0", "4 0 0", "0 4 0", "4 4 0")),
+    # too few vertices: the facet is skipped
+    _get_facet(("0 0 0", "4 0 0")),
+    _get_facet(("1 0 0", "4 0 3", "0 4 3")))
+
+COMMENT_STL = ("; created by hand\n" + _get_solid(_get_facet(CCW), "; a comment\n",
+                                                  _get_facet(("7 0 0", "9 0 0", "7 2 0"))))
+
+# the third coordinate is not a number: the line-based parser ignores this vertex
+INVALID_NUMBER_STL = _get_solid(
+    _get_facet(CCW),
+    _get_facet(("0 0 0", "1 0 0", "0 1 foo")),
+    _get_facet(("0 0 1", "1 0 1", "0 1 1")))
+
+
+class _Messages(logging.Handler):
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def _get_triangles(model):
+    return [tuple(tuple(float(value) for value in point[:3])
+                  for point in (t.p1, t.p2, t.p3, t.normal))
+            for t in model.triangles()]
+
+
+class ASCIIImport(pycam.Test.PycamTestCase):
+    """Token-based parser of ASCII STL files"""
+
+    def setUp(self):
+        if not STLImporter.numpy_enabled:
+            self.skipTest("the token-based parser requires numpy")
+        self.messages = _Messages()
+        pycam.Utils.log.get_logger().addHandler(self.messages)
+
+    def tearDown(self):
+        pycam.Utils.log.get_logger().removeHandler(self.messages)
+
+    def _import_mesh(self, text, block_size=STLImporter.ASCII_BLOCK_SIZE):
+        return STLImporter._import_ascii_mesh(io.BytesIO(text.encode("ascii")), "sample.stl",
+                                              use_kdtree=False, block_size=block_size)
+
+    def _import_legacy(self, text):
+        if sys.version_info[0] > 2:
+            self.skipTest("the line-based parser requires Python 2")
+        STLImporter.numpy_enabled = False
+        try:
+            return STLImporter.ImportModel(io.BytesIO(text.encode("ascii")), use_kdtree=False)
+        finally:
+            STLImporter.numpy_enabled = True
+
+    def _assert_model_equal(self, model, expected):
+        self.assertEqual(model.name, expected.name)
+        triangles = _get_triangles(model)
+        expected_triangles = _get_triangles(expected)
+        self.assertEqual(len(triangles), len(expected_triangles))
+        for triangle, expected_triangle in zip(triangles, expected_triangles):
+            for point, expected_point in zip(triangle, expected_triangle):
+                self.assertVectorEqual(point, expected_point)
+
+    def test_winding(self):
+        "Normals and the order of vertices are handled like the line-based parser"
+        model = self._import_mesh(WINDING_STL)
+        self.assertEqual(len(model.triangles()), 6)
+        triangles = _get_triangles(model)
+        # the vertices are stored in clockwise order
+        self.assertEqual(triangles[0][:3], ((0, 0, 0), (0, 2, 1), (2, 0, 0)))
+        # inconsistent normals are kept (with a warning)
+        self.assertEqual(triangles[1][:3], ((0, 0, 0), (0, 2, 1), (2, 0, 0)))
+        self.assertVectorEqual(triangles[1][3], (0, 0, 1))
+        self.assertTrue([text for text in self.messages.messages
+                         if text.startswith("Inconsistent normal")])
+        self._assert_model_equal(model, self._import_legacy(WINDING_STL))
+
+    def test_name(self):
+        "The name of the solid is a string"
+        model = self._import_mesh(WINDING_STL)
+        self.assertEqual(model.name, "sample")
+        self.assertIsInstance(model.name, str)
+
+    def test_vertex_count(self):
+        "Only the first three vertices of a facet are used"
+        model = self._import_mesh(VERTEX_COUNT_STL)
+        self.assertEqual(len(model.triangles()), 3)
+        self.assertEqual(_get_triangles(model)[1][:3], ((0, 0, 0), (0, 4, 0), (4, 0, 0)))
+        self._assert_model_equal(model, self._import_legacy(VERTEX_COUNT_STL))
+
+    def test_blocks(self):
+        "Facets may be split across the blocks of the file"
+        expected = self._import_mesh(WINDING_STL)
+        for block_size in (1, 7, 30, 100):
+            self._assert_model_equal(self._import_mesh(WINDING_STL, block_size=block_size),
+                                     expected)
+        comments = self._import_mesh(COMMENT_STL, block_size=10)
+        self.assertEqual(len(comments.triangles()), 2)
+        self._assert_model_equal(comments, self._import_legacy(COMMENT_STL))
+
+    def test_fallback(self):
+        "Files with invalid numbers are imported by the line-based parser"
+        self.assertRaises(ValueError, self._import_mesh, INVALID_NUMBER_STL)
+        legacy = self._import_legacy(INVALID_NUMBER_STL)
+        model = STLImporter.ImportModel(io.BytesIO(INVALID_NUMBER_STL.encode("ascii")),
+                                        use_kdtree=False)
+        self.assertTrue([text for text in self.messages.messages
+                         if text.startswith("STLImporter: falling back")])
+        self.assertEqual(len(model.triangles()), 2)
+        self._assert_model_equal(model, legacy)
+
+
+if __name__ == "__main__":
+    pycam.Test.main()
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2017 The PyCAM developers
+
+This file is part of PyCAM.
+
+PyCAM is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyCAM is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import logging
+import time
+
+from pycam import GenericError
+from pycam.Plugins.Tasks import Tasks
+import pycam.Test
+
+
+class _Log(object):
+
+    def __init__(self):
+        self.messages = []
+
+    def _add(self, level, text, *args):
+        self.messages.append((level, text % args))
+
+    def info(self, text, *args):
+        self._add(logging.INFO, text, *args)
+
+    def error(self, text, *args):
+        self._add(logging.ERROR, text, *args)
+
+
+class _Toolpaths(list):
+
+    def add_new(self, toolpath):
+        self.append(toolpath)
+
+
+class _Progress(object):
+
+    def __init__(self, cancel_after=None):
+        self.cancel_after = cancel_after
+        self.updates = 0
+        self.finished_tasks = 0
+
+    def update(self, text=None, percent=None):
+        self.updates += 1
+        return (self.cancel_after is not None) and (self.updates > self.cancel_after)
+
+    def update_multiple(self):
+        self.finished_tasks += 1
+
+
+class _Core(dict):
+    """ the settings of the plugins (without a GUI) """
+
+    def __init__(self, task_types):
+        super(_Core, self).__init__()
+        self["toolpaths"] = _Toolpaths()
+        self["tool_progress_max_fps"] = 10
+        self["get_parameter_sets"] = lambda name: task_types
+
+    def set(self, key, value):
+        self[key] = value
+
+    def emit_event(self, event, *args):
+        pass
+
+
+def _generate(task, callback=None):
+    """ a fake task type: the task parameters control its behaviour """
+    parameters = task["parameters"]
+    callback(text="generating", percent=0)
+    time.sleep(parameters.get("duration", 0))
+    if parameters.get("wait_for_cancel"):
+        while not callback(text="waiting"):
+            time.sleep(0.01)
+        return None
+    if parameters.get("error"):
+        raise parameters["error"]
+    callback(percent=100)
+    return task["name"]
+
+
+def _get_task(name, **parameters):
+    parameters["tool"] = None
+    return {"name": name, "type": "fake", "parameters": parameters}
+
+
+class ConcurrentTasks(pycam.Test.PycamTestCase):
+    """Generation of independent tasks at the same time"""
+
+    def setUp(self):
+        self.core = _Core({"fake": {"func": _generate}})
+        # the plugin is used without its GUI
+        self.plugin = Tasks.__new__(Tasks)
+        self.plugin.core = self.core
+        self.plugin.log = _Log()
+
+    def _generate(self, tasks, progress=None):
+        progress = progress or _Progress()
+        self.plugin._generate_toolpaths_concurrently(tasks, progress, 2)
+        return progress
+
+    def test_task_order(self):
+        """Toolpaths are added in the order of the tasks"""
+        tasks = [_get_task("first", duration=0.1), _get_task("second"), _get_task("third")]
+        progress = self._generate(tasks)
+        self.assertEqual(self.core["toolpaths"], ["first", "second", "third"])
+        self.assertEqual(progress.finished_tasks, 3)
+        self.assertIsNone(self.core["current_tool"])
+        self.assertIsNone(self.core["toolpath_in_progress"])
+
+    def test_failing_tasks(self):
+        """Failing tasks are reported - the other tasks continue"""
+        tasks = [_get_task("first", error=GenericError("no model")),
+                 _get_task("second", error=ValueError("broken")), _get_task("third")]
+        self._generate(tasks)
+        self.assertEqual(self.core["toolpaths"], ["third"])
+        errors = [text for level, text in self.plugin.log.messages if level == logging.ERROR]
+        self.assertEqual(len(errors), 2)
+        self.assertIn("no model", errors[0])
+        self.assertIn("broken", errors[1])
+
+    def test_cancel(self):
+        """Cancelling the progress stops all tasks - their toolpaths are discarded"""
+        tasks = [_get_task("first"), _get_task("second", wait_for_cancel=True),
+                 _get_task("third", wait_for_cancel=True), _get_task("fourth")]
+        self._generate(tasks, progress=_Progress(cancel_after=5))
+        self.assertEqual(self.core["toolpaths"], ["first"])
+        cancelled = [text for level, text in self.plugin.log.messages
+                     if text.startswith("Toolpath generation cancelled")]
+        self.assertEqual(len(cancelled), 3)
+
+
+if __name__ == "__main__":
+    pycam.Test.main()
@@ -0,0 +1,637 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2017 The PyCAM developers
+
+This file is part of PyCAM.
+
+PyCAM is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyCAM is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import functools
+import os
+try:
+    import Queue
+except ImportError:
+    # Python3
+    import queue as Queue
+import threading
+import time
+import uuid
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import pycam.Utils.log
+import pycam.Utils.threading as pycam_threading
+import pycam.Test
+
+
+class _SharedItem(object):
+    """ a cacheable argument (it has an "uuid") """
+
+    def __init__(self, value, size=10):
+        self.uuid = str(uuid.uuid4())
+        self.value = value
+        if numpy is None:
+            self.data = [value] * size
+        else:
+            self.data = numpy.array([value] * size, dtype=float)
+
+
+def _square(value):
+    return value * value
+
+
+def _scale(args):
+    item, factor = args
+    return item.value * factor + len(item.data)
+
+
+def _fail_on_three(value):
+    if value == 3:
+        raise ValueError("three")
+    return value
+
+
+def _get_process_id(value):
+    return os.getpid()
+
+
+def _sum(args):
+    return sum(args)
+
+
+def _sleep(duration):
+    time.sleep(duration)
+    return duration
+
+
+def _get_cancel_callback(calls_before_cancel):
+    """ return a callback requesting a cancel with its call after "calls_before_cancel" """
+    calls = []
+
+    def callback():
+        calls.append(None)
+        return len(calls) > calls_before_cancel
+
+    return callback
+
+
+class _Closing(object):
+    """ the "closing" flag of the workers: it is set as soon as all tasks are taken """
+
+    def __init__(self, tasks):
+        self.tasks = tasks
+
+    def get(self):
+        return self.tasks.empty()
+
+
+class _Statistics(object):
+
+    def worker_notification(self, name):
+        pass
+
+    def add_transfer_time(self, name, amount):
+        pass
+
+    def add_process_time(self, name, amount):
+        pass
+
+
+class _PendingTasks(object):
+
+    def __init__(self):
+        self.tasks = {}
+
+    def add(self, job_id, task_id, info):
+        self.tasks[(job_id, task_id)] = info
+
+    def remove(self, job_id, task_id=None):
+        self.tasks.pop((job_id, task_id), None)
+
+
+class _Results(object):
+
+    def __init__(self):
+        self.results = []
+
+    def put(self, job_id, task_id, result):
+        self.results.append((job_id, task_id, result))
+
+
+class SharedObjectStoreTest(pycam.Test.PycamTestCase):
+    """Objects published for the local worker processes"""
+
+    def setUp(self):
+        self.store = pycam_threading.SharedObjectStore(max_items=2)
+
+    def tearDown(self):
+        self.store.clear()
+
+    def test_publish_and_load(self):
+        """Published objects are loaded from the files of the store"""
+        item = _SharedItem(3, size=pycam_threading.SHARED_ARRAY_MIN_SIZE)
+        handle = self.store.publish(item)
+        self.assertTrue(os.path.isfile(handle.filename))
+        loaded = pycam_threading.SharedObjectStore.load(handle.filename)
+        self.assertEqual(loaded.uuid, item.uuid)
+        self.assertEqual(list(loaded.data), list(item.data))
+
+    def test_reuse_and_eviction(self):
+        """Each object is published only once and old objects are removed"""
+        items = [_SharedItem(index) for index in range(3)]
+        first_handle = self.store.publish(items[0])
+        self.assertIs(self.store.publish(items[0]), first_handle)
+        self.store.publish(items[1])
+        self.store.publish(items[2])
+        statistics = self.store.get_statistics()
+        self.assertEqual(statistics["items"], 2)
+        self.assertEqual(statistics["hits"], 1)
+        self.assertEqual(statistics["misses"], 3)
+        self.assertEqual(statistics["evictions"], 1)
+        self.assertFalse(os.path.exists(first_handle.filename))
+
+    def test_clear(self):
+        """Clearing the store removes its files"""
+        handle = self.store.publish(_SharedItem(1))
+        self.store.clear()
+        self.assertFalse(os.path.exists(handle.filename))
+        self.assertEqual(self.store.get_statistics()["size"], 0)
+
+
+class ProcessDataCacheTest(pycam.Test.PycamTestCase):
+    """LRU cache of the data shared by many tasks"""
+
+    def test_lru(self):
+        """The least recently used items are discarded"""
+        cache = pycam_threading.ProcessDataCache(max_size=300)
+        for name in ("a", "b", "c"):
+            cache.add(name, name, size=100)
+        self.assertEqual(cache.get("a"), "a")
+        cache.add("d", "d", size=100)
+        self.assertFalse(cache.contains("b"))
+        for name in ("a", "c", "d"):
+            self.assertTrue(cache.contains(name))
+        self.assertEqual(cache.get_statistics()["evictions"], 1)
+        self.assertEqual(cache.get_statistics()["size"], 300)
+
+    def test_large_item(self):
+        """The most recently used item is kept - even if it exceeds the limit"""
+        cache = pycam_threading.ProcessDataCache(max_size=100)
+        cache.add("a", "a", size=50)
+        cache.add("b", "b", size=500)
+        self.assertTrue(cache.contains("b"))
+        self.assertFalse(cache.contains("a"))
+
+    def test_estimated_size(self):
+        """The size of an item is estimated based on its numpy arrays"""
+        if numpy is None:
+            self.skipTest("numpy is required")
+        item = _SharedItem(1, size=10000)
+        cache = pycam_threading.ProcessDataCache()
+        cache.add("item", item)
+        size = cache.get_statistics()["size"]
+        self.assertGreaterEqual(size, item.data.nbytes)
+        self.assertLess(size, 2 * item.data.nbytes)
+
+
+class LocalPoolTest(pycam.Test.PycamTestCase):
+    """Parallel processing with a pool of two local worker processes"""
+
+    def setUp(self):
+        pycam_threading.init_threading(2)
+
+    def tearDown(self):
+        pycam_threading.cleanup()
+
+    def test_pool_is_reused(self):
+        """The worker processes are started only once"""
+        pool = pycam_threading._get_local_pool()
+        self.assertIs(pycam_threading._get_local_pool(), pool)
+        process_ids = set(pycam_threading.run_in_parallel(_get_process_id, range(20)))
+        process_ids.update(pycam_threading.run_in_parallel(_get_process_id, range(20)))
+        self.assertNotIn(os.getpid(), process_ids)
+        self.assertLessEqual(len(process_ids), 2)
+
+    def test_ordered(self):
+        """Results are yielded in the order of the arguments"""
+        self.assertEqual(list(pycam_threading.run_in_parallel(_square, range(30))),
+                         [value * value for value in range(30)])
+
+    def test_unordered(self):
+        """All results are yielded (in any order), if requested"""
+        results = pycam_threading.run_in_parallel(_square, range(30), unordered=True)
+        self.assertEqual(sorted(results), [value * value for value in range(30)])
+
+    def test_shared_arguments(self):
+        """Cacheable arguments are published for the workers"""
+        item = _SharedItem(2)
+        args = [(item, factor) for factor in range(5)]
+        self.assertEqual(list(pycam_threading.run_in_parallel(_scale, args)),
+                         [2 * factor + 10 for factor in range(5)])
+        statistics = pycam_threading.get_task_statistics()
+        self.assertEqual(statistics["cache"], 1)
+        self.assertEqual(statistics["cache misses"], 1)
+
+    def test_errors(self):
+        """Exceptions of the tasks are raised in the caller"""
+        for unordered in (False, True):
+            results = pycam_threading.run_in_parallel(_fail_on_three, range(6),
+                                                      unordered=unordered)
+            self.assertRaises(ValueError, list, results)
+
+    def test_cancel(self):
+        """No further results are yielded after the callback requested a cancel"""
+        for unordered in (False, True):
+            calls = []
+
+            def callback():
+                calls.append(None)
+                return len(calls) > 3
+
+            results = list(pycam_threading.run_in_parallel(_square, range(100),
+                                                           unordered=unordered,
+                                                           callback=callback))
+            self.assertEqual(len(results), 3)
+
+    def test_cancel_slow_tasks(self):
+        """A cancel request is noticed while waiting - the next job is not delayed"""
+        for unordered in (False, True):
+            start_time = time.time()
+            results = list(pycam_threading.run_in_parallel(
+                _sleep, [0.3] * 40, unordered=unordered, callback=_get_cancel_callback(3)))
+            self.assertLess(len(results), 3)
+            self.assertLess(time.time() - start_time, 1.0)
+            # the workers skip the queued tasks of the cancelled job
+            start_time = time.time()
+            self.assertEqual(list(pycam_threading.run_in_parallel(_square, range(4))),
+                             [0, 1, 4, 9])
+            self.assertLess(time.time() - start_time, 0.8)
+
+    def test_disable_multiprocessing(self):
+        """Tasks are processed in the current process, if multiprocessing is disabled"""
+        process_ids = set(pycam_threading.run_in_parallel(_get_process_id, range(5),
+                                                          disable_multiprocessing=True))
+        self.assertEqual(process_ids, {os.getpid()})
+
+
+class ChunkPolicyTest(pycam.Test.PycamTestCase):
+    """Chunk sizes of the scheduling policies"""
+
+    def test_fixed(self):
+        """The fixed policy always returns its size"""
+        policy = pycam_threading.FixedChunkPolicy(5)
+        self.assertEqual(policy.get_chunk_size(100, 4), 5)
+        self.assertEqual(policy.get_chunk_size(2, 4), 5)
+        self.assertEqual(pycam_threading.FixedChunkPolicy(0).get_chunk_size(10, 1), 1)
+
+    def test_guided(self):
+        """The guided policy shrinks the chunks towards the end of the job"""
+        policy = pycam_threading.GuidedChunkPolicy(min_size=2, max_size=20)
+        self.assertEqual(policy.get_chunk_size(100, 2), 20)
+        self.assertEqual(policy.get_chunk_size(60, 2), 15)
+        self.assertEqual(policy.get_chunk_size(9, 2), 3)
+        self.assertEqual(policy.get_chunk_size(3, 2), 2)
+
+    def test_auto_tune(self):
+        """The auto-tuning policy aims at the target duration of a chunk"""
+        policy = pycam_threading.AutoTuneChunkPolicy(target_duration=1.0, max_size=50,
+                                                     smoothing=0.5)
+        # no timing is known yet
+        self.assertEqual(policy.get_chunk_size(1000, 2), 1)
+        policy.add_timing(1, 0.1)
+        self.assertEqual(policy.get_chunk_size(1000, 2), 10)
+        # smoothing: the new estimate is the average of 0.1 and 0.3
+        policy.add_timing(10, 3.0)
+        self.assertEqual(policy.get_chunk_size(1000, 2), 5)
+        # every process gets a chunk
+        self.assertEqual(policy.get_chunk_size(6, 2), 3)
+        # very fast tasks
+        policy = pycam_threading.AutoTuneChunkPolicy(max_size=50)
+        policy.add_timing(10, 0)
+        self.assertEqual(policy.get_chunk_size(1000, 2), 50)
+
+
+class ChunkedProcessingTest(pycam.Test.PycamTestCase):
+    """Processing of chunked tasks in worker processes and in the current process"""
+
+    def setUp(self):
+        pycam_threading.init_threading(2)
+        self.run_functions = (
+            ("serial", functools.partial(pycam_threading.run_in_parallel_local,
+                                         disable_multiprocessing=True)),
+            ("pool", pycam_threading.run_in_parallel_local))
+
+    def tearDown(self):
+        pycam_threading.cleanup()
+
+    def _run(self, run_function, args, policy, func=_square, **kwargs):
+        return list(pycam_threading._run_in_chunks(run_function, func, args, policy, **kwargs))
+
+    def _get_policies(self):
+        return (pycam_threading.FixedChunkPolicy(3),
+                pycam_threading.GuidedChunkPolicy(min_size=2),
+                pycam_threading.AutoTuneChunkPolicy(target_duration=0.001, max_size=8))
+
+    def test_ordered(self):
+        """Chunked results are yielded in the order of the arguments"""
+        expected = [value * value for value in range(25)]
+        for name, run_function in self.run_functions:
+            for policy in self._get_policies():
+                self.assertEqual(self._run(run_function, range(25), policy), expected,
+                                 (name, policy))
+
+    def test_unordered(self):
+        """All chunked results are yielded, if the order is not relevant"""
+        expected = [value * value for value in range(25)]
+        for name, run_function in self.run_functions:
+            for policy in self._get_policies():
+                results = self._run(run_function, range(25), policy, unordered=True)
+                self.assertEqual(sorted(results), expected, (name, policy))
+
+    def test_cancel(self):
+        """A cancel request stops the processing of the remaining chunks"""
+        for name, run_function in self.run_functions:
+            for unordered in (False, True):
+                calls = []
+
+                def callback():
+                    calls.append(None)
+                    return len(calls) > 1
+
+                results = self._run(run_function, range(30),
+                                    pycam_threading.FixedChunkPolicy(3),
+                                    unordered=unordered, callback=callback)
+                self.assertEqual(len(results), 3, (name, unordered))
+
+    def test_cancel_latency(self):
+        """Large chunks of slow tasks are cancelled quickly - the next job is not delayed"""
+        for unordered in (False, True):
+            start_time = time.time()
+            results = self._run(pycam_threading.run_in_parallel_local, [0.05] * 400,
+                                pycam_threading.GuidedChunkPolicy(), func=_sleep,
+                                unordered=unordered, callback=_get_cancel_callback(3))
+            self.assertLess(len(results), 10)
+            self.assertLess(time.time() - start_time, 1.5)
+            # the workers stop processing the current chunks and skip the queued chunks
+            start_time = time.time()
+            self.assertEqual(self._run(pycam_threading.run_in_parallel_local, range(4),
+                                       pycam_threading.FixedChunkPolicy(1)), [0, 1, 4, 9])
+            self.assertLess(time.time() - start_time, 0.5)
+
+    def test_statistics(self):
+        """The size and duration of each processed chunk is recorded"""
+        self._run(pycam_threading.run_in_parallel_local, range(10),
+                  pycam_threading.FixedChunkPolicy(4))
+        timings = pycam_threading.get_chunk_statistics()["_square"]
+        self.assertEqual([size for size, duration in timings[-3:]], [4, 4, 2])
+
+    def test_run_in_parallel(self):
+        """A chunk policy is used by "run_in_parallel" only with multiprocessing"""
+        policy = pycam_threading.FixedChunkPolicy(4)
+        for disable_multiprocessing in (False, True):
+            results = pycam_threading.run_in_parallel(
+                _square, range(10), chunk_policy=policy,
+                disable_multiprocessing=disable_multiprocessing)
+            self.assertEqual(list(results), [value * value for value in range(10)])
+
+
+class ResultRouterTest(pycam.Test.PycamTestCase):
+    """Delivery of remote results to the job that submitted the tasks"""
+
+    def setUp(self):
+        self.router = pycam_threading.ResultRouter()
+
+    def test_routing(self):
+        """Every job receives only its own results"""
+        self.router.open_job("first")
+        self.router.open_job("second")
+        self.router.put("first", 0, "a")
+        self.router.put("second", 0, "b")
+        self.router.put("first", 1, "c")
+        self.assertEqual(self.router.qsize(), 3)
+        self.assertEqual(self.router.get("first", timeout=0.1), [(0, "a"), (1, "c")])
+        self.assertEqual(self.router.get("second", timeout=0.1), [(0, "b")])
+        self.assertEqual(self.router.qsize(), 0)
+
+    def test_unknown_jobs(self):
+        """Results of closed or unknown jobs are discarded"""
+        self.router.open_job("job")
+        self.router.close_job("job")
+        self.router.put("job", 0, "a")
+        self.router.put("other", 0, "b")
+        self.assertEqual(self.router.qsize(), 0)
+        self.assertEqual(self.router.get("job", timeout=0.1), [])
+
+    def test_timeout(self):
+        """An empty list is returned if no result arrives in time"""
+        self.router.open_job("job")
+        self.assertEqual(self.router.get("job", timeout=0.05), [])
+
+
+class RemoteWorkerTest(pycam.Test.PycamTestCase):
+    """Prefetching of tasks by the workers of the remote pool"""
+
+    def setUp(self):
+        pycam_threading.init_threading(2)
+        self.tasks = Queue.Queue()
+        self.pending_tasks = _PendingTasks()
+
+    def tearDown(self):
+        pycam_threading.cleanup()
+
+    def test_prefetch(self):
+        """A worker fetches only a limited number of tasks in advance"""
+        for index in range(5):
+            self.tasks.put(("job", index, _sum, [index]))
+        fetched_tasks = Queue.Queue(2)
+        fetcher = threading.Thread(target=pycam_threading._fetch_tasks,
+                                   args=("worker", self.tasks, _Statistics(), self.pending_tasks,
+                                         _Closing(self.tasks), fetched_tasks))
+        fetcher.daemon = True
+        fetcher.start()
+        # the fetcher waits for the third task to be processed
+        time.sleep(0.3)
+        self.assertEqual(fetched_tasks.qsize(), 2)
+        self.assertEqual(self.tasks.qsize(), 2)
+        self.assertEqual(len(self.pending_tasks.tasks), 3)
+        received = []
+        while True:
+            task = fetched_tasks.get(timeout=5)
+            if task is None:
+                break
+            received.append(task[1])
+        fetcher.join(5)
+        self.assertEqual(received, list(range(5)))
+        self.assertFalse(fetcher.is_alive())
+
+    def test_handle_tasks(self):
+        """All results are delivered and cached arguments are resolved"""
+        remote_cache = pycam_threading.ProcessDataCache()
+        remote_cache.add("offset", 100)
+        offset_id = pycam_threading.ProcessDataCacheItemID("offset")
+        for index in range(10):
+            self.tasks.put(("job", index, _sum, [index, offset_id]))
+        results = _Results()
+        pycam_threading._handle_tasks(self.tasks, results, _Statistics(), remote_cache,
+                                      self.pending_tasks, _Closing(self.tasks), task_prefetch=3)
+        self.assertEqual(results.results, [("job", index, index + 100) for index in range(10)])
+        self.assertEqual(self.pending_tasks.tasks, {})
+        # the cached argument was transferred only once
+        self.assertEqual(remote_cache.get_statistics()["hits"], 1)
+
+
+def _get_job_function(result, duration=0.0, error=None):
+    def run_job(job):
+        job.update(text="running", percent=0)
+        time.sleep(duration)
+        if error:
+            raise error
+        job.update(percent=100)
+        return result
+    return run_job
+
+
+def _wait_for_cancel(job):
+    """ run until the job is cancelled """
+    while not job.update(text="waiting"):
+        time.sleep(0.01)
+    return "cancelled"
+
+
+def _run_slow_tasks(job):
+    """ process slow tasks in the local pool until the job is cancelled """
+    return list(pycam_threading.run_in_parallel(_sleep, [0.05] * 400, callback=job.update,
+                                                chunk_policy=pycam_threading.GuidedChunkPolicy()))
+
+
+class ConcurrentJobsTest(pycam.Test.PycamTestCase):
+    """Independent jobs running in threads of the current process"""
+
+    def _run(self, funcs, max_jobs=2, poll=None):
+        return list(pycam_threading.run_jobs_concurrently(funcs, max_jobs=max_jobs, poll=poll,
+                                                          poll_interval=0.01))
+
+    def test_order(self):
+        """Jobs are yielded in their original order"""
+        funcs = [_get_job_function(index, duration=0.01 * (5 - index)) for index in range(5)]
+        jobs = self._run(funcs, max_jobs=3)
+        self.assertEqual([job.index for job in jobs], list(range(5)))
+        self.assertEqual([job.result for job in jobs], list(range(5)))
+        for job in jobs:
+            self.assertTrue(job.finished)
+            self.assertIsNone(job.error)
+            self.assertEqual(job.percent, 100)
+
+    def test_errors(self):
+        """A failing job does not affect the other jobs"""
+        funcs = [_get_job_function(0), _get_job_function(1, error=ValueError("broken")),
+                 _get_job_function(2)]
+        jobs = self._run(funcs)
+        self.assertEqual([job.result for job in jobs], [0, None, 2])
+        self.assertIsNone(jobs[0].error)
+        self.assertIn("broken", jobs[1].error)
+        self.assertIsNone(jobs[2].error)
+
+    def test_cancel_single_job(self):
+        """A single job can be cancelled - the other jobs continue"""
+
+        def poll(jobs):
+            if jobs[0].started:
+                jobs[0].cancel()
+            return False
+
+        jobs = self._run([_wait_for_cancel, _get_job_function(1, duration=0.05)], poll=poll)
+        self.assertTrue(jobs[0].cancel_requested)
+        self.assertEqual(jobs[0].result, "cancelled")
+        self.assertFalse(jobs[1].cancel_requested)
+        self.assertEqual(jobs[1].result, 1)
+
+    def test_cancel_before_start(self):
+        """Jobs cancelled before their start are skipped"""
+
+        def poll(jobs):
+            jobs[1].cancel()
+            return False
+
+        jobs = self._run([_get_job_function(0, duration=0.05), _get_job_function(1),
+                          _get_job_function(2)], max_jobs=1, poll=poll)
+        self.assertEqual([job.result for job in jobs], [0, None, 2])
+        self.assertFalse(jobs[1].started)
+        self.assertTrue(jobs[1].finished)
+
+    def test_cancel_all(self):
+        """All remaining jobs are cancelled, if "poll" returns True"""
+        jobs = self._run([_wait_for_cancel, _wait_for_cancel, _get_job_function(2)],
+                         poll=lambda jobs: any(job.started for job in jobs))
+        for job in jobs:
+            self.assertTrue(job.cancel_requested)
+        self.assertEqual([job.result for job in jobs[:2]], ["cancelled", "cancelled"])
+        self.assertFalse(jobs[2].started)
+
+    def test_cancel_pool_jobs(self):
+        """Cancelling all jobs stops their tasks in the local pool"""
+        pycam_threading.init_threading(2)
+        try:
+            start_time = time.time()
+            jobs = self._run([_run_slow_tasks] * 3,
+                             poll=lambda jobs: time.time() > start_time + 0.3)
+            self.assertLess(time.time() - start_time, 1.5)
+            for job in jobs:
+                self.assertTrue(job.cancel_requested)
+                self.assertLess(len(job.result or []), 400)
+            # the queued chunks of the cancelled jobs are skipped
+            start_time = time.time()
+            self.assertEqual(list(pycam_threading.run_in_parallel(_square, range(4))),
+                             [0, 1, 4, 9])
+            self.assertLess(time.time() - start_time, 0.5)
+        finally:
+            pycam_threading.cleanup()
+
+    def test_consumer_stops_early(self):
+        """All jobs are stopped, if the caller stops consuming the results"""
+        funcs = [_get_job_function(0)] + [_wait_for_cancel] * 3
+        job_iter = pycam_threading.run_jobs_concurrently(funcs, max_jobs=2, poll_interval=0.01)
+        first_job = next(job_iter)
+        self.assertEqual(first_job.result, 0)
+        job_iter.close()
+        for thread in threading.enumerate():
+            self.assertFalse(thread.name.startswith("pycam-job-"), thread.name)
+
+    def test_log_records(self):
+        """Log records of the jobs are delivered in the thread of the caller"""
+        received = []
+        handler = pycam.Utils.log.HookHandler(
+            lambda *args, **kwargs: received.append(threading.current_thread()))
+        logger = pycam.Utils.log.get_logger()
+        logger.addHandler(handler)
+        try:
+
+            def log_message(job):
+                logger.warning("message of a job")
+                # the record is delivered later
+                return list(received)
+
+            jobs = self._run([log_message])
+        finally:
+            logger.removeHandler(handler)
+        self.assertEqual(jobs[0].result, [])
+        self.assertEqual(received, [threading.current_thread()])
+
+
+if __name__ == "__main__":
+    pycam.Test.main()
@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2017 The PyCAM developers
+
+This file is part of PyCAM.
+
+PyCAM is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyCAM is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import itertools
+import math
+import random
+
+import numpy
+
+from pycam.Cutters.SphericalCutter import SphericalCutter
+from pycam.Geometry.Model import Model
+from pycam.Geometry.Plane import Plane
+from pycam.Geometry.PointUtils import pdist
+from pycam.Toolpath import MOVE_ARC, MOVE_STRAIGHT
+from pycam.Geometry.Triangle import Triangle
+from pycam.PathGenerators.BatchDropCutter import drop_many
+from pycam.Toolpath import Toolpath
+import pycam.Toolpath.Filters as Filters
+from pycam.Toolpath.StepArray import StepArray
+import pycam.Toolpath.Steps as Steps
+import pycam.Test
+
+
+def _get_steps():
+    return [Steps.MachineSetting("feedrate", 200), Steps.Comment("start"),
+            Steps.MoveStraightRapid((0, 0, 5)), Steps.MoveStraight((0, 0, -1)),
+            Steps.MoveStraight((3, 4, -1)), Steps.MoveSafety(),
+            Steps.MachineSetting("feedrate", 50), Steps.MoveStraight((3, 4, -2.5)),
+            Steps.MoveArc((-2, 1, 0.5)), Steps.MachineSetting("spindle_enabled", False)]
+
+
+class ColumnarToolpath(pycam.Test.PycamTestCase):
+    """Columnar storage of toolpath steps"""
+
+    def test_steps(self):
+        "Steps are restored from the arrays"
+        steps = _get_steps()
+        array = StepArray.from_steps(steps)
+        self.assertEqual(len(array), len(steps))
+        self.assertEqual(list(array), steps)
+        self.assertEqual(array[4], steps[4])
+        self.assertEqual(array[-1], steps[-1])
+        self.assertEqual(list(array[3:8]), steps[3:8])
+        self.assertEqual(list(array[::-2]), steps[::-2])
+
+    def test_zero_copy_slices(self):
+        "Slices share their data"
+        array = StepArray.from_steps(_get_steps())
+        part = array[2:6]
+        self.assertTrue(numpy.may_share_memory(part.positions, array.positions))
+        self.assertIs(part.extras, array.extras)
+        self.assertRaises(ValueError, part.positions.fill, 0)
+
+    def test_limits_and_time(self):
+        "Limits, distance and duration of moves"
+        steps = _get_steps()
+        toolpath = Toolpath(toolpath_path=steps)
+        self.assertTrue(isinstance(toolpath.path, StepArray))
+        self.assertEqual((toolpath.minx, toolpath.miny, toolpath.minz), (-2, 0, -2.5))
+        self.assertEqual((toolpath.maxx, toolpath.maxy, toolpath.maxz), (3, 4, 5))
+        # the distances and feedrates of the single moves
+        moves = [(pdist((0, 0, 5), (0, 0, -1)), 200), (pdist((0, 0, -1), (3, 4, -1)), 200),
+                 (pdist((3, 4, -1), (3, 4, -2.5)), 50), (pdist((3, 4, -2.5), (-2, 1, 0.5)), 50)]
+        distance, duration = toolpath.get_machine_move_distance_and_time()
+        self.assertAlmostEqual(distance, sum(move[0] for move in moves))
+        self.assertAlmostEqual(duration, sum(move[0] / move[1] for move in moves))
+        self.assertEqual(Toolpath().get_machine_move_distance_and_time(), (0, 0))
+
+
+class StreamingFilters(pycam.Test.PycamTestCase):
+    """Toolpath filters as a chain of generators"""
+
+    def test_endless_moves(self):
+        "Streaming filters process one step after the other"
+        moves = (Steps.MoveStraight((index, 0, 0)) for index in itertools.count())
+        filters = [Filters.MachineSetting("feedrate", 60), Filters.SafetyHeight(5),
+                   Filters.TimeLimit(0.5)]
+        result = list(Filters.iter_filtered_moves(moves, filters))
+        # the time limit filter returns only moves
+        self.assertEqual(result[0], Steps.MoveStraightRapid((0, 0, 5)))
+        self.assertEqual(result[1], Steps.MoveStraight((0, 0, 0)))
+        # 0.5 minutes with a feedrate of 60 (including the move down from safety height)
+        self.assertVectorEqual(result[-1].position, (25, 0, 0))
+
+    def test_trigger_spindle(self):
+        "The spindle is started after tool changes and stopped after the last move"
+        steps = _get_steps()
+        filters = [Filters.TriggerSpindle(0), Filters.SelectTool(2), Filters.Copy()]
+        result = Filters.get_filtered_moves(steps, filters)
+        self.assertEqual(result, list(Filters.iter_filtered_moves(iter(steps), filters)))
+        self.assertEqual(result[2:4], [Steps.MachineSetting("select_tool", 2),
+                                       Steps.MachineSetting("spindle_enabled", True)])
+        self.assertEqual(result[-2], Steps.MachineSetting("spindle_enabled", False))
+        # a delay follows the start - trailing steps are kept after the stop
+        spindle = Filters.TriggerSpindle(3)
+        enable = [Steps.MachineSetting("spindle_enabled", True), Steps.MachineSetting("delay", 3)]
+        disable = [Steps.MachineSetting("spindle_enabled", False)]
+        move1, move2 = Steps.MoveStraight((1, 0, 0)), Steps.MoveStraight((2, 0, 0))
+        tool1 = Steps.MachineSetting("select_tool", 1)
+        tool2 = Steps.MachineSetting("select_tool", 2)
+        comment = Steps.Comment("end")
+        for steps, expected in (
+                ([], []),
+                ([comment], [comment]),
+                ([comment, move1, Steps.MoveSafety(), move2, Steps.MoveSafety(), comment],
+                 [comment] + enable + [move1, Steps.MoveSafety(), move2] + disable
+                 + [Steps.MoveSafety(), comment]),
+                ([tool1, move1, tool2, move2, comment],
+                 [tool1] + enable + [move1, tool2] + enable + [move2] + disable + [comment]),
+                ([move1, tool2], enable + [move1] + disable + [tool2] + enable)):
+            self.assertEqual(list(spindle.filter_steps(iter(steps))), expected)
+        # only the steps after the latest move are kept back
+        moves = (Steps.MoveStraight((index, 0, 0)) for index in itertools.count())
+        result = list(itertools.islice(spindle.filter_steps(moves), 4))
+        self.assertEqual(result, enable + [Steps.MoveStraight((0, 0, 0)),
+                                           Steps.MoveStraight((1, 0, 0))])
+
+
+class ArrayFilters(pycam.Test.PycamTestCase):
+    """Array operations of toolpath filters"""
+
+    def setUp(self):
+        self._model = Model()
+        for points in (((0, 0, 0), (0, 2, 1), (3, 0, 0)),
+                       ((3, 0, 0), (0, 2, 1), (4, 3, 2)),
+                       ((-1, -2, 0.5), (0, 0, 0), (3, 0, 0)),
+                       ((1, 1, 3), (1.5, 1, 3), (1, 1.5, 2.5))):
+            self._model.append(Triangle(*points))
+        # drop a cutter along a grid of lines (with a varying density of positions)
+        steps = [Steps.MachineSetting("feedrate", 300)]
+        for line_index in range(30):
+            y = line_index * 0.17 - 2.5
+            positions = [(x * 0.005 * (1 + line_index % 4) - 2, y) for x in range(250)]
+            heights = drop_many(self._model, SphericalCutter(0.3), positions, -1, 3)
+            for (x, y), height in zip(positions, heights):
+                if height == height:
+                    steps.append(Steps.MoveStraight((x, y, height)))
+            steps.append(Steps.MoveSafety())
+            if line_index % 7 == 0:
+                steps.append(Steps.MachineSetting("feedrate", 50 + line_index))
+        self._steps = StepArray.from_steps(steps)
+
+    def _check_filters(self, filters):
+        for one_filter in filters:
+            expected = list(one_filter.filter_steps(iter(self._steps)))
+            result = one_filter.filter_array(self._steps)
+            self.assertTrue(isinstance(result, StepArray))
+            self.assertEqual(list(result), expected)
+
+    def test_step_width(self):
+        "Skip short moves"
+        self._check_filters([Filters.StepWidth(0.01, 0.01, 0.01), Filters.StepWidth(0.1, 0.1, 1),
+                             Filters.StepWidth(0.015, 0.002, 0), Filters.StepWidth(0, 0, 0)])
+
+    def test_transform_position(self):
+        "Shift and rotate moves"
+        self._check_filters([
+            Filters.TransformPosition(((0, 1, 0, 2), (-1, 0, 0, 3), (0, 0, 2, 1))),
+            Filters.TransformPosition(((0.3, 0.4, 0), (0.1, 1, 0), (0, 0, 1)))])
+
+    def test_time_limit(self):
+        "Partial toolpath"
+        self._check_filters([Filters.TimeLimit(limit) for limit in (-1, 0, 0.001, 0.2, 1, 100)])
+
+    def test_crop(self):
+        "Crop moves"
+        polygons = self._model.get_waterline_contour(Plane((0, 0, 0.7), (0, 0, 1))).get_polygons()
+        self._check_filters([Filters.Crop(polygons), Filters.Crop([])])
+
+    def test_filter_pipeline(self):
+        "Array operations in a chain of filters"
+        filters = [Filters.TriggerSpindle(0), Filters.StepWidth(0.01, 0.01, 0.01),
+                   Filters.SafetyHeight(5), Filters.TransformPosition(((1, 0, 0, 2), (0, 1, 0, 3),
+                                                                       (0, 0, 1, 0))),
+                   Filters.TimeLimit(0.3)]
+        expected = list(self._steps)
+        for one_filter in sorted(filters):
+            expected = list(one_filter.filter_steps(iter(expected)))
+        self.assertEqual(Filters.get_filtered_moves(self._steps, filters), expected)
+        toolpath = Toolpath(toolpath_path=self._steps)
+        self.assertTrue(isinstance(toolpath | filters[1], StepArray))
+
+
+class ArcFittingFilter(pycam.Test.PycamTestCase):
+    """Replace short straight moves with lines and arcs"""
+
+    def _get_fitted(self, positions, tolerance):
+        steps = [Steps.MoveStraightRapid(positions[0])]
+        steps.extend(Steps.MoveStraight(position) for position in positions[1:])
+        steps.append(Steps.MoveSafety())
+        result = list(Filters.ArcFitting(tolerance).filter_steps(iter(steps)))
+        self.assertEqual(result[0], steps[0])
+        self.assertEqual(result[-1], steps[-1])
+        return result[1:-1]
+
+    def test_arcs(self):
+        "Circles are split into arcs"
+        positions = [(10 * math.cos(math.radians(angle)), 10 * math.sin(math.radians(angle)), 1)
+                     for angle in range(0, 361, 3)]
+        # a straight line with some noise
+        positions.extend((10 + index * 0.1, 0.0001 * (index % 2), 1) for index in range(1, 50))
+        result = self._get_fitted(positions, 0.01)
+        self.assertEqual([step.action for step in result], [MOVE_ARC, MOVE_ARC, MOVE_STRAIGHT])
+        start = positions[0]
+        for step in result:
+            # all targets are original positions
+            self.assertTrue(step.position in positions)
+            if step.action == MOVE_ARC:
+                self.assertFalse(step.clockwise)
+                self.assertAlmostEqual(pdist(start, step.center), 10)
+                self.assertAlmostEqual(pdist(step.position, step.center), 10)
+            start = step.position
+        self.assertEqual(result[-1].position, positions[-1])
+        # the reversed circle is clockwise
+        result = self._get_fitted(list(reversed(positions[:121])), 0.01)
+        self.assertTrue(all(step.clockwise for step in result))
+
+    def test_tolerance(self):
+        "Moves with larger deviations are kept"
+        generator = random.Random(3)
+        positions = [(index * 0.1, generator.uniform(-0.5, 0.5), 0) for index in range(100)]
+        result = self._get_fitted(positions, 0.001)
+        self.assertEqual([step.position for step in result], positions[1:])
+        self.assertEqual(len(self._get_fitted(positions, 1)), 1)
+
+    def test_time_limit(self):
+        "Arcs keep their center in a simulation with a time limit"
+        steps = [Steps.MachineSetting("feedrate", 60), Steps.MoveStraightRapid((10, 0, 1)),
+                 Steps.MoveArc((0, 10, 1), center=(0, 0, 1)),
+                 Steps.MoveArc((-10, 0, 1), center=(0, 0, 1), clockwise=False)]
+        full_duration = math.pi * 10 / 60
+        for steps_input in (steps, StepArray.from_steps(steps)):
+            # both arcs are complete
+            self.assertEqual(list(steps_input | Filters.TimeLimit(full_duration + 1)), steps[1:])
+            # the second arc ends halfway
+            result = list(steps_input | Filters.TimeLimit(0.75 * full_duration))
+            self.assertEqual(result[:2], steps[1:3])
+            self.assertEqual(result[2].action, MOVE_ARC)
+            self.assertEqual(result[2].center, (0, 0, 1))
+            self.assertFalse(result[2].clockwise)
+            position = result[2].position
+            self.assertAlmostEqual(position[0], -10 * math.sqrt(0.5))
+            self.assertAlmostEqual(position[1], 10 * math.sqrt(0.5))
+            self.assertAlmostEqual(position[2], 1)
+        # clockwise arcs
+        clockwise = [Steps.MoveStraight((10, 0, 0)),
+                     Steps.MoveArc((0, -10, 2), center=(0, 0, 0), clockwise=True)]
+        result = list(Filters.TimeLimit(0.5 * math.hypot(5 * math.pi, 2)).filter_steps(
+            iter(clockwise)))
+        self.assertTrue(result[1].clockwise)
+        for value, expected in zip(result[1].position,
+                                   (10 * math.sqrt(0.5), -10 * math.sqrt(0.5), 1)):
+            self.assertAlmostEqual(value, expected)
+
+
+if __name__ == "__main__":
+    pycam.Test.main()
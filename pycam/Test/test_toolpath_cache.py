@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2017 The PyCAM developers
+
+This file is part of PyCAM.
+
+PyCAM is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyCAM is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import os
+import shutil
+import tempfile
+
+from pycam.Cutters.CylindricalCutter import CylindricalCutter
+from pycam.Cutters.SphericalCutter import SphericalCutter
+from pycam.Geometry import Box3D, Point3D
+from pycam.Geometry.Model import Model
+from pycam.Geometry.Triangle import Triangle
+import pycam.Toolpath.Cache
+from pycam.Toolpath.Cache import ToolpathCache, get_toolpath_key
+from pycam.Toolpath.StepArray import StepArray
+import pycam.Toolpath.Steps as Steps
+import pycam.Test
+
+
+class _SurfaceGenerator(object):
+    pass
+
+
+class _SliceGenerator(object):
+    pass
+
+
+def _get_model(height):
+    model = Model()
+    model.append(Triangle((0, 0, 0), (0, 2, height), (3, 0, 0)))
+    return model
+
+
+class ToolpathCacheFiles(pycam.Test.PycamTestCase):
+    """Persistent cache of generated toolpaths"""
+
+    def setUp(self):
+        self._directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self._directory)
+
+    def _get_key(self, models=None, tool=None, process=None, grid=None, box=None,
+                 generator=None):
+        if models is None:
+            models = [_get_model(1)]
+        if tool is None:
+            tool = SphericalCutter(1)
+        if process is None:
+            process = {"strategy": "surfacing", "parameters": {"overlap": 0.6, "step_down": 1}}
+        if grid is None:
+            grid = [[[(0, 0, 1), (1, 0, 1)], [(1, 1, 1), (0, 1, 1)]]]
+        if box is None:
+            box = Box3D(Point3D(0, 0, 0), Point3D(3, 2, 1))
+        if generator is None:
+            generator = _SurfaceGenerator()
+        return get_toolpath_key(models, tool, process, grid, box, generator)
+
+    def test_key(self):
+        "Keys depend on the content of all parameters"
+        key = self._get_key()
+        # equal content results in the same key
+        self.assertEqual(self._get_key(process={"parameters": {"step_down": 1, "overlap": 0.6},
+                                                "strategy": "surfacing"}), key)
+        self.assertEqual(self._get_key(tool=SphericalCutter(1, location=(2, 3, 4))), key)
+        for changed in (self._get_key(models=[_get_model(2)]),
+                        self._get_key(tool=CylindricalCutter(1)),
+                        self._get_key(process={"strategy": "surfacing",
+                                               "parameters": {"overlap": 0.5, "step_down": 1}}),
+                        self._get_key(grid=[[[(0, 0, 1), (1, 0, 1)]], [[(1, 1, 1), (0, 1, 1)]]]),
+                        self._get_key(box=Box3D(Point3D(0, 0, 0), Point3D(3, 2, 2))),
+                        self._get_key(generator=_SliceGenerator())):
+            self.assertNotEqual(changed, key)
+        # unknown parameter types can't be cached
+        self.assertIsNone(self._get_key(process={"parameters": {"value": object()}}))
+
+    def test_key_version(self):
+        "Toolpaths of other releases are not used"
+        key = self._get_key()
+        original_version = pycam.Toolpath.Cache.VERSION
+        pycam.Toolpath.Cache.VERSION = original_version + "-other"
+        try:
+            self.assertNotEqual(self._get_key(), key)
+        finally:
+            pycam.Toolpath.Cache.VERSION = original_version
+        self.assertEqual(self._get_key(), key)
+
+    def test_store(self):
+        "Cached toolpaths are restored"
+        cache = ToolpathCache(self._directory)
+        steps = [Steps.MachineSetting("feedrate", 200), Steps.Comment(u"start"),
+                 Steps.MoveStraightRapid((0, 0, 5)), Steps.MoveStraight((0, 0, -1)),
+                 Steps.MoveSafety(), Steps.MoveArc((-2, 1, 0.5), center=(0, 0, 0.5)),
+                 Steps.MoveArc((3, 1, 0.5))]
+        self.assertIsNone(cache.get("1234"))
+        cache.store("1234", steps)
+        result = cache.get("1234")
+        self.assertTrue(isinstance(result, StepArray))
+        self.assertEqual(list(result), steps)
+        # setting values without a faithful representation are not stored
+        cache.store("5678", [Steps.MachineSetting("corner_style", (1, 2))])
+        self.assertIsNone(cache.get("5678"))
+
+    def test_eviction(self):
+        "The least recently used toolpaths are removed"
+        steps = [Steps.MoveStraight((index, 0, 0)) for index in range(100)]
+        cache = ToolpathCache(self._directory)
+        for index, key in enumerate(("a", "b", "c")):
+            cache.store(key, steps)
+            filename = os.path.join(self._directory, key + ".npz")
+            os.utime(filename, (1000 * (index + 1), 1000 * (index + 1)))
+        cache.max_size = 2.5 * os.path.getsize(filename)
+        # "a" is used recently
+        self.assertIsNotNone(cache.get("a"))
+        cache.store("d", steps)
+        self.assertEqual(sorted(os.listdir(self._directory)), ["a.npz", "d.npz"])
+
+    def test_clear(self):
+        "All cached toolpaths are removed"
+        cache = ToolpathCache(os.path.join(self._directory, "cache"))
+        # the directory does not exist, yet
+        cache.clear()
+        for key in ("a", "b"):
+            cache.store(key, [Steps.MoveStraight((1, 2, 3))])
+        other_filename = os.path.join(cache.directory, "other.txt")
+        open(other_filename, "w").close()
+        cache.clear()
+        self.assertIsNone(cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        # unrelated files are kept
+        self.assertEqual(os.listdir(cache.directory), ["other.txt"])
+
+
+if __name__ == "__main__":
+    pycam.Test.main()
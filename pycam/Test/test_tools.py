@@ -24,6 +24,7 @@ import pycam.Test
 from pycam.Geometry.Triangle import Triangle
 from pycam.Cutters.CylindricalCutter import CylindricalCutter
 from pycam.Cutters.SphericalCutter import SphericalCutter
+from pycam.Cutters.ToroidalCutter import ToroidalCutter
 
 
 class CylindricalCutterCollisions(pycam.Test.PycamTestCase):
@@ -47,6 +48,21 @@ class CylindricalCutterCollisions(pycam.Test.PycamTestCase):
 #       self.assertVectorEqual(self._drop(3, skewed_triangle), (0, 0, 3))
 
 
+class CutterContentHash(pycam.Test.PycamTestCase):
+    """Cutter uuid"""
+
+    def test_equal_shapes(self):
+        "Equal shapes share their uuid"
+        self.assertEqual(CylindricalCutter(2, location=(0, 0, 0)).uuid,
+                         CylindricalCutter(2, location=(1, 2, 3)).uuid)
+        self.assertNotEqual(CylindricalCutter(2).uuid, SphericalCutter(2).uuid)
+        self.assertNotEqual(ToroidalCutter(2, 0.5).uuid, ToroidalCutter(2, 0.25).uuid)
+        cutter = SphericalCutter(2)
+        old_uuid = cutter.uuid
+        cutter.set_required_distance(0.5)
+        self.assertNotEqual(cutter.uuid, old_uuid)
+
+
 class SphericalCutterCollisions(pycam.Test.PycamTestCase):
     """Spherical cutter collisions"""
 
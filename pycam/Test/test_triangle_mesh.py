@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2017 The PyCAM developers
+
+This file is part of PyCAM.
+
+PyCAM is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyCAM is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import pycam.Test
+from pycam.Geometry.Model import Model
+from pycam.Geometry.Triangle import Triangle
+from pycam.Geometry.TriangleMesh import merge_vertices, TriangleMesh
+
+
+def _get_triangles():
+    return [Triangle((0, 0, 0), (0, 2, 1), (3, 0, 0)),
+            Triangle((3, 0, 0), (0, 2, 1), (4, 3, 2)),
+            Triangle((-1, -2, 0.5), (0, 0, 0), (3, 0, 0))]
+
+
+class TriangleMeshCache(pycam.Test.PycamTestCase):
+    """Array-based triangle storage"""
+
+    def test_cache_values(self):
+        "Per-face values"
+        triangles = _get_triangles()
+        mesh = TriangleMesh.from_triangles(triangles)
+        self.assertEqual(len(mesh), len(triangles))
+        self.assertEqual(len(mesh.vertices), 5)
+        for index, triangle in enumerate(triangles):
+            self.assertVectorEqual(mesh.lower[index].tolist(),
+                                   (triangle.minx, triangle.miny, triangle.minz))
+            self.assertVectorEqual(mesh.upper[index].tolist(),
+                                   (triangle.maxx, triangle.maxy, triangle.maxz))
+            self.assertVectorEqual(mesh.normals[index].tolist(), triangle.normal)
+            self.assertVectorEqual(mesh.middle[index].tolist(), triangle.middle)
+            self.assertAlmostEqual(mesh.radius[index], triangle.radius)
+
+    def test_lazy_triangles(self):
+        "Lazy triangle objects"
+        triangles = _get_triangles()
+        mesh = TriangleMesh.from_triangles(triangles)
+        self.assertEqual(len(mesh._triangles), 0)
+        self.assertEqual(mesh[1].get_points(), triangles[1].get_points())
+        self.assertIs(mesh[1], mesh[1])
+        self.assertEqual(len(mesh._triangles), 1)
+
+    def test_model_transform(self):
+        "Model transformation"
+        model = Model()
+        for triangle in _get_triangles():
+            model.append(triangle)
+        mesh_model = Model(mesh=TriangleMesh.from_triangles(_get_triangles()))
+        self.assertEqual(model.get_bounds().get_bounds(), mesh_model.get_bounds().get_bounds())
+        matrix = ((0, 1, 0, 2), (-1, 0, 0, 3), (0, 0, 2, 1))
+        mesh_model.transform_by_matrix(matrix)
+        self.assertVectorEqual((mesh_model.minx, mesh_model.miny, mesh_model.minz), (0, -1, 1))
+        self.assertVectorEqual((mesh_model.maxx, mesh_model.maxy, mesh_model.maxz), (5, 4, 5))
+        found = mesh_model.triangles(minx=4.5, miny=-1, maxx=5, maxy=0)
+        self.assertEqual([triangle.get_points() for triangle in found],
+                         [((2.0, 0.0, 1.0), (4.0, 3.0, 3.0), (5.0, -1.0, 5.0))])
+
+    def test_merge_vertices(self):
+        "Merge identical vertices"
+        points = [(1, 2, 3), (0, 5, 1), (1, 2, 3), (1, 0, 3), (0, 5, 1)]
+        vertices, inverse = merge_vertices(points)
+        self.assertEqual(len(vertices), 3)
+        self.assertEqual(vertices[inverse].tolist(), [list(point) for point in points])
+
+    def test_content_hash(self):
+        "Equal models share their uuid"
+        models = []
+        for index in range(2):
+            model = Model()
+            for triangle in _get_triangles():
+                model.append(triangle)
+            models.append(model)
+        self.assertEqual(models[0].uuid, models[1].uuid)
+        mesh_models = [Model(mesh=TriangleMesh.from_triangles(_get_triangles()))
+                       for index in range(2)]
+        self.assertEqual(mesh_models[0].uuid, mesh_models[1].uuid)
+        old_uuid = mesh_models[0].uuid
+        mesh_models[0].transform_by_matrix(((1, 0, 0, 1), (0, 1, 0, 0), (0, 0, 1, 0)))
+        self.assertNotEqual(mesh_models[0].uuid, old_uuid)
+        models[0].append(Triangle((0, 0, 0), (1, 0, 0), (0, 1, 0)))
+        self.assertNotEqual(models[0].uuid, models[1].uuid)
+
+
+if __name__ == "__main__":
+    pycam.Test.main()
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2017 The PyCAM developers
+
+This file is part of PyCAM.
+
+PyCAM is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyCAM is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import math
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from pycam.Geometry import epsilon
+
+
+# arcs are limited to three quarters of a circle (full circles would be ambiguous)
+MAX_ARC_ANGLE = 1.5 * math.pi
+# minimum number of original moves replaced by an arc
+MIN_ARC_MOVES = 3
+
+
+def _get_line_deviation(points):
+    """ return the maximum distance of the inner points from the line between the first and the
+    last point
+    """
+    start, end = points[0], points[-1]
+    inner = points[1:-1] - start
+    direction = end - start
+    length_sq = numpy.dot(direction, direction)
+    if length_sq > 0:
+        # the projection onto the line is limited to the line's length
+        factors = numpy.clip(inner.dot(direction) / length_sq, 0, 1)
+        inner = inner - factors[:, numpy.newaxis] * direction
+    return numpy.sqrt((inner ** 2).sum(axis=1)).max()
+
+
+def get_arc(points, tolerance):
+    """ return the center and the direction of an arc through the given points
+
+    The points (array of shape (N, 3)) need to be on a horizontal circle - within the given
+    tolerance. The tolerance applies to the distance of the points from the arc as well as to
+    the distance between the arc and the straight lines connecting the points.
+    The result is None, if the points do not fit to an arc.  Otherwise it is a tuple of the
+    center (x, y, z) and a boolean value (True for a clockwise arc).
+    """
+    if len(points) < MIN_ARC_MOVES + 1:
+        return None
+    if numpy.abs(points[:, 2] - points[0, 2]).max() > epsilon:
+        return None
+    # the circle through the first, the last and the middle point
+    (ax, ay), (bx, by), (cx, cy) = points[[0, len(points) // 2, -1], :2].tolist()
+    determinant = 2 * (ax * (by - cy) + bx * (cy - ay) + cx * (ay - by))
+    if abs(determinant) < epsilon:
+        return None
+    a_sq, b_sq, c_sq = ax ** 2 + ay ** 2, bx ** 2 + by ** 2, cx ** 2 + cy ** 2
+    center_x = (a_sq * (by - cy) + b_sq * (cy - ay) + c_sq * (ay - by)) / determinant
+    center_y = (a_sq * (cx - bx) + b_sq * (ax - cx) + c_sq * (bx - ax)) / determinant
+    radius = math.hypot(ax - center_x, ay - center_y)
+    offsets_x = points[:, 0] - center_x
+    offsets_y = points[:, 1] - center_y
+    radial_error = numpy.abs(numpy.hypot(offsets_x, offsets_y) - radius).max()
+    # the angular steps between neighbouring points (normalized to -pi..pi)
+    angles = numpy.diff(numpy.arctan2(offsets_y, offsets_x))
+    angles = (angles + math.pi) % (2 * math.pi) - math.pi
+    if not ((angles > 0).all() or (angles < 0).all()):
+        # the points do not proceed in one direction
+        return None
+    total_angle = angles.sum()
+    if abs(total_angle) > MAX_ARC_ANGLE:
+        return None
+    # maximum distance between the arc and a straight line connecting two points
+    sagitta = radius * (1 - math.cos(numpy.abs(angles).max() / 2))
+    if radial_error + sagitta > tolerance:
+        return None
+    return (center_x, center_y, float(points[0, 2])), bool(total_angle < 0)
+
+
+def _get_fit(points, tolerance):
+    """ return the replacement of the straight moves through the points (or None) """
+    if (len(points) < 3) or (_get_line_deviation(points) <= tolerance):
+        return (None, False)
+    return get_arc(points, tolerance)
+
+
+def fit_moves(points, tolerance):
+    """ replace straight moves through the given points with fewer lines and arcs (requires numpy)
+
+    @param points: array of shape (N, 3) - the first point is the start position
+    @param tolerance: maximum deviation of the new moves from the original path
+    @returns: list of tuples (index of the target point, center of the arc (or None),
+        clockwise)
+    """
+    result = []
+    start = 0
+    last_index = len(points) - 1
+    while start < last_index:
+        # find the longest run of points fitting to a line or an arc (based on the assumption
+        # that shorter runs fit, as well): first double the size, then use bisection
+        good, good_fit = start + 1, (None, False)
+        size = MIN_ARC_MOVES
+        bad = None
+        while good < last_index:
+            candidate = min(start + size, last_index)
+            fit = _get_fit(points[start:candidate + 1], tolerance)
+            if fit is None:
+                bad = candidate
+                break
+            good, good_fit = candidate, fit
+            size *= 2
+        while (bad is not None) and (bad - good > 1):
+            candidate = (good + bad) // 2
+            fit = _get_fit(points[start:candidate + 1], tolerance)
+            if fit is None:
+                bad = candidate
+            else:
+                good, good_fit = candidate, fit
+        result.append((good, good_fit[0], good_fit[1]))
+        start = good
+    return result
@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2017 The PyCAM developers
+
+This file is part of PyCAM.
+
+PyCAM is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyCAM is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import hashlib
+import json
+import numbers
+import os
+import tempfile
+import zipfile
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from pycam import VERSION
+from pycam.Toolpath import MACHINE_SETTING, COMMENT, MOVE_ARC
+from pycam.Toolpath.StepArray import StepArray
+import pycam.Toolpath.Steps as Steps
+import pycam.Utils.log
+
+
+log = pycam.Utils.log.get_logger()
+
+# default size limit of all cache files (bytes)
+CACHE_SIZE = 256 * 1024 * 1024
+# increment this number whenever the meaning of cached toolpaths changes
+CACHE_FORMAT_VERSION = 1
+CACHE_FILE_SUFFIX = ".npz"
+
+
+def _update_hash(content_hash, value):
+    """ add a parameter value to a hash - independent of memory addresses or dict order
+
+    Objects are represented by their content hash ("uuid" - e.g. models and cutters).
+    A TypeError is raised for unsupported values.
+    """
+    if hasattr(value, "model"):
+        # only the model of a wrapper (pycam.Plugins.Models.ModelEntity) is relevant - not its
+        # random "uuid" or its color
+        _update_hash(content_hash, value.model)
+    elif isinstance(value, dict):
+        content_hash.update(b"{")
+        for key in sorted(value, key=str):
+            _update_hash(content_hash, key)
+            _update_hash(content_hash, value[key])
+        content_hash.update(b"}")
+    elif isinstance(value, (list, tuple)):
+        content_hash.update(b"[")
+        for item in value:
+            _update_hash(content_hash, item)
+        content_hash.update(b"]")
+    elif (value is None) or isinstance(value, numbers.Number):
+        content_hash.update(("%s:%r;" % (type(value).__name__, value)).encode("utf-8"))
+    elif isinstance(value, (type(b""), type(u""))):
+        if not isinstance(value, bytes):
+            value = value.encode("utf-8")
+        content_hash.update(("s%d:" % len(value)).encode("utf-8") + value)
+    elif hasattr(value, "uuid"):
+        _update_hash(content_hash, value.uuid)
+    else:
+        raise TypeError("Unsupported parameter type for the toolpath cache: %s" % type(value))
+
+
+def get_toolpath_key(models, tool, process, motion_grid, box, path_generator):
+    """ calculate a hash of all inputs of a toolpath generator
+
+    @param models: list of collision models
+    @param tool: the cutter
+    @param process: dictionary of the process (strategy and parameters)
+    @param motion_grid: list of layers (lists of lines) - each line is a list of points
+    @param box: the absolute bounds (Box3D)
+    @param path_generator: the path generator instance
+    @returns: a hex string or None (for unsupported input data)
+    """
+    if numpy is None:
+        # the cache stores StepArray instances
+        return None
+    content_hash = hashlib.sha1()
+    try:
+        # the results of path generators may change between releases
+        _update_hash(content_hash, [CACHE_FORMAT_VERSION, VERSION, type(path_generator).__name__,
+                                    [model.uuid for model in models], tool.uuid,
+                                    process.get("strategy"), process.get("parameters"),
+                                    tuple(box.lower), tuple(box.upper)])
+        for layer in motion_grid:
+            content_hash.update(b"#")
+            for line in layer:
+                content_hash.update(("|%d|" % len(line)).encode("utf-8"))
+                points = numpy.array(line, dtype=numpy.float64)
+                if (points.ndim != 2) or (points.shape[1] != 3):
+                    raise TypeError("Unexpected shape of a motion grid line: %s"
+                                    % str(points.shape))
+                content_hash.update(points.tobytes())
+    except (TypeError, ValueError) as exc:
+        log.debug("Toolpath cache: ignoring uncacheable task (%s)", exc)
+        return None
+    return content_hash.hexdigest()
+
+
+def _encode_extras(steps):
+    """ serialize the side table of a StepArray (machine settings, comments and arcs) """
+    result = []
+    for step in steps:
+        if step.action == MOVE_ARC:
+            result.append((step.action, step.position, step.center, step.clockwise))
+        elif step.action == MACHINE_SETTING:
+            result.append((step.action, step.key, step.value))
+        elif step.action == COMMENT:
+            result.append((step.action, step.text))
+        else:
+            raise TypeError("Unexpected step in side table: %s" % str(step))
+    return json.dumps(result)
+
+
+def _decode_extras(text):
+    result = []
+    for item in json.loads(text):
+        action, arguments = item[0], item[1:]
+        if action == MOVE_ARC:
+            position, center, clockwise = arguments
+            result.append(Steps.MoveArc(tuple(position),
+                                        None if center is None else tuple(center), clockwise))
+        else:
+            result.append(Steps.get_step_class_by_action(action)(*arguments))
+    return result
+
+
+class ToolpathCache(object):
+    """ persistent storage of generated toolpaths
+
+    Each toolpath is stored in a separate file (named after its key) containing the arrays of a
+    StepArray.  The least recently used files are removed as soon as the total size exceeds the
+    limit.
+    """
+
+    def __init__(self, directory, max_size=CACHE_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+
+    def _get_filename(self, key):
+        return os.path.join(self.directory, key + CACHE_FILE_SUFFIX)
+
+    def get(self, key):
+        """ return the cached steps (StepArray) for the key or None """
+        if (numpy is None) or (key is None):
+            return None
+        filename = self._get_filename(key)
+        try:
+            with open(filename, "rb") as cache_file:
+                data = numpy.load(cache_file, allow_pickle=False)
+                steps = StepArray(data["actions"], data["positions"], data["extra_indices"],
+                                  _decode_extras(data["extras"].tobytes().decode("utf-8")))
+            # mark the file as recently used
+            os.utime(filename, None)
+        except (IOError, OSError):
+            return None
+        except (KeyError, ValueError, TypeError, zipfile.BadZipfile) as exc:
+            log.warn("Toolpath cache: removing invalid file '%s': %s", filename, exc)
+            self._remove(filename)
+            return None
+        log.info("Toolpath cache: loaded %d steps from '%s'", len(steps), filename)
+        return steps
+
+    def store(self, key, steps):
+        """ add a toolpath (list of steps or StepArray) to the cache """
+        if (numpy is None) or (key is None):
+            return
+        if not isinstance(steps, StepArray):
+            steps = StepArray.from_steps(steps)
+        try:
+            extras = _encode_extras(steps.extras)
+        except TypeError as exc:
+            log.debug("Toolpath cache: failed to store uncacheable steps (%s)", exc)
+            return
+        # JSON turns tuples into lists - values of other types can't be stored faithfully
+        if _decode_extras(extras) != list(steps.extras):
+            log.debug("Toolpath cache: skipping steps with unsupported setting values")
+            return
+        if not os.path.isdir(self.directory):
+            try:
+                os.makedirs(self.directory)
+            except OSError as exc:
+                log.warn("Toolpath cache: failed to create directory '%s': %s",
+                         self.directory, exc)
+                return
+        filename = self._get_filename(key)
+        # write to a temporary file first - concurrent readers never see incomplete files
+        handle, temp_filename = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        try:
+            with os.fdopen(handle, "wb") as cache_file:
+                numpy.savez(cache_file, actions=steps.actions, positions=steps.positions,
+                            extra_indices=steps.extra_indices,
+                            extras=numpy.frombuffer(extras.encode("utf-8"), dtype=numpy.uint8))
+            if os.path.exists(filename):
+                # "rename" fails on Windows if the target exists
+                os.remove(filename)
+            os.rename(temp_filename, filename)
+        except (IOError, OSError) as exc:
+            log.warn("Toolpath cache: failed to write '%s': %s", filename, exc)
+            self._remove(temp_filename)
+            return
+        self._shrink(keep=filename)
+
+    def clear(self):
+        """ remove all cached toolpaths """
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            # the cache was not used, yet
+            return
+        for name in names:
+            if name.endswith(CACHE_FILE_SUFFIX):
+                self._remove(os.path.join(self.directory, name))
+        log.info("Toolpath cache: removed all files from '%s'", self.directory)
+
+    def _remove(self, filename):
+        try:
+            os.remove(filename)
+        except OSError:
+            pass
+
+    def _shrink(self, keep=None):
+        """ remove the least recently used files until the size limit is met """
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(CACHE_FILE_SUFFIX):
+                continue
+            filename = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(filename)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, filename))
+        total_size = sum(entry[1] for entry in entries)
+        for mtime, size, filename in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            if filename == keep:
+                continue
+            log.debug("Toolpath cache: removing '%s'", filename)
+            self._remove(filename)
+            total_size -= size
@@ -20,11 +20,20 @@ along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
 
 
 import decimal
+import fractions
+import math
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 from pycam.Geometry import epsilon
 from pycam.Geometry.Line import Line
 from pycam.Geometry.PointUtils import padd, psub, pmul, pdist, pnear, ptransform_by_matrix
-from pycam.Toolpath import MOVE_SAFETY, MOVES_LIST, MACHINE_SETTING
+from pycam.Toolpath import MOVE_ARC, MOVE_SAFETY, MOVE_STRAIGHT, MOVES_LIST, MACHINE_SETTING
+from pycam.Toolpath.ArcFitting import fit_moves
+from pycam.Toolpath.StepArray import StepArray, get_read_only_steps
 import pycam.Toolpath.Steps as ToolpathSteps
 import pycam.Utils.log
 
@@ -64,18 +73,40 @@ def toolpath_filter(our_category, key):
 
 
 def get_filtered_moves(moves, filters):
-    filters = list(filters)
-    moves = list(moves)
-    filters.sort()
-    for one_filter in filters:
-        moves |= one_filter
-    return moves
+    return list(iter_filtered_moves(moves, filters))
+
+
+def iter_filtered_moves(moves, filters):
+    """ apply the filters (sorted by their WEIGHT) to the moves
+
+    Streaming filters are chained as generators: the steps are passed on one by one.  Only the
+    filters requiring the complete toolpath collect the steps (see "BaseFilter.STREAMING").
+    Complete toolpaths (e.g. a StepArray or the result of a non-streaming filter) are processed
+    with array operations by the filters supporting them (see "BaseFilter.ARRAY_OPERATIONS").
+    The result is an iterator of steps.
+    """
+    steps = moves
+    for one_filter in sorted(filters):
+        if one_filter.ARRAY_OPERATIONS and (numpy is not None) \
+                and isinstance(steps, (StepArray, list, tuple)):
+            steps = one_filter.filter_array(get_read_only_steps(steps))
+        elif one_filter.STREAMING:
+            steps = one_filter.filter_steps(iter(steps))
+        else:
+            steps = one_filter.filter_toolpath(list(steps))
+    return iter(steps)
 
 
 class BaseFilter(object):
 
     PARAMS = []
     WEIGHT = 50
+    # Streaming filters process one step after the other (see "filter_steps").
+    # All other filters require the complete toolpath (see "filter_toolpath").
+    STREAMING = False
+    # Some filters can process a complete StepArray with array operations (see "filter_array").
+    # The result must be identical to the result of "filter_steps".
+    ARRAY_OPERATIONS = False
 
     def __init__(self, *args, **kwargs):
         self.settings = dict(kwargs)
@@ -102,6 +133,8 @@ class BaseFilter(object):
             toolpath = toolpath.path
         # use a copy of the list -> changes will be permitted
         _log.debug("Applying toolpath filter: %s", self.__class__)
+        if self.ARRAY_OPERATIONS and isinstance(toolpath, StepArray):
+            return self.filter_array(toolpath)
         return self.filter_toolpath(list(toolpath))
 
     def __repr__(self):
@@ -120,31 +153,46 @@ class BaseFilter(object):
         return ", ".join(["%s=%s" % (key, self.settings[key]) for key in self.settings])
 
     def filter_toolpath(self, toolpath):
+        if self.STREAMING:
+            return list(self.filter_steps(toolpath))
         raise NotImplementedError(("The filter class %s failed to implement the 'filter_toolpath' "
                                    "method") % str(type(self)))
 
+    def filter_steps(self, steps):
+        """ return an iterator of the filtered steps """
+        if self.STREAMING:
+            raise NotImplementedError(("The streaming filter class %s failed to implement the "
+                                       "'filter_steps' method") % str(type(self)))
+        # the complete toolpath is required
+        return iter(self.filter_toolpath(list(steps)))
+
+    def filter_array(self, steps):
+        """ return the filtered steps of a StepArray as a new StepArray """
+        return StepArray.from_steps(self.filter_steps(iter(steps)))
+
 
 class SafetyHeight(BaseFilter):
 
     PARAMS = ("safety_height", )
     WEIGHT = 80
+    STREAMING = True
 
-    def filter_toolpath(self, toolpath):
+    def filter_steps(self, steps):
         last_pos = None
         max_height = None
-        new_path = []
         safety_pending = False
         get_safe = lambda pos: tuple((pos[0], pos[1], self.settings["safety_height"]))
-        for step in toolpath:
+        for step in steps:
             if step.action == MOVE_SAFETY:
                 safety_pending = True
             elif step.action in MOVES_LIST:
                 new_pos = tuple(step.position)
-                max_height = max(max_height, new_pos[2])
+                if (max_height is None) or (new_pos[2] > max_height):
+                    max_height = new_pos[2]
                 if not last_pos:
                     # there was a safety move (or no move at all) before
                     # -> move sideways
-                    new_path.append(ToolpathSteps.MoveStraightRapid(get_safe(new_pos)))
+                    yield ToolpathSteps.MoveStraightRapid(get_safe(new_pos))
                 elif safety_pending:
                     safety_pending = False
                     if pnear(last_pos, new_pos, axes=(0, 1)):
@@ -152,39 +200,45 @@ class SafetyHeight(BaseFilter):
                         pass
                     else:
                         # go up, sideways and down
-                        new_path.append(ToolpathSteps.MoveStraightRapid(get_safe(last_pos)))
-                        new_path.append(ToolpathSteps.MoveStraightRapid(get_safe(new_pos)))
+                        yield ToolpathSteps.MoveStraightRapid(get_safe(last_pos))
+                        yield ToolpathSteps.MoveStraightRapid(get_safe(new_pos))
                 else:
                     # we are in the middle of usual moves -> keep going
                     pass
-                new_path.append(step)
+                yield step
                 last_pos = new_pos
             else:
                 # unknown move -> keep it
-                new_path.append(step)
+                yield step
         # process pending safety moves
         if safety_pending and last_pos:
-            new_path.append(ToolpathSteps.MoveStraightRapid(get_safe(last_pos)))
-        if max_height > self.settings["safety_height"]:
+            yield ToolpathSteps.MoveStraightRapid(get_safe(last_pos))
+        if (max_height is not None) and (max_height > self.settings["safety_height"]):
             _log.warn("Toolpath exceeds safety height: %f => %f",
                       max_height, self.settings["safety_height"])
-        return new_path
 
 
 class MachineSetting(BaseFilter):
 
     PARAMS = ("key", "value")
     WEIGHT = 20
-
-    def filter_toolpath(self, toolpath):
-        result = []
-        # move all previous machine settings
-        while toolpath and toolpath[0].action == MACHINE_SETTING:
-            result.append(toolpath.pop(0))
-        # add the new setting
-        for key, value in self._get_settings():
-            result.append(ToolpathSteps.MachineSetting(key, value))
-        return result + toolpath
+    STREAMING = True
+
+    def filter_steps(self, steps):
+        # the new settings are added after all previous machine settings at the start
+        settings_pending = True
+        for step in steps:
+            if settings_pending and (step.action != MACHINE_SETTING):
+                for new_step in self._get_new_steps():
+                    yield new_step
+                settings_pending = False
+            yield step
+        if settings_pending:
+            for new_step in self._get_new_steps():
+                yield new_step
+
+    def _get_new_steps(self):
+        return [ToolpathSteps.MachineSetting(key, value) for key, value in self._get_settings()]
 
     def _get_settings(self):
         return [(self.settings["key"], self.settings["value"])]
@@ -213,52 +267,64 @@ class SelectTool(BaseFilter):
 
     PARAMS = ("tool_id", )
     WEIGHT = 35
+    STREAMING = True
 
-    def filter_toolpath(self, toolpath):
-        index = 0
-        # skip all non-moves
-        while (index < len(toolpath)) and (toolpath[index][0] not in MOVES_LIST):
-            index += 1
-        toolpath.insert(index, ToolpathSteps.MachineSetting("select_tool",
-                                                            self.settings["tool_id"]))
-        return toolpath
+    def filter_steps(self, steps):
+        # the tool is selected just before the first move
+        tool_pending = True
+        for step in steps:
+            if tool_pending and (step.action in MOVES_LIST):
+                yield ToolpathSteps.MachineSetting("select_tool", self.settings["tool_id"])
+                tool_pending = False
+            yield step
+        if tool_pending:
+            yield ToolpathSteps.MachineSetting("select_tool", self.settings["tool_id"])
 
 
 class TriggerSpindle(BaseFilter):
 
     PARAMS = ("delay", )
     WEIGHT = 40
-
-    def filter_toolpath(self, toolpath):
-        def enable_spindle(path, index):
-            path.insert(index, ToolpathSteps.MachineSetting("spindle_enabled", True))
-            if self.settings["delay"]:
-                path.insert(index + 1, ToolpathSteps.MachineSetting("delay",
-                                                                    self.settings["delay"]))
-
-        def disable_spindle(path, index):
-            path.insert(index, ToolpathSteps.MachineSetting("spindle_enabled", False))
-
-        # find all positions of "select_tool"
-        tool_changes = [index for index, step in enumerate(toolpath)
-                        if (step.action == MACHINE_SETTING) and (step.key == "select_tool")]
-        if tool_changes:
-            tool_changes.reverse()
-            for index in tool_changes:
-                enable_spindle(toolpath, index + 1)
-        else:
-            # add a single tool selection before the first move
-            for index, step in enumerate(toolpath):
-                if step.action in MOVES_LIST:
-                    enable_spindle(toolpath, index)
-                    break
-        # add "stop spindle" just after the last move
-        index = len(toolpath) - 1
-        while (toolpath[index].action not in MOVES_LIST) and (index > 0):
-            index -= 1
-        if toolpath[index].action in MOVES_LIST:
-            disable_spindle(toolpath, index + 1)
-        return toolpath
+    STREAMING = True
+
+    def _get_enable_steps(self):
+        yield ToolpathSteps.MachineSetting("spindle_enabled", True)
+        if self.settings["delay"]:
+            yield ToolpathSteps.MachineSetting("delay", self.settings["delay"])
+
+    def filter_steps(self, steps):
+        # The spindle is started after every tool change (or before the first move).  It is
+        # stopped just after the last move: only the non-move steps following the latest move
+        # are kept back.
+        spindle_enabled = False
+        any_moves = False
+        pending = []
+        for step in steps:
+            if step.action in MOVES_LIST:
+                for pending_step in pending:
+                    yield pending_step
+                pending = []
+                if not spindle_enabled:
+                    for enable_step in self._get_enable_steps():
+                        yield enable_step
+                    spindle_enabled = True
+                any_moves = True
+                yield step
+            elif any_moves:
+                pending.append(step)
+            else:
+                yield step
+            if (step.action == MACHINE_SETTING) and (step.key == "select_tool"):
+                if any_moves:
+                    pending.extend(self._get_enable_steps())
+                else:
+                    for enable_step in self._get_enable_steps():
+                        yield enable_step
+                spindle_enabled = True
+        if any_moves:
+            yield ToolpathSteps.MachineSetting("spindle_enabled", False)
+        for pending_step in pending:
+            yield pending_step
 
 
 class PlungeFeedrate(BaseFilter):
@@ -266,13 +332,13 @@ class PlungeFeedrate(BaseFilter):
     PARAMS = ("plunge_feedrate", )
     # must be greater than the weight of the SafetyHeight filter
     WEIGHT = 82
+    STREAMING = True
 
-    def filter_toolpath(self, toolpath):
-        new_path = []
+    def filter_steps(self, steps):
         last_pos = None
         original_feedrate = None
         current_feedrate = None
-        for step in toolpath:
+        for step in steps:
             if (step.action == MACHINE_SETTING) and (step.key == "feedrate"):
                 # store the current feedrate
                 original_feedrate = step.value
@@ -289,52 +355,86 @@ class PlungeFeedrate(BaseFilter):
                     max_feedrate = min(original_feedrate, max_feedrate)
                     if current_feedrate != max_feedrate:
                         # we are too slow or too fast
-                        new_path.append(ToolpathSteps.MachineSetting("feedrate", max_feedrate))
+                        yield ToolpathSteps.MachineSetting("feedrate", max_feedrate)
                         current_feedrate = max_feedrate
                 else:
                     # we do not move down
                     if current_feedrate != original_feedrate:
                         # switch back to the maximum feedrate
-                        new_path.append(ToolpathSteps.MachineSetting("feedrate",
-                                                                     original_feedrate))
+                        yield ToolpathSteps.MachineSetting("feedrate", original_feedrate)
                         current_feedrate = original_feedrate
                 last_pos = step.position
             else:
                 pass
-            new_path.append(step)
-        return new_path
+            yield step
 
 
 class Crop(BaseFilter):
 
     PARAMS = ("polygons", )
     WEIGHT = 90
+    STREAMING = True
+    ARRAY_OPERATIONS = True
+
+    def filter_steps(self, steps):
+        return self._get_cropped_steps(steps)
+
+    def filter_array(self, steps):
+        # Only lines close to a polygon can contain inner pieces.  The other lines are recognized
+        # by their bounding box - for all moves at once.
+        move_mask = steps.get_move_mask()
+        positions = steps.positions[move_mask]
+        crossing = numpy.zeros(len(positions), dtype=bool)
+        lower = numpy.minimum(positions[:-1], positions[1:])
+        upper = numpy.maximum(positions[:-1], positions[1:])
+        margin = 2 * epsilon
+        for polygon in self.settings["polygons"]:
+            if not polygon.is_closed:
+                # open polygons do not contain any point
+                continue
+            elif polygon.plane.n[0] == polygon.plane.n[1] == 0:
+                # the projection onto a horizontal plane keeps the x/y coordinates
+                crossing[1:] |= ((lower[:, 0] <= polygon.maxx + margin)
+                                 & (upper[:, 0] >= polygon.minx - margin)
+                                 & (lower[:, 1] <= polygon.maxy + margin)
+                                 & (upper[:, 1] >= polygon.miny - margin))
+            else:
+                crossing[1:] = True
+        candidates = numpy.zeros(len(steps), dtype=bool)
+        candidates[move_mask] = crossing
+        return StepArray.from_steps(self._get_cropped_steps(iter(steps), candidates.tolist()))
 
-    def filter_toolpath(self, toolpath):
-        new_path = []
+    def _get_cropped_steps(self, steps, candidates=None):
+        """ crop the moves
+
+        @param candidates: optional sequence of flags (one for each step): only the lines
+            towards a marked move are split by the polygons
+        """
         last_pos = None
         optional_moves = []
-        for step in toolpath:
+        for index, step in enumerate(steps):
             if step.action in MOVES_LIST:
                 if last_pos:
                     # find all remaining pieces of this line
                     inner_lines = []
-                    for polygon in self.settings["polygons"]:
+                    if (candidates is None) or candidates[index]:
+                        polygons = self.settings["polygons"]
+                    else:
+                        polygons = []
+                    for polygon in polygons:
                         inner, outer = polygon.split_line(Line(last_pos, step.position))
                         inner_lines.extend(inner)
                     # turn these lines into moves
                     for line in inner_lines:
                         if pdist(line.p1, last_pos) > epsilon:
-                            new_path.append(ToolpathSteps.MoveSafety())
-                            new_path.append(
-                                ToolpathSteps.get_step_class_by_action(step.action)(line.p1))
+                            yield ToolpathSteps.MoveSafety()
+                            yield ToolpathSteps.get_step_class_by_action(step.action)(line.p1)
                         else:
                             # we continue where we left
-                            if optional_moves:
-                                new_path.extend(optional_moves)
-                                optional_moves = []
-                        new_path.append(
-                            ToolpathSteps.get_step_class_by_action(step.action)(line.p2))
+                            for optional_step in optional_moves:
+                                yield optional_step
+                            optional_moves = []
+                        yield ToolpathSteps.get_step_class_by_action(step.action)(line.p2)
                         last_pos = line.p2
                     optional_moves = []
                     # finish the line by moving to its end (if necessary)
@@ -345,8 +445,7 @@ class Crop(BaseFilter):
             elif step.action == MOVE_SAFETY:
                 optional_moves = []
             else:
-                new_path.append(step)
-        return new_path
+                yield step
 
 
 class TransformPosition(BaseFilter):
@@ -355,16 +454,65 @@ class TransformPosition(BaseFilter):
 
     PARAMS = ("matrix", )
     WEIGHT = 85
-
-    def filter_toolpath(self, toolpath):
-        new_path = []
-        for step in toolpath:
+    STREAMING = True
+    ARRAY_OPERATIONS = True
+
+    def filter_array(self, steps):
+        move_mask = steps.get_move_mask()
+        x, y, z = steps.positions[move_mask].T
+        positions = numpy.array(steps.positions)
+        for axis, row in enumerate(self.settings["matrix"][:3]):
+            offset = row[3] if len(row) > 3 else 0
+            # same order of operations as in "ptransform_by_matrix" (identical results)
+            positions[move_mask, axis] = x * row[0] + y * row[1] + z * row[2] + offset
+        # arcs are turned into straight moves (see "filter_steps")
+        extra_indices = numpy.where(steps.actions == MOVE_ARC, -1, steps.extra_indices)
+        return StepArray(steps.actions, positions, extra_indices, steps.extras)
+
+    def filter_steps(self, steps):
+        for step in steps:
             if step.action in MOVES_LIST:
                 new_pos = ptransform_by_matrix(step.position, self.settings["matrix"])
-                new_path.append(ToolpathSteps.get_step_class_by_action(step.action)(new_pos))
+                yield ToolpathSteps.get_step_class_by_action(step.action)(new_pos)
             else:
-                new_path.append(step)
-        return new_path
+                yield step
+
+
+def _get_arc_sweep(start, step):
+    """ return the radius and the (signed) angle of an arc move starting at "start" """
+    center = step.center
+    radius = math.hypot(start[0] - center[0], start[1] - center[1])
+    start_angle = math.atan2(start[1] - center[1], start[0] - center[0])
+    end_angle = math.atan2(step.position[1] - center[1], step.position[0] - center[0])
+    sweep = (end_angle - start_angle) % (2 * math.pi)
+    if step.clockwise and (sweep > 0):
+        sweep -= 2 * math.pi
+    return radius, sweep
+
+
+def _get_move_length(start, step):
+    """ return the length of a straight move or an arc """
+    if (step.action == MOVE_ARC) and (step.center is not None):
+        radius, sweep = _get_arc_sweep(start, step)
+        return math.hypot(radius * sweep, step.position[2] - start[2])
+    return pdist(step.position, start)
+
+
+def _get_partial_move(start, step, partial):
+    """ return a move covering the given fraction of a straight move or an arc """
+    if (step.action == MOVE_ARC) and (step.center is not None):
+        radius, sweep = _get_arc_sweep(start, step)
+        angle = math.atan2(start[1] - step.center[1], start[0] - step.center[0]) \
+            + partial * sweep
+        destination = (step.center[0] + radius * math.cos(angle),
+                       step.center[1] + radius * math.sin(angle),
+                       start[2] + partial * (step.position[2] - start[2]))
+    else:
+        destination = padd(start, pmul(psub(step.position, start), partial))
+    if step.action == MOVE_ARC:
+        # keep the center and the direction of the arc
+        return step._replace(position=destination)
+    return ToolpathSteps.get_step_class_by_action(step.action)(destination)
 
 
 class TimeLimit(BaseFilter):
@@ -374,34 +522,134 @@ class TimeLimit(BaseFilter):
 
     PARAMS = ("timelimit", )
     WEIGHT = 100
+    STREAMING = True
+    ARRAY_OPERATIONS = True
 
-    def filter_toolpath(self, toolpath):
+    def filter_array(self, steps):
+        if (steps.actions == MOVE_ARC).any():
+            # arcs are stored in the side table - they are passed on by "filter_steps"
+            return StepArray.from_steps(self.filter_steps(iter(steps)))
+        limit = self.settings["timelimit"]
+        move_mask = steps.get_move_mask()
+        move_indices = numpy.nonzero(move_mask)[0]
+        if limit <= 0:
+            # only the first step is processed
+            move_indices = move_indices[:1] if move_mask[:1].all() else move_indices[:0]
+        positions = numpy.array(steps.positions[move_indices])
+        if len(positions) > 1:
+            diff = positions[1:] - positions[:-1]
+            distances = numpy.sqrt(diff[:, 0] ** 2 + diff[:, 1] ** 2 + diff[:, 2] ** 2)
+            feedrates = steps.get_setting_values("feedrate", default=1)[move_indices][1:]
+            durations = distances / numpy.maximum(feedrates.astype(numpy.float64), 1)
+            # the durations are accumulated in the same order as in "filter_steps"
+            total_durations = numpy.cumsum(durations)
+            finished = numpy.nonzero(total_durations >= limit)[0]
+            if len(finished) > 0:
+                last = finished[0]
+                if total_durations[last] > limit:
+                    # stop in the middle of the last move
+                    previous = float(total_durations[last - 1]) if last > 0 else 0
+                    partial = (limit - previous) / float(durations[last])
+                    last_pos = tuple(positions[last].tolist())
+                    destination = tuple(positions[last + 1].tolist())
+                    positions[last + 1] = padd(last_pos,
+                                               pmul(psub(destination, last_pos), partial))
+                move_indices = move_indices[:last + 2]
+                positions = positions[:last + 2]
+        return StepArray(steps.actions[move_indices], positions,
+                         numpy.full(len(positions), -1, dtype=numpy.int32), [])
+
+    def filter_steps(self, steps):
         feedrate = min_feedrate = 1
-        new_path = []
         last_pos = None
         limit = self.settings["timelimit"]
         duration = 0
-        for step in toolpath:
+        for step in steps:
             if step.action in MOVES_LIST:
                 if last_pos:
-                    new_distance = pdist(step.position, last_pos)
+                    new_distance = _get_move_length(last_pos, step)
                     new_duration = new_distance / max(feedrate, min_feedrate)
                     if (new_duration > 0) and (duration + new_duration > limit):
                         partial = (limit - duration) / new_duration
-                        destination = padd(last_pos, pmul(psub(step.position, last_pos), partial))
+                        new_step = _get_partial_move(last_pos, step, partial)
                         duration = limit
                     else:
-                        destination = step.position
+                        new_step = step
                         duration += new_duration
                 else:
-                    destination = step.position
-                new_path.append(ToolpathSteps.get_step_class_by_action(step.action)(destination))
+                    new_step = step
+                if step.action == MOVE_ARC:
+                    # arcs are passed on with their center
+                    yield new_step
+                else:
+                    yield ToolpathSteps.get_step_class_by_action(step.action)(new_step.position)
                 last_pos = step.position
             if (step.action == MACHINE_SETTING) and (step.key == "feedrate"):
                 feedrate = step.value
             if duration >= limit:
                 break
-        return new_path
+
+
+class ArcFitting(BaseFilter):
+    """ Replace sequences of short straight moves with fewer lines and arcs.
+
+    The new moves deviate from the original path by no more than the given tolerance.  Arcs
+    (in the xy plane) cannot be transformed or cropped - thus this filter is applied after all
+    other filters changing the shape of a toolpath.
+    """
+
+    PARAMS = ("tolerance", )
+    WEIGHT = 92
+    STREAMING = True
+    # maximum number of consecutive moves processed at once
+    MAX_RUN_LENGTH = 10000
+
+    def filter_steps(self, steps):
+        if numpy is None:
+            _log.warn("Arc fitting requires numpy - the toolpath is not simplified")
+            for step in steps:
+                yield step
+            return
+        statistics = {"original": 0, "lines": 0, "arcs": 0}
+        last_pos = None
+        run = []
+        for step in steps:
+            if (step.action == MOVE_STRAIGHT) and (last_pos is not None):
+                run.append(step.position)
+                if len(run) >= self.MAX_RUN_LENGTH:
+                    for new_step in self._get_fitted_steps(last_pos, run, statistics):
+                        yield new_step
+                    last_pos = run[-1]
+                    run = []
+                continue
+            if run:
+                for new_step in self._get_fitted_steps(last_pos, run, statistics):
+                    yield new_step
+                run = []
+            yield step
+            if step.action in MOVES_LIST:
+                last_pos = step.position
+            elif step.action == MOVE_SAFETY:
+                last_pos = None
+        if run:
+            for new_step in self._get_fitted_steps(last_pos, run, statistics):
+                yield new_step
+        if statistics["original"] > 0:
+            ratio = float(statistics["lines"] + statistics["arcs"]) / statistics["original"]
+            _log.info("Arc fitting: replaced %d straight moves with %d lines and %d arcs "
+                      "(reduction: %.1f%%)", statistics["original"], statistics["lines"],
+                      statistics["arcs"], 100.0 * (1 - ratio))
+
+    def _get_fitted_steps(self, start, positions, statistics):
+        points = numpy.array([start] + positions, dtype=numpy.float64)
+        statistics["original"] += len(positions)
+        for index, center, clockwise in fit_moves(points, self.settings["tolerance"]):
+            if center is None:
+                statistics["lines"] += 1
+                yield ToolpathSteps.MoveStraight(positions[index - 1])
+            else:
+                statistics["arcs"] += 1
+                yield ToolpathSteps.MoveArc(positions[index - 1], center, clockwise)
 
 
 class MovesOnly(BaseFilter):
@@ -410,17 +658,22 @@ class MovesOnly(BaseFilter):
     """
 
     WEIGHT = 95
+    STREAMING = True
 
-    def filter_toolpath(self, toolpath):
-        return [step for step in toolpath if step.action in MOVES_LIST]
+    def filter_steps(self, steps):
+        for step in steps:
+            if step.action in MOVES_LIST:
+                yield step
 
 
 class Copy(BaseFilter):
 
     WEIGHT = 100
+    STREAMING = True
 
-    def filter_toolpath(self, toolpath):
-        return list(toolpath)
+    def filter_steps(self, steps):
+        for step in steps:
+            yield step
 
 
 def _get_num_of_significant_digits(number):
@@ -452,13 +705,77 @@ def _get_num_converter(step_width):
     return conv_func, format_string
 
 
+def _get_rounded_integers(values, step_width):
+    """ Return the values (array) in multiples of the precision suitable for the given step width.
+    The result is rounded exactly like the converter of "_get_num_converter".
+    """
+    digits = _get_num_of_significant_digits(step_width)
+    scaled = values * (10 ** digits)
+    result = numpy.rint(scaled).astype(numpy.int64)
+    # The product is not exact: values close to a tie are converted via their decimal string.
+    ambiguous = (numpy.abs(scaled - numpy.floor(scaled) - 0.5)
+                 <= 2 * numpy.spacing(numpy.abs(scaled)))
+    format_string = _get_num_converter(step_width)[1]
+    for index in numpy.nonzero(ambiguous)[0]:
+        result[index] = int((format_string % values[index]).replace(".", ""))
+    return result
+
+
+def _get_step_width_limit(step_width):
+    """ Return the smallest distance (in multiples of the precision of "_get_rounded_integers")
+    that is not below the step width.
+    """
+    scaled = fractions.Fraction(step_width) * 10 ** _get_num_of_significant_digits(step_width)
+    return -(-scaled // 1)
+
+
 class StepWidth(BaseFilter):
 
     PARAMS = ("step_width_x", "step_width_y", "step_width_z")
     NUM_OF_AXES = 3
     WEIGHT = 60
+    STREAMING = True
+    ARRAY_OPERATIONS = True
+
+    def filter_array(self, steps):
+        move_indices = numpy.nonzero(steps.get_move_mask())[0]
+        count = len(move_indices)
+        # a move following any other step is never skipped
+        is_first = numpy.ones(count, dtype=bool)
+        is_first[1:] = (move_indices[1:] - move_indices[:-1]) != 1
+        limits = []
+        rounded = []
+        for axis, key in enumerate("xyz"):
+            step_width = self.settings["step_width_%s" % key]
+            limits.append(_get_step_width_limit(step_width))
+            rounded.append(_get_rounded_integers(steps.positions[move_indices, axis], step_width))
+        rounded = numpy.column_stack(rounded)
+        is_close = numpy.zeros(count, dtype=bool)
+        is_close[1:] = (numpy.abs(rounded[1:] - rounded[:-1]) < limits).all(axis=1)
+        is_close &= ~is_first
+        keep = numpy.ones(count, dtype=bool)
+        # A move close to its predecessor is skipped if the predecessor is kept.  After a skipped
+        # move the following moves are compared with the last kept move one by one.
+        rows = rounded.tolist()
+        position = 0
+        for index in numpy.nonzero(is_close)[0].tolist():
+            if index < position:
+                continue
+            keep[index] = False
+            last_row = rows[index - 1]
+            position = index + 1
+            while (position < count) and not is_first[position]:
+                position += 1
+                if all(abs(a - b) < limit
+                       for a, b, limit in zip(rows[position - 1], last_row, limits)):
+                    keep[position - 1] = False
+                else:
+                    break
+        step_mask = numpy.ones(len(steps), dtype=bool)
+        step_mask[move_indices[~keep]] = False
+        return steps[step_mask]
 
-    def filter_toolpath(self, toolpath):
+    def filter_steps(self, steps):
         minimum_steps = []
         conv = []
         for key in "xyz":
@@ -466,8 +783,7 @@ class StepWidth(BaseFilter):
         for step_width in minimum_steps:
             conv.append(_get_num_converter(step_width)[0])
         last_pos = None
-        path = []
-        for step in toolpath:
+        for step in steps:
             if step.action in MOVES_LIST:
                 if last_pos:
                     diff = [(abs(a_conv(a_last_pos) - a_conv(a_pos)))
@@ -480,11 +796,9 @@ class StepWidth(BaseFilter):
                 # floats instead of decimals at this point. The output
                 # conversion needs to move into the GCode output hook.
 #               destination = [a_conv(a_pos) for a_conv, a_pos in zip(conv, step.position)]
-                destination = step.position
-                path.append(ToolpathSteps.get_step_class_by_action(step.action)(destination))
+                yield step
                 last_pos = step.position
             else:
                 # forget "last_pos" - we don't know what happened in between
                 last_pos = None
-                path.append(step)
-        return path
+                yield step
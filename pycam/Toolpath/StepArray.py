@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2017 The PyCAM developers
+
+This file is part of PyCAM.
+
+PyCAM is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyCAM is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from pycam.Toolpath import MOVES_LIST, MOVE_ARC, MOVE_SAFETY, MACHINE_SETTING
+from pycam.Toolpath.Steps import MoveArc, MoveClass
+
+
+# number of steps converted at once while iterating
+ITERATION_CHUNK_SIZE = 4096
+
+# all safety moves are equal
+_SAFETY_STEP = MoveClass(MOVE_SAFETY, None)
+
+
+def get_read_only_steps(steps):
+    """ return a read-only copy of a sequence of toolpath steps
+
+    The result is a StepArray (or a tuple, if numpy is not available).
+    """
+    if isinstance(steps, (StepArray, tuple)):
+        return steps
+    elif numpy is None:
+        return tuple(steps)
+    else:
+        return StepArray.from_steps(steps)
+
+
+class StepArray(object):
+    """ columnar storage of toolpath steps
+
+    Each step is represented by an action code (uint8) and a position (a row of a Nx3 float
+    array).  All other steps (machine settings, comments) are kept in a side table.  Arcs are
+    stored in both places.
+    Indexing and iterating return the usual step tuples (see pycam.Toolpath.Steps).
+    Slices share the arrays and the side table with their origin (zero-copy).  Index arrays and
+    boolean masks return a copy.
+    The arrays are read-only.
+    """
+
+    def __init__(self, actions, positions, extra_indices, extras):
+        """
+        @param actions: array of the action codes of all steps
+        @param positions: array of shape (N, 3) with the position of each step (NaN for
+            steps without a position)
+        @param extra_indices: array with the index of the step's item in "extras" (or -1)
+        @param extras: list of steps stored in the side table
+        """
+        self.actions = actions
+        self.positions = positions
+        self.extra_indices = extra_indices
+        self.extras = extras
+        for array in (self.actions, self.positions, self.extra_indices):
+            array.flags.writeable = False
+        self._move_mask = None
+
+    @classmethod
+    def from_steps(cls, steps):
+        actions = []
+        positions = []
+        extra_indices = []
+        extras = []
+        no_position = (numpy.nan, numpy.nan, numpy.nan)
+        for step in steps:
+            actions.append(step.action)
+            if step.action == MOVE_ARC:
+                positions.append(step.position)
+                extra_indices.append(len(extras))
+                extras.append(step)
+            elif step.action in MOVES_LIST:
+                positions.append(step.position)
+                extra_indices.append(-1)
+            elif step.action == MOVE_SAFETY:
+                positions.append(no_position)
+                extra_indices.append(-1)
+            else:
+                positions.append(no_position)
+                extra_indices.append(len(extras))
+                extras.append(step)
+        return cls(numpy.array(actions, dtype=numpy.uint8),
+                   numpy.array(positions, dtype=numpy.float64).reshape(-1, 3),
+                   numpy.array(extra_indices, dtype=numpy.int32), extras)
+
+    def __len__(self):
+        return len(self.actions)
+
+    def __repr__(self):
+        return "StepArray<%d steps>" % len(self)
+
+    def __getitem__(self, index):
+        if isinstance(index, (slice, numpy.ndarray)):
+            return type(self)(self.actions[index], self.positions[index],
+                              self.extra_indices[index], self.extras)
+        extra_index = int(self.extra_indices[index])
+        action = int(self.actions[index])
+        if extra_index >= 0:
+            return self.extras[extra_index]
+        elif action == MOVE_SAFETY:
+            return _SAFETY_STEP
+        elif action == MOVE_ARC:
+            return MoveArc(tuple(self.positions[index].tolist()))
+        else:
+            return MoveClass(action, tuple(self.positions[index].tolist()))
+
+    def __iter__(self):
+        extras = self.extras
+        for start in range(0, len(self), ITERATION_CHUNK_SIZE):
+            chunk = slice(start, start + ITERATION_CHUNK_SIZE)
+            for action, position, extra_index in zip(self.actions[chunk].tolist(),
+                                                     self.positions[chunk].tolist(),
+                                                     self.extra_indices[chunk].tolist()):
+                if extra_index >= 0:
+                    yield extras[extra_index]
+                elif action == MOVE_SAFETY:
+                    yield _SAFETY_STEP
+                elif action == MOVE_ARC:
+                    yield MoveArc(tuple(position))
+                else:
+                    yield MoveClass(action, tuple(position))
+
+    def get_move_mask(self):
+        """ return a boolean array marking all moves (with a position) """
+        if self._move_mask is None:
+            mask = numpy.zeros(len(self), dtype=bool)
+            for action in MOVES_LIST:
+                mask |= (self.actions == action)
+            self._move_mask = mask
+        return self._move_mask
+
+    def get_bounds(self):
+        """ return the lower and upper limits of the positions of all moves
+
+        A ValueError is raised for a toolpath without moves.
+        """
+        positions = self.positions[self.get_move_mask()]
+        return positions.min(axis=0).tolist(), positions.max(axis=0).tolist()
+
+    def get_setting_values(self, key, default=None):
+        """ return the value of a machine setting that is valid for each step
+
+        A setting is valid for all subsequent steps - until it is changed again.
+        """
+        rows = []
+        values = [default]
+        # only the steps of the side table need to be checked
+        extra_rows = numpy.nonzero(self.extra_indices >= 0)[0].tolist()
+        for row, extra_index in zip(extra_rows, self.extra_indices[extra_rows].tolist()):
+            step = self.extras[extra_index]
+            if (step.action == MACHINE_SETTING) and (step.key == key):
+                rows.append(row)
+                values.append(step.value)
+        values = numpy.array(values)
+        # the position of the latest setting (within "values") for each step
+        latest = numpy.zeros(len(self), dtype=numpy.int64)
+        latest[rows] = numpy.arange(1, len(rows) + 1)
+        return values[numpy.maximum.accumulate(latest)]
+
+    def get_distance_and_time(self, min_feedrate=1):
+        """ return the length of all moves and their duration based on the current feedrate """
+        mask = self.get_move_mask()
+        positions = self.positions[mask]
+        if len(positions) < 2:
+            return 0, 0
+        distances = numpy.sqrt(((positions[1:] - positions[:-1]) ** 2).sum(axis=1))
+        feedrates = self.get_setting_values("feedrate", default=min_feedrate)[mask][1:]
+        feedrates = numpy.maximum(feedrates.astype(numpy.float64), min_feedrate)
+        return float(distances.sum()), float((distances / feedrates).sum())
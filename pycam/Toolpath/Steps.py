@@ -38,11 +38,14 @@ def get_step_class_by_action(action):
 MoveClass = collections.namedtuple("Move", ("action", "position"))
 MachineSettingClass = collections.namedtuple("MachineSetting", ("action", "key", "value"))
 CommentClass = collections.namedtuple("Comment", ("action", "text"))
+# circular arc in the xy plane around an absolute center (a straight move if the center is None)
+ArcClass = collections.namedtuple("MoveArc", ("action", "position", "center", "clockwise"))
 
 
 MoveStraight = lambda position: MoveClass(MOVE_STRAIGHT, position)
 MoveStraightRapid = lambda position: MoveClass(MOVE_STRAIGHT_RAPID, position)
-MoveArc = lambda position: MoveClass(MOVE_ARC, position)
+MoveArc = lambda position, center=None, clockwise=False: \
+    ArcClass(MOVE_ARC, position, center, clockwise)
 MoveSafety = lambda: MoveClass(MOVE_SAFETY, None)
 MachineSetting = lambda key, value: MachineSettingClass(MACHINE_SETTING, key, value)
 Comment = lambda text: CommentClass(COMMENT, text)
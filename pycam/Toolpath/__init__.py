@@ -89,9 +89,11 @@ class Toolpath(object):
         return self.__path
 
     def __set_path(self, new_path):
-        # use a read-only tuple instead of a list
+        # late import due to dependency cycle
+        import pycam.Toolpath.StepArray
+        # use a read-only (columnar) copy instead of a list
         # (otherwise we can't detect changes)
-        self.__path = tuple(new_path)
+        self.__path = pycam.Toolpath.StepArray.get_read_only_steps(new_path)
         self.clear_cache()
 
     def __get_filters(self):
@@ -116,52 +118,43 @@ class Toolpath(object):
         self._cache_visual_filters_string = None
         self._cache_visual_filters = None
         self._cache_machine_distance_and_time = None
-        self._minx = None
-        self._maxx = None
-        self._miny = None
-        self._maxy = None
-        self._minz = None
-        self._maxz = None
-
-    def _get_limit_generic(self, idx, func):
-        values = [step.position[idx] for step in self.path if step.action in MOVES_LIST]
-        return func(values)
+        self._limits = None
+
+    def _get_limits(self):
+        """ return the lower and upper limits of all moves (for all three axes) """
+        if self._limits is None:
+            if isinstance(self.path, tuple):
+                # numpy is not available
+                positions = [step.position for step in self.path if step.action in MOVES_LIST]
+                self._limits = ([min([pos[idx] for pos in positions]) for idx in range(3)],
+                                [max([pos[idx] for pos in positions]) for idx in range(3)])
+            else:
+                self._limits = self.path.get_bounds()
+        return self._limits
 
     @property
     def minx(self):
-        if self._minx is None:
-            self._minx = self._get_limit_generic(0, min)
-        return self._minx
+        return self._get_limits()[0][0]
 
     @property
     def maxx(self):
-        if self._maxx is None:
-            self._maxx = self._get_limit_generic(0, max)
-        return self._maxx
+        return self._get_limits()[1][0]
 
     @property
     def miny(self):
-        if self._miny is None:
-            self._miny = self._get_limit_generic(1, min)
-        return self._miny
+        return self._get_limits()[0][1]
 
     @property
     def maxy(self):
-        if self._maxy is None:
-            self._maxy = self._get_limit_generic(1, max)
-        return self._maxy
+        return self._get_limits()[1][1]
 
     @property
     def minz(self):
-        if self._minz is None:
-            self._minz = self._get_limit_generic(2, min)
-        return self._minz
+        return self._get_limits()[0][2]
 
     @property
     def maxz(self):
-        if self._maxz is None:
-            self._maxz = self._get_limit_generic(2, max)
-        return self._maxz
+        return self._get_limits()[1][2]
 
     def get_meta_data(self):
         meta = self.toolpath_settings.get_string()
@@ -340,22 +333,29 @@ class Toolpath(object):
 
     def get_machine_move_distance_and_time(self):
         if self._cache_machine_distance_and_time is None:
-            min_feedrate = 1
-            length = 0
-            duration = 0
-            feedrate = min_feedrate
-            current_position = None
-            # go through all points of the path
-            for step in self.get_basic_moves():
-                if (step.action == MACHINE_SETTING) and (step.key == "feedrate"):
-                    feedrate = step.value
-                elif step.action in MOVES_LIST:
-                    if current_position is not None:
-                        distance = pdist(step.position, current_position)
-                        duration += distance / max(feedrate, min_feedrate)
-                        length += distance
-                    current_position = step.position
-            self._cache_machine_distance_and_time = length, duration
+            # late import due to dependency cycle
+            import pycam.Toolpath.StepArray
+            moves = pycam.Toolpath.StepArray.get_read_only_steps(self.get_basic_moves())
+            if not isinstance(moves, tuple):
+                self._cache_machine_distance_and_time = moves.get_distance_and_time()
+            else:
+                # numpy is not available
+                min_feedrate = 1
+                length = 0
+                duration = 0
+                feedrate = min_feedrate
+                current_position = None
+                # go through all points of the path
+                for step in moves:
+                    if (step.action == MACHINE_SETTING) and (step.key == "feedrate"):
+                        feedrate = step.value
+                    elif step.action in MOVES_LIST:
+                        if current_position is not None:
+                            distance = pdist(step.position, current_position)
+                            duration += distance / max(feedrate, min_feedrate)
+                            length += distance
+                        current_position = step.position
+                self._cache_machine_distance_and_time = length, duration
         return self._cache_machine_distance_and_time
 
     def get_basic_moves(self, filters=None, reset_cache=False):
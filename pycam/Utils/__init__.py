@@ -22,6 +22,7 @@ import os
 import re
 import socket
 import sys
+import time
 import traceback
 import urllib
 try:
@@ -40,6 +41,9 @@ PLATFORM_WINDOWS = 1
 PLATFORM_MACOS = 2
 PLATFORM_UNKNOWN = 3
 
+# minimum time between two calls of a progress or visualization callback (in seconds)
+PROGRESS_UPDATE_INTERVAL = 0.1
+
 
 # setproctitle is (optionally) imported
 try:
@@ -239,9 +243,41 @@ def print_stack_trace():
     traceback.print_stack()
 
 
+class RateLimiter(object):
+    """ decide whether a costly callback is due: at most once per "min_interval" seconds
+
+    The clock is read only for every "check_every"-th request. This is a fast path for tight
+    loops.  The latency of the callback is bounded by "min_interval" (and "check_every" items).
+    """
+
+    def __init__(self, min_interval=PROGRESS_UPDATE_INTERVAL, check_every=1):
+        self.min_interval = min_interval
+        self.check_every = max(1, check_every)
+        self._skipped = 0
+        self._last_time = None
+
+    def is_due(self, force=False):
+        self._skipped += 1
+        if not force and (self._skipped < self.check_every):
+            return False
+        self._skipped = 0
+        now = time.time()
+        if force or (self._last_time is None) or (now - self._last_time >= self.min_interval):
+            self._last_time = now
+            return True
+        else:
+            return False
+
+
 class ProgressCounter(object):
+    """ report the progress of an operation to a callback
+
+    The callback is called at a limited rate (see RateLimiter).  A cancel request returned by
+    the callback is remembered: all further calls of "increment" and "update" return True.
+    """
 
-    def __init__(self, max_value, update_callback):
+    def __init__(self, max_value, update_callback, min_interval=PROGRESS_UPDATE_INTERVAL,
+                 check_every=1):
         if max_value <= 0:
             # prevent divide-by-zero in "get_percent"
             self.max_value = 100
@@ -249,17 +285,64 @@ class ProgressCounter(object):
             self.max_value = max_value
         self.current_value = 0
         self.update_callback = update_callback
+        self._rate_limiter = RateLimiter(min_interval=min_interval, check_every=check_every)
+        self._cancelled = False
 
     def increment(self, increment=1):
         self.current_value += increment
         return self.update()
 
-    def update(self):
-        if self.update_callback:
+    def update(self, force=False):
+        if self.update_callback and not self._cancelled \
+                and self._rate_limiter.is_due(force=force):
             # "True" means: "quit requested via GUI"
-            return self.update_callback(percent=self.get_percent())
-        else:
-            return False
+            if self.update_callback(percent=self.get_percent()):
+                self._cancelled = True
+        return self._cancelled
 
     def get_percent(self):
         return min(100, max(0, 100.0 * self.current_value / self.max_value))
+
+
+class DrawCallbackThrottle(object):
+    """ forward tool positions, texts and new moves to a "draw_callback" at a limited rate
+
+    Intermediate tool positions and texts are dropped.  The moves added since the previous call
+    are passed as "toolpath_delta" - thus the receiver can assemble the complete toolpath.
+    A cancel request returned by the callback is remembered (see ProgressCounter).
+    """
+
+    def __init__(self, draw_callback, min_interval=PROGRESS_UPDATE_INTERVAL, check_every=1):
+        self.draw_callback = draw_callback
+        self._rate_limiter = RateLimiter(min_interval=min_interval, check_every=check_every)
+        self._cancelled = False
+        self._pending = {}
+        self._delta = []
+
+    def update(self, text=None, tool_position=None, toolpath=None, moves=None, force=False):
+        if not self.draw_callback or self._cancelled:
+            return self._cancelled
+        if text is not None:
+            self._pending["text"] = text
+        if tool_position is not None:
+            self._pending["tool_position"] = tool_position
+        if toolpath is not None:
+            self._pending["toolpath"] = toolpath
+        if moves:
+            self._delta.extend(moves)
+        if self._rate_limiter.is_due(force=force):
+            self.flush()
+        return self._cancelled
+
+    def flush(self):
+        """ deliver all pending information immediately """
+        if not self.draw_callback or self._cancelled:
+            return self._cancelled
+        kwargs = self._pending
+        if self._delta:
+            kwargs["toolpath_delta"] = self._delta
+        self._pending = {}
+        self._delta = []
+        if self.draw_callback(**kwargs):
+            self._cancelled = True
+        return self._cancelled
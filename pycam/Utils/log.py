@@ -18,12 +18,24 @@ You should have received a copy of the GNU General Public License
 along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
 """
 
+# the standard "threading" module is required below (not pycam.Utils.threading)
+from __future__ import absolute_import
+
+import collections
 import locale
 import logging
 import re
+import threading
 import time
 
 
+# GUI toolkits may be used only by the main thread: the records of other threads are delivered
+# later (see "emit_deferred_records").  The oldest records are dropped, if nobody delivers them.
+DEFERRED_RECORDS_LIMIT = 1000
+_main_thread = threading.current_thread()
+_deferred_records = collections.deque(maxlen=DEFERRED_RECORDS_LIMIT)
+
+
 def is_debug():
     log = get_logger()
     return log.level <= logging.DEBUG
@@ -57,6 +69,24 @@ def init_logger(log, logfilename=None):
     log.addHandler(buffer_handler)
 
 
+def _defer_foreign_record(handler, record):
+    """ queue a record of a thread other than the main thread - returns True if it was queued """
+    if threading.current_thread() is _main_thread:
+        return False
+    _deferred_records.append((handler, record))
+    return True
+
+
+def emit_deferred_records():
+    """ deliver the records of other threads to the GUI handlers
+
+    This needs to be called regularly in the main thread (e.g. by a timer of the GUI main loop).
+    """
+    while _deferred_records:
+        handler, record = _deferred_records.popleft()
+        handler.emit(record)
+
+
 def _push_back_old_logs(new_handler):
     log = get_logger()
     # push all older log items into the new handler
@@ -163,6 +193,8 @@ class GTKHandler(logging.Handler):
         self.parent_window = parent_window
 
     def emit(self, record):
+        if _defer_foreign_record(self, record):
+            return
         raw_message = self.format(record)
         try:
             message = raw_message.encode("utf-8")
@@ -208,6 +240,8 @@ class HookHandler(logging.Handler):
         self.callback = callback
 
     def emit(self, record):
+        if _defer_foreign_record(self, record):
+            return
         message = self.format(record)
         message_type = record.levelname
         self.callback(message_type, message, record=record)
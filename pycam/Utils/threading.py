@@ -18,18 +18,40 @@ You should have received a copy of the GNU General Public License
 along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
 """
 
+# the standard "threading" module is required below (not this module)
+from __future__ import absolute_import
+
 # multiprocessing is imported later
 # import multiprocessing
+import atexit
+import collections
 import os
 import platform
-import Queue
+try:
+    import Queue
+except ImportError:
+    # Python3
+    import queue as Queue
 import random
+import shutil
 import signal
 import socket
 import sys
+import tempfile
+import threading
 import time
 import uuid
 
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 from pycam import CommunicationError
 import pycam.Utils
 import pycam.Utils.log
@@ -55,6 +77,23 @@ else:
 
 DEFAULT_PORT = 1250
 
+# the number of tasks (per process) waiting for a worker of the local pool
+LOCAL_POOL_TASKS_PER_PROCESS = 4
+# the number of chunks (per process) waiting for a worker of the local pool
+LOCAL_POOL_CHUNKS_PER_PROCESS = 2
+# the interval (in seconds) of cancel checks while waiting for the results of the local pool
+LOCAL_POOL_POLL_INTERVAL = 0.1
+# the number of cancel flags of local jobs (see "_cancel_local_job")
+LOCAL_POOL_CANCEL_SLOTS = 1024
+# numpy arrays above this size (in bytes) are mapped into the memory of the local workers
+SHARED_ARRAY_MIN_SIZE = 64 * 1024
+# the number of chunk timings kept for each function (see "ProcessStatistics.add_chunk_time")
+CHUNK_STATISTICS_LENGTH = 100
+# the maximum size (in bytes) of the data shared by all tasks (e.g. models and cutters)
+DATA_CACHE_SIZE = 512 * 1024 * 1024
+# the number of tasks fetched in advance by each worker of the remote pool
+TASK_PREFETCH = 2
+
 
 # TODO: create one or two classes for these functions (to get rid of the globals)
 
@@ -73,17 +112,51 @@ __task_source_uuid = None
 __finished_jobs = []
 __issued_warnings = []
 
-
-def run_in_parallel(*args, **kwargs):
-    global __manager
+# the long-lived pool of local worker processes and the objects published for it
+__pool = None
+__shared_objects = None
+# the pool is used by concurrent jobs (see "run_jobs_concurrently")
+__pool_lock = threading.Lock()
+# the IDs of the cancelled jobs of the local pool (shared with the worker processes)
+__cancelled_local_jobs = None
+__last_local_job_id = 0
+# the published objects loaded by a worker process of the local pool
+_worker_objects = collections.OrderedDict()
+# the cancelled jobs (as seen by a worker process) and the job of its current task
+_worker_cancelled_jobs = None
+_worker_job_id = None
+# the proxies of the shared objects of the manager (see "_get_proxy")
+__manager_proxies = {}
+# the chunk timings of the local pool (the remote statistics are maintained by the manager)
+__local_statistics = None
+
+
+def run_in_parallel(func, args, unordered=False, disable_multiprocessing=False, callback=None,
+                    chunk_policy=None):
+    """ apply "func" to every item of "args" and yield the results
+
+    Items are transferred to the worker processes in chunks if a "chunk_policy" is given (see
+    "FixedChunkPolicy", "GuidedChunkPolicy" and "AutoTuneChunkPolicy").  This reduces the
+    overhead of cheap tasks.  The results are yielded in the order of "args" unless
+    "unordered" is requested.
+    """
+    global __multiprocessing, __manager
+    if __multiprocessing is None:
+        # threading was not configured before
+        init_threading()
+    if (__manager is None) and pycam.Utils.log.is_debug():
+        # force serial processing in debug mode
+        disable_multiprocessing = True
     if __manager is None:
-        if pycam.Utils.log.is_debug():
-            # force serial processing in debug mode
-            kwargs = dict(kwargs)
-            kwargs["disable_multiprocessing"] = True
-        return run_in_parallel_local(*args, **kwargs)
+        run_function = run_in_parallel_local
+    else:
+        run_function = run_in_parallel_remote
+    if (chunk_policy is None) or disable_multiprocessing or not __multiprocessing:
+        return run_function(func, args, unordered=unordered,
+                            disable_multiprocessing=disable_multiprocessing, callback=callback)
     else:
-        return run_in_parallel_remote(*args, **kwargs)
+        return _run_in_chunks(run_function, func, args, chunk_policy, unordered=unordered,
+                              callback=callback)
 
 
 def is_pool_available():
@@ -142,7 +215,41 @@ def get_pool_statistics():
     if __manager is None:
         return []
     else:
-        return __manager.statistics().get_worker_statistics()
+        return _get_proxy("statistics").get_worker_statistics()
+
+
+def _get_proxy(name):
+    """ return the proxy of a shared object of the manager (e.g. "tasks" or "cache")
+
+    Creating a proxy requires multiple round trips to the manager - thus they are reused.
+    """
+    try:
+        return __manager_proxies[name]
+    except KeyError:
+        proxy = getattr(__manager, name)()
+        __manager_proxies[name] = proxy
+        return proxy
+
+
+def get_chunk_statistics():
+    """ return the recent (size, duration) pairs of the chunks processed for each function """
+    statistics = _get_statistics()
+    if statistics is None:
+        return {}
+    else:
+        return statistics.get_chunk_statistics()
+
+
+def _get_statistics():
+    global __manager, __local_statistics
+    if __manager is not None:
+        return _get_proxy("statistics")
+    elif __multiprocessing:
+        if __local_statistics is None:
+            __local_statistics = ProcessStatistics()
+        return __local_statistics
+    else:
+        return None
 
 
 def get_task_statistics():
@@ -150,16 +257,25 @@ def get_task_statistics():
     result = {}
     if __manager is not None:
         try:
-            result["tasks"] = __manager.tasks().qsize()
-            result["results"] = __manager.results().qsize()
+            result["tasks"] = _get_proxy("tasks").qsize()
+            result["results"] = _get_proxy("results").qsize()
         except NotImplementedError:
             # this can happen on MacOS (see multiprocessing doc)
             pass
-        result["pending"] = __manager.pending_tasks().length()
-        result["cache"] = __manager.cache().length()
+        result["pending"] = _get_proxy("pending_tasks").length()
+        _add_cache_statistics(result, _get_proxy("cache").get_statistics())
+    elif __shared_objects is not None:
+        # the objects published for the local pool
+        _add_cache_statistics(result, __shared_objects.get_statistics())
     return result
 
 
+def _add_cache_statistics(result, cache_statistics):
+    result["cache"] = cache_statistics["items"]
+    for key in ("size", "hits", "misses", "evictions"):
+        result["cache %s" % key] = cache_statistics[key]
+
+
 class ManagerInfo(object):
     """ this separate class allows proper pickling for "multiprocesssing"
     """
@@ -188,11 +304,20 @@ class ManagerInfo(object):
 
 
 def init_threading(number_of_processes=None, enable_server=False, remote=None, run_server=False,
-                   server_credentials="", local_port=DEFAULT_PORT):
+                   server_credentials="", local_port=DEFAULT_PORT, cache_size=DATA_CACHE_SIZE,
+                   task_prefetch=TASK_PREFETCH, worker_cache_size=DATA_CACHE_SIZE):
+    """ configure parallel processing
+
+    @param cache_size: size limit (bytes) of the data shared by all tasks (e.g. models)
+    @param task_prefetch: number of tasks fetched in advance by each worker (server mode)
+    @param worker_cache_size: size limit (bytes) of the data kept by each worker (server mode)
+    """
     global __multiprocessing, __num_of_processes, __manager, __closing, __task_source_uuid
     if __multiprocessing:
         # kill the manager and clean everything up for a re-initialization
         cleanup()
+    else:
+        _stop_local_pool()
     if (not is_server_mode_available()) and (enable_server or run_server):
         # server mode is disabled for the Windows pyinstaller standalone
         # due to "pickle errors". How to reproduce: run the standalone binary
@@ -241,7 +366,7 @@ def init_threading(number_of_processes=None, enable_server=False, remote=None, r
                 __num_of_processes = multiprocessing.cpu_count()
             else:
                 __multiprocessing = False
-        elif (number_of_processes < 1) and (remote is None) and (enable_server is None):
+        elif (number_of_processes < 1) and (remote is None) and not enable_server:
             # Zero processes are allowed if we use a remote server or offer a
             # server.
             __multiprocessing = False
@@ -291,9 +416,9 @@ def init_threading(number_of_processes=None, enable_server=False, remote=None, r
             address = (host, port)
         if remote is None:
             tasks_queue = multiprocessing.Queue()
-            results_queue = multiprocessing.Queue()
+            results_queue = ResultRouter()
             statistics = ProcessStatistics()
-            cache = ProcessDataCache()
+            cache = ProcessDataCache(max_size=cache_size)
             pending_tasks = PendingTasks()
             info = ManagerInfo(tasks_queue, results_queue, statistics, cache, pending_tasks)
             TaskManager.register("tasks", callable=info.get_tasks_queue)
@@ -308,6 +433,7 @@ def init_threading(number_of_processes=None, enable_server=False, remote=None, r
             TaskManager.register("cache")
             TaskManager.register("pending_tasks")
         __manager = TaskManager(address=address, authkey=server_credentials)
+        __manager_proxies.clear()
         # run the local server, connect to a remote one or begin serving
         try:
             if remote is None:
@@ -328,7 +454,8 @@ def init_threading(number_of_processes=None, enable_server=False, remote=None, r
             # only start the spawner, if we want to use local workers
             spawner = __multiprocessing.Process(name="spawn", target=_spawn_daemon,
                                                 args=(__manager, __num_of_processes,
-                                                      worker_uuid_list))
+                                                      worker_uuid_list, task_prefetch,
+                                                      worker_cache_size))
             spawner.start()
         else:
             spawner = None
@@ -342,12 +469,17 @@ def init_threading(number_of_processes=None, enable_server=False, remote=None, r
 
 def cleanup():
     global __multiprocessing, __manager, __closing
+    _stop_local_pool()
+    # release the proxies while the manager is still available
+    __manager_proxies.clear()
     if __multiprocessing and __closing:
         log.debug("Shutting down process handler")
         try:
             __closing.set(True)
         except (IOError, EOFError):
             log.debug("Connection to manager lost during cleanup")
+        # release the proxy while the manager is still available
+        __closing = None
         # Only managers that were started via ".start()" implement a "shutdown".
         # Managers started via ".connect" may skip this.
         if hasattr(__manager, "shutdown"):
@@ -363,7 +495,8 @@ def cleanup():
     __multiprocessing = None
 
 
-def _spawn_daemon(manager, number_of_processes, worker_uuid_list):
+def _spawn_daemon(manager, number_of_processes, worker_uuid_list, task_prefetch=TASK_PREFETCH,
+                  worker_cache_size=DATA_CACHE_SIZE):
     """ wait for items in the 'tasks' queue to appear and then spawn workers
     """
     global __multiprocessing, __closing
@@ -389,7 +522,8 @@ def _spawn_daemon(manager, number_of_processes, worker_uuid_list):
                     task_name = "%s-%s" % (hostname, task_id)
                     worker = __multiprocessing.Process(name=task_name, target=_handle_tasks,
                                                        args=(tasks, results, stats, cache,
-                                                             pending_tasks, __closing))
+                                                             pending_tasks, __closing,
+                                                             task_prefetch, worker_cache_size))
                     worker.start()
                     workers.append(worker)
                 # wait until all workers are finished
@@ -409,68 +543,123 @@ def _spawn_daemon(manager, number_of_processes, worker_uuid_list):
         log.info("Spawner daemon lost connection to server")
 
 
-def _handle_tasks(tasks, results, stats, cache, pending_tasks, closing):
+def _handle_tasks(tasks, results, stats, cache, pending_tasks, closing,
+                  task_prefetch=TASK_PREFETCH, cache_size=DATA_CACHE_SIZE):
+    """ process tasks until the queue stays empty for a while
+
+    A separate thread fetches up to "task_prefetch" tasks in advance and another one delivers
+    the results.  Thus the worker does not wait for the round trips to the manager.  Cached
+    arguments (e.g. models) are kept locally (up to "cache_size" bytes).
+    """
     global __multiprocessing
     name = __multiprocessing.current_process().name
-    local_cache = ProcessDataCache()
+    local_cache = ProcessDataCache(max_size=cache_size)
+    fetched_tasks = Queue.Queue(max(1, task_prefetch))
+    finished_tasks = Queue.Queue()
+    fetcher = threading.Thread(target=_fetch_tasks,
+                               args=(name, tasks, stats, pending_tasks, closing, fetched_tasks))
+    sender = threading.Thread(target=_send_results,
+                              args=(name, results, stats, pending_tasks, finished_tasks))
+    for thread in (fetcher, sender):
+        thread.daemon = True
+        thread.start()
+    log.debug("Worker thread started: %s" % name)
+    try:
+        while True:
+            try:
+                task = fetched_tasks.get(timeout=1.0)
+            except Queue.Empty:
+                continue
+            if task is None:
+                # the fetcher finished
+                break
+            job_id, task_id, func, args = task
+            log.debug("Worker %s processes %s / %s", name, job_id, task_id)
+            start_time = time.time()
+            real_args = _resolve_cached_args(args, local_cache, cache)
+            transfer_time = time.time() - start_time
+            start_time = time.time()
+            result = func(real_args)
+            finished_tasks.put((job_id, task_id, result, transfer_time, time.time() - start_time))
+    except KeyboardInterrupt:
+        pass
+    # deliver the remaining results
+    finished_tasks.put(None)
+    sender.join()
+    log.debug("Worker thread finished: %s", name)
+
+
+def _fetch_tasks(name, tasks, stats, pending_tasks, closing, fetched_tasks):
+    """ move tasks from the shared queue into the local queue of a worker """
     timeout_limit = 60
     timeout_counter = 0
     last_worker_notification = 0
-    log.debug("Worker thread started: %s" % name)
     try:
         while (timeout_counter < timeout_limit) and not closing.get():
             if last_worker_notification + 30 < time.time():
                 stats.worker_notification(name)
                 last_worker_notification = time.time()
-            start_time = time.time()
             try:
-                job_id, task_id, func, args = tasks.get(timeout=0.2)
+                # block instead of sleeping - new tasks are picked up immediately
+                job_id, task_id, func, args = tasks.get(timeout=2.0)
             except Queue.Empty:
-                time.sleep(1.8)
                 timeout_counter += 1
                 continue
             # TODO: if the client aborts/disconnects between "tasks.get" and
             # "pending_tasks.add", the task is lost. We should better use some
             # backup.
             pending_tasks.add(job_id, task_id, (func, args))
-            log.debug("Worker %s processes %s / %s", name, job_id, task_id)
             # reset the timeout counter, if we found another item in the queue
             timeout_counter = 0
-            real_args = []
-            for arg in args:
-                if isinstance(arg, ProcessDataCacheItemID):
-                    try:
-                        value = local_cache.get(arg)
-                    except KeyError:
-                        # TODO: we will break hard, if the item is expired
-                        value = cache.get(arg)
-                        local_cache.add(arg, value)
-                    real_args.append(value)
-                elif isinstance(arg, list) and [True for item in arg
-                                                if isinstance(item, ProcessDataCacheItemID)]:
-                    # check if any item in the list is cacheable
-                    args_list = []
-                    for item in arg:
-                        if isinstance(item, ProcessDataCacheItemID):
-                            try:
-                                value = local_cache.get(item)
-                            except KeyError:
-                                value = cache.get(item)
-                                local_cache.add(item, value)
-                            args_list.append(value)
-                        else:
-                            args_list.append(item)
-                    real_args.append(args_list)
-                else:
-                    real_args.append(arg)
-            stats.add_transfer_time(name, time.time() - start_time)
-            start_time = time.time()
-            results.put((job_id, task_id, func(real_args)))
+            # this blocks as long as enough tasks are waiting for the worker
+            fetched_tasks.put((job_id, task_id, func, args))
+        log.debug("Worker %s is idle for %d seconds", name, 2 * timeout_counter)
+    except (IOError, EOFError):
+        log.debug("Worker %s lost the connection to the manager", name)
+    finally:
+        fetched_tasks.put(None)
+
+
+def _send_results(name, results, stats, pending_tasks, finished_tasks):
+    """ deliver the results of a worker to the manager """
+    while True:
+        item = finished_tasks.get()
+        if item is None:
+            break
+        job_id, task_id, result, transfer_time, process_time = item
+        try:
+            results.put(job_id, task_id, result)
             pending_tasks.remove(job_id, task_id)
-            stats.add_process_time(name, time.time() - start_time)
-    except KeyboardInterrupt:
-        pass
-    log.debug("Worker thread finished after %d seconds of inactivity: %s", timeout_counter, name)
+            stats.add_transfer_time(name, transfer_time)
+            stats.add_process_time(name, process_time)
+        except (IOError, EOFError):
+            log.debug("Worker %s lost the connection to the manager", name)
+            break
+
+
+def _resolve_cached_args(args, local_cache, cache):
+    """ replace the IDs of cached items with their values (see "run_in_parallel_remote") """
+
+    def get_value(item_id):
+        try:
+            return local_cache.get(item_id)
+        except KeyError:
+            # TODO: we will break hard, if the item is expired
+            value = cache.get(item_id)
+            local_cache.add(item_id, value)
+            return value
+
+    real_args = []
+    for arg in args:
+        if isinstance(arg, ProcessDataCacheItemID):
+            real_args.append(get_value(arg))
+        elif isinstance(arg, list) and any(isinstance(item, ProcessDataCacheItemID)
+                                           for item in arg):
+            real_args.append([get_value(item) if isinstance(item, ProcessDataCacheItemID)
+                              else item for item in arg])
+        else:
+            real_args.append(arg)
+    return real_args
 
 
 def run_in_parallel_remote(func, args_list, unordered=False, disable_multiprocessing=False,
@@ -482,13 +671,17 @@ def run_in_parallel_remote(func, args_list, unordered=False, disable_multiproces
     if __multiprocessing and not disable_multiprocessing:
         job_id = str(uuid.uuid1())
         log.debug("Starting parallel tasks: %s", job_id)
-        tasks_queue = __manager.tasks()
-        results_queue = __manager.results()
-        remote_cache = __manager.cache()
-        stats = __manager.statistics()
-        pending_tasks = __manager.pending_tasks()
+        tasks_queue = _get_proxy("tasks")
+        results_queue = _get_proxy("results")
+        remote_cache = _get_proxy("cache")
+        stats = _get_proxy("statistics")
+        pending_tasks = _get_proxy("pending_tasks")
+        # the results of this job are delivered to us only
+        results_queue.open_job(job_id)
         # add all tasks of this job to the queue
+        task_count = 0
         for index, args in enumerate(args_list):
+            task_count += 1
             if callback:
                 callback()
             start_time = time.time()
@@ -522,12 +715,13 @@ def run_in_parallel_remote(func, args_list, unordered=False, disable_multiproces
                     result_args.append(arg)
             tasks_queue.put((job_id, index, func, result_args))
             stats.add_queueing_time(__task_source_uuid, time.time() - start_time)
-        log.debug("Added %d tasks for job %s", len(args_list), job_id)
+        log.debug("Added %d tasks for job %s", task_count, job_id)
         result_buffer = {}
+        received_tasks = set()
         index = 0
         cancelled = False
         # wait for all results of this job
-        while (index < len(args_list)) and not cancelled:
+        while (index < task_count) and not cancelled:
             if callback and callback():
                 # cancel requested
                 cancelled = True
@@ -548,12 +742,12 @@ def run_in_parallel_remote(func, args_list, unordered=False, disable_multiproces
                     # non-local task
                     log.debug("Ignoring stale non-local task: %s / %s",
                               stale_job_id, stale_task_id)
-            try:
-                result_job_id, task_id, result = results_queue.get(timeout=1.0)
-            except Queue.Empty:
-                time.sleep(1.0)
-                continue
-            if result_job_id == job_id:
+            # wait for the next results (this call returns early, if results are available)
+            for task_id, result in results_queue.get(job_id, timeout=0.5):
+                if task_id in received_tasks:
+                    # a reinjected stale task was finished twice
+                    continue
+                received_tasks.add(task_id)
                 log.debug("Received the result of a task: %s / %s", job_id, task_id)
                 try:
                     if unordered:
@@ -565,9 +759,8 @@ def run_in_parallel_remote(func, args_list, unordered=False, disable_multiproces
                         if task_id == index:
                             yield result
                             index += 1
-                            while index in result_buffer.keys():
-                                yield result_buffer[index]
-                                del result_buffer[index]
+                            while index in result_buffer:
+                                yield result_buffer.pop(index)
                                 index += 1
                         else:
                             result_buffer[task_id] = result
@@ -575,19 +768,11 @@ def run_in_parallel_remote(func, args_list, unordered=False, disable_multiproces
                     # This exception is triggered when the caller stops
                     # requesting more items from the generator.
                     log.debug("Parallel processing cancelled: %s", job_id)
-                    _cleanup_job(job_id, tasks_queue, pending_tasks, __finished_jobs)
+                    _cleanup_job(job_id, tasks_queue, results_queue, pending_tasks,
+                                 __finished_jobs)
                     # re-raise the GeneratorExit exception to finish destruction
                     raise
-            elif result_job_id in __finished_jobs:
-                # throw away this result of an old job
-                log.debug("Throwing away one result of an old job: %s", result_job_id)
-            else:
-                log.debug("Skipping result of non-local job: %s", result_job_id)
-                # put the result back to the queue for the next manager
-                results_queue.put((result_job_id, task_id, result))
-                # wait a little bit to get some idle CPU cycles
-                time.sleep(0.2)
-        _cleanup_job(job_id, tasks_queue, pending_tasks, __finished_jobs)
+        _cleanup_job(job_id, tasks_queue, results_queue, pending_tasks, __finished_jobs)
         if cancelled:
             log.debug("Parallel processing cancelled: %s", job_id)
         else:
@@ -597,7 +782,9 @@ def run_in_parallel_remote(func, args_list, unordered=False, disable_multiproces
             yield func(args)
 
 
-def _cleanup_job(job_id, tasks_queue, pending_tasks, finished_jobs):
+def _cleanup_job(job_id, tasks_queue, results_queue, pending_tasks, finished_jobs):
+    # discard all further results of this job
+    results_queue.close_job(job_id)
     # flush the task queue
     try:
         queue_len = tasks_queue.qsize()
@@ -626,6 +813,124 @@ def _cleanup_job(job_id, tasks_queue, pending_tasks, finished_jobs):
         finished_jobs.pop(0)
 
 
+def _init_local_worker(cancelled_jobs=None):
+    global _worker_cancelled_jobs
+    # the parent process takes care for KeyboardInterrupt (e.g. via "cleanup")
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _worker_cancelled_jobs = cancelled_jobs
+
+
+def _get_local_pool():
+    """ return the pool of local worker processes - it is started only once """
+    global __pool, __shared_objects, __cancelled_local_jobs
+    with __pool_lock:
+        if __pool is None:
+            log.debug("Starting a pool of %d local worker processes", __num_of_processes)
+            __cancelled_local_jobs = __multiprocessing.RawArray("l", LOCAL_POOL_CANCEL_SLOTS)
+            __pool = __multiprocessing.Pool(__num_of_processes, initializer=_init_local_worker,
+                                            initargs=(__cancelled_local_jobs, ))
+            __shared_objects = SharedObjectStore()
+        return __pool
+
+
+def _get_local_job_id():
+    global __last_local_job_id
+    with __pool_lock:
+        __last_local_job_id += 1
+        return __last_local_job_id
+
+
+def _cancel_local_job(job_id):
+    """ let the local workers skip the remaining tasks of a job
+
+    Every job uses the slot "job_id % LOCAL_POOL_CANCEL_SLOTS".  Thus the flag of a job is
+    overwritten only after many newer jobs were cancelled.
+    """
+    with __pool_lock:
+        if __cancelled_local_jobs is not None:
+            __cancelled_local_jobs[job_id % len(__cancelled_local_jobs)] = job_id
+
+
+def _is_local_job_cancelled(job_id):
+    """ check the cancel flag of a job - this is used in the local worker processes """
+    return ((_worker_cancelled_jobs is not None) and (job_id is not None)
+            and (_worker_cancelled_jobs[job_id % len(_worker_cancelled_jobs)] == job_id))
+
+
+def _stop_local_pool():
+    global __pool, __shared_objects, __cancelled_local_jobs
+    with __pool_lock:
+        if __pool is not None:
+            log.debug("Stopping the pool of local worker processes")
+            __pool.terminate()
+            __pool = None
+            __cancelled_local_jobs = None
+        if __shared_objects is not None:
+            __shared_objects.clear()
+            __shared_objects = None
+
+
+def _get_shared_args(args, shared_objects):
+    """ replace all cacheable items of the arguments with handles of published objects
+
+    This works like the argument caching of "run_in_parallel_remote".
+    """
+    if type(args) not in (list, tuple):
+        return args
+    result = []
+    for arg in args:
+        if hasattr(arg, "uuid"):
+            result.append(shared_objects.publish(arg))
+        elif (type(arg) in (list, set, tuple)) and any(hasattr(item, "uuid") for item in arg):
+            result.append(type(arg)(shared_objects.publish(item) if hasattr(item, "uuid")
+                                    else item for item in arg))
+        else:
+            result.append(arg)
+    return type(args)(result)
+
+
+def _resolve_shared_args(args):
+    """ the reverse of "_get_shared_args" - used in the local worker processes """
+    if type(args) not in (list, tuple):
+        return args
+    result = []
+    for arg in args:
+        if isinstance(arg, SharedObjectHandle):
+            result.append(arg.load())
+        elif ((type(arg) in (list, set, tuple))
+              and any(isinstance(item, SharedObjectHandle) for item in arg)):
+            result.append(type(arg)(item.load() if isinstance(item, SharedObjectHandle)
+                                    else item for item in arg))
+        else:
+            result.append(arg)
+    return type(args)(result)
+
+
+def _run_local_task(task):
+    global _worker_job_id
+    job_id, func, args = task
+    if _is_local_job_cancelled(job_id):
+        # the job was cancelled while this task was waiting in the pool
+        return None
+    _worker_job_id = job_id
+    try:
+        return func(_resolve_shared_args(args))
+    finally:
+        _worker_job_id = None
+
+
+def _run_local_task_captured(task):
+    """ return the result or the exception of a task
+
+    The callback of "apply_async" is skipped for failed tasks (Python2) - thus the
+    exception is delivered like a result.
+    """
+    try:
+        return True, _run_local_task(task)
+    except Exception as exc:
+        return False, exc
+
+
 def run_in_parallel_local(func, args, unordered=False, disable_multiprocessing=False,
                           callback=None):
     global __multiprocessing, __num_of_processes
@@ -633,25 +938,58 @@ def run_in_parallel_local(func, args, unordered=False, disable_multiprocessing=F
         # threading was not configured before
         init_threading()
     if __multiprocessing and not disable_multiprocessing:
-        # use the number of CPUs as the default number of worker threads
-        pool = __multiprocessing.Pool(__num_of_processes)
-        if unordered:
-            imap_func = pool.imap_unordered
+        pool = _get_local_pool()
+        job_id = _get_local_job_id()
+        # Only a limited number of tasks is submitted in advance.  The workers skip the
+        # remaining tasks of a cancelled job.  Thus they do not block the pool.
+        if func is _process_chunk:
+            # chunks are expensive: only a few of them are queued
+            max_pending = LOCAL_POOL_CHUNKS_PER_PROCESS * __num_of_processes
         else:
-            imap_func = pool.imap
-        # We need to use try/finally here to ensure the garbage collection
-        # of "pool". Otherwise a memory overflow is caused for Python 2.7.
+            max_pending = LOCAL_POOL_TASKS_PER_PROCESS * __num_of_processes
+        args_iter = iter(args)
+        pending = collections.deque()
+        # unordered: the pool delivers the finished tasks into this queue
+        finished = Queue.Queue()
         try:
-            # Beware: we may not return "pool.imap" or "pool.imap_unordered"
-            # directly. It would somehow loose the focus and just hang infinitely.
-            # Thus we wrap our own generator around it.
-            for result in imap_func(func, args):
+            while True:
+                for arg in args_iter:
+                    task = (job_id, func, _get_shared_args(arg, __shared_objects))
+                    if unordered:
+                        pending.append(pool.apply_async(_run_local_task_captured, (task, ),
+                                                        callback=finished.put))
+                    else:
+                        pending.append(pool.apply_async(_run_local_task, (task, )))
+                    if len(pending) >= max_pending:
+                        break
+                if not pending:
+                    break
+                # the callback is polled while waiting for slow tasks
+                if unordered:
+                    while True:
+                        try:
+                            success, result = finished.get(timeout=LOCAL_POOL_POLL_INTERVAL)
+                            break
+                        except Queue.Empty:
+                            if callback and callback():
+                                return
+                    pending.pop()
+                    if not success:
+                        raise result
+                else:
+                    while not pending[0].ready():
+                        pending[0].wait(LOCAL_POOL_POLL_INTERVAL)
+                        if callback and not pending[0].ready() and callback():
+                            return
+                    result = pending.popleft().get()
                 if callback and callback():
                     # cancel requested
                     break
                 yield result
         finally:
-            pool.terminate()
+            if pending:
+                # cancelled, failed or closed by the consumer
+                _cancel_local_job(job_id)
     else:
         for arg in args:
             if callback and callback():
@@ -660,6 +998,273 @@ def run_in_parallel_local(func, args, unordered=False, disable_multiprocessing=F
             yield func(arg)
 
 
+class ConcurrentJob(object):
+    """ the state of a job run by "run_jobs_concurrently" """
+
+    def __init__(self, index, func):
+        self.index = index
+        self.func = func
+        self.text = None
+        self.percent = None
+        self.result = None
+        self.error = None
+        self.started = False
+        self.finished = False
+        self.cancel_requested = False
+        self._thread = None
+
+    def update(self, text=None, percent=None):
+        """ store the progress of the job - returns True if cancel was requested """
+        if text:
+            self.text = text
+        if percent is not None:
+            self.percent = percent
+        return self.cancel_requested
+
+    def cancel(self):
+        self.cancel_requested = True
+
+    def _start(self, finished_condition):
+        self.started = True
+        self._thread = threading.Thread(target=self._run, args=(finished_condition, ),
+                                        name="pycam-job-%d" % self.index)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self, finished_condition):
+        try:
+            self.result = self.func(self)
+        except Exception:
+            self.error = pycam.Utils.get_exception_report()
+        with finished_condition:
+            self.finished = True
+            finished_condition.notify()
+
+    def _join(self):
+        if self._thread is not None:
+            self._thread.join()
+
+
+def run_jobs_concurrently(funcs, max_jobs=None, poll=None, poll_interval=0.2):
+    """ run independent jobs in threads of this process and yield them in order when finished
+
+    Every function is called with its ConcurrentJob - it should pass the progress via
+    "job.update" and stop as soon as "update" returns True.  The heavy lifting of a job is
+    supposed to be done via "run_in_parallel": thus the serial phases of the jobs (in this
+    process) overlap with the calculations of the other jobs in the worker processes.  All jobs
+    share the models published for the workers.
+    At most "max_jobs" jobs are running at the same time (default: the number of processes).
+    "poll" is called regularly (in the thread of the caller) with the list of all jobs.  All
+    remaining jobs are cancelled if it returns True.  They are cancelled, too, if the caller
+    stops consuming the results.  Jobs cancelled before their start are not started at all.
+    The "result" of each job is the return value of its function.  An exception of a function
+    is stored in "error" (as a text report).  Log messages of the jobs are delivered to the GUI
+    handlers in the thread of the caller.
+    """
+    if __multiprocessing is None:
+        # initialize threading before the jobs start in parallel
+        init_threading()
+    if max_jobs is None:
+        max_jobs = get_number_of_processes()
+    jobs = [ConcurrentJob(index, func) for index, func in enumerate(funcs)]
+    waiting = collections.deque(jobs)
+    running = []
+    finished_condition = threading.Condition()
+    next_index = 0
+    try:
+        while next_index < len(jobs):
+            with finished_condition:
+                running = [job for job in running if not job.finished]
+                while waiting and (len(running) < max(1, max_jobs)):
+                    job = waiting.popleft()
+                    if job.cancel_requested:
+                        job.finished = True
+                    else:
+                        job._start(finished_condition)
+                        running.append(job)
+                if not jobs[next_index].finished:
+                    finished_condition.wait(poll_interval)
+            pycam.Utils.log.emit_deferred_records()
+            if poll and poll(jobs):
+                for job in jobs:
+                    job.cancel()
+            while (next_index < len(jobs)) and jobs[next_index].finished:
+                jobs[next_index]._join()
+                yield jobs[next_index]
+                next_index += 1
+    finally:
+        # the consumer stopped early (or an exception occurred): stop all remaining jobs
+        for job in jobs:
+            if not job.finished:
+                job.cancel()
+        for job in jobs:
+            job._join()
+        pycam.Utils.log.emit_deferred_records()
+
+
+class FixedChunkPolicy(object):
+    """ transfer a fixed number of items per task """
+
+    def __init__(self, size):
+        self.size = max(1, int(size))
+
+    def get_chunk_size(self, remaining, processes):
+        return self.size
+
+    def add_timing(self, size, duration):
+        pass
+
+
+class GuidedChunkPolicy(object):
+    """ guided scheduling: every chunk contains a fraction of the remaining items
+
+    Large chunks are used at the beginning.  The chunks get smaller towards the end of the job.
+    Thus idle workers can pick up the remaining work in small pieces.
+    """
+
+    def __init__(self, min_size=1, max_size=None):
+        self.min_size = max(1, int(min_size))
+        self.max_size = max_size
+
+    def get_chunk_size(self, remaining, processes):
+        # "-(-a // b)" is the integer ceiling of the division
+        size = max(self.min_size, -(-remaining // (2 * max(1, processes))))
+        if self.max_size is not None:
+            size = min(self.max_size, size)
+        return size
+
+    def add_timing(self, size, duration):
+        pass
+
+
+class AutoTuneChunkPolicy(object):
+    """ choose the chunk size based on the measured duration of previously processed chunks
+
+    Every chunk should take roughly "target_duration" seconds.  The first chunks contain only
+    a single item (until the first timing is known).  The same policy object may be used for
+    multiple jobs of the same kind - it keeps its estimate.
+    """
+
+    def __init__(self, target_duration=0.1, max_size=512, smoothing=0.3):
+        self.target_duration = target_duration
+        self.max_size = max_size
+        self.smoothing = smoothing
+        self.item_duration = None
+
+    def get_chunk_size(self, remaining, processes):
+        if self.item_duration is None:
+            return 1
+        elif self.item_duration <= 0:
+            size = self.max_size
+        else:
+            size = int(self.target_duration / self.item_duration)
+        # leave at least one chunk for every process
+        size = min(size, self.max_size, -(-remaining // max(1, processes)))
+        return max(1, size)
+
+    def add_timing(self, size, duration):
+        item_duration = float(duration) / max(1, size)
+        if self.item_duration is None:
+            self.item_duration = item_duration
+        else:
+            self.item_duration += self.smoothing * (item_duration - self.item_duration)
+
+
+class SharedChunkItemID(object):
+    """ the placeholder of an argument that was moved to the shared items of a chunk """
+
+    def __init__(self, index):
+        self.index = index
+
+
+def _split_shared_items(args_list):
+    """ replace the cacheable items of all arguments with references to a common list
+
+    The common list is a separate argument of the chunk task.  Thus its items are cached (remote)
+    or published (local) only once - just like the arguments of a single task.
+    """
+    shared_items = []
+    positions = {}
+
+    def get_reference(item):
+        if not hasattr(item, "uuid"):
+            return item
+        if id(item) not in positions:
+            positions[id(item)] = len(shared_items)
+            shared_items.append(item)
+        return SharedChunkItemID(positions[id(item)])
+
+    result = []
+    for args in args_list:
+        if type(args) in (list, tuple):
+            new_args = []
+            for arg in args:
+                if type(arg) in (list, set, tuple):
+                    new_args.append(type(arg)(get_reference(item) for item in arg))
+                else:
+                    new_args.append(get_reference(arg))
+            args = type(args)(new_args)
+        result.append(args)
+    return shared_items, result
+
+
+def _resolve_shared_items(args, shared_items):
+    """ the reverse of "_split_shared_items" for the arguments of a single item """
+    if type(args) not in (list, tuple):
+        return args
+    result = []
+    for arg in args:
+        if isinstance(arg, SharedChunkItemID):
+            arg = shared_items[arg.index]
+        elif type(arg) in (list, set, tuple):
+            arg = type(arg)(shared_items[item.index] if isinstance(item, SharedChunkItemID)
+                            else item for item in arg)
+        result.append(arg)
+    return type(args)(result)
+
+
+def _process_chunk(chunk_args):
+    func, shared_items, args_list = chunk_args
+    start_time = time.time()
+    results = []
+    for args in args_list:
+        if _is_local_job_cancelled(_worker_job_id):
+            # the results of a cancelled job are discarded anyway
+            break
+        results.append(func(_resolve_shared_items(args, shared_items)))
+    return time.time() - start_time, results
+
+
+def _get_chunks(func, args, chunk_policy):
+    """ split the arguments into chunks - the size of each chunk is chosen on demand """
+    remaining = len(args)
+    index = 0
+    while remaining > 0:
+        size = min(remaining, chunk_policy.get_chunk_size(remaining, get_number_of_processes()))
+        shared_items, args_list = _split_shared_items(args[index:index + size])
+        yield (func, shared_items, args_list)
+        index += size
+        remaining -= size
+
+
+def _run_in_chunks(run_function, func, args, chunk_policy, unordered=False, callback=None):
+    if not isinstance(args, (list, tuple)):
+        args = list(args)
+    statistics = _get_statistics()
+    name = getattr(func, "__name__", str(func))
+    results_iter = run_function(_process_chunk, _get_chunks(func, args, chunk_policy),
+                                unordered=unordered, callback=callback)
+    try:
+        for duration, results in results_iter:
+            chunk_policy.add_timing(len(results), duration)
+            statistics.add_chunk_time(name, len(results), duration)
+            for result in results:
+                yield result
+    finally:
+        # stop the remaining tasks of a cancelled job
+        results_iter.close()
+
+
 class OneProcess(object):
     def __init__(self, name, is_queue=False):
         self.is_queue = is_queue
@@ -693,6 +1298,7 @@ class ProcessStatistics(object):
         self.processes = {}
         self.queues = {}
         self.workers = {}
+        self.chunks = {}
         self.timeout = timeout
 
     def __str__(self):
@@ -730,6 +1336,15 @@ class ProcessStatistics(object):
         self.queues[name].transfer_count += 1
         self.queues[name].transfer_time += amount
 
+    def add_chunk_time(self, name, size, duration):
+        """ store the size and the processing time of a chunk of tasks (see "run_in_parallel") """
+        if name not in self.chunks:
+            self.chunks[name] = collections.deque(maxlen=CHUNK_STATISTICS_LENGTH)
+        self.chunks[name].append((size, duration))
+
+    def get_chunk_statistics(self):
+        return dict((name, list(timings)) for name, timings in list(self.chunks.items()))
+
     def worker_notification(self, name):
         timestamp = time.time()
         self.workers[name] = timestamp
@@ -757,6 +1372,57 @@ class ProcessStatistics(object):
         return result
 
 
+class ResultRouter(object):
+    """ deliver the results of the workers to the client that submitted the job
+
+    Every client receives only the results of its own jobs.  Results of unknown (e.g.
+    finished or cancelled) jobs are discarded.  This object lives within the manager process.
+    """
+
+    def __init__(self):
+        # we assume that multiprocessing was imported before
+        import multiprocessing
+        self._lock = multiprocessing.Lock()
+        self._jobs = {}
+
+    def open_job(self, job_id):
+        with self._lock:
+            if job_id not in self._jobs:
+                self._jobs[job_id] = Queue.Queue()
+
+    def close_job(self, job_id):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def put(self, job_id, task_id, result):
+        queue = self._jobs.get(job_id)
+        if queue is None:
+            log.debug("Throwing away one result of an unknown job: %s", job_id)
+        else:
+            queue.put((task_id, result))
+
+    def get(self, job_id, timeout=None):
+        """ wait for results of a job and return all available (task_id, result) pairs
+
+        An empty list is returned if no result arrived within "timeout" seconds.
+        """
+        queue = self._jobs.get(job_id)
+        if queue is None:
+            return []
+        try:
+            results = [queue.get(timeout=timeout)]
+        except Queue.Empty:
+            return []
+        while True:
+            try:
+                results.append(queue.get_nowait())
+            except Queue.Empty:
+                return results
+
+    def qsize(self):
+        return sum(queue.qsize() for queue in list(self._jobs.values()))
+
+
 class PendingTasks(object):
 
     def __init__(self, stale_timeout=300):
@@ -797,7 +1463,7 @@ class PendingTasks(object):
         stale_start_time = time.time() - self._stale_timeout
         stale_tasks = []
         # use a copy to prevent "dictionary changed size in iteration" errors
-        current_jobs = list(self._jobs.iteritems())
+        current_jobs = list(self._jobs.items())
         for (job_id, task_id), (start_time, info) in current_jobs:
             if start_time < stale_start_time:
                 stale_tasks.append((job_id, task_id, info))
@@ -815,58 +1481,259 @@ class PendingTasks(object):
 
 
 class ProcessDataCache(object):
+    """ LRU cache for data shared by many tasks (e.g. models and cutters)
 
-    def __init__(self, timeout=600):
-        self.cache = {}
-        self.timeout = timeout
+    The items are kept in the order of their last use.  The least recently used items are
+    discarded as soon as the total size of all items exceeds "max_size" (bytes).  Optionally
+    items are discarded, if they were not used for "timeout" seconds.
+    """
 
-    def _update_timestamp(self, name):
-        if isinstance(name, ProcessDataCacheItemID):
-            name = name.value
-        now = time.time()
-        try:
-            self.cache[name][1] = now
-        except KeyError:
-            # the item was deleted meanwhile
-            pass
+    def __init__(self, max_size=DATA_CACHE_SIZE, timeout=None):
+        # we assume that multiprocessing was imported before
+        import multiprocessing
+        self._lock = multiprocessing.Lock()
+        # name -> (value, size, timestamp of last use)
+        self.cache = collections.OrderedDict()
+        self.max_size = max_size
+        self.timeout = timeout
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _touch(self, name):
+        """ move an item to the end of the queue (most recently used) """
+        value, size, timestamp = self.cache.pop(name)
+        self.cache[name] = (value, size, time.time())
+        return value
+
+    def _discard_oldest(self):
+        name, (value, size, timestamp) = self.cache.popitem(last=False)
+        self.size -= size
+        self.evictions += 1
+        log.debug("Discarding cache item: %s", name)
 
     def expire_cache_items(self):
-        expired = time.time() - self.timeout
-        # use a copy in order to avoid "changed size during iteration" errors
-        for key in list(self.cache):
-            try:
-                if self.cache[key][1] < expired:
-                    del self.cache[key]
-            except KeyError:
-                # ignore removed items
-                pass
+        with self._lock:
+            self._expire_cache_items()
+
+    def _expire_cache_items(self):
+        # the oldest items are always at the front of the queue
+        while self.cache:
+            timestamp = self.cache[next(iter(self.cache))][2]
+            # the most recently used item is kept - even if it exceeds the size limit on its own
+            if ((self.size > self.max_size) and (len(self.cache) > 1)) or (
+                    (self.timeout is not None) and (timestamp < time.time() - self.timeout)):
+                self._discard_oldest()
+            else:
+                break
 
     def contains(self, name):
         if isinstance(name, ProcessDataCacheItemID):
             name = name.value
-        self._update_timestamp(name)
-        self.expire_cache_items()
-        return name in self.cache.keys()
+        with self._lock:
+            self._expire_cache_items()
+            if name in self.cache:
+                self._touch(name)
+                self.hits += 1
+                return True
+            else:
+                self.misses += 1
+                return False
 
-    def add(self, name, value):
-        now = time.time()
+    def add(self, name, value, size=None):
         if isinstance(name, ProcessDataCacheItemID):
             name = name.value
-        self.expire_cache_items()
-        self.cache[name] = [value, now]
+        if size is None:
+            size = _estimate_size(value)
+        with self._lock:
+            if name in self.cache:
+                self.size -= self.cache.pop(name)[1]
+            self.cache[name] = (value, size, time.time())
+            self.size += size
+            self._expire_cache_items()
 
     def get(self, name):
         if isinstance(name, ProcessDataCacheItemID):
             name = name.value
-        self._update_timestamp(name)
-        self.expire_cache_items()
-        return self.cache[name][0]
+        with self._lock:
+            try:
+                value = self._touch(name)
+            except KeyError:
+                self.misses += 1
+                raise
+            self.hits += 1
+            return value
 
     def length(self):
         return len(self.cache)
 
+    def get_statistics(self):
+        return {"items": len(self.cache), "size": self.size, "max_size": self.max_size,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+def _estimate_size(value, depth=3):
+    """ return the approximate memory usage (bytes) of an object - without pickling it
+
+    Numpy arrays (e.g. the triangles of a TriangleMesh) are counted exactly.  The size of a
+    sequence is extrapolated from its first item.  Nested objects are inspected down to the
+    given depth.
+    """
+    if (numpy is not None) and isinstance(value, numpy.ndarray):
+        return value.nbytes
+    size = sys.getsizeof(value)
+    if depth <= 0:
+        return size
+    if isinstance(value, dict):
+        value = list(value.values())
+    if isinstance(value, (list, tuple, set, frozenset, collections.deque)):
+        if value:
+            size += len(value) * _estimate_size(next(iter(value)), depth - 1)
+    else:
+        size += sum(_estimate_size(attribute, depth - 1)
+                    for attribute in getattr(value, "__dict__", {}).values())
+    return size
+
 
 class ProcessDataCacheItemID(object):
 
     def __init__(self, value):
         self.value = value
+
+
+class SharedObjectHandle(object):
+    """ reference to an object published for the worker processes of the local pool """
+
+    def __init__(self, key, filename):
+        self.key = key
+        self.filename = filename
+
+    def load(self):
+        """ return the object (it is loaded only once by each worker process) """
+        try:
+            value = _worker_objects.pop(self.key)
+        except KeyError:
+            value = SharedObjectStore.load(self.filename)
+            while len(_worker_objects) >= SharedObjectStore.WORKER_CACHE_SIZE:
+                _worker_objects.popitem(last=False)
+        _worker_objects[self.key] = value
+        return value
+
+
+class SharedObjectStore(object):
+    """ publish objects for the worker processes of the local pool
+
+    Each object is pickled only once into a file of a temporary directory (in
+    shared memory, if available). Large numpy arrays (e.g. the triangles of a
+    model) are stored separately and mapped into the memory of the workers.
+    The least recently used objects are removed, if the number of objects or their
+    total size (in bytes) exceeds the limits.
+    """
+
+    # the number of published objects kept by each worker process
+    WORKER_CACHE_SIZE = 16
+
+    def __init__(self, max_items=64, max_size=DATA_CACHE_SIZE):
+        self._directory = None
+        # key -> (handle, filenames, size)
+        self._items = collections.OrderedDict()
+        self._counter = 0
+        self.max_items = max_items
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def _get_directory(self):
+        if self._directory is None:
+            shm_dir = "/dev/shm"
+            self._directory = tempfile.mkdtemp(
+                prefix="pycam-", dir=(shm_dir if os.path.isdir(shm_dir) else None))
+            atexit.register(self.clear)
+        return self._directory
+
+    def publish(self, obj):
+        # concurrent jobs share the published objects
+        with self._lock:
+            return self._publish(obj)
+
+    def _publish(self, obj):
+        key = "%s-%s" % (obj.__class__.__name__, obj.uuid)
+        try:
+            item = self._items.pop(key)
+        except KeyError:
+            self.misses += 1
+            handle, filenames = self._dump(key, obj)
+            size = sum(os.path.getsize(filename) for filename in filenames)
+            item = (handle, filenames, size)
+            self.size += size
+            # the new item is kept - even if it exceeds the size limit on its own
+            while self._items and ((len(self._items) >= self.max_items)
+                                   or (self.size > self.max_size)):
+                old_handle, old_filenames, old_size = self._items.popitem(last=False)[1]
+                self._remove_files(old_filenames)
+                self.size -= old_size
+                self.evictions += 1
+        else:
+            self.hits += 1
+        self._items[key] = item
+        return item[0]
+
+    def _dump(self, key, obj):
+        prefix = os.path.join(self._get_directory(), str(self._counter))
+        self._counter += 1
+        filenames = []
+
+        def persistent_id(value):
+            if ((numpy is not None) and (type(value) is numpy.ndarray)
+                    and (value.nbytes >= SHARED_ARRAY_MIN_SIZE) and not value.dtype.hasobject):
+                filename = "%s-%d.npy" % (prefix, len(filenames))
+                numpy.save(filename, value)
+                filenames.append(filename)
+                return filename
+            return None
+
+        filename = prefix + ".pickle"
+        with open(filename, "wb") as pickle_file:
+            pickler = pickle.Pickler(pickle_file, pickle.HIGHEST_PROTOCOL)
+            pickler.persistent_id = persistent_id
+            pickler.dump(obj)
+        filenames.append(filename)
+        log.debug("Published %s for local workers: %s", key, filename)
+        return SharedObjectHandle(key, filename), filenames
+
+    @staticmethod
+    def load(filename):
+        with open(filename, "rb") as pickle_file:
+            unpickler = pickle.Unpickler(pickle_file)
+            unpickler.persistent_load = lambda array_filename: numpy.load(array_filename,
+                                                                          mmap_mode="r")
+            return unpickler.load()
+
+    @staticmethod
+    def _remove_files(filenames):
+        for filename in filenames:
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+
+    def get_statistics(self):
+        return {"items": len(self._items), "size": self.size, "max_size": self.max_size,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    def _clear(self):
+        for handle, filenames, size in self._items.values():
+            self._remove_files(filenames)
+        self._items.clear()
+        self.size = 0
+        if self._directory is not None:
+            shutil.rmtree(self._directory, ignore_errors=True)
+            self._directory = None
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright 2017 The PyCAM developers
+
+This file is part of PyCAM.
+
+PyCAM is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyCAM is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+import time
+
+import numpy
+
+BASE_DIR = os.path.realpath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, BASE_DIR)
+
+from pycam.Cutters.CylindricalCutter import CylindricalCutter  # noqa: E402
+from pycam.Cutters.SphericalCutter import SphericalCutter  # noqa: E402
+from pycam.Cutters.ToroidalCutter import ToroidalCutter  # noqa: E402
+from pycam.Importers.STLImporter import ImportModel  # noqa: E402
+from pycam.PathGenerators import get_max_height_many  # noqa: E402
+from pycam.PathGenerators.HeightField import HeightField  # noqa: E402
+
+
+DESCRIPTION = """Compare the height field approximation with the exact drop cutter.
+The heights of a regular grid of positions above each model are calculated with both
+engines. The script prints the runtime of both and the deviation of the height field."""
+
+DEFAULT_MODELS = ("SampleScene.stl", "TestModel.stl", "pycam-textbox.stl", "Sphere0.stl")
+
+
+def get_cutters(radius):
+    return (("flat", CylindricalCutter(radius)),
+            ("ball", SphericalCutter(radius)),
+            ("bull", ToroidalCutter(radius, radius / 4.0)))
+
+
+def get_positions(model, count):
+    xs = numpy.linspace(model.minx, model.maxx, count)
+    ys = numpy.linspace(model.miny, model.maxy, count)
+    grid_x, grid_y = numpy.meshgrid(xs, ys)
+    return list(zip(grid_x.ravel().tolist(), grid_y.ravel().tolist()))
+
+
+def run_benchmark(model, cutter, positions, resolutions):
+    minz, maxz = model.minz, model.maxz + cutter.radius
+    start_time = time.time()
+    exact = get_max_height_many(model, cutter, positions, minz, maxz)
+    exact_time = time.time() - start_time
+    exact = numpy.array([numpy.nan if point is None else point[2] for point in exact])
+    results = []
+    for resolution in resolutions:
+        start_time = time.time()
+        height_field = HeightField(model, cutter, resolution, minz, maxz)
+        approximated = height_field.get_heights(positions)
+        height_field_time = time.time() - start_time
+        deviation = numpy.abs(approximated - exact)
+        deviation = deviation[numpy.isfinite(deviation)]
+        results.append((resolution, height_field_time, deviation.mean(),
+                        numpy.percentile(deviation, 99), deviation.max()))
+    return exact_time, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument("models", nargs="*", help="STL files (default: some bundled samples)")
+    parser.add_argument("--radius", type=float, default=1.0, help="radius of the cutters")
+    parser.add_argument("--resolution", type=float, action="append", dest="resolutions",
+                        help="grid distance of the height field (may be repeated)")
+    parser.add_argument("--positions", type=int, default=200,
+                        help="number of positions along each axis")
+    args = parser.parse_args()
+    resolutions = args.resolutions or [args.radius / 10.0, args.radius / 20.0]
+    models = args.models or [os.path.join(BASE_DIR, "samples", name) for name in DEFAULT_MODELS]
+    print("%-20s %-5s %10s %10s %10s %10s %10s %10s" % (
+        "model", "tool", "resolution", "exact [s]", "field [s]", "mean err", "p99 err",
+        "max err"))
+    for filename in models:
+        model = ImportModel(filename)
+        positions = get_positions(model, args.positions)
+        for cutter_name, cutter in get_cutters(args.radius):
+            exact_time, results = run_benchmark(model, cutter, positions, resolutions)
+            for resolution, field_time, mean_error, p99_error, max_error in results:
+                print("%-20s %-5s %10.4f %10.3f %10.3f %10.5f %10.5f %10.5f" % (
+                    os.path.basename(filename)[:20], cutter_name, resolution, exact_time,
+                    field_time, mean_error, p99_error, max_error))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,584 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright 2017 The PyCAM developers
+
+This file is part of PyCAM.
+
+PyCAM is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyCAM is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from __future__ import print_function
+
+import argparse
+import collections
+import cProfile
+import fnmatch
+import json
+import os
+import platform
+import pstats
+import random
+import subprocess
+import sys
+import tempfile
+import timeit
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+BASE_DIR = os.path.realpath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, BASE_DIR)
+
+from pycam import VERSION  # noqa: E402
+from pycam.Cutters.CylindricalCutter import CylindricalCutter  # noqa: E402
+from pycam.Cutters.SphericalCutter import SphericalCutter  # noqa: E402
+from pycam.Cutters.ToroidalCutter import ToroidalCutter  # noqa: E402
+from pycam.Exporters.GCode.LinuxCNC import LinuxCNC  # noqa: E402
+from pycam.Geometry import Box3D, epsilon, Point3D  # noqa: E402
+from pycam.Geometry.Model import get_combined_model  # noqa: E402
+from pycam.Geometry.PointUtils import pdist  # noqa: E402
+import pycam.Importers.DXFImporter  # noqa: E402
+import pycam.Importers.STLImporter  # noqa: E402
+from pycam.PathGenerators.DropCutter import DropCutter  # noqa: E402
+from pycam.PathGenerators.PushCutter import PushCutter  # noqa: E402
+from pycam.Toolpath import CORNER_STYLE_EXACT_PATH, MOVE_ARC, Toolpath  # noqa: E402
+import pycam.Toolpath.Filters as Filters  # noqa: E402
+import pycam.Toolpath.Steps as Steps  # noqa: E402
+from pycam.Toolpath.MotionGrid import get_fixed_grid  # noqa: E402
+import pycam.Utils.log  # noqa: E402
+import pycam.Utils.threading  # noqa: E402
+
+
+DESCRIPTION = """Measure the runtime, the peak memory usage and the results of PyCAM's geometry
+and toolpath operations. Every benchmark case runs in a separate process. The results are written
+as JSON. They can be compared with a stored baseline: slower cases, a higher peak memory usage and
+changed operation counts (e.g. the number of generated moves) are reported as regressions."""
+
+SAMPLES_DIR = os.path.join(BASE_DIR, "samples")
+DEFAULT_MODELS = ("pycam-textbox.stl", "SampleScene.stl")
+DEFAULT_CONTOURS = ("pycam-text.dxf", )
+DEFAULT_SCALES = (1, 2)
+# the tool radius is a fraction of the size of the model (before tiling)
+TOOL_RADIUS_FACTOR = 1.0 / 25
+# number of layers of slicing and waterline operations
+LAYER_COUNT = 4
+KDTREE_QUERY_COUNT = 20000
+RANDOM_SEED = 1
+
+
+class _CountingWriter(object):
+    """ a G-code destination discarding the output (but counting its size) """
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, text):
+        self.size += len(text)
+
+
+def _get_filename(name, directory=SAMPLES_DIR):
+    if os.path.exists(name):
+        return name
+    return os.path.join(directory, name)
+
+
+def _get_peak_rss(children=False):
+    """ return the peak resident set size (kilobytes) of this process (or of its largest
+    terminated child process) or None
+    """
+    if resource is None:
+        return None
+    value = resource.getrusage(resource.RUSAGE_CHILDREN if children
+                               else resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        # bytes instead of kilobytes
+        value //= 1024
+    return value
+
+
+def get_tiled_model(model, scale):
+    """ combine scale x scale copies of the model - the workload grows with the square """
+    width = 1.1 * (model.maxx - model.minx)
+    height = 1.1 * (model.maxy - model.miny)
+    parts = []
+    for x_index in range(scale):
+        for y_index in range(scale):
+            part = model.copy()
+            part.shift(x_index * width, y_index * height, 0)
+            parts.append(part)
+    return get_combined_model(parts)
+
+
+def load_model(name, scale=1):
+    model = pycam.Importers.STLImporter.ImportModel(_get_filename(name))
+    tool_radius = TOOL_RADIUS_FACTOR * max(model.maxx - model.minx, model.maxy - model.miny)
+    if scale > 1:
+        model = get_tiled_model(model, scale)
+    return model, tool_radius
+
+
+def load_contour_model(name, scale=1):
+    model = pycam.Importers.DXFImporter.import_model(_get_filename(name))
+    if scale > 1:
+        model = get_tiled_model(model, scale)
+    return model
+
+
+CUTTER_NAMES = ("flat", "ball", "bull")
+
+
+def get_cutter(name, radius):
+    return {"flat": lambda: CylindricalCutter(radius),
+            "ball": lambda: SphericalCutter(radius),
+            "bull": lambda: ToroidalCutter(radius, radius / 4.0)}[name]()
+
+
+def get_box(model, margin=0):
+    return Box3D(Point3D(model.minx - margin, model.miny - margin, model.minz),
+                 Point3D(model.maxx + margin, model.maxy + margin, model.maxz))
+
+
+def get_grid(*args, **kwargs):
+    """ calculate the motion grid in advance - it is not part of the measured operation """
+    return [[list(line) for line in layer] for layer in get_fixed_grid(*args, **kwargs)]
+
+
+def get_grid_size(grid):
+    return sum(len(line) for layer in grid for line in layer)
+
+
+def get_settings_filters(tool_radius):
+    """ the filters applied during G-code export (see pycam.Plugins.ToolpathProcessors) """
+    return [Filters.MachineSetting("feedrate", 1000), Filters.MachineSetting("spindle_speed", 250),
+            Filters.SafetyHeight(25), Filters.PlungeFeedrate(100),
+            Filters.StepWidth(tool_radius / 1000, tool_radius / 1000, tool_radius / 1000),
+            Filters.TriggerSpindle(3), Filters.PathMode(CORNER_STYLE_EXACT_PATH, 0, 0)]
+
+
+def get_drop_generator_and_grid(model, tool_radius):
+    """ surfacing (see pycam.Plugins.ProcessStrategies) """
+    return DropCutter(), get_grid(get_box(model, tool_radius), None, step_width=tool_radius / 4.0,
+                                  line_distance=0.8 * tool_radius)
+
+
+def get_push_generator_and_grid(model, tool_radius):
+    """ slicing (see pycam.Plugins.ProcessStrategies) """
+    return PushCutter(waterlines=False), get_grid(
+        get_box(model, tool_radius), (model.maxz - model.minz) / LAYER_COUNT,
+        line_distance=1.8 * tool_radius)
+
+
+def get_waterline_generator_and_grid(model, tool_radius):
+    """ waterline (see pycam.Plugins.ProcessStrategies) """
+    return PushCutter(waterlines=True), get_grid(
+        get_box(model, tool_radius), (model.maxz - model.minz) / LAYER_COUNT,
+        line_distance=0.4 * tool_radius)
+
+
+GENERATORS = (("drop", get_drop_generator_and_grid),
+              ("push", get_push_generator_and_grid),
+              ("waterline", get_waterline_generator_and_grid))
+
+
+def get_surfacing_toolpath(name, scale):
+    """ generate the input toolpath for filter and export operations (with a ball nose cutter) """
+    model, tool_radius = load_model(name, scale)
+    path_generator, grid = get_drop_generator_and_grid(model, tool_radius)
+    moves = path_generator.GenerateToolPath(SphericalCutter(tool_radius), [model], grid,
+                                            minz=model.minz, maxz=model.maxz)
+    return Toolpath(toolpath_path=moves), tool_radius
+
+
+# The "prepare" functions below load and calculate the input data of an operation. They return
+# a function performing the measured operation. Its result is a dictionary of operation counts.
+
+def prepare_import_stl(name):
+    filename = _get_filename(name)
+
+    def run():
+        return {"triangles": len(pycam.Importers.STLImporter.ImportModel(filename))}
+    return run
+
+
+def prepare_import_dxf(name):
+    filename = _get_filename(name)
+
+    def run():
+        model = pycam.Importers.DXFImporter.import_model(filename)
+        return {"polygons": len(model.get_polygons())}
+    return run
+
+
+def prepare_kdtree_build(name, scale):
+    model = load_model(name, scale)[0]
+
+    def run():
+        # the triangle index is rebuilt by "reset_cache" (e.g. after a transformation)
+        model.reset_cache()
+        return {"triangles": len(model)}
+    return run
+
+
+def _get_queries(model, tool_radius):
+    generator = random.Random(RANDOM_SEED)
+    queries = []
+    for index in range(KDTREE_QUERY_COUNT):
+        x = generator.uniform(model.minx, model.maxx)
+        y = generator.uniform(model.miny, model.maxy)
+        queries.append((x - tool_radius, x + tool_radius, y - tool_radius, y + tool_radius))
+    return queries
+
+
+def prepare_kdtree_query(name, scale):
+    model, tool_radius = load_model(name, scale)
+    queries = _get_queries(model, tool_radius)
+
+    def run():
+        result_count = 0
+        for minx, maxx, miny, maxy in queries:
+            result_count += len(model.get_triangle_indices(minx=minx, maxx=maxx, miny=miny,
+                                                           maxy=maxy))
+        return {"queries": len(queries), "results": result_count}
+    return run
+
+
+def prepare_kdtree_query_many(name, scale):
+    model, tool_radius = load_model(name, scale)
+    kdtree = model.get_triangle_index()[0]
+    queries = numpy.array(_get_queries(model, tool_radius))
+
+    def run():
+        offsets, indices = kdtree.search_many(*queries.T)
+        return {"queries": len(queries), "results": len(indices)}
+    return run
+
+
+def prepare_generator(name, scale, get_generator_and_grid, cutter_name):
+    model, tool_radius = load_model(name, scale)
+    cutter = get_cutter(cutter_name, tool_radius)
+    path_generator, grid = get_generator_and_grid(model, tool_radius)
+
+    def run():
+        moves = path_generator.GenerateToolPath(cutter, [model], grid, minz=model.minz,
+                                                maxz=model.maxz)
+        return {"positions": get_grid_size(grid), "steps": len(moves)}
+    return run
+
+
+def prepare_offset(name, scale, direction):
+    model = load_contour_model(name, scale)
+    # the offset is relative to the size of the model (before tiling)
+    offset = 0.005 * max(model.maxx - model.minx, model.maxy - model.miny) / scale
+    if direction == "inner":
+        offset = -offset
+
+    def run():
+        result = model.get_offset_model(offset)
+        return {"polygons": len(model.get_polygons()), "offset_polygons": len(result)}
+    return run
+
+
+def prepare_filters(name, scale):
+    toolpath, tool_radius = get_surfacing_toolpath(name, scale)
+    filters = get_settings_filters(tool_radius)
+
+    def run():
+        return {"steps": len(toolpath.path),
+                "filtered_steps": len(Filters.get_filtered_moves(toolpath.path, filters))}
+    return run
+
+
+def prepare_arc_fitting(name, scale):
+    # the connected lines of a 2D model (with curves) are the toolpath of an engraving operation
+    model = load_contour_model(name, scale)
+    steps = []
+    last_position = None
+    for polygon in model.get_polygons():
+        points = polygon.get_points()
+        if polygon.is_closed:
+            points.append(points[0])
+        if (last_position is None) or (pdist(last_position, points[0]) > epsilon):
+            if last_position is not None:
+                steps.append(Steps.MoveSafety())
+            steps.append(Steps.MoveStraightRapid(points[0]))
+        steps.extend(Steps.MoveStraight(point) for point in points[1:])
+        last_position = points[-1]
+    steps.append(Steps.MoveSafety())
+    steps = Toolpath(toolpath_path=steps).path
+    # the tolerance is relative to the size of the model (before tiling)
+    arc_filter = Filters.ArcFitting(
+        0.0001 * max(model.maxx - model.minx, model.maxy - model.miny) / scale)
+
+    def run():
+        result = Filters.get_filtered_moves(steps, [arc_filter])
+        return {"steps": len(steps), "filtered_steps": len(result),
+                "arcs": len([step for step in result if step.action == MOVE_ARC])}
+    return run
+
+
+def prepare_gcode(name, scale):
+    toolpath, tool_radius = get_surfacing_toolpath(name, scale)
+    filters = get_settings_filters(tool_radius)
+
+    def run():
+        destination = _CountingWriter()
+        generator = LinuxCNC(destination)
+        generator.add_filters(filters)
+        generator.add_moves(toolpath.path, toolpath.filters)
+        generator.finish()
+        return {"steps": len(toolpath.path), "bytes": destination.size}
+    return run
+
+
+def get_cases(models, contours, scales):
+    """ return an ordered dictionary of all benchmark cases (name -> "prepare" function) """
+    cases = collections.OrderedDict()
+
+    def add(name, func, *args):
+        cases[name] = lambda: func(*args)
+
+    for model in models:
+        add("import/stl/%s" % model, prepare_import_stl, model)
+    for contour in contours:
+        add("import/dxf/%s" % contour, prepare_import_dxf, contour)
+    for scale in scales:
+        for model in models:
+            label = "%s@%d" % (model, scale)
+            add("kdtree/build/%s" % label, prepare_kdtree_build, model, scale)
+            add("kdtree/query/%s" % label, prepare_kdtree_query, model, scale)
+            if numpy is not None:
+                add("kdtree/query_many/%s" % label, prepare_kdtree_query_many, model, scale)
+            for generator_name, get_generator_and_grid in GENERATORS:
+                for cutter_name in CUTTER_NAMES:
+                    add("%s/%s/%s" % (generator_name, label, cutter_name), prepare_generator,
+                        model, scale, get_generator_and_grid, cutter_name)
+            add("filters/chain/%s" % label, prepare_filters, model, scale)
+            add("gcode/%s" % label, prepare_gcode, model, scale)
+        for contour in contours:
+            add("filters/arc_fitting/%s@%d" % (contour, scale), prepare_arc_fitting, contour,
+                scale)
+            for direction in ("outer", "inner"):
+                add("offset/%s@%d/%s" % (contour, scale, direction), prepare_offset, contour,
+                    scale, direction)
+    return cases
+
+
+def run_case(prepare, repeat):
+    """ measure a benchmark case within the current process """
+    run = prepare()
+    setup_rss = _get_peak_rss()
+    times = []
+    counts = None
+    for index in range(repeat):
+        start_time = timeit.default_timer()
+        counts = run()
+        times.append(timeit.default_timer() - start_time)
+    return {"time": min(times), "times": times, "counts": counts, "setup_peak_rss": setup_rss,
+            "peak_rss": _get_peak_rss()}
+
+
+def run_case_in_subprocess(name, args):
+    """ measure a benchmark case in a separate process (the peak memory usage is per process) """
+    handle, result_filename = tempfile.mkstemp(suffix=".json", prefix="pycam-benchmark-")
+    os.close(handle)
+    command = [sys.executable, os.path.abspath(__file__), "--run-case", name,
+               "--result-file", result_filename, "--repeat", str(args.repeat),
+               "--processes", str(args.processes)]
+    for option, values in (("--model", args.models), ("--contour", args.contours),
+                           ("--scale", args.scales)):
+        for value in values:
+            command.extend((option, str(value)))
+    try:
+        with open(os.devnull, "w") as devnull:
+            returncode = subprocess.call(command, stdout=devnull)
+        if returncode != 0:
+            return {"error": "benchmark process failed (exit code %d)" % returncode}
+        with open(result_filename) as result_file:
+            return json.load(result_file)
+    finally:
+        os.remove(result_filename)
+
+
+def get_memory_usage(result):
+    """ return the peak memory usage (kilobytes) of the main process or the largest worker """
+    values = [value for value in (result.get("peak_rss"), result.get("workers_peak_rss"))
+              if value is not None]
+    return max(values) if values else None
+
+
+def compare_results(results, baseline, threshold, min_time):
+    """ compare the results with a baseline
+
+    @returns: a list of tuples (name, baseline time, time, list of problems)
+    """
+    comparison = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if (reference is None) or ("error" in reference):
+            comparison.append((name, None, result.get("time"), ["new"]))
+            continue
+        if "error" in result:
+            comparison.append((name, reference["time"], None, ["failed"]))
+            continue
+        problems = []
+        if ((result["time"] > (1 + threshold) * reference["time"])
+                and (result["time"] - reference["time"] > min_time)):
+            problems.append("slower")
+        reference_memory, memory = get_memory_usage(reference), get_memory_usage(result)
+        if reference_memory and memory and (memory > (1 + threshold) * reference_memory):
+            problems.append("memory")
+        if result["counts"] != reference["counts"]:
+            problems.append("counts")
+        comparison.append((name, reference["time"], result["time"], problems))
+    return comparison
+
+
+def get_environment(args):
+    return {"pycam": VERSION,
+            "python": platform.python_version(),
+            "numpy": None if numpy is None else numpy.__version__,
+            "platform": platform.platform(),
+            "processes": args.processes,
+            "repeat": args.repeat,
+            "scales": args.scales}
+
+
+def _format_time(value):
+    return "-" if value is None else "%.4f" % value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument("cases", nargs="*",
+                        help="names of benchmark cases (wildcards are allowed - default: all)")
+    parser.add_argument("--model", action="append", dest="models",
+                        help="STL file (default: some bundled samples - may be repeated)")
+    parser.add_argument("--contour", action="append", dest="contours",
+                        help="DXF file for 2D operations (default: a bundled sample)")
+    parser.add_argument("--scale", type=int, action="append", dest="scales",
+                        help=("number of copies of each model along both axes (default: %s - "
+                              "may be repeated)" % ", ".join(str(s) for s in DEFAULT_SCALES)))
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="number of runs of each case (the fastest one is reported)")
+    parser.add_argument("--processes", type=int, default=0,
+                        help="number of worker processes (default: 0 - serial processing)")
+    parser.add_argument("--list", action="store_true", help="list the benchmark cases and exit")
+    parser.add_argument("--output", help="write the results (JSON) to a file")
+    parser.add_argument("--compare", metavar="BASELINE",
+                        help="compare the results with a previous result file")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="relative change of time or memory reported as a regression")
+    parser.add_argument("--min-time", type=float, default=0.01,
+                        help="ignore smaller time differences (seconds)")
+    parser.add_argument("--profile", metavar="FILE",
+                        help=("profile a single case within this process and store the "
+                              "statistics in a file"))
+    parser.add_argument("--run-case", help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    args.models = args.models or list(DEFAULT_MODELS)
+    args.contours = args.contours or list(DEFAULT_CONTOURS)
+    args.scales = args.scales or list(DEFAULT_SCALES)
+    pycam.Utils.log.get_logger().setLevel("ERROR")
+    cases = get_cases(args.models, args.contours, args.scales)
+    if args.run_case:
+        # we are the subprocess running a single case
+        pycam.Utils.threading.init_threading(args.processes)
+        try:
+            result = run_case(cases[args.run_case], args.repeat)
+        finally:
+            pycam.Utils.threading.cleanup()
+        # the worker processes are terminated now
+        result["workers_peak_rss"] = _get_peak_rss(children=True) if args.processes else None
+        with open(args.result_file, "w") as result_file:
+            json.dump(result, result_file)
+        return 0
+    if args.cases:
+        selected = [name for name in cases
+                    if any(fnmatch.fnmatch(name, pattern) for pattern in args.cases)]
+        if not selected:
+            parser.error("No benchmark case matches: %s" % " ".join(args.cases))
+    else:
+        selected = list(cases)
+    if args.list:
+        for name in selected:
+            print(name)
+        return 0
+    if args.profile:
+        if len(selected) != 1:
+            parser.error("Profiling requires the selection of a single case (%d selected)"
+                         % len(selected))
+        pycam.Utils.threading.init_threading(args.processes)
+        run = cases[selected[0]]()
+        cProfile.runctx("run()", globals(), {"run": run}, args.profile)
+        pycam.Utils.threading.cleanup()
+        print("Top ten time-consuming functions:")
+        pstats.Stats(args.profile).sort_stats("time").print_stats(10)
+        return 0
+    baseline = None
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+    results = collections.OrderedDict()
+    name_width = max(len(name) for name in selected)
+    print("%-*s %10s %10s  %s" % (name_width, "case", "time [s]", "RSS [MB]", "counts"))
+    for name in selected:
+        result = run_case_in_subprocess(name, args)
+        results[name] = result
+        if "error" in result:
+            print("%-*s %s" % (name_width, name, result["error"]))
+        else:
+            memory = get_memory_usage(result)
+            print("%-*s %10.4f %10s  %s" % (
+                name_width, name, result["time"],
+                "-" if memory is None else "%.1f" % (memory / 1024.0),
+                " ".join("%s=%s" % item for item in sorted(result["counts"].items()))))
+        sys.stdout.flush()
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump({"environment": get_environment(args), "results": results}, output_file,
+                      indent=2, sort_keys=True)
+    exit_code = 1 if any("error" in result for result in results.values()) else 0
+    if baseline is not None:
+        comparison = compare_results(results, baseline, args.threshold, args.min_time)
+        print()
+        print("%-*s %10s %10s %8s  %s" % (name_width, "case", "baseline", "time [s]", "ratio",
+                                          "regressions"))
+        for name, reference_time, current_time, problems in comparison:
+            if reference_time and current_time:
+                ratio = "%.2f" % (current_time / reference_time)
+            else:
+                ratio = "-"
+            print("%-*s %10s %10s %8s  %s" % (name_width, name, _format_time(reference_time),
+                                              _format_time(current_time), ratio,
+                                              ", ".join(problems)))
+        regressions = [name for name, reference_time, current_time, problems in comparison
+                       if set(problems).difference(("new", ))]
+        if regressions:
+            print("%d regression(s) found" % len(regressions))
+            exit_code = 1
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())